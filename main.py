@@ -7,9 +7,18 @@ import time
 from datetime import datetime
 import google.generativeai as genai
 from sparql_translator.src.parser.edoal_parser import EdoalParser
-from sparql_translator.src.parser.sparql_ast_parser import SparqlAstParser
+from sparql_translator.src.parser.sparql_ast_parser import SparqlAstParser, DaemonSparqlAstParser
+from sparql_translator.src.parser.py_sparql_parser import PySparqlAstParser
+from sparql_translator.src.rewriter.alternatives import AlternativePolicy
+from sparql_translator.src.rewriter.rewrite_cost import RewriteBudget
 from sparql_translator.src.rewriter.sparql_rewriter import SparqlRewriter
-from sparql_translator.src.rewriter.ast_serializer import AstSerializer
+from sparql_translator.src.rewriter.ast_serializer import AstSerializer, DaemonAstSerializer
+from sparql_translator.src.rewriter.py_ast_serializer import PyAstSerializer
+from sparql_translator.src.rewriter.rewrite_trace import print_trace
+from sparql_translator.src.common.term_dictionary import TERMS
+from sparql_translator.src.common.java_daemon import JavaHelperDaemon
+from sparql_translator.src.common.java_launcher import JavaLauncher
+from sparql_translator.src.common.java_worker_pool import JavaWorkerPool, default_pool_size
 from sparql_translator.src.common.logger import get_logger
 from dotenv import load_dotenv
 """
@@ -31,6 +40,66 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 # LLM評価機能のオン/オフ
 ENABLE_LLM_EVALUATION = False
 
+# Javaのパーサー/シリアライザーを常駐プロセスとして使い回すかどうか
+# False の場合はクエリごとに gradlew を起動する（従来の動作）
+USE_JAVA_DAEMON = True
+
+# Java ヘルパーとの AST の受け渡し形式: 'json'（従来の形式）/ 'compact'（1行の JSON）/
+# 'cbor'（文字列テーブル付きのバイナリ。転送量が最も小さい）
+# 'compact' / 'cbor' は、Java の出力を Python で読む往復テスト（tests/test_ast_wire.py）が
+# 実際の Jar で通るまでは既定にしない
+JAVA_WIRE_FORMAT = 'json'
+
+# 常駐プロセスを何個並べるか（USE_JAVA_DAEMON = True の場合のみ）
+# 2 以上ならワーカープールでパース/シリアライズを並列に処理する。1 なら常駐プロセス1つを使い回す
+JAVA_WORKER_POOL_SIZE = default_pool_size()
+# ワーカープールの処理待ちキューの上限と、1要求あたりのタイムアウト（秒）
+JAVA_WORKER_QUEUE_DEPTH = 64
+JAVA_REQUEST_TIMEOUT = 60.0
+
+# SPARQL → AST のパーサー実装: 'java'（Jena）または 'python'（Pure-Python、JVM を起動しない）
+# 'python' で対応していない構文（EXISTS など）は Java 版に委譲する
+# 'python' は、Java 版との差分テスト（tests/test_py_sparql_parser.py）が実際の Jar で通るまでは既定にしない
+SPARQL_PARSER_BACKEND = 'java'
+
+# AST → SPARQL のシリアライザー実装: 'java'（Jena）または 'python'（Pure-Python、JVM を起動しない）
+# 'python' で変換できない AST（未知の FILTER 関数など）は Java 版に委譲する
+# パーサーと同じく、'python' は差分テスト（tests/test_py_ast_serializer.py）が通るまでは既定にしない
+SPARQL_SERIALIZER_BACKEND = 'java'
+
+# 1つの BGP 内で複数のトリプルが edoal:or（UNION）に展開される場合の出力形式
+# 'product'（各 UNION の直積に展開）/ 'factorized'（各 UNION を独立したグループ要素として残す）/
+# 'auto'（直積の分岐数が UNION_PRODUCT_LIMIT を超える場合だけ 'factorized'）
+UNION_MODE = 'auto'
+UNION_PRODUCT_LIMIT = 16
+
+# 同じソース URI に対する対応が複数ある場合の選び方（src/rewriter/alternatives.py）
+# 'last'（最後の対応だけ。従来の動作）/ 'best'（measure が最も高い対応だけ）/
+# 'top-k'（measure の高い順に ALTERNATIVE_TOP_K 個を UNION に）/ 'union'（MIN_MEASURE 以上のすべてを UNION に）
+ALTERNATIVE_MODE = 'last'
+# これより measure の低い対応は使わない
+MIN_MEASURE = 0.0
+ALTERNATIVE_TOP_K = 3
+# 1つのソース URI が生む UNION の分岐数の上限
+MAX_ALTERNATIVE_BRANCHES = 8
+
+# 書き換え後のクエリのコストの上限（src/rewriter/rewrite_cost.py の COST_FIGURES の名前 -> 上限。空なら確認しない）
+# 例: {'triples': 200, 'branches': 64, 'product': 256}
+REWRITE_BUDGET = {}
+# 上限を超えた場合: 'reject'（そのクエリを失敗にする）/ 'factorize'（UNION を直積にしない形式で書き換え直し、なお超えれば失敗）
+REWRITE_BUDGET_ON_EXCEED = 'factorize'
+
+# 書き換え後に、他の分岐に包含される（重複を含む）UNION の分岐を取り除く（src/rewriter/union_pruning.py）
+# 'off'（取り除かない）/ 'distinct'（SELECT DISTINCT のクエリだけ。解の重複の数が変わらない）/
+# 'always'（すべてのクエリ。解の集合は同じだが重複の数が変わりうる）
+UNION_PRUNING = 'distinct'
+
+# 書き換えの記録（どの URI をどの対応でどう展開したか）。記録しない場合は書き換え中に画面やログへの出力を行わない
+# True にすると、各クエリの書き換えを従来どおり "[Rewrite] ..." の形式で画面とログに表示する
+PRINT_REWRITE_TRACE = False
+# 空でなければ、各クエリの記録を <REWRITE_TRACE_DIR>/<データセット名>/<クエリ名>.trace.json に書き出す
+REWRITE_TRACE_DIR = ''
+
 # テストデータのルートディレクトリ（相対パスまたは絶対パス）
 TEST_DATA_DIR = 'data/alignment'
 
@@ -265,7 +334,8 @@ def process_dataset(dataset_path, sparql_parser, project_root,
                     alignment_dir_name=ALIGNMENT_DIR_NAME,
                     alignment_file_name=ALIGNMENT_FILE_NAME,
                     queries_dir_name=QUERIES_DIR_NAME,
-                    expected_outputs_dir_name=EXPECTED_OUTPUTS_DIR_NAME):
+                    expected_outputs_dir_name=EXPECTED_OUTPUTS_DIR_NAME,
+                    serializer=None):
     """
     単一のデータセットに対する変換処理を行う。
     
@@ -277,6 +347,7 @@ def process_dataset(dataset_path, sparql_parser, project_root,
         alignment_file_name: アラインメントファイル名（ワイルドカード対応）
         queries_dir_name: クエリディレクトリ名
         expected_outputs_dir_name: 期待される出力ディレクトリ名
+        serializer: ASTシリアライザーインスタンス（Noneの場合はAstSerializerを生成）
     
     Returns:
         変換結果のリスト
@@ -307,20 +378,50 @@ def process_dataset(dataset_path, sparql_parser, project_root,
     print(f"Using alignment file: {os.path.basename(alignment_file)}")
     
     try:
+        # URI の辞書はアラインメントごとに作り直す（前のデータセットの語彙を持ち越さない）
+        TERMS.clear()
         edoal_parser = EdoalParser(alignment_file)
         alignment_data = edoal_parser.parse()
         print(f"Loaded {len(alignment_data.cells)} alignment cells.")
-        rewriter = SparqlRewriter(alignment_data)
-        serializer = AstSerializer(project_root)
+        policy = AlternativePolicy(ALTERNATIVE_MODE, MIN_MEASURE, ALTERNATIVE_TOP_K, MAX_ALTERNATIVE_BRANCHES)
+        budget = RewriteBudget(REWRITE_BUDGET_ON_EXCEED, **REWRITE_BUDGET) if REWRITE_BUDGET else None
+        rewriter = SparqlRewriter(alignment_data, union_mode=UNION_MODE, union_product_limit=UNION_PRODUCT_LIMIT,
+                                  trace=PRINT_REWRITE_TRACE or bool(REWRITE_TRACE_DIR), alternative_policy=policy,
+                                  budget=budget, union_pruning=UNION_PRUNING)
+        if serializer is None:
+            serializer = AstSerializer(project_root, wire_format=JAVA_WIRE_FORMAT)
     except Exception as e:
         print(f"Error parsing alignment file {alignment_file}: {e}")
         return []
 
+    # アラインメントの語彙（ソース URI）を含まないクエリは、パースせずにそのまま返す
+    query_filenames = sorted(f for f in os.listdir(queries_dir) if f.endswith('.sparql'))
+    input_queries = {}
+    for query_filename in query_filenames:
+        with open(os.path.join(queries_dir, query_filename), 'r', encoding='utf-8') as f:
+            input_queries[query_filename] = f.read()
+    to_parse = [f for f in query_filenames if rewriter.may_rewrite(input_queries[f])]
+    prescan_hits = set(to_parse)
+
+    # 書き換え対象のクエリを1回のJava呼び出しでまとめてパースしておく
+    parsed_queries = {}
+    if to_parse:
+        if len(to_parse) == len(query_filenames):
+            parse_paths = [queries_dir]
+        else:
+            parse_paths = [os.path.join(queries_dir, f) for f in to_parse]
+        try:
+            for record in sparql_parser.parse_many(parse_paths):
+                parsed_queries[os.path.basename(record['file'])] = record
+        except Exception as e:
+            # バッチパースに失敗した場合はクエリごとのパースにフォールバックする
+            print(f"Batch parsing failed, falling back to per-query parsing: {e}")
+
+    # 1. 各クエリをパースして書き換える（シリアライズは後でまとめて行う）
     results = []
-    for query_filename in sorted(os.listdir(queries_dir)):
+    rewritten_asts = []
+    for query_filename in query_filenames:
         query_filepath = os.path.join(queries_dir, query_filename)
-        if not query_filepath.endswith(".sparql"):
-            continue
 
         # 画面表示はそのまま残す（ユーザー指示）。加えてログにも書き込む。
         print(f"  - Processing query: {query_filename}")
@@ -332,8 +433,7 @@ def process_dataset(dataset_path, sparql_parser, project_root,
             # ログ失敗でも処理は継続
             pass
         
-        with open(query_filepath, 'r', encoding='utf-8') as f:
-            input_query = f.read()
+        input_query = input_queries[query_filename]
 
         expected_query = ""
         expected_output_filepath = os.path.join(expected_outputs_dir, query_filename)
@@ -341,35 +441,95 @@ def process_dataset(dataset_path, sparql_parser, project_root,
             with open(expected_output_filepath, 'r', encoding='utf-8') as f:
                 expected_query = f.read()
         
-        status = "Failure"
-        output_query = ""
         error_info = ""
+        # 'prescan': 書き換え対象の語彙を含まない / 'unchanged': 書き換えても AST が変わらない
+        shortcut = ""
+        # 取り除いた UNION の分岐の数
+        pruned_branches = 0
 
         try:
-            source_ast = sparql_parser.parse(query_filepath)
-            rewritten_ast = rewriter.walk(source_ast)
-            output_query = serializer.serialize(rewritten_ast)
-            
-            # URIベースの成功判定ロジック
-            status = check_translation_quality(input_query, output_query, expected_query, alignment_file)
+            if query_filename not in prescan_hits:
+                shortcut = "prescan"
+            else:
+                record = parsed_queries.get(query_filename)
+                if record is None:
+                    source_ast = sparql_parser.parse(query_filepath)
+                elif record['error']:
+                    raise RuntimeError(f"SPARQL AST Parser failed: {record['error']}")
+                else:
+                    source_ast = record['ast']
+                # 一時変数の番号などはクエリごとのコンテキストに持つので、出力は処理の順序に依存しない
+                context = rewriter.rewrite(source_ast)
+                if context.trace is not None:
+                    write_rewrite_trace(context.trace, dataset_path, query_filename)
+                pruned_branches = context.pruned_branches
+                if pruned_branches:
+                    print(f"    -> Pruned {pruned_branches} redundant UNION branch(es)")
+                if context.changed:
+                    rewritten_asts.append((len(results), context.ast))
+                else:
+                    shortcut = "unchanged"
             
         except Exception:
             error_info = traceback.format_exc()
             print(f"    -> Failed to translate: {error_info.splitlines()[-1]}")
 
-        results.append({
+        result = {
             "dataset": os.path.basename(dataset_path),
             "alignment_file": os.path.basename(alignment_file),
             "query_file": query_filename,
-            "status": status,
+            "status": "Failure",
             "input_query": input_query,
-            "output_query": output_query,
+            "output_query": "",
             "expected_query": expected_query,
             "error_info": error_info,
-        })
+            "shortcut": shortcut,
+            "pruned_branches": pruned_branches,
+        }
+        if shortcut:
+            # 元のクエリ文字列をそのまま出力とし、シリアライズは行わない
+            print(f"    -> Returned unchanged ({shortcut})")
+            result['output_query'] = input_query.strip()
+            result['status'] = check_translation_quality(
+                input_query, result['output_query'], expected_query, alignment_file)
+        results.append(result)
+
+    # 2. 書き換え後のASTを1回のJava呼び出しでまとめてシリアライズする
+    try:
+        serialized = serializer.serialize_many(ast for _, ast in rewritten_asts)
+        for (result_index, _), record in zip(rewritten_asts, serialized):
+            result = results[result_index]
+            if record['error']:
+                result['error_info'] = f"SPARQL AST Serializer failed: {record['error']}"
+                print(f"    -> Failed to serialize {result['query_file']}: {record['error']}")
+                continue
+            result['output_query'] = record['query'].strip()
+            # URIベースの成功判定ロジック
+            result['status'] = check_translation_quality(
+                result['input_query'], result['output_query'], result['expected_query'], alignment_file)
+    except Exception:
+        error_info = traceback.format_exc()
+        print(f"    -> Failed to serialize dataset: {error_info.splitlines()[-1]}")
+        for result_index, _ in rewritten_asts:
+            if not results[result_index]['output_query']:
+                results[result_index]['error_info'] = error_info
     return results
 
 
+def write_rewrite_trace(trace, dataset_path, query_filename):
+    """
+    1クエリ分の書き換えの記録を、設定に応じて画面・ログに表示し、JSON に書き出す。
+    """
+    if PRINT_REWRITE_TRACE:
+        print_trace(trace, get_logger('sparql_rewriter', verbose=False))
+    if REWRITE_TRACE_DIR:
+        trace_dir = os.path.join(REWRITE_TRACE_DIR, os.path.basename(dataset_path))
+        os.makedirs(trace_dir, exist_ok=True)
+        trace_path = os.path.join(trace_dir, os.path.splitext(query_filename)[0] + '.trace.json')
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            f.write(trace.to_json(indent=2))
+
+
 def find_datasets(test_data_dir, alignment_dir_name=ALIGNMENT_DIR_NAME, queries_dir_name=QUERIES_DIR_NAME):
     """
     テストデータディレクトリから処理可能なデータセットを自動検出する。
@@ -472,7 +632,7 @@ def write_results_to_csv(results, output_csv_file):
         fieldnames = [
             "dataset", "alignment_file", "query_file", "status",
             "input_query", "output_query", "expected_query", "error_info",
-            "llm_judgment", "llm_reason"
+            "llm_judgment", "llm_reason", "shortcut", "pruned_branches"
         ]
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
@@ -500,6 +660,10 @@ def print_summary(results):
     print(f"Successful translations: {successful_translations}")
     print(f"Failed translations: {total_queries - successful_translations}")
     print(f"Success rate: {success_rate:.2f}%")
+    # パース/シリアライズを省略したクエリの件数
+    print(f"Skipped by vocabulary prescan: {sum(1 for r in results if r.get('shortcut') == 'prescan')}")
+    print(f"Serializer skipped (AST unchanged): {sum(1 for r in results if r.get('shortcut') == 'unchanged')}")
+    print(f"Pruned UNION branches: {sum(r.get('pruned_branches', 0) for r in results)}")
 
 
 def main():
@@ -528,22 +692,52 @@ def main():
         print("No datasets found or processed.")
         return
 
-    # SPARQLパーサーの初期化
-    sparql_parser = SparqlAstParser(project_root)
+    # SPARQLパーサー/シリアライザーの初期化
+    # 常駐プロセスを使う場合は、パースとシリアライズで同じJVM（またはワーカープール）を共有する
+    daemon = None
+    if USE_JAVA_DAEMON:
+        # クリーンな checkout では、各ワーカーが gradlew でコンパイルし始める前に Jar を1回だけビルドしておく
+        JavaLauncher(project_root).ensure_jar()
+        if JAVA_WORKER_POOL_SIZE > 1:
+            daemon = JavaWorkerPool(project_root, size=JAVA_WORKER_POOL_SIZE,
+                                    queue_depth=JAVA_WORKER_QUEUE_DEPTH,
+                                    request_timeout=JAVA_REQUEST_TIMEOUT,
+                                    wire_format=JAVA_WIRE_FORMAT)
+        else:
+            daemon = JavaHelperDaemon(project_root, wire_format=JAVA_WIRE_FORMAT)
+        sparql_parser = DaemonSparqlAstParser(project_root, daemon)
+        serializer = DaemonAstSerializer(project_root, daemon)
+    else:
+        sparql_parser = SparqlAstParser(project_root, wire_format=JAVA_WIRE_FORMAT)
+        serializer = AstSerializer(project_root, wire_format=JAVA_WIRE_FORMAT)
+    if SPARQL_PARSER_BACKEND == 'python':
+        sparql_parser = PySparqlAstParser(project_root, fallback=sparql_parser)
+    if SPARQL_SERIALIZER_BACKEND == 'python':
+        serializer = PyAstSerializer(project_root, fallback=serializer)
     
     # 各データセットを処理
     all_results = []
-    for dataset_path in dataset_paths:
-        results = process_dataset(
-            dataset_path, 
-            sparql_parser, 
-            project_root,
-            ALIGNMENT_DIR_NAME,
-            ALIGNMENT_FILE_NAME,
-            QUERIES_DIR_NAME,
-            EXPECTED_OUTPUTS_DIR_NAME
-        )
-        all_results.extend(results)
+    try:
+        for dataset_path in dataset_paths:
+            results = process_dataset(
+                dataset_path, 
+                sparql_parser, 
+                project_root,
+                ALIGNMENT_DIR_NAME,
+                ALIGNMENT_FILE_NAME,
+                QUERIES_DIR_NAME,
+                EXPECTED_OUTPUTS_DIR_NAME,
+                serializer
+            )
+            all_results.extend(results)
+    finally:
+        if daemon is not None:
+            if isinstance(daemon, JavaWorkerPool):
+                stats = daemon.stats()
+                print(f"\nJava worker pool: {stats['size']} workers, "
+                      f"{stats['completed']} completed, {stats['failed']} failed, "
+                      f"{stats['timeouts']} timeouts, {stats['restarts']} restarts")
+            daemon.close()
 
     # LLM評価の実行（オプション）
     if ENABLE_LLM_EVALUATION:
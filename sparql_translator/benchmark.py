@@ -0,0 +1,596 @@
+"""
+書き換え・パース・Java ヘルパーの性能の比較
+- 各機能を入れたときの比較（以前の実装や設定との時間・メモリ・出力の大きさ）を、項目ごとのサブコマンドで実行する:
+    python3 sparql_translator/benchmark.py --help
+    python3 sparql_translator/benchmark.py rewrite-plan --datasets conference gbo-gmo
+    python3 sparql_translator/benchmark.py term-dictionary --queries 10000
+- 比較用の以前の実装や合成クエリのうち、テストでも使うものは tests のモジュールから import する
+"""
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import pathlib
+import time
+import tracemalloc
+
+# どのディレクトリから実行しても src と tests を import できるよう、このファイルのディレクトリを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parent)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.common import ast_wire
+from src.common.java_launcher import HELPERS, HELPER_JVM_OPTIONS, JavaLauncher, default_project_root
+from src.common.term_dictionary import RDF_TYPE, TermDictionary
+from src.common.typed_ast import to_dict, to_typed
+from src.parser.edoal_parser import EdoalParser, IdentifiedEntity
+from src.parser.py_sparql_parser import PySparqlAstParser, parse_sparql
+from src.rewriter.alternatives import AlternativePolicy
+from src.rewriter.pattern_index import PatternIndex, _query_keys, _unify
+from src.rewriter.py_ast_serializer import PyAstSerializer
+from src.rewriter.rewrite_cost import RewriteBudget, measure_cost
+from src.rewriter.rewrite_trace import print_trace
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+
+
+def load_dataset(dataset: str):
+    """data/alignment/<dataset> の最初のアラインメントと、全クエリの AST。"""
+    dataset_dir = os.path.join(REPO_ROOT, 'data', 'alignment', dataset)
+    alignment = EdoalParser(sorted(glob.glob(os.path.join(dataset_dir, 'alignment', '*.edoal')))[0]).parse()
+    parser = PySparqlAstParser()
+    asts = [parser.parse(path) for path in sorted(glob.glob(os.path.join(dataset_dir, 'queries', '*.sparql')))]
+    return alignment, asts
+
+
+def per_query(run, asts, rounds: int = 100, repeat: int = 5) -> float:
+    """
+    全クエリに run を rounds 回ずつ実行し、1クエリあたりの時間（マイクロ秒、repeat 回の最小値）を返す。
+    テンプレートの作成など、初回だけの処理は計測に含めない。
+    """
+    for ast in asts:
+        run(ast)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for ast in asts:
+                run(ast)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / (rounds * len(asts)) * 1e6
+
+
+def best_of(run, repeat: int = 5) -> float:
+    """run() 1回の時間（ミリ秒、repeat 回の最小値）。"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def quiet(rewriter: SparqlRewriter):
+    """rewriter のログと print を止める（計測に表示の時間を含めない）。"""
+    rewriter.logger.disabled = True
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+# --- ast-wire: AST のフレームのペイロード形式（JSON / compact / CBOR）の大きさとデコード時間 ---
+
+def bench_ast_wire(args):
+    from tests.test_ast_wire import make_large_ast
+
+    ast = make_large_ast(args.triples)
+    payloads = {
+        'json (pretty)': json.dumps(ast, indent=2).encode('utf-8'),
+        'compact': ast_wire.encode(ast, 'compact'),
+        'cbor': ast_wire.encode(ast, 'cbor'),
+    }
+    decoders = {'json (pretty)': json.loads, 'compact': json.loads, 'cbor': ast_wire.decode_cbor}
+    print(f"{'format':<15}{'bytes':>12}{'decode ms':>12}")
+    for name, payload in payloads.items():
+        elapsed = best_of(lambda: decoders[name](payload), repeat=10)
+        print(f"{name:<15}{len(payload):>12}{elapsed:>12.1f}")
+
+
+# --- java-launcher: コールドスタートの時間（何も付けない / JIT 設定のみ / AppCDS + JIT 設定） ---
+
+def measure_cold_start(launcher: JavaLauncher, runs: int) -> dict:
+    """
+    パーサー/シリアライザーを毎回新しい JVM で起動し、1件を処理し終えるまでの時間（ミリ秒の中央値）を測る。
+
+    :return: {(ヘルパー名, 設定名): 中央値}
+    """
+    query_file = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*', 'queries', '*.sparql')))[0]
+    ast_json = json.dumps(PySparqlAstParser().parse(query_file)).encode('utf-8')
+    java = launcher.java_command()
+    results = {}
+    for helper, helper_args, stdin in [('parser', [query_file], None), ('serializer', [], ast_json)]:
+        main_class, _ = HELPERS[helper]
+        configurations = {
+            'plain': java + ['-cp', launcher.jar_path, main_class] + helper_args,
+            'jit': java + HELPER_JVM_OPTIONS[helper] + ['-cp', launcher.jar_path, main_class] + helper_args,
+            'cds+jit': launcher.command(helper, helper_args),
+        }
+        for name, command in configurations.items():
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(command, cwd=REPO_ROOT, input=stdin, capture_output=True, check=True)
+                timings.append((time.perf_counter() - start) * 1000)
+            results[(helper, name)] = statistics.median(timings)
+    return results
+
+
+def bench_java_launcher(args):
+    launcher = JavaLauncher(REPO_ROOT)
+    if not launcher.uses_jar:
+        print('ビルド済みの Jar と java が必要です（python3 -m sparql_translator.src.common.java_launcher --build）。')
+        sys.exit(1)
+    if not launcher.has_cds_archives():
+        print('AppCDS アーカイブが無いため、cds+jit は jit と同じ設定になります。')
+    results = measure_cold_start(launcher, args.runs)
+    print(f"{'helper':<12}{'plain ms':>12}{'jit ms':>12}{'cds+jit ms':>12}{'speedup':>10}")
+    for helper in ('parser', 'serializer'):
+        plain, jit, cds = (results[(helper, name)] for name in ('plain', 'jit', 'cds+jit'))
+        print(f"{helper:<12}{plain:>12.0f}{jit:>12.0f}{cds:>12.0f}{plain / cds:>9.2f}x")
+
+
+# --- rewrite-plan: トリプルごとに Cell.entity2 を展開する場合と、コンパイル済みのテンプレートを使う場合 ---
+
+class DirectExpansionRewriter(SparqlRewriter):
+    """テンプレートを使わず、トリプルごとに Cell.entity2 を展開する（比較用）。"""
+
+    def visit_triple(self, node):
+        s = self._walk_node(node['subject'])
+        p = self._walk_node(node['predicate'])
+        o = self._walk_node(node['object'])
+        if p.get('type') == 'uri' and p.get('value') in self.mapping:
+            target_entity = self.mapping[p['value']]
+            if not isinstance(target_entity, IdentifiedEntity):
+                expanded = self._expand_predicate(s, target_entity, o)
+                if expanded:
+                    return expanded
+        if (o.get('type') == 'uri' and o.get('value') in self.mapping and
+                p.get('type') == 'uri' and 'rdf-syntax-ns#type' in p.get('value', '')):
+            target_entity = self.mapping[o['value']]
+            if not isinstance(target_entity, IdentifiedEntity):
+                expanded = self._expand_complex_entity(s, target_entity)
+                if expanded:
+                    return expanded
+        return {**node, 'subject': s, 'predicate': p, 'object': o}
+
+
+def _var(name: str) -> dict:
+    return {'type': 'variable', 'value': name}
+
+
+def measure_expansion(alignment, rounds: int = 2000, repeat: int = 5) -> tuple:
+    """
+    複雑な対応（Cell.entity2 が IdentifiedEntity でないもの）1件あたりの展開時間（マイクロ秒）を、
+    直接展開とテンプレートのインスタンス化で測る。
+
+    :return: (対応の数, 直接展開, テンプレート)
+    """
+    rewriter = SparqlRewriter(alignment)
+    cases = []
+    with quiet(rewriter):
+        for uri, target in rewriter.mapping.items():
+            if not isinstance(target, IdentifiedEntity):
+                cases.append((lambda t=target: rewriter._expand_predicate(_var('s'), t, _var('o')),
+                              lambda u=uri: rewriter.plan.relation(u).instantiate(
+                                  _var('s'), _var('o'), rewriter._generate_temp_var)))
+                cases.append((lambda t=target: rewriter._expand_complex_entity(_var('s'), t),
+                              lambda u=uri: rewriter.plan.rdf_class(u).instantiate(
+                                  _var('s'), None, rewriter._generate_temp_var)))
+        results = []
+        for index in (0, 1):
+            def run_all():
+                for _ in range(rounds):
+                    for case in cases:
+                        case[index]()
+            results.append(best_of(run_all, repeat) * 1000 / (rounds * max(len(cases), 1)))
+    return len(cases) // 2, results[0], results[1]
+
+
+def bench_rewrite_plan(args):
+    print('1クエリの書き換え（walk 全体）')
+    print(f"{'dataset':<14}{'queries':>8}{'direct us':>12}{'template us':>13}{'speedup':>10}")
+    for dataset in args.datasets:
+        alignment, asts = load_dataset(dataset)
+        direct, planned = DirectExpansionRewriter(alignment), SparqlRewriter(alignment)
+        with quiet(direct), quiet(planned):
+            direct_us = per_query(direct.walk, asts, rounds=args.rounds)
+            planned_us = per_query(planned.walk, asts, rounds=args.rounds)
+        print(f"{dataset:<14}{len(asts):>8}{direct_us:>12.1f}{planned_us:>13.1f}{direct_us / planned_us:>9.2f}x")
+    print('\n複雑な対応1件の展開')
+    print(f"{'dataset':<14}{'cells':>8}{'direct us':>12}{'template us':>13}{'speedup':>10}")
+    for dataset in args.datasets:
+        alignment, _ = load_dataset(dataset)
+        cells, direct_us, planned_us = measure_expansion(alignment)
+        print(f"{dataset:<14}{cells:>8}{direct_us:>12.2f}{planned_us:>13.2f}{direct_us / planned_us:>9.2f}x")
+
+
+# --- union-mode: edoal:or に展開されるトリプルを増やしたときの 'product' と 'factorized' ---
+
+def bench_union_mode(args):
+    from tests.test_union_mode import _rewrite
+
+    serializer = PyAstSerializer()
+    print(f"{'unions':>7}{'branches':>10}{'mode':>12}{'rewrite ms':>12}{'SPARQL bytes':>14}")
+    for disjunctions in args.disjunctions:
+        for mode in ('product', 'factorized'):
+            start = time.perf_counter()
+            pattern = _rewrite(disjunctions, 3, union_mode=mode)
+            elapsed = (time.perf_counter() - start) * 1000
+            ast = {'queryType': 'SELECT', 'selectVariables': [], 'prefixes': {},
+                   'ast': {'type': 'group', 'patterns': [pattern]}}
+            size = len(serializer.serialize(ast).encode('utf-8'))
+            print(f"{disjunctions:>7}{3 ** disjunctions:>10}{mode:>12}{elapsed:>12.1f}{size:>14}")
+
+
+# --- copy-on-write: 書き換えの有無にかかわらず全ノードを作り直す場合と、変わった部分だけをコピーする場合 ---
+
+class RebuildingRewriter(SparqlRewriter):
+    """コピーオンライト以前の実装のように、書き換えの有無にかかわらず全ノードを作り直す（比較用）。"""
+
+    def _walk_node(self, node):
+        result = super()._walk_node(node)
+        if result is node and isinstance(node, dict):
+            return dict(node)
+        return result
+
+
+def _large_query(triples: int, aligned_every: int) -> dict:
+    lines = [f'?s{i} <http://cmt#title> ?o{i} .' if i % aligned_every == 0 else f'?s{i} <http://other#p{i}> ?o{i} .'
+             for i in range(triples)]
+    return parse_sparql('SELECT * WHERE { ' + ' '.join(lines) + ' }')
+
+
+def measure_copy_on_write(rewriter_class, ast, rounds: int = 20) -> tuple:
+    """(1回の書き換え時間 ms（最小値）, 1回の書き換えで確保したメモリの最大値 KB)"""
+    from tests.test_copy_on_write import _alignment
+
+    rewriter = rewriter_class(_alignment())
+    with quiet(rewriter):
+        elapsed = best_of(lambda: rewriter.walk(ast), rounds)
+        tracemalloc.start()
+        rewriter.walk(ast)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak / 1024
+
+
+def bench_copy_on_write(args):
+    print(f"{'triples':>8}{'aligned':>9}{'rebuild ms':>12}{'cow ms':>9}{'rebuild KB':>12}{'cow KB':>9}")
+    for triples in args.triples:
+        ast = _large_query(triples, 100)
+        rebuild_ms, rebuild_kb = measure_copy_on_write(RebuildingRewriter, ast)
+        cow_ms, cow_kb = measure_copy_on_write(SparqlRewriter, ast)
+        print(f"{triples:>8}{triples // 100:>9}{rebuild_ms:>12.1f}{cow_ms:>9.1f}{rebuild_kb:>12.0f}{cow_kb:>9.0f}")
+
+
+# --- ast-traversal: 再帰的な巡回と、明示的なスタックによる巡回（幅の広いクエリと深いクエリ） ---
+
+def bench_ast_traversal(args):
+    from tests.test_ast_traversal import RecursiveRewriter, _alignment, _level, _rewrite, nested_query
+
+    def wide_query(groups: int, triples: int) -> dict:
+        """同じ深さに groups 個のグループ（OPTIONAL）を並べたクエリの AST。"""
+        per_group = max(triples // groups, 1)
+        patterns = [{'type': 'optional', 'pattern': {'type': 'group', 'patterns': _level(index, per_group)}}
+                    for index in range(groups)]
+        return {'queryType': 'SELECT', 'selectVariables': [], 'prefixes': {},
+                'ast': {'type': 'group', 'patterns': patterns}}
+
+    def measure(rewriter_class, ast):
+        """1回の書き換え時間（ms）。再帰の上限に達した場合は None。"""
+        rewriter = rewriter_class(_alignment())
+        try:
+            return best_of(lambda: _rewrite(rewriter, ast))
+        except RecursionError:
+            return None
+
+    cases = [('wide', 'default', wide_query(1000, args.triples)),
+             ('deep', 'default', nested_query(1000, args.triples)),
+             ('deep', '20000', nested_query(1000, args.triples))]
+    print(f"{'shape':<8}{'limit':>9}{'triples':>9}{'recursive ms':>14}{'iterative ms':>14}")
+    for shape, limit, ast in cases:
+        previous = sys.getrecursionlimit()
+        if limit != 'default':
+            sys.setrecursionlimit(int(limit))
+        try:
+            recursive = measure(RecursiveRewriter, ast)
+            iterative = measure(SparqlRewriter, ast)
+        finally:
+            sys.setrecursionlimit(previous)
+        recursive_text = 'RecursionError' if recursive is None else f'{recursive:.1f}'
+        print(f"{shape:<8}{limit:>9}{args.triples:>9}{recursive_text:>14}{iterative:>14.1f}")
+
+
+# --- rewrite-trace: 書き換えの記録なし・記録あり・記録あり + 表示 ---
+
+def bench_rewrite_trace(args):
+    print(f"{'dataset':<14}{'queries':>8}{'off us':>10}{'trace us':>10}{'print us':>10}")
+    for dataset in args.datasets:
+        alignment, asts = load_dataset(dataset)
+        plain, traced = SparqlRewriter(alignment), SparqlRewriter(alignment, trace=True)
+
+        def walk_and_print(ast):
+            traced.walk(ast)
+            print_trace(traced.last_trace)
+
+        with quiet(plain), quiet(traced):
+            off_us = per_query(plain.walk, asts, rounds=args.rounds)
+            traced_us = per_query(traced.walk, asts, rounds=args.rounds)
+            printed_us = per_query(walk_and_print, asts, rounds=args.rounds)
+        print(f"{dataset:<14}{len(asts):>8}{off_us:>10.1f}{traced_us:>10.1f}{printed_us:>10.1f}")
+
+
+# --- pattern-index: 複雑なソース側の対応のパターンを、索引で選ぶ場合と全パターンを順に照合する場合 ---
+
+def linear_select(patterns, triples) -> int:
+    """索引を使わず、全パターンを BGP の全トリプルに対して照合する（比較用）。一致の数を返す。"""
+    by_key = {}
+    for position, triple in enumerate(triples):
+        for key in _query_keys(triple):
+            by_key.setdefault(key, []).append(position)
+    found = 0
+    for pattern in patterns:
+        for position in range(len(triples)):
+            for _ in _unify(pattern, triples, by_key, position):
+                found += 1
+    return found
+
+
+def bench_pattern_index(args):
+    from tests.test_pattern_index import _synthetic_alignment, _synthetic_bgp
+
+    print(f"{'patterns':>9}{'build ms':>10}{'index ms':>10}{'linear ms':>11}")
+    for size in args.patterns:
+        start = time.perf_counter()
+        index = PatternIndex(_synthetic_alignment(size).cells)
+        build = (time.perf_counter() - start) * 1000
+        triples = _synthetic_bgp(size)
+        counts = {f'm{i}': 2 for i in range(size)}
+        indexed = best_of(lambda: index.select(triples, counts))
+        linear = best_of(lambda: linear_select(index.patterns, triples), repeat=1 if size >= 10000 else 5)
+        print(f"{size:>9}{build:>10.1f}{indexed:>10.3f}{linear:>11.1f}")
+
+
+# --- mapping-index: 1つの辞書と部分文字列の判定で書き換える場合と、役割ごとの索引を使う場合 ---
+
+class FlatMappingRewriter(SparqlRewriter):
+    """以前の実装のように、1つの辞書と rdf:type の部分文字列の判定で書き換える（比較用）。"""
+
+    def visit_triple(self, node):
+        s = self._walk_node(node['subject'])
+        p = self._walk_node(node['predicate'])
+        o = self._walk_node(node['object'])
+        if p.get('type') == 'uri' and p.get('value') in self.mapping:
+            template = self.plan.relation(p['value'])
+            if template is not None:
+                expanded = self._instantiate(template, s, o)
+                if expanded:
+                    return expanded
+        if (o.get('type') == 'uri' and o.get('value') in self.mapping and
+                p.get('type') == 'uri' and 'rdf-syntax-ns#type' in p.get('value', '')):
+            template = self.plan.rdf_class(o['value'])
+            if template is not None:
+                expanded = self._instantiate(template, s, None)
+                if expanded:
+                    return expanded
+        if s is node['subject'] and p is node['predicate'] and o is node['object']:
+            return node
+        return {**node, 'subject': s, 'predicate': p, 'object': o}
+
+
+def bench_mapping_index(args):
+    print(f"{'dataset':<14}{'queries':>8}{'flat us':>10}{'roles us':>10}")
+    for dataset in args.datasets:
+        alignment, asts = load_dataset(dataset)
+        flat = per_query(FlatMappingRewriter(alignment).walk, asts, rounds=args.rounds)
+        roles = per_query(SparqlRewriter(alignment).walk, asts, rounds=args.rounds)
+        print(f"{dataset:<14}{len(asts):>8}{flat:>10.1f}{roles:>10.1f}")
+
+
+# --- term-dictionary: URI をインターンする場合としない場合の、AST のメモリとパース + 書き換えのスループット ---
+
+class PlainTerms(TermDictionary):
+    """インターンしない辞書（比較用）。"""
+
+    def intern(self, text: str) -> str:
+        return text
+
+
+def synthetic_corpus(alignment, size: int, seed: int = 0) -> list:
+    """アラインメントのソース URI をランダムに組み合わせた size 個のクエリ文字列。"""
+    rewriter = SparqlRewriter(alignment)
+    classes, predicates = sorted(rewriter.roles.classes), sorted(rewriter.roles.predicates)
+    rng = random.Random(seed)
+    queries = []
+    for index in range(size):
+        patterns = [f'?x <{RDF_TYPE}> <{rng.choice(classes)}> .']
+        patterns += [f'?x <{rng.choice(predicates)}> ?v{i} .' for i in range(3)]
+        patterns.append(f'?v0 a <{rng.choice(classes)}> .')
+        queries.append(f'SELECT * WHERE {{ {" ".join(patterns)} }} LIMIT {index % 100 + 1}')
+    return queries
+
+
+def retained_memory(build, items) -> int:
+    """build(item) で作ったものを全部保持したときに増えたメモリ（バイト）。"""
+    gc.collect()
+    tracemalloc.start()
+    built = [build(item) for item in items]
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del built
+    return current
+
+
+def bench_term_dictionary(args):
+    alignment, _ = load_dataset('gbo-gmo')
+    queries = synthetic_corpus(alignment, args.queries)
+    rewriter = SparqlRewriter(alignment)
+    print(f"gbo-gmo: {len(alignment.cells)} cells, {args.queries} synthetic queries")
+    print(f"{'terms':<10}{'AST MB':>10}{'queries/s':>12}")
+    for name, terms in [('plain', PlainTerms()), ('interned', TermDictionary([RDF_TYPE]))]:
+        memory = retained_memory(lambda query: parse_sparql(query, terms=terms), queries) / 1e6
+        start = time.perf_counter()
+        for query in queries:
+            rewriter.rewrite(parse_sparql(query, terms=terms))
+        rate = len(queries) / (time.perf_counter() - start)
+        print(f"{name:<10}{memory:>10.1f}{rate:>12.0f}")
+
+
+# --- alternatives: 同じソース URI の複数の対応の選び方ごとの、出力の大きさと書き換え時間 ---
+
+POLICIES = [('last', {}), ('best', {}), ('top-k', {'top_k': 2}), ('union', {}), ('union', {'max_branches': 2})]
+
+
+def bench_alternatives(args):
+    print(f"{'dataset':<20}{'policy':<24}{'chars':>9}{'UNIONs':>8}{'us/query':>10}")
+    serializer = PyAstSerializer()
+    for dataset in args.datasets:
+        alignment, asts = load_dataset(dataset)
+        for mode, options in POLICIES:
+            rewriter = SparqlRewriter(alignment, alternative_policy=AlternativePolicy(mode, **options))
+            texts = [serializer.serialize(rewriter.walk(ast)) for ast in asts]
+            elapsed = per_query(rewriter.walk, asts, rounds=args.rounds)
+            size = sum(len(text) for text in texts)
+            unions = sum(text.count('UNION') for text in texts)
+            name = mode + ''.join(f' {key}={value}' for key, value in options.items())
+            print(f"{dataset:<20}{name:<24}{size:>9}{unions:>8}{elapsed:>10.1f}")
+
+
+# --- rewrite-cost: 書き換えだけ・予算の確認つき・explain() ---
+
+def bench_rewrite_cost(args):
+    print(f"{'dataset':<14}{'queries':>8}{'rewrite us':>12}{'budget us':>11}{'explain us':>12}")
+    for dataset in args.datasets:
+        alignment, asts = load_dataset(dataset)
+        plain = SparqlRewriter(alignment)
+        budgeted = SparqlRewriter(alignment, budget=RewriteBudget('factorize', triples=10000))
+        rewrite = per_query(plain.rewrite, asts, rounds=args.rounds)
+        budget = per_query(budgeted.rewrite, asts, rounds=args.rounds)
+        explain = per_query(plain.explain, asts, rounds=args.rounds)
+        print(f"{dataset:<14}{len(asts):>8}{rewrite:>12.1f}{budget:>11.1f}{explain:>12.1f}")
+
+
+# --- typed-ast: dict と型付きの AST の1ノードあたりのメモリ・書き換え時間・変換時間 ---
+
+def large_query(triples: int) -> dict:
+    """tests/test_typed_ast.py の _alignment() のソース URI を10個に1個含む、50 個ずつのトリプルの BGP を
+    OPTIONAL で並べたクエリの AST。"""
+    patterns = []
+    for group in range(0, triples, 50):
+        bgp = ' . '.join(f'?s{group} <http://cmt#title> ?o{index}' if index % 10 == 0 else
+                         f'?s{group} <http://other#p{index}> "v{index}"@en' for index in range(group, group + 50))
+        patterns.append(f'OPTIONAL {{ {bgp} }}')
+    return parse_sparql(f'SELECT * WHERE {{ {" ".join(patterns)} }}')
+
+
+def bench_typed_ast(args):
+    from tests.test_typed_ast import _alignment, _nodes
+
+    workloads = [(dataset, *load_dataset(dataset)) for dataset in args.datasets]
+    workloads.append((f'large-{args.triples}', _alignment(), [large_query(args.triples)]))
+
+    print(f"{'workload':<14}{'nodes':>8}{'dict B':>8}{'typed B':>9}{'dict us':>10}{'typed us':>10}"
+          f"{'to_typed':>10}{'to_dict':>9}")
+    for name, alignment, asts in workloads:
+        rewriter = SparqlRewriter(alignment)
+        typed = [to_typed(ast) for ast in asts]
+        nodes = sum(len(_nodes(ast)) for ast in asts)
+        # どちらも同じ URI の文字列を共有するので、ノードとリストの分だけを比べる
+        dict_bytes = retained_memory(to_dict, typed) / nodes
+        typed_bytes = retained_memory(to_typed, asts) / nodes
+        rounds = max(2000 // nodes, 1)
+        print(f"{name:<14}{nodes:>8}{dict_bytes:>8.0f}{typed_bytes:>9.0f}"
+              f"{per_query(rewriter.rewrite, asts, rounds, 7):>10.1f}"
+              f"{per_query(rewriter.rewrite, typed, rounds, 7):>10.1f}"
+              f"{per_query(to_typed, asts, rounds, 7):>10.1f}{per_query(to_dict, typed, rounds, 7):>9.1f}")
+
+
+# --- union-pruning: 1クエリあたりに取り除いた UNION の分岐の数と、除去にかかる時間 ---
+
+def bench_union_pruning(args):
+    print(f"{'dataset':<14}{'queries':>8}{'pruned':>8}{'per query':>11}{'branches':>10}{'after':>7}"
+          f"{'rewrite us':>12}{'pruning us':>12}")
+    for dataset in args.datasets:
+        alignment, asts = load_dataset(dataset)
+        plain = SparqlRewriter(alignment)
+        pruning = SparqlRewriter(alignment, union_pruning='always')
+        contexts = [pruning.rewrite(ast) for ast in asts]
+        pruned = sum(context.pruned_branches for context in contexts)
+        branches = sum(measure_cost(plain.rewrite(ast).ast).branches for ast in asts)
+        after = sum(measure_cost(context.ast).branches for context in contexts)
+        print(f"{dataset:<14}{len(asts):>8}{pruned:>8}{pruned / len(asts):>11.2f}{branches:>10}{after:>7}"
+              f"{per_query(plain.rewrite, asts, rounds=args.rounds):>12.1f}"
+              f"{per_query(pruning.rewrite, asts, rounds=args.rounds):>12.1f}")
+
+
+DATASETS = ('--datasets', 'data/alignment の下のデータセット')
+ROUNDS = ('--rounds', '1回の計測で全クエリを処理する回数')
+
+# サブコマンド名 -> (実行する関数, 説明, [(オプション, 既定値, 説明)])。既定値がリストのオプションは複数の値を取る
+BENCHMARKS = {
+    'ast-wire': (bench_ast_wire, 'フレームのペイロード形式の大きさとデコード時間', [
+        ('--triples', 5000, '合成した AST のトリプル数')]),
+    'java-launcher': (bench_java_launcher, 'Java ヘルパーのコールドスタート時間（ビルド済みの Jar が必要）', [
+        ('--runs', 10, '設定ごとの起動回数')]),
+    'rewrite-plan': (bench_rewrite_plan, 'トリプルごとの展開とテンプレートの書き換え時間', [
+        (DATASETS[0], ['conference', 'gbo-gmo'], DATASETS[1]), (ROUNDS[0], 200, ROUNDS[1])]),
+    'union-mode': (bench_union_mode, "union_mode 'product' / 'factorized' の書き換え時間と出力の大きさ", [
+        ('--disjunctions', [2, 4, 6, 8], 'edoal:or（3分岐）に展開されるトリプルの数')]),
+    'copy-on-write': (bench_copy_on_write, '全ノードの作り直しとコピーオンライトの時間・メモリ', [
+        ('--triples', [1000, 10000], 'クエリのトリプル数（100 個に 1 個が書き換わる）')]),
+    'ast-traversal': (bench_ast_traversal, '再帰的な巡回とスタックによる巡回の時間', [
+        ('--triples', 10000, '幅の広いクエリと深いクエリのトリプル数')]),
+    'rewrite-trace': (bench_rewrite_trace, '書き換えの記録の有無と表示の時間', [
+        (DATASETS[0], ['conference', 'gbo-gmo'], DATASETS[1]), (ROUNDS[0], 200, ROUNDS[1])]),
+    'pattern-index': (bench_pattern_index, 'パターン索引と全パターンの照合の時間', [
+        ('--patterns', [100, 1000, 10000, 100000], 'アラインメントのパターンの数')]),
+    'mapping-index': (bench_mapping_index, '1つの辞書と役割ごとの索引の書き換え時間', [
+        (DATASETS[0], ['conference', 'gbo-gmo'], DATASETS[1]), (ROUNDS[0], 200, ROUNDS[1])]),
+    'term-dictionary': (bench_term_dictionary, 'URI のインターンの有無による AST のメモリとスループット', [
+        ('--queries', 100000, 'gbo-gmo の語彙から作る合成クエリの数')]),
+    'alternatives': (bench_alternatives, '代替の対応の選び方ごとの出力の大きさと書き換え時間', [
+        (DATASETS[0], ['cmt-conference', 'confOf-conference', 'conference-ekaw'], DATASETS[1]),
+        (ROUNDS[0], 20, ROUNDS[1])]),
+    'rewrite-cost': (bench_rewrite_cost, '書き換え・予算の確認・explain() の時間', [
+        (DATASETS[0], ['conference', 'gbo-gmo'], DATASETS[1]), (ROUNDS[0], 100, ROUNDS[1])]),
+    'typed-ast': (bench_typed_ast, 'dict と型付きの AST のメモリと時間', [
+        (DATASETS[0], ['conference', 'gbo-gmo', 'agronomic-voc'], DATASETS[1]),
+        ('--triples', 10000, '大きな合成クエリのトリプル数')]),
+    'union-pruning': (bench_union_pruning, 'UNION の分岐の除去の数と時間', [
+        (DATASETS[0], ['agronomic-voc', 'edas-ekaw', 'conference'], DATASETS[1]), (ROUNDS[0], 100, ROUNDS[1])]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='書き換え・パース・Java ヘルパーの性能の比較')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True, metavar='benchmark')
+    for name, (run, help_text, options) in BENCHMARKS.items():
+        subparser = subparsers.add_parser(name, help=help_text, description=help_text)
+        subparser.set_defaults(run=run)
+        for flag, default, option_help in options:
+            many = isinstance(default, list)
+            subparser.add_argument(flag, nargs='+' if many else None, type=type(default[0] if many else default),
+                                   default=default,
+                                   help=f"{option_help} (既定: {' '.join(map(str, default)) if many else default})")
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
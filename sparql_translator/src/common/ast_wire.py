@@ -0,0 +1,270 @@
+"""
+Python と Java ヘルパーの間で AST をやり取りするワイヤーフォーマット
+- 'json'    : 従来どおりの JSON（パーサーの単発モードは整形済み JSON を出力する）
+- 'compact' : 空白を含まない1行の JSON
+- 'cbor'    : 文字列テーブル付きの CBOR (RFC 8949)。AST に何度も現れる URI やキー名を
+              テーブルに1回だけ書き、本体からは番号で参照する
+
+形式はヘルパーに `--wire <format>` を渡して明示的に選ぶ（省略時は 'json'）。
+Java 側の実装は sparql_wire_java.AstWire で、両者は同じ形式を読み書きする。
+
+CBOR メッセージの構造:
+    [ [文字列0, 文字列1, ...], 本体 ]
+本体の中の文字列（マップのキーを含む）は、テーブルに入っていれば tag 25 + 番号、
+入っていなければ通常のテキスト文字列として書く。数値は整数なら int、それ以外は float64。
+
+バイナリを含むため、CBOR の場合は単発の出力やバッチの各レコードも常駐プロセスと同じ
+「バイト長 + 改行」のヘッダ付きフレームで送る。
+"""
+import json
+import struct
+
+from .term_dictionary import TERMS
+
+WIRE_FORMATS = ('json', 'compact', 'cbor')
+
+# この長さ（UTF-8 バイト数）未満の文字列はテーブルに入れず、そのまま書く
+_MIN_INTERNED_LENGTH = 3
+_STRING_REF_TAG = 25
+
+_FLOAT64 = struct.Struct('>d')
+_FLOAT32 = struct.Struct('>f')
+
+
+def check_wire_format(wire_format: str) -> str:
+    """ワイヤーフォーマット名を検証して返す。"""
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError(f"Unknown wire format: {wire_format!r} (expected one of {', '.join(WIRE_FORMATS)})")
+    return wire_format
+
+
+def wire_args(wire_format: str) -> list:
+    """ヘルパーに渡すコマンドライン引数。'json' の場合は従来どおり何も付けない。"""
+    return [] if check_wire_format(wire_format) == 'json' else ['--wire', wire_format]
+
+
+def encode(obj, wire_format: str) -> bytes:
+    """オブジェクトを指定した形式のバイト列にする。"""
+    if wire_format == 'cbor':
+        return encode_cbor(obj)
+    if wire_format == 'compact':
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj).encode('utf-8')
+
+
+def decode(payload: bytes, wire_format: str):
+    """指定した形式のバイト列をオブジェクトに戻す。"""
+    if wire_format == 'cbor':
+        return decode_cbor(payload)
+    # AST の URI は読み込み時にインターンする（EdoalParser・SparqlRewriter と共有）
+    return json.loads(payload, object_hook=TERMS.intern_node)
+
+
+# ============================================================
+# フレーム / レコード
+# ============================================================
+
+def write_frame(stream, payload: bytes):
+    """「バイト長 + 改行」のヘッダとペイロードを書き出す。"""
+    stream.write(f"{len(payload)}\n".encode('ascii'))
+    stream.write(payload)
+
+
+def read_frame(stream):
+    """
+    フレームを1つ読み込む。Gradle のログなど、ヘッダ以外の行は読み飛ばす。
+
+    :return: ペイロード。フレームの前にストリームが終わった場合は None。
+    :raises EOFError: フレームの途中でストリームが終わった場合
+    """
+    while True:
+        header = stream.readline()
+        if not header:
+            return None
+        header = header.strip()
+        if header.isdigit():
+            break
+    length = int(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        raise EOFError("Stream closed in the middle of a frame.")
+    return payload
+
+
+def write_record(stream, obj, wire_format: str):
+    """バッチモードのレコードを1件書き出す（JSON は1行、CBOR はフレーム）。"""
+    if wire_format == 'cbor':
+        write_frame(stream, encode_cbor(obj))
+    else:
+        stream.write(encode(obj, 'compact' if wire_format == 'compact' else 'json'))
+        stream.write(b'\n')
+
+
+def read_records(stream, wire_format: str):
+    """バッチモードの出力（バイナリストリーム）からレコードを順に読み出す。"""
+    if wire_format == 'cbor':
+        while True:
+            payload = read_frame(stream)
+            if payload is None:
+                return
+            yield decode_cbor(payload)
+    else:
+        for line in stream:
+            line = line.strip()
+            # Gradleのログなど、JSON以外の行は読み飛ばす
+            if line.startswith(b'{'):
+                yield json.loads(line, object_hook=TERMS.intern_node)
+
+
+# ============================================================
+# CBOR（文字列テーブル付き）
+# ============================================================
+
+def _head(major: int, value: int) -> bytes:
+    major <<= 5
+    if value < 24:
+        return bytes((major | value,))
+    if value < 0x100:
+        return bytes((major | 24, value))
+    if value < 0x10000:
+        return bytes((major | 25,)) + value.to_bytes(2, 'big')
+    if value < 0x100000000:
+        return bytes((major | 26,)) + value.to_bytes(4, 'big')
+    return bytes((major | 27,)) + value.to_bytes(8, 'big')
+
+
+def encode_cbor(obj) -> bytes:
+    """オブジェクト（dict / list / str / int / float / bool / None）を文字列テーブル付き CBOR にする。"""
+    table = {}
+    strings = []
+    body = []
+    append = body.append
+
+    def encode_string(value: str):
+        index = table.get(value)
+        if index is None:
+            data = value.encode('utf-8')
+            if len(data) < _MIN_INTERNED_LENGTH:
+                append(_head(3, len(data)))
+                append(data)
+                return
+            index = table[value] = len(strings)
+            strings.append(data)
+        append(b'\xd8\x19')  # tag 25
+        append(_head(0, index))
+
+    def encode_value(value):
+        if isinstance(value, str):
+            encode_string(value)
+        elif isinstance(value, dict):
+            append(_head(5, len(value)))
+            for key, item in value.items():
+                encode_string(str(key))
+                encode_value(item)
+        elif isinstance(value, (list, tuple)):
+            append(_head(4, len(value)))
+            for item in value:
+                encode_value(item)
+        elif value is None:
+            append(b'\xf6')
+        elif value is True:
+            append(b'\xf5')
+        elif value is False:
+            append(b'\xf4')
+        elif isinstance(value, int):
+            append(_head(0, value) if value >= 0 else _head(1, -1 - value))
+        elif isinstance(value, float):
+            append(b'\xfb' + _FLOAT64.pack(value))
+        else:
+            raise TypeError(f"Cannot encode {type(value).__name__} as CBOR")
+
+    encode_value(obj)
+
+    out = [_head(4, 2), _head(4, len(strings))]
+    for data in strings:
+        out.append(_head(3, len(data)))
+        out.append(data)
+    out.extend(body)
+    return b''.join(out)
+
+
+def decode_cbor(data: bytes):
+    """
+    encode_cbor / AstWire.java が書く CBOR のサブセットを元のオブジェクトに戻す。
+
+    :raises ValueError: 形式が正しくない場合
+    """
+    if not data or data[0] != 0x82:
+        raise ValueError("Malformed CBOR message: expected [string table, body]")
+    from_bytes = int.from_bytes
+    strings = ()
+    pos = 1
+
+    def argument(info):
+        nonlocal pos
+        if info < 24:
+            return info
+        if info > 27:
+            raise ValueError(f"Unsupported CBOR additional info {info} at offset {pos}")
+        end = pos + (1 << (info - 24))
+        value = from_bytes(data[pos:end], 'big')
+        pos = end
+        return value
+
+    def read():
+        nonlocal pos
+        initial = data[pos]
+        pos += 1
+        # 最も多い文字列参照（tag 25 + 番号）を先に処理する
+        if initial == 0xd8 and data[pos] == _STRING_REF_TAG:
+            index = data[pos + 1]
+            pos += 2
+            if index < 24:
+                return strings[index]
+            return strings[argument(index & 0x1f)]
+        major = initial >> 5
+        info = initial & 0x1f
+        if major == 3:
+            length = argument(info)
+            end = pos + length
+            text = data[pos:end].decode('utf-8')
+            pos = end
+            return text
+        if major == 5:
+            result = {}
+            for _ in range(argument(info)):
+                key = read()
+                result[key] = read()
+            # JSON の object_hook と同じく、AST のノードの URI だけをインターンする
+            return TERMS.intern_node(result)
+        if major == 4:
+            return [read() for _ in range(argument(info))]
+        if major == 0:
+            return argument(info)
+        if major == 1:
+            return -1 - argument(info)
+        if initial == 0xf4:
+            return False
+        if initial == 0xf5:
+            return True
+        if initial in (0xf6, 0xf7):
+            return None
+        if initial == 0xfb:
+            pos += 8
+            return _FLOAT64.unpack_from(data, pos - 8)[0]
+        if initial == 0xfa:
+            pos += 4
+            return _FLOAT32.unpack_from(data, pos - 4)[0]
+        if major == 6:
+            raise ValueError(f"Unsupported CBOR tag {argument(info)}")
+        raise ValueError(f"Unsupported CBOR item 0x{initial:02x} at offset {pos - 1}")
+
+    try:
+        # 本体の tag 25 を解決できるよう、先に文字列テーブルを読む
+        strings = read()
+        result = read()
+    except (IndexError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed CBOR message: {e}") from e
+    if pos != len(data):
+        raise ValueError("Malformed CBOR message: trailing bytes")
+    return result
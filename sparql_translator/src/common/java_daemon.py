@@ -0,0 +1,208 @@
+"""
+Java ヘルパー常駐プロセスのクライアント
+- sparql_daemon_java.SparqlHelperDaemon を1つだけ起動し、実行中はそれを使い回す
+- パース要求とシリアライズ要求を同じ JVM で処理する
+- プロセスが落ちた場合は再起動するが、落としたリクエストは再送せずに失敗させる
+
+プロトコル: 1フレーム = 「ペイロードのバイト長 + 改行」のヘッダ行 + UTF-8 JSON ペイロード
+          （wire_format='cbor' の場合、ペイロードは文字列テーブル付きの CBOR。ast_wire 参照）
+"""
+import collections
+import os
+import subprocess
+import threading
+
+from . import ast_wire
+from .java_launcher import JavaLauncher, default_project_root
+
+
+class HelperTimeoutError(RuntimeError):
+    """常駐プロセスが制限時間内に応答しなかった場合のエラー。プロセスは強制終了される。"""
+
+
+class HelperCrashError(RuntimeError):
+    """リクエストの処理中に常駐プロセスが落ちた場合のエラー。プロセスは再起動される。"""
+
+
+class JavaHelperDaemon:
+    """
+    SparqlHelperDaemon (Java) を子プロセスとして保持し、フレーム化した
+    リクエスト/レスポンスをやり取りするクライアント。
+
+    使い方:
+        with JavaHelperDaemon(project_root) as daemon:
+            ast = daemon.request('parse', path='/abs/query.sparql')
+            query = daemon.request('serialize', ast=ast)
+    """
+
+    def __init__(self, project_root: str = None, wire_format: str = 'json'):
+        """
+        :param project_root: Gradle プロジェクトのルート。None の場合はこのファイルから推測する。
+        :param wire_format: フレームのペイロード形式。'cbor' 以外は JSON（'compact' も同じ1行の JSON）。
+        """
+        if project_root is None:
+            project_root = default_project_root()
+        self.project_root = project_root
+        self.gradlew_path = os.path.join(project_root, 'gradlew')
+        # ビルド済みJarがあれば java -cp で直接起動し、無ければ gradlew にフォールバックする
+        self.launcher = JavaLauncher(project_root)
+        # クラッシュによる再起動の合計（統計用）
+        self.restart_count = 0
+        self.timeout_count = 0
+        self.wire_format = ast_wire.check_wire_format(wire_format)
+
+        self._process = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        # クラッシュ時の診断用に stderr の末尾を保持する
+        self._stderr_tail = collections.deque(maxlen=50)
+
+    def _build_command(self) -> list:
+        """常駐プロセスを起動するコマンドを返す。"""
+        return self.launcher.command('daemon', ast_wire.wire_args(self.wire_format))
+
+    def start(self):
+        """常駐プロセスを起動する（起動済みなら何もしない）。"""
+        if self.is_alive():
+            return
+        command = self._build_command()
+        try:
+            self._process = subprocess.Popen(
+                command,
+                cwd=self.project_root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            raise RuntimeError(f"Could not launch the Java helper: {command[0]} not found. "
+                               "Ensure the project root is correct and Gradle wrapper (or helper jar) is set up.")
+
+        # stderr を読み捨てないとパイプが詰まるため、別スレッドで末尾だけ保持する
+        stderr = self._process.stderr
+        threading.Thread(target=self._drain_stderr, args=(stderr,), daemon=True).start()
+
+    def _drain_stderr(self, stream):
+        for line in iter(stream.readline, b''):
+            self._stderr_tail.append(line.decode('utf-8', errors='replace').rstrip())
+
+    def is_alive(self) -> bool:
+        """常駐プロセスが生きているかどうか。"""
+        return self._process is not None and self._process.poll() is None
+
+    def close(self):
+        """常駐プロセスに stdin の EOF を送り、終了を待つ。"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def request(self, op: str, timeout: float = None, **params):
+        """
+        リクエストを1件送り、レスポンスの result を返す。
+
+        :param op: 'parse' / 'serialize' / 'ping'
+        :param timeout: 応答を待つ最大秒数。超えた場合はプロセスを強制終了する（None なら無制限）。
+        :param params: リクエストに含めるパラメータ（path, query, ast など）
+        :return: レスポンスの result
+        :raises HelperTimeoutError: timeout 秒以内に応答が無かった場合（再送はしない）
+        :raises HelperCrashError: 処理中にプロセスが落ちた場合（再起動するが再送はしない）
+        :raises RuntimeError: Java 側で処理が失敗した場合
+        """
+        with self._lock:
+            self.start()
+            self._next_id += 1
+            message = {'id': self._next_id, 'op': op, **params}
+            expired = threading.Event()
+            watchdog = None
+            if timeout is not None:
+                # 読み込み中のスレッドは止められないため、プロセスを殺してパイプを閉じさせる
+                watchdog = threading.Timer(timeout, self._expire, args=(self._process, expired))
+                watchdog.daemon = True
+                watchdog.start()
+            try:
+                self._write_frame(ast_wire.encode(message, self.wire_format))
+                response = ast_wire.decode(self._read_frame(), self.wire_format)
+            except (BrokenPipeError, EOFError, OSError, ValueError):
+                if expired.is_set():
+                    # 重いリクエストを再送しても同じことになるので、そのまま失敗させる
+                    self.close()
+                    self.timeout_count += 1
+                    raise HelperTimeoutError(f"Java helper daemon did not answer '{op}' "
+                                             f"within {timeout} seconds.")
+                # プロセスを落とした要求を再送すると、呼ぶたびに JVM を落とし続けることになる。
+                # 次の要求のためにプロセスだけ起動し直し、この要求は失敗させる
+                stderr_tail = self._restart()
+                raise HelperCrashError(f"Java helper daemon crashed while handling '{op}'; "
+                                       f"the request was not resent.\nStderr (tail):\n{stderr_tail}")
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+
+        if not response.get('ok'):
+            error_message = f"Java helper daemon failed to handle '{op}' request.\n"
+            error_message += f"Error: {response.get('error')}\n"
+            error_message += response.get('trace', '')
+            raise RuntimeError(error_message)
+        return response.get('result')
+
+    def ping(self, timeout: float = None) -> bool:
+        """常駐プロセスが応答するかどうかを確認する（ヘルスチェック用）。"""
+        try:
+            return self.request('ping', timeout=timeout) == 'pong'
+        except RuntimeError:
+            return False
+
+    def request_many(self, op: str, params_list):
+        """
+        同じ op のリクエストを順に送る。JavaWorkerPool.request_many と同じ形式。
+
+        :param params_list: 各リクエストのパラメータ（辞書）のイテラブル
+        :return: (result, error) を入力順に返すイテレータ。失敗した場合は result が None。
+        """
+        for params in params_list:
+            try:
+                yield self.request(op, **params), None
+            except RuntimeError as e:
+                yield None, e
+
+    @staticmethod
+    def _expire(process, expired: threading.Event):
+        expired.set()
+        try:
+            process.kill()
+        except OSError:
+            pass
+
+    def _restart(self) -> str:
+        """落ちたプロセスを片付けて起動し直し、落ちる前の stderr の末尾を返す。"""
+        self.close()
+        stderr_tail = '\n'.join(self._stderr_tail)
+        self._stderr_tail.clear()
+        self.restart_count += 1
+        self.start()
+        return stderr_tail
+
+    def _write_frame(self, payload: bytes):
+        stdin = self._process.stdin
+        ast_wire.write_frame(stdin, payload)
+        stdin.flush()
+
+    def _read_frame(self) -> bytes:
+        # Gradle のログなど、ヘッダ以外の行は読み飛ばされる
+        payload = ast_wire.read_frame(self._process.stdout)
+        if payload is None:
+            raise EOFError("Java helper daemon closed its stdout.")
+        return payload
@@ -0,0 +1,356 @@
+"""
+Java ヘルパーの起動コマンド解決
+- ビルド済みの依存関係込み Jar (build/libs/sparql-helpers-all.jar) があれば `java -cp <jar>` で直接起動する
+- Jar が無い、またはソースより古い場合のみ gradlew 経由で起動する
+- 解決した java コマンドは build/helper-launch.json にキャッシュし、次回以降の解決を省く
+- ヘルパーごとの AppCDS アーカイブ (build/cds/<helper>.jsa) があれば、起動時に読み込んでクラスロードを省く
+
+常駐プロセスを使う main.py は、起動前に ensure_jar() で Jar が無ければビルドする。
+
+初回ビルド（Jar と AppCDS アーカイブ）:
+    python -m sparql_translator.src.common.java_launcher --build
+AppCDS アーカイブだけを作り直す:
+    python -m sparql_translator.src.common.java_launcher --cds
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from . import ast_wire
+
+# 依存関係込み Jar とキャッシュファイルの場所（プロジェクトルートからの相対パス）
+HELPER_JAR_RELPATH = os.path.join('build', 'libs', 'sparql-helpers-all.jar')
+LAUNCH_CACHE_RELPATH = os.path.join('build', 'helper-launch.json')
+
+# ヘルパー名 -> (メインクラス, Gradle タスク)
+HELPERS = {
+    'parser': ('sparql_parser_java.SparqlAstParser', 'run'),
+    'serializer': ('sparql_serializer_java.SparqlAstSerializer', 'runSerializer'),
+    'daemon': ('sparql_daemon_java.SparqlHelperDaemon', 'runDaemon'),
+}
+
+# AppCDS アーカイブの置き場所と、作成に使った java / Jar を記録するファイル
+CDS_DIR_RELPATH = os.path.join('build', 'cds')
+CDS_INFO_FILENAME = 'archives.json'
+
+# 起動を速くするための JVM オプション
+# パーサー/シリアライザーは1回で終わるため、C1 だけでコンパイルして JIT の待ち時間を減らす。
+# 常駐プロセスは長く動くので、C2 まで使う通常の段階的コンパイルのままにする
+HELPER_JVM_OPTIONS = {
+    'parser': ['-XX:TieredStopAtLevel=1', '-XX:+UseSerialGC', '-XX:-UsePerfData'],
+    'serializer': ['-XX:TieredStopAtLevel=1', '-XX:+UseSerialGC', '-XX:-UsePerfData'],
+    'daemon': ['-XX:+UseSerialGC', '-XX:-UsePerfData'],
+}
+
+# JVM の警告（アーカイブが使えない場合など）は既定で stdout に出るため、stderr に回す
+_JVM_LOG_OPTIONS = ['-Xlog:disable', '-Xlog:all=warning:stderr']
+
+# AppCDS アーカイブを記録するときに各ヘルパーに処理させるクエリ
+_CDS_TRAINING_QUERY = """PREFIX ex: <http://example.org/onto#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+SELECT DISTINCT ?s ?label WHERE {
+  { ?s a ex:Paper } UNION { ?s a ex:Poster }
+  ?s ex:hasAuthor/ex:name ?name ; rdfs:label ?label .
+  ?s ex:cites+ ?other .
+  OPTIONAL { ?s ex:year ?year FILTER(?year >= 2010) }
+  FILTER(regex(str(?label), "^a", "i") && !bound(?missing))
+}
+ORDER BY ?s
+LIMIT 10
+"""
+
+# Jar の鮮度判定に使うビルド入力
+_BUILD_INPUTS = ('build.gradle', 'settings.gradle')
+_JAVA_SOURCE_DIR = os.path.join('src', 'main', 'java')
+
+
+class JavaLauncher:
+    """
+    Java ヘルパーを起動するコマンドラインを組み立てるクラス。
+
+    使い方:
+        launcher = JavaLauncher(project_root)
+        command = launcher.command('parser', [sparql_file_path])
+        if launcher.uses_jar: ...  # stdout は JSON のみ（Gradle のログが混ざらない）
+    """
+
+    def __init__(self, project_root: str):
+        self.project_root = project_root
+        self.gradlew_path = os.path.join(project_root, 'gradlew')
+        self.jar_path = os.path.join(project_root, HELPER_JAR_RELPATH)
+        self.cache_path = os.path.join(project_root, LAUNCH_CACHE_RELPATH)
+        self.cds_dir = os.path.join(project_root, CDS_DIR_RELPATH)
+        self._java_command = None
+        self._uses_jar = None
+        self._cds_ready = None
+
+    @property
+    def uses_jar(self) -> bool:
+        """ビルド済み Jar から直接起動するかどうか（初回参照時に判定してキャッシュする）。"""
+        if self._uses_jar is None:
+            self._uses_jar = self.is_jar_fresh() and self.java_command() is not None
+        return self._uses_jar
+
+    def command(self, helper: str, args=()) -> list:
+        """
+        指定したヘルパーを起動するコマンドを返す。
+
+        :param helper: 'parser' / 'serializer' / 'daemon'
+        :param args: ヘルパーに渡す引数のリスト
+        :return: subprocess に渡すコマンドのリスト
+        """
+        main_class, gradle_task = HELPERS[helper]
+        if self.uses_jar:
+            return self.java_command() + self.jvm_options(helper) + ['-cp', self.jar_path, main_class] + list(args)
+
+        command = [self.gradlew_path, gradle_task, '--quiet', '--console=plain']
+        if args:
+            command.append('--args=' + ' '.join(f'"{arg}"' for arg in args))
+        return command
+
+    def jvm_options(self, helper: str) -> list:
+        """
+        Jar から直接起動する場合の JVM オプション（JIT の設定と、あれば AppCDS アーカイブ）。
+
+        :param helper: 'parser' / 'serializer' / 'daemon'
+        """
+        options = list(HELPER_JVM_OPTIONS[helper])
+        if self.has_cds_archives():
+            options += [f'-XX:SharedArchiveFile={self.cds_archive_path(helper)}', '-Xshare:auto']
+            options += _JVM_LOG_OPTIONS
+        return options
+
+    def cds_archive_path(self, helper: str) -> str:
+        """ヘルパーの AppCDS アーカイブのパス。"""
+        return os.path.join(self.cds_dir, f'{helper}.jsa')
+
+    def has_cds_archives(self) -> bool:
+        """
+        全ヘルパーの AppCDS アーカイブが揃っていて、今の Jar と java で作られたものかどうか。
+        アーカイブは作成した JVM と Jar でしか使えないため、どちらかが変わっていれば使わない。
+        """
+        if self._cds_ready is None:
+            self._cds_ready = self._check_cds_archives()
+        return self._cds_ready
+
+    def _check_cds_archives(self) -> bool:
+        try:
+            with open(os.path.join(self.cds_dir, CDS_INFO_FILENAME), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if info.get('java') != self.java_command() or info.get('jar') != self.jar_path:
+            return False
+        if not os.path.exists(self.jar_path):
+            return False
+        jar_mtime = os.path.getmtime(self.jar_path)
+        for helper in HELPERS:
+            path = self.cds_archive_path(helper)
+            if not os.path.exists(path) or os.path.getmtime(path) < jar_mtime:
+                return False
+        return True
+
+    def build_cds(self):
+        """
+        各ヘルパーに小さなクエリを1回処理させ、読み込まれたクラスを AppCDS アーカイブに記録する
+        (-XX:ArchiveClassesAtExit)。記録には実際の起動と同じ java・Jar・JIT 設定を使う。
+
+        :raises RuntimeError: Jar が無い、java が見つからない、または記録に失敗した場合
+        """
+        if not self.uses_jar:
+            raise RuntimeError("AppCDS archives need a fresh helper jar and a java executable. "
+                               "Run with --build first.")
+        os.makedirs(self.cds_dir, exist_ok=True)
+        info_path = os.path.join(self.cds_dir, CDS_INFO_FILENAME)
+        if os.path.exists(info_path):
+            os.remove(info_path)
+        self._cds_ready = None
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            query_path = os.path.join(tmp_dir, 'training.sparql')
+            with open(query_path, 'w', encoding='utf-8') as f:
+                f.write(_CDS_TRAINING_QUERY)
+            # パーサーの出力した AST を、シリアライザーと常駐プロセスの入力にも使う
+            ast_json = self._record_cds('parser', [query_path])
+            self._record_cds('serializer', [], stdin=ast_json)
+            ast = json.loads(ast_json)
+            frames = b''
+            for request_id, (op, params) in enumerate([('parse', {'query': _CDS_TRAINING_QUERY}),
+                                                       ('serialize', {'ast': ast}),
+                                                       ('ping', {})], start=1):
+                payload = ast_wire.encode({'id': request_id, 'op': op, **params}, 'json')
+                frames += f"{len(payload)}\n".encode('ascii') + payload
+            # stdin の EOF で常駐プロセスが終了し、そのときにアーカイブが書き出される
+            self._record_cds('daemon', [], stdin=frames)
+
+        with open(info_path, 'w', encoding='utf-8') as f:
+            json.dump({'java': self.java_command(), 'jar': self.jar_path}, f, indent=2)
+        self._cds_ready = None
+
+    def _record_cds(self, helper: str, args: list, stdin: bytes = None) -> bytes:
+        main_class, _ = HELPERS[helper]
+        archive = self.cds_archive_path(helper)
+        if os.path.exists(archive):
+            os.remove(archive)
+        command = (self.java_command() + HELPER_JVM_OPTIONS[helper]
+                   + [f'-XX:ArchiveClassesAtExit={archive}'] + _JVM_LOG_OPTIONS
+                   + ['-cp', self.jar_path, main_class] + list(args))
+        try:
+            result = subprocess.run(command, cwd=self.project_root, input=stdin or b'',
+                                    capture_output=True, timeout=300, check=True)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Recording the AppCDS archive for '{helper}' failed with exit code {e.returncode}.\n"
+                               f"Stderr:\n{e.stderr.decode('utf-8', errors='replace')}")
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"Recording the AppCDS archive for '{helper}' timed out.")
+        if not os.path.exists(archive):
+            raise RuntimeError(f"The JVM did not write the AppCDS archive for '{helper}'.\n"
+                               f"Stderr:\n{result.stderr.decode('utf-8', errors='replace')}")
+        return result.stdout
+
+    def is_jar_fresh(self) -> bool:
+        """Jar が存在し、Java ソースとビルド定義のどれよりも新しいかどうか。"""
+        if not os.path.exists(self.jar_path):
+            return False
+        jar_mtime = os.path.getmtime(self.jar_path)
+        return jar_mtime >= self._latest_source_mtime()
+
+    def _latest_source_mtime(self) -> float:
+        latest = 0.0
+        for name in _BUILD_INPUTS:
+            path = os.path.join(self.project_root, name)
+            if os.path.exists(path):
+                latest = max(latest, os.path.getmtime(path))
+        for dirpath, _, filenames in os.walk(os.path.join(self.project_root, _JAVA_SOURCE_DIR)):
+            for filename in filenames:
+                if filename.endswith('.java'):
+                    latest = max(latest, os.path.getmtime(os.path.join(dirpath, filename)))
+        return latest
+
+    def java_command(self):
+        """
+        java 実行ファイルを含むコマンドの先頭部分を返す。見つからない場合は None。
+        解決結果は build/helper-launch.json にキャッシュする。
+        """
+        if self._java_command is not None:
+            return self._java_command
+
+        cached = self._load_cache()
+        if cached and cached.get('jar') == self.jar_path and os.path.exists(cached['java'][0]):
+            self._java_command = cached['java']
+            return self._java_command
+
+        java = self._find_java()
+        if java is None:
+            return None
+        self._java_command = [java]
+        self._save_cache()
+        return self._java_command
+
+    def _find_java(self):
+        """JAVA_HOME、PATH、gradle.properties の org.gradle.java.home の順に java を探す。"""
+        candidates = []
+        if os.environ.get('JAVA_HOME'):
+            candidates.append(os.path.join(os.environ['JAVA_HOME'], 'bin', 'java'))
+        on_path = shutil.which('java')
+        if on_path:
+            candidates.append(on_path)
+        gradle_java_home = self._gradle_java_home()
+        if gradle_java_home:
+            candidates.append(os.path.join(gradle_java_home, 'bin', 'java'))
+
+        for candidate in candidates:
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                return candidate
+        return None
+
+    def _gradle_java_home(self):
+        path = os.path.join(self.project_root, 'gradle.properties')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                key, sep, value = line.partition('=')
+                if sep and key.strip() == 'org.gradle.java.home':
+                    return value.strip()
+        return None
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump({'java': self._java_command, 'jar': self.jar_path}, f, indent=2)
+        except OSError:
+            # キャッシュの書き込みに失敗しても起動自体は可能
+            pass
+
+    def ensure_jar(self) -> bool:
+        """
+        Jar が無いか古い場合に、java と gradlew があれば build() でビルドする。
+        クリーンな checkout で常駐プロセスやワーカーを起動する前に呼ぶと、各プロセスが
+        gradlew 経由でコンパイルから始める（初回の要求がタイムアウトしやすい）のを避けられる。
+
+        :return: ビルド済み Jar から直接起動できるかどうか
+        :raises RuntimeError: ビルドに失敗した場合
+        """
+        if not self.is_jar_fresh() and self.java_command() is not None and os.path.exists(self.gradlew_path):
+            self.build()
+        return self.uses_jar
+
+    def build(self):
+        """
+        gradlew helperJar を実行して依存関係込み Jar をビルドし、起動コマンドのキャッシュを更新する。
+
+        :raises RuntimeError: ビルドに失敗した場合
+        """
+        try:
+            subprocess.run(
+                [self.gradlew_path, 'helperJar', '--quiet', '--console=plain'],
+                cwd=self.project_root,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Building the helper jar failed with exit code {e.returncode}.\n"
+                               f"Stderr:\n{e.stderr}")
+        except FileNotFoundError:
+            raise RuntimeError(f"Could not find gradlew executable at {self.gradlew_path}. "
+                               "Ensure the project root is correct and Gradle wrapper is set up.")
+
+        self._java_command = None
+        self._uses_jar = None
+        self._cds_ready = None
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+        self.java_command()
+
+
+def default_project_root() -> str:
+    """このファイルの場所からプロジェクトルートを推測する。"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(current_dir, '..', '..', '..'))
+
+
+if __name__ == '__main__':
+    launcher = JavaLauncher(default_project_root())
+    if '--build' in sys.argv[1:]:
+        print(f"Building {launcher.jar_path} ...")
+        launcher.build()
+    if '--build' in sys.argv[1:] or '--cds' in sys.argv[1:]:
+        print(f"Recording AppCDS archives in {launcher.cds_dir} ...")
+        launcher.build_cds()
+    print(f"Helper jar: {launcher.jar_path} ({'fresh' if launcher.is_jar_fresh() else 'missing or stale'})")
+    print(f"Java command: {launcher.java_command()}")
+    print(f"Launch mode: {'java -cp <jar>' if launcher.uses_jar else 'gradlew'}")
+    print(f"AppCDS archives: {'in use' if launcher.uses_jar and launcher.has_cds_archives() else 'not used'}")
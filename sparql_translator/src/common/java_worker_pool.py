@@ -0,0 +1,200 @@
+"""
+Java ヘルパー常駐プロセスのワーカープール
+- SparqlHelperDaemon を N 個起動し、パース/シリアライズ要求を並列に処理する
+- 要求は上限付きのキューに入り、空いているワーカーが順に取り出す（キューが満杯なら投入側が待つ）
+- 要求ごとのタイムアウトを超えたワーカーは強制終了し、次の要求で起動し直す
+- 一定時間アイドルだったワーカーには ping を送り、応答しなければ起動し直す
+
+JavaHelperDaemon と同じ request() / request_many() / close() を持つため、
+DaemonSparqlAstParser / DaemonAstSerializer にそのまま渡せる。
+"""
+import collections
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from .java_daemon import JavaHelperDaemon
+from .java_launcher import default_project_root
+
+
+def default_pool_size() -> int:
+    """CPU コア数に合わせたワーカー数（JVM のメモリを考えて最大 4）。"""
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+class JavaWorkerPool:
+    """
+    JavaHelperDaemon を N 個保持し、スレッドで並列に要求を処理するディスパッチャー。
+
+    使い方:
+        with JavaWorkerPool(project_root, size=4) as pool:
+            future = pool.submit('parse', path='/abs/query.sparql')
+            ast = future.result()
+            for result, error in pool.request_many('serialize', ({'ast': a} for a in asts)):
+                ...
+            print(pool.stats())
+    """
+
+    def __init__(self, project_root: str = None, size: int = None, queue_depth: int = 64,
+                 request_timeout: float = 60.0, health_check_interval: float = 30.0,
+                 wire_format: str = 'json', daemon_factory=None):
+        """
+        :param project_root: Gradle プロジェクトのルート。None の場合はこのファイルから推測する。
+        :param size: ワーカー（JVM）の数。None の場合は default_pool_size()。
+        :param queue_depth: 処理待ちキューの上限。満杯の間は submit() がブロックする。
+        :param request_timeout: 1要求あたりの最大秒数（None なら無制限）。
+        :param health_check_interval: この秒数アイドルだったワーカーに ping を送る（None なら送らない）。
+        :param wire_format: フレームのペイロード形式（ast_wire.WIRE_FORMATS）。
+        :param daemon_factory: ワーカーを作る関数（テスト用）。None の場合は JavaHelperDaemon。
+        """
+        if project_root is None:
+            project_root = default_project_root()
+        self.project_root = project_root
+        self.size = size if size is not None else default_pool_size()
+        if self.size < 1 or queue_depth < 1:
+            raise ValueError("Pool size and queue depth must be at least 1.")
+        self.queue_depth = queue_depth
+        self.request_timeout = request_timeout
+        self.health_check_interval = health_check_interval
+        self.wire_format = wire_format
+
+        if daemon_factory is None:
+            def daemon_factory():
+                return JavaHelperDaemon(project_root, wire_format=wire_format)
+        self._workers = [daemon_factory() for _ in range(self.size)]
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._health_check_failures = 0
+        self._closed = False
+        self._threads = []
+        for index, worker in enumerate(self._workers):
+            thread = threading.Thread(target=self._run_worker, args=(worker,),
+                                      name=f"java-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        """全ワーカーの JVM を先に起動しておく（起動は並行して進む）。"""
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, op: str, **params) -> Future:
+        """
+        要求をキューに入れ、結果を受け取る Future を返す。キューが満杯の間はブロックする。
+
+        :raises RuntimeError: close() 後に呼ばれた場合
+        """
+        if self._closed:
+            raise RuntimeError("Java worker pool is closed.")
+        future = Future()
+        self._queue.put((future, op, params))
+        return future
+
+    def request(self, op: str, **params):
+        """要求を1件処理して result を返す（JavaHelperDaemon.request と同じ）。"""
+        return self.submit(op, **params).result()
+
+    def request_many(self, op: str, params_list):
+        """
+        同じ op の要求を並列に処理し、(result, error) を入力順に返す。
+        投入済みで未回収の要求は「ワーカー数 + キューの上限」件までに抑える。
+
+        :param params_list: 各要求のパラメータ（辞書）のイテラブル
+        """
+        window = collections.deque()
+        limit = self.size + self.queue_depth
+        try:
+            for params in params_list:
+                window.append(self.submit(op, **params))
+                if len(window) >= limit:
+                    yield self._outcome(window.popleft())
+            while window:
+                yield self._outcome(window.popleft())
+        finally:
+            # 途中で打ち切られた場合は、まだ始まっていない要求を取り消す
+            for future in window:
+                future.cancel()
+
+    @staticmethod
+    def _outcome(future: Future):
+        try:
+            return future.result(), None
+        except RuntimeError as e:
+            return None, e
+
+    def stats(self) -> dict:
+        """プールの状態（ワーカー数、キューの上限、処理中/待ちの件数、再起動回数など）。"""
+        with self._stats_lock:
+            return {
+                'size': self.size,
+                'queue_depth': self.queue_depth,
+                'in_flight': self._in_flight,
+                'queued': self._queue.qsize(),
+                'completed': self._completed,
+                'failed': self._failed,
+                'timeouts': sum(w.timeout_count for w in self._workers),
+                'restarts': (sum(w.restart_count + w.timeout_count for w in self._workers)
+                             + self._health_check_failures),
+            }
+
+    def close(self):
+        """新しい要求の受け付けを止め、キューを処理し終えてから全ワーカーを終了する。"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        for worker in self._workers:
+            worker.close()
+
+    def _run_worker(self, worker):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.health_check_interval)
+            except queue.Empty:
+                self._check_health(worker)
+                continue
+            if item is None:
+                return
+            future, op, params = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._stats_lock:
+                self._in_flight += 1
+            try:
+                result = worker.request(op, timeout=self.request_timeout, **params)
+            except Exception as e:
+                with self._stats_lock:
+                    self._in_flight -= 1
+                    self._failed += 1
+                future.set_exception(e)
+            else:
+                with self._stats_lock:
+                    self._in_flight -= 1
+                    self._completed += 1
+                future.set_result(result)
+
+    def _check_health(self, worker):
+        # まだ起動していない（または既に落ちている）ワーカーは次の要求で起動されるので何もしない
+        if not worker.is_alive():
+            return
+        timeouts = worker.timeout_count
+        if not worker.ping(timeout=self.request_timeout):
+            # タイムアウトの場合は timeout_count として数えられているので二重に数えない
+            if worker.timeout_count == timeouts:
+                with self._stats_lock:
+                    self._health_check_failures += 1
+            worker.close()
+
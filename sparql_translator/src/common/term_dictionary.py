@@ -0,0 +1,81 @@
+"""
+URI の辞書（インターン）
+- EdoalParser・AST の読み込み（PySparqlAstParser / ast_wire）・SparqlRewriter が同じ TermDictionary（既定は TERMS）を使い、
+  同じ URI は1つの文字列オブジェクトを共有する。書き換え中の辞書の検索や比較は同一性の判定で済み、
+  ハッシュも URI ごとに1回しか計算しない。多数のクエリの AST を保持する場合も、URI の文字列は1つ分で済む
+- AST の中は文字列のままなので、シリアライザーや式木の処理は変更しなくてよい
+- rdf:type は sys.intern した RDF_TYPE を最初に登録しておくので、どの経路で読んだ AST でも同一性で判定できる
+- 登録するのは URI だけ（リテラルの値・変数名・式のテキストは登録しない）。辞書はアラインメントごとに
+  clear() し、max_size を超えた場合も clear() するので、常駐するプロセスでも大きくなり続けない。
+  clear() の前後で同じ URI が別のオブジェクトになっても、検索や比較は文字列の等価性で正しく動く
+- 整数の ID には置き換えない（シリアライザーや式木の処理が文字列をそのまま扱うため）
+"""
+import sys
+
+RDF_TYPE = sys.intern('http://www.w3.org/1999/02/22-rdf-syntax-ns#type')
+
+
+class TermDictionary:
+    """
+    URI 文字列 -> 共有する文字列オブジェクトの表。
+
+    intern() は dict の get と setdefault だけなので、複数のスレッドから同時に呼んでもよい
+    （clear() と重なった場合に共有を取りこぼすことはあるが、返す文字列は常に text と等しい）。
+    """
+
+    __slots__ = ('_terms', '_pinned', 'max_size')
+
+    def __init__(self, terms=(), max_size: int = None):
+        """
+        :param terms: 最初に登録し、clear() の後も残す文字列
+        :param max_size: 登録数の上限。超える場合は clear() してから登録する（None なら無制限）
+        """
+        self._pinned = tuple(terms)
+        self.max_size = max_size
+        self.clear()
+
+    def intern(self, text: str) -> str:
+        """text と等しい登録済みの文字列を返す（無ければ text を登録して返す）。"""
+        found = self._terms.get(text)
+        if found is not None:
+            return found
+        if self.max_size is not None and len(self._terms) >= self.max_size:
+            self.clear()
+        return self._terms.setdefault(text, text)
+
+    def clear(self):
+        """登録を最初の terms だけに戻す。"""
+        self._terms = {term: term for term in self._pinned}
+
+    def intern_node(self, node: dict) -> dict:
+        """
+        AST のノード1つの URI（uri ノードの値、リテラルのデータ型、パスの link）をインターンする。
+        json.loads の object_hook にそのまま渡せる。
+        """
+        node_type = node.get('type')
+        if node_type == 'uri':
+            value = node.get('value')
+            if isinstance(value, str):
+                node['value'] = self.intern(value)
+        elif node_type == 'literal':
+            datatype = node.get('datatype')
+            if isinstance(datatype, str):
+                node['datatype'] = self.intern(datatype)
+        elif node_type == 'link':
+            uri = node.get('uri')
+            if isinstance(uri, str):
+                node['uri'] = self.intern(uri)
+        return node
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, text) -> bool:
+        return text in self._terms
+
+
+# 共有の辞書の登録数の上限（アラインメント1つ分の語彙とクエリの URI には十分な数）
+TERMS_MAX_SIZE = 100_000
+
+# 全モジュールで共有する既定の辞書（main.py はアラインメントごとに clear() する）
+TERMS = TermDictionary([RDF_TYPE], max_size=TERMS_MAX_SIZE)
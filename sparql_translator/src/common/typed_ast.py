@@ -0,0 +1,338 @@
+"""
+型付きの AST（__slots__ を持つ変更できないノードのクラス）
+- パーサーの出力する AST は文字列の type キーを持つ入れ子の dict。よく現れる型（group / bgp / triple /
+  path_triple / union / optional / filter / uri / variable / literal）を、type をクラス属性に、各項目を
+  __slots__ に持つクラスで表す。ノードごとの辞書（ハッシュ表）が無いので1ノードあたりのメモリが小さい
+- ノードは読み取り専用の Mapping で、node['subject'] / node.get('type') / 'lang' in node / == などは dict と
+  同じように使える。そのため AstWalker / SparqlRewriter / PyAstSerializer / measure_cost は dict の AST と
+  型付きの AST のどちらにもそのまま使え、dict のノードと型付きのノードが混在した AST も扱える
+- to_typed() / to_dict() で現在の JSON のスキーマ（dict）と相互に変換する。それ以外の型のノード（式・パス・
+  bind など）や、項目がクラスの定義と合わないノードは dict のまま残すので、変換で情報は失われない
+- 書き換えで置換したノード（URI・トリプル・BGP・FILTER）は元と同じ表現になり、展開で新しく作るノードは dict に
+  なる。すべて型付きにそろえる場合は結果を to_typed() に通す
+- json.dumps や Java ヘルパー（ast_wire）には to_dict() で dict に戻してから渡す
+"""
+from collections.abc import Mapping
+
+_MISSING = object()
+_set = object.__setattr__
+
+
+class Node:
+    """
+    型付きのノードの基底クラス（読み取り専用の Mapping）。
+
+    isinstance の判定を速くするため Mapping は継承せず、登録だけする（ABC の判定を経由しない）。
+    サブクラスは type（AST の type の値）、_fields（必須の項目。スキーマの順）、_optional（省略できる項目）、
+    _children（子のノードやリストを持ちうる項目。AstWalker が巡回する）を定義する。
+    """
+
+    __slots__ = ()
+    type = None
+    _fields = ()
+    _optional = ()
+    _children = ()
+    _keys = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._keys = frozenset(cls._fields + cls._optional)
+        cls._required_keys = frozenset(('type',) + cls._fields)
+        cls._allowed_keys = cls._keys | {'type'}
+
+    def __getitem__(self, key):
+        if key == 'type':
+            return self.type
+        if key in self._keys:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == 'type':
+            return self.type
+        if key in self._keys:
+            return getattr(self, key, default)
+        return default
+
+    def __contains__(self, key) -> bool:
+        return key == 'type' or (key in self._keys and hasattr(self, key))
+
+    def __iter__(self):
+        yield 'type'
+        yield from self._fields
+        for key in self._optional:
+            if hasattr(self, key):
+                yield key
+
+    def __len__(self) -> int:
+        return 1 + len(self._fields) + sum(1 for key in self._optional if hasattr(self, key))
+
+    def keys(self) -> list:
+        return list(self)
+
+    def items(self) -> list:
+        items = [('type', self.type)]
+        items += [(key, getattr(self, key)) for key in self._fields]
+        for key in self._optional:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                items.append((key, value))
+        return items
+
+    def values(self) -> list:
+        return [value for _, value in self.items()]
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return all(getattr(self, key, _MISSING) == getattr(other, key, _MISSING) for key in self._keys)
+        if isinstance(other, (dict, Node)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (_from_fields, (type(self), dict(self.items())))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{key}={self[key]!r}' for key in self if key != 'type')})"
+
+    def replace(self, **changes) -> 'Node':
+        """一部の項目を変えたノードを返す（このノードは変えない）。"""
+        fields = {key: getattr(self, key) for key in self._keys if hasattr(self, key)}
+        fields.update(changes)
+        return type(self)(**fields)
+
+    @classmethod
+    def accepts(cls, fields) -> bool:
+        """dict のノード fields を、項目を失わずにこのクラスで表せるかどうか。"""
+        return fields.get('type') == cls.type and cls._required_keys <= fields.keys() <= cls._allowed_keys
+
+
+Mapping.register(Node)
+
+
+def _from_fields(cls, fields: dict) -> Node:
+    return cls(**{key: value for key, value in fields.items() if key != 'type'})
+
+
+class Group(Node):
+    __slots__ = ('patterns',)
+    type = 'group'
+    _fields = ('patterns',)
+    _children = ('patterns',)
+
+    def __init__(self, patterns):
+        _set(self, 'patterns', patterns)
+
+
+class Bgp(Node):
+    __slots__ = ('triples',)
+    type = 'bgp'
+    _fields = ('triples',)
+    _children = ('triples',)
+
+    def __init__(self, triples):
+        _set(self, 'triples', triples)
+
+
+class Triple(Node):
+    __slots__ = ('subject', 'predicate', 'object')
+    type = 'triple'
+    _fields = ('subject', 'predicate', 'object')
+    _children = _fields
+
+    def __init__(self, subject, predicate, object):
+        _set(self, 'subject', subject)
+        _set(self, 'predicate', predicate)
+        _set(self, 'object', object)
+
+
+class PathTriple(Node):
+    __slots__ = ('subject', 'path', 'object')
+    type = 'path_triple'
+    _fields = ('subject', 'path', 'object')
+    _children = _fields
+
+    def __init__(self, subject, path, object):
+        _set(self, 'subject', subject)
+        _set(self, 'path', path)
+        _set(self, 'object', object)
+
+
+class Union(Node):
+    __slots__ = ('patterns',)
+    type = 'union'
+    _fields = ('patterns',)
+    _children = ('patterns',)
+
+    def __init__(self, patterns):
+        _set(self, 'patterns', patterns)
+
+
+class Optional(Node):
+    __slots__ = ('pattern',)
+    type = 'optional'
+    _fields = ('pattern',)
+    _children = ('pattern',)
+
+    def __init__(self, pattern):
+        _set(self, 'pattern', pattern)
+
+
+class Filter(Node):
+    __slots__ = ('expression',)
+    type = 'filter'
+    _fields = ('expression',)
+    _children = ('expression',)
+
+    def __init__(self, expression):
+        _set(self, 'expression', expression)
+
+
+class Uri(Node):
+    __slots__ = ('value',)
+    type = 'uri'
+    _fields = ('value',)
+
+    def __init__(self, value):
+        _set(self, 'value', value)
+
+    def items(self) -> list:
+        # 最も多いノードなので直接作る
+        return [('type', 'uri'), ('value', self.value)]
+
+
+class Variable(Node):
+    __slots__ = ('value',)
+    type = 'variable'
+    _fields = ('value',)
+
+    def __init__(self, value):
+        _set(self, 'value', value)
+
+    def items(self) -> list:
+        # 最も多いノードなので直接作る
+        return [('type', 'variable'), ('value', self.value)]
+
+
+class Literal(Node):
+    __slots__ = ('value', 'datatype', 'lang')
+    type = 'literal'
+    _fields = ('value',)
+    _optional = ('datatype', 'lang')
+
+    def __init__(self, value, datatype=_MISSING, lang=_MISSING):
+        _set(self, 'value', value)
+        if datatype is not _MISSING:
+            _set(self, 'datatype', datatype)
+        if lang is not _MISSING:
+            _set(self, 'lang', lang)
+
+
+NODE_CLASSES = {cls.type: cls for cls in (Group, Bgp, Triple, PathTriple, Union, Optional, Filter, Uri, Variable,
+                                          Literal)}
+# AST のノードとして扱う型（isinstance の判定に使う）
+AST_NODES = (dict, Node)
+_CONTAINERS = (dict, Node, list)
+
+
+def replace_node(node, **changes):
+    """ノードの一部の項目を変えたノードを、元と同じ表現（dict / 型付き）で返す。"""
+    if isinstance(node, Node):
+        return node.replace(**changes)
+    return {**node, **changes}
+
+
+def _convert(root, build):
+    """
+    root の中の dict / Node / list を、子から順に作り直す（明示的なスタックで巡回するので深い入れ子でもよい）。
+    ノードは build(元のノード, 子を変換した項目の dict) の結果に置き換える。
+    """
+    if not isinstance(root, _CONTAINERS):
+        return root
+    # フレーム: [元の値, 子の反復子, 変換後の子（dict または list）, 巡回中の子のキー]
+    stack = [_frame(root)]
+    while True:
+        frame = stack[-1]
+        out = frame[2]
+        is_list = isinstance(out, list)
+        for item in frame[1]:
+            child = item if is_list else item[1]
+            if isinstance(child, _CONTAINERS):
+                if not isinstance(child, list):
+                    # 子を持たないノード（URI・変数・リテラルなど）はフレームを作らずに変換する
+                    fields = dict(child.items())
+                    for value in fields.values():
+                        if isinstance(value, _CONTAINERS):
+                            break
+                    else:
+                        child = build(child, fields)
+                        if is_list:
+                            out.append(child)
+                        else:
+                            out[item[0]] = child
+                        continue
+                frame[3] = None if is_list else item[0]
+                stack.append(_frame(child))
+                break
+            if is_list:
+                out.append(child)
+            else:
+                out[item[0]] = child
+        else:
+            stack.pop()
+            result = out if is_list else build(frame[0], out)
+            if not stack:
+                return result
+            parent = stack[-1]
+            if isinstance(parent[2], list):
+                parent[2].append(result)
+            else:
+                parent[2][parent[3]] = result
+
+
+def _frame(value) -> list:
+    if isinstance(value, list):
+        return [value, iter(value), [], None]
+    return [value, iter(value.items()), {}, None]
+
+
+def _typed(node, fields: dict):
+    cls = NODE_CLASSES.get(fields.get('type'))
+    if cls is not None and cls._required_keys <= fields.keys() <= cls._allowed_keys:
+        # fields は _convert が作った dict なので、そのまま引数にしてよい
+        del fields['type']
+        return cls(**fields)
+    return fields
+
+
+def _plain(node, fields: dict) -> dict:
+    return fields
+
+
+def to_typed(value):
+    """
+    AST（dict、または型付きのノードとの混在）を型付きのノードにそろえる。
+    NODE_CLASSES に無い型や、項目がクラスの定義と合わないノードは dict のまま（子は変換する）。
+    入力は変更しない。
+    """
+    return _convert(value, _typed)
+
+
+def to_dict(value):
+    """型付きのノードを含む AST を、現在の JSON のスキーマ（dict と list だけ）に戻す。入力は変更しない。"""
+    return _convert(value, _plain)
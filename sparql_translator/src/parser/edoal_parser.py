@@ -20,6 +20,8 @@ import xml.etree.ElementTree as ET
 from dataclasses import dataclass, field
 from typing import List, Any, Optional
 
+from ..common.term_dictionary import TERMS
+
 # 基底クラス
 @dataclass
 class EDOALEntity:
@@ -154,11 +156,13 @@ class EdoalParser:
     Args:
         file_path: EDOAL (RDF/XML) ファイルのパス
         verbose: デバッグログを出力するかどうか (デフォルト: False)
+        terms: URI をインターンする TermDictionary (デフォルト: クエリのパーサー・リライターと共有の TERMS)
     """
-    def __init__(self, file_path, verbose=False):
+    def __init__(self, file_path, verbose=False, terms=None):
         # ファイルパスを保持
         self.file_path = file_path
         self.verbose = verbose
+        self.terms = TERMS if terms is None else terms
         # XML を読み込んで ElementTree を構築
         self.tree = ET.parse(file_path)
         self.root = self.tree.getroot()
@@ -238,8 +242,9 @@ class EdoalParser:
         # rdf:about 属性があるかを確認（直接 URI を持つ要素）
         rdf_about = element.get('{' + self.namespaces['rdf'] + '}about')
 
-        # 識別可能なエンティティ (URI を持つ)
+        # 識別可能なエンティティ (URI を持つ)。URI はクエリの AST と同じ文字列オブジェクトを共有する
         if rdf_about:
+            rdf_about = self.terms.intern(rdf_about)
             if tag == 'Class': return Class(uri=rdf_about)
             if tag == 'Property': return Property(uri=rdf_about)
             if tag == 'Relation': return Relation(uri=rdf_about)
@@ -274,13 +279,13 @@ class EdoalParser:
                     # Literalの場合: edoal:string, edoal:type属性を取得
                     value = {
                         'string': value_child.get('{' + self.namespaces['edoal'] + '}string', ''),
-                        'type': value_child.get('{' + self.namespaces['edoal'] + '}type', '')
+                        'type': self.terms.intern(value_child.get('{' + self.namespaces['edoal'] + '}type', ''))
                     }
                 elif value_tag in ['Class', 'Property', 'Relation', 'Instance']:
                     # URIリファレンスの場合
                     uri = value_child.get('{' + self.namespaces['rdf'] + '}about')
                     if uri:
-                        value = {'uri': uri}
+                        value = {'uri': self.terms.intern(uri)}
                 else:
                     # その他の場合はエンティティとして解析
                     value = self._parse_entity(value_child)
@@ -0,0 +1,1237 @@
+"""
+Pure-Python の SPARQL → AST パーサー
+- Java 版 (SparqlAstParser.java / AstVisitor.java) と同じ JSON AST スキーマの辞書を返す
+- JVM を起動せずにプロセス内でパースできるため、小さなクエリはサブプロセス無しで変換できる
+- FILTER 式は式木の辞書（expr_to_map）、ORDER BY は SortCondition.toString() 形式で出力する
+- 対応していない構文（EXISTS / NOT EXISTS など）は UnsupportedSparqlError を送出する。
+  fallback に Java 版のパーサーを渡しておくと、その場合だけ Java 側に委譲する
+"""
+import collections
+import os
+import pathlib
+import re
+from urllib.parse import urljoin
+
+from ..common.term_dictionary import TERMS
+
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+# 'a' と rdf:type の IRI は、書き換えで同一性により判定できるよう TERMS の文字列にそろえる
+RDF_TYPE = TERMS.intern(RDF + 'type')
+
+XSD_STRING = XSD + 'string'
+XSD_INTEGER = XSD + 'integer'
+XSD_DECIMAL = XSD + 'decimal'
+XSD_DOUBLE = XSD + 'double'
+XSD_BOOLEAN = XSD + 'boolean'
+RDF_LANG_STRING = RDF + 'langString'
+
+
+class SparqlSyntaxError(ValueError):
+    """SPARQL クエリの構文エラー。"""
+
+
+class UnsupportedSparqlError(SparqlSyntaxError):
+    """構文としては正しいが、Pure-Python パーサーでは Java 版と同じ AST を再現できない構文。"""
+
+
+# ============================================================
+# 字句解析
+# ============================================================
+
+_PN_CHARS_BASE = ('A-Za-z\u00C0-\u00D6\u00D8-\u00F6\u00F8-\u02FF\u0370-\u037D\u037F-\u1FFF'
+                  '\u200C-\u200D\u2070-\u218F\u2C00-\u2FEF\u3001-\uD7FF\uF900-\uFDCF\uFDF0-\uFFFD'
+                  '\U00010000-\U000EFFFF')
+_PN_CHARS_U = _PN_CHARS_BASE + '_'
+_PN_CHARS = _PN_CHARS_U + '\\-0-9\u00B7\u0300-\u036F\u203F-\u2040'
+_PLX = r"(?:%[0-9A-Fa-f]{2}|\\[_~.\-!$&'()*+,;=/?#@%])"
+_PN_PREFIX = f'[{_PN_CHARS_BASE}](?:[{_PN_CHARS}.]*[{_PN_CHARS}])?'
+_PN_LOCAL = (f'(?:[{_PN_CHARS_U}:0-9]|{_PLX})'
+             f'(?:(?:[{_PN_CHARS}.:]|{_PLX})*(?:[{_PN_CHARS}:]|{_PLX}))?')
+_VARNAME = f'[{_PN_CHARS_U}0-9][{_PN_CHARS_U}0-9\u00B7\u0300-\u036F\u203F-\u2040]*'
+_EXPONENT = r'[eE][+-]?[0-9]+'
+
+# 先に書いたものが優先される（JavaCC の最長一致に近くなるよう順序を決めている）
+_TOKEN_SPEC = [
+    ('WS', r'\s+|#[^\r\n]*'),
+    ('IRIREF', r'<[^<>"{}|^`\\\x00-\x20]*>'),
+    ('STRING_LONG1', r"'''(?:(?:'|'')?(?:[^'\\]|\\.))*'''"),
+    ('STRING_LONG2', r'"""(?:(?:"|"")?(?:[^"\\]|\\.))*"""'),
+    ('STRING1', r"'(?:[^'\\\n\r]|\\.)*'"),
+    ('STRING2', r'"(?:[^"\\\n\r]|\\.)*"'),
+    ('VAR', f'[?$]{_VARNAME}'),
+    ('BLANK_NODE_LABEL', f'_:[{_PN_CHARS_U}0-9](?:[{_PN_CHARS}.]*[{_PN_CHARS}])?'),
+    ('PNAME', f'(?:{_PN_PREFIX})?:(?:{_PN_LOCAL})?'),
+    ('LANGTAG', r'@[a-zA-Z]+(?:-[a-zA-Z0-9]+)*'),
+    ('DOUBLE', f'[+-]?(?:[0-9]+\\.[0-9]*{_EXPONENT}|\\.[0-9]+{_EXPONENT}|[0-9]+{_EXPONENT})'),
+    ('DECIMAL', r'[+-]?[0-9]*\.[0-9]+'),
+    ('INTEGER', r'[+-]?[0-9]+'),
+    ('NAME', r'[A-Za-z_][A-Za-z0-9_]*'),
+    ('NIL', r'\(\s*\)'),
+    ('ANON', r'\[\s*\]'),
+    ('PUNCT', r'\^\^|&&|\|\||!=|<=|>=|[{}()\[\].,;*/|^+\-!=<>?]'),
+]
+_TOKEN_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in _TOKEN_SPEC))
+
+_Token = collections.namedtuple('_Token', ['kind', 'value', 'pos'])
+
+_STRING_KINDS = ('STRING_LONG1', 'STRING_LONG2', 'STRING1', 'STRING2')
+_NUMBER_KINDS = ('INTEGER', 'DECIMAL', 'DOUBLE')
+_NUMBER_DATATYPES = {'INTEGER': XSD_INTEGER, 'DECIMAL': XSD_DECIMAL, 'DOUBLE': XSD_DOUBLE}
+
+_ECHAR = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+_UCHAR_RE = re.compile(r'\\u([0-9A-Fa-f]{4})|\\U([0-9A-Fa-f]{8})')
+_ECHAR_RE = re.compile(r'\\(.)')
+_PN_LOCAL_ESC_RE = re.compile(r"\\([_~.\-!$&'()*+,;=/?#@%])")
+_SCHEME_RE = re.compile(r'^[A-Za-z][A-Za-z0-9+.\-]*:')
+
+
+def _tokenize(text: str) -> list:
+    tokens = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise SparqlSyntaxError(f"Lexical error at {_line_col(text, pos)}: unexpected character {text[pos]!r}")
+        kind = match.lastgroup
+        if kind != 'WS':
+            tokens.append(_Token(kind, match.group(), pos))
+        pos = match.end()
+    tokens.append(_Token('EOF', '', length))
+    return tokens
+
+
+def _line_col(text: str, pos: int) -> str:
+    line = text.count('\n', 0, pos) + 1
+    column = pos - (text.rfind('\n', 0, pos) + 1) + 1
+    return f"line {line}, column {column}"
+
+
+def _unescape_uchar(s: str) -> str:
+    return _UCHAR_RE.sub(lambda m: chr(int(m.group(1) or m.group(2), 16)), s)
+
+
+def _unescape_string(s: str) -> str:
+    s = _unescape_uchar(s)
+    return _ECHAR_RE.sub(lambda m: _ECHAR.get(m.group(1), m.group(0)), s)
+
+
+# ============================================================
+# AST ノード（AstVisitor.java と同じキー順）
+# ============================================================
+
+def _uri(value: str) -> dict:
+    return {'type': 'uri', 'value': value}
+
+
+def _variable(name: str) -> dict:
+    return {'type': 'variable', 'value': name}
+
+
+def _literal(lexical: str, datatype: str = XSD_STRING, lang: str = None) -> dict:
+    node = {'type': 'literal', 'value': lexical, 'datatype': datatype}
+    if lang:
+        node['lang'] = lang
+    return node
+
+
+def _format_node(node: dict) -> str:
+    """Jena の FmtUtils.stringForNode（プレフィックス無し）と同じ形式でノードを文字列化する。"""
+    node_type = node['type']
+    if node_type == 'uri':
+        return f"<{node['value']}>"
+    if node_type == 'variable':
+        return f"?{node['value']}"
+    if node_type != 'literal':
+        return str(node.get('value'))
+
+    lexical = node['value']
+    datatype = node.get('datatype')
+    lang = node.get('lang')
+    # 数値・真偽値は、字句形式が正しければ引用符無しで出力される
+    if datatype == XSD_INTEGER and re.fullmatch(r'[+-]?[0-9]+', lexical):
+        return lexical
+    if datatype == XSD_DECIMAL and lexical.find('.') > 0 and re.fullmatch(r'[+-]?[0-9]*\.[0-9]+|[+-]?[0-9]+\.[0-9]*', lexical):
+        return lexical
+    if datatype == XSD_DOUBLE and ('e' in lexical or 'E' in lexical) and re.fullmatch(
+            r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)[eE][+-]?[0-9]+', lexical):
+        return lexical
+    if datatype == XSD_BOOLEAN and lexical.lower() in ('true', 'false'):
+        return lexical
+
+    escaped = (lexical.replace('\\', '\\\\').replace('"', '\\"')
+               .replace('\n', '\\n').replace('\r', '\\r').replace('\f', '\\f'))
+    if lang:
+        return f'"{escaped}"@{lang}'
+    if datatype and datatype not in (XSD_STRING, RDF_LANG_STRING):
+        return f'"{escaped}"^^<{datatype}>'
+    return f'"{escaped}"'
+
+
+# ============================================================
+# 式（FILTER / ORDER BY など）
+#   ('var', name) / ('const', node) / ('op', symbol, args) / ('call', name, args)
+#   / ('func', iri, args)
+# ============================================================
+
+# SPARQL の組み込み関数名 -> Jena の SSE 名
+BUILTIN_FUNCTIONS = {
+    'STR': 'str', 'LANG': 'lang', 'LANGMATCHES': 'langMatches', 'DATATYPE': 'datatype',
+    'BOUND': 'bound', 'IRI': 'iri', 'URI': 'uri', 'BNODE': 'bnode', 'RAND': 'rand',
+    'ABS': 'abs', 'CEIL': 'ceil', 'FLOOR': 'floor', 'ROUND': 'round', 'CONCAT': 'concat',
+    'STRLEN': 'strlen', 'UCASE': 'ucase', 'LCASE': 'lcase', 'ENCODE_FOR_URI': 'encode_for_uri',
+    'CONTAINS': 'contains', 'STRSTARTS': 'strstarts', 'STRENDS': 'strends',
+    'STRBEFORE': 'strbefore', 'STRAFTER': 'strafter', 'YEAR': 'year', 'MONTH': 'month',
+    'DAY': 'day', 'HOURS': 'hours', 'MINUTES': 'minutes', 'SECONDS': 'seconds',
+    'TIMEZONE': 'timezone', 'TZ': 'tz', 'NOW': 'now', 'UUID': 'uuid', 'STRUUID': 'struuid',
+    'MD5': 'md5', 'SHA1': 'sha1', 'SHA256': 'sha256', 'SHA384': 'sha384', 'SHA512': 'sha512',
+    'COALESCE': 'coalesce', 'IF': 'if', 'STRLANG': 'strlang', 'STRDT': 'strdt',
+    'SAMETERM': 'sameTerm', 'ISIRI': 'isIRI', 'ISURI': 'isURI', 'ISBLANK': 'isBlank',
+    'ISLITERAL': 'isLiteral', 'ISNUMERIC': 'isNumeric', 'REGEX': 'regex',
+    'SUBSTR': 'substr', 'REPLACE': 'replace',
+}
+
+_AGGREGATES = {
+    'COUNT': 'count', 'SUM': 'sum', 'MIN': 'min', 'MAX': 'max', 'AVG': 'avg',
+    'SAMPLE': 'sample', 'GROUP_CONCAT': 'group_concat',
+}
+
+_RELATIONAL_OPERATORS = ('=', '!=', '<', '>', '<=', '>=')
+
+
+def format_sse(expr) -> str:
+    """式を Jena の ExprNode.toString() と同じ S-Expression 文字列にする。"""
+    kind = expr[0]
+    if kind == 'var':
+        return f'?{expr[1]}'
+    if kind == 'const':
+        return _format_node(expr[1])
+    if kind == 'func':
+        name = f'<{expr[1]}>'
+    else:
+        name = expr[1]
+    return '(' + ' '.join([name] + [format_sse(arg) for arg in expr[2]]) + ')'
+
+
+def expr_to_map(expr) -> dict:
+    """
+    式を AstVisitor.exprToMap と同じ式木の辞書にする（FILTER 用）。
+    変数・定数は triple と同じノード、演算子は {'type': 'operator', 'name', 'args'}、
+    組み込み関数は {'type': 'function', 'name', 'args'}、IRI の関数は {'type': 'function', 'iri', 'args'}。
+    """
+    kind = expr[0]
+    if kind == 'var':
+        return _variable(expr[1])
+    if kind == 'const':
+        return expr[1]
+    args = [expr_to_map(arg) for arg in expr[2]]
+    if kind == 'func':
+        return {'type': 'function', 'iri': expr[1], 'args': args}
+    if kind == 'op':
+        return {'type': 'operator', 'name': expr[1], 'args': args}
+    return {'type': 'function', 'name': expr[1], 'args': args}
+
+
+def format_sparql_expr(expr) -> str:
+    """式を Jena の FmtExprSPARQL と同じ SPARQL 構文の文字列にする（ORDER BY 用）。"""
+    kind = expr[0]
+    if kind == 'var':
+        return f'?{expr[1]}'
+    if kind == 'const':
+        return _format_node(expr[1])
+    if kind == 'op':
+        args = expr[2]
+        if len(args) == 1:
+            return f'( {expr[1]} {format_sparql_expr(args[0])} )'
+        return f'( {format_sparql_expr(args[0])} {expr[1]} {format_sparql_expr(args[1])} )'
+    name = f'<{expr[1]}>' if kind == 'func' else expr[1]
+    return f"{name}({', '.join(format_sparql_expr(arg) for arg in expr[2])})"
+
+
+# ============================================================
+# プロパティパス
+#   ('link', iri) / ('inverse', path) / ('mod', modifier, path) / ('seq', left, right)
+#   / ('alt', left, right) / ('negated', [(is_forward, iri), ...])
+# ============================================================
+
+def _path_to_map(path) -> dict:
+    """パスを AstVisitor.pathToMap と同じ辞書にする。"""
+    kind = path[0]
+    if kind == 'link':
+        return {'type': 'link', 'uri': path[1]}
+    if kind == 'inverse':
+        return {'type': 'inverse', 'subPath': _path_to_map(path[1])}
+    if kind == 'mod' and path[1] in ('*', '+'):
+        return {'type': 'mod', 'subPath': _path_to_map(path[2]), 'modifier': path[1]}
+    if kind in ('seq', 'alt'):
+        return {'type': kind, 'left': _path_to_map(path[1]), 'right': _path_to_map(path[2])}
+    # '?' (P_ZeroOrOne) や否定プロパティセットは Java 側でも "complex" になる
+    return {'type': 'complex', 'pathString': _path_to_string(path)}
+
+
+def _path_to_string(path, nested: bool = False) -> str:
+    """パスを Jena の PathWriter と同じ SPARQL 構文の文字列にする。"""
+    kind = path[0]
+    if kind == 'link':
+        return f'<{path[1]}>'
+    if kind == 'negated':
+        items = [('' if forward else '^') + f'<{iri}>' for forward, iri in path[1]]
+        return '!' + items[0] if len(items) == 1 else '!(' + '|'.join(items) + ')'
+    if kind == 'inverse':
+        return '^' + _path_to_string(path[1], nested=True)
+    if kind == 'mod':
+        sub = path[2]
+        sub_string = _path_to_string(sub)
+        if sub[0] not in ('link', 'negated'):
+            sub_string = f'({sub_string})'
+        return sub_string + path[1]
+    separator = '/' if kind == 'seq' else '|'
+    text = _path_to_string(path[1], nested=True) + separator + _path_to_string(path[2], nested=True)
+    return f'({text})' if nested else text
+
+
+# ============================================================
+# 構文解析
+# ============================================================
+
+class _QueryParser:
+    """SPARQL 1.1 クエリを再帰下降でパースし、Java 版と同じ AST を組み立てる。"""
+
+    def __init__(self, text: str, base: str = None, terms=None):
+        self.text = text
+        # IRI をインターンする辞書（EdoalParser・SparqlRewriter と共有する）
+        self.terms = TERMS if terms is None else terms
+        self.tokens = _tokenize(text)
+        self.index = 0
+        self.base = base or pathlib.Path.cwd().as_uri() + '/'
+        self.prefixes = {}
+        # 空白ノードは Jena と同様に "?0", "?1", ... という匿名変数に置き換える
+        self._anon_count = 0
+        self._bnode_labels = {}
+        self._used_bnode_labels = set()
+        # SELECT * の変数を求めるため、型だけのノード（bind, data など）が束縛する変数を保持する
+        self._element_vars = {}
+        # 集約関数は Jena と同様に "?.0", "?.1", ... という変数に置き換える
+        self._aggregates = {}
+        # 読んでいる SELECT（副問い合わせを除く）で集約関数が現れたかどうか
+        self._aggregate_seen = False
+
+    # --- トークン操作 ---
+
+    def _peek(self, offset: int = 0) -> _Token:
+        return self.tokens[min(self.index + offset, len(self.tokens) - 1)]
+
+    def _next(self) -> _Token:
+        token = self.tokens[self.index]
+        if token.kind != 'EOF':
+            self.index += 1
+        return token
+
+    def _error(self, message: str, token: _Token = None) -> SparqlSyntaxError:
+        token = token or self._peek()
+        found = token.value if token.kind != 'EOF' else '<EOF>'
+        return SparqlSyntaxError(f"{message} at {_line_col(self.text, token.pos)} (found {found!r})")
+
+    def _at(self, punct: str) -> bool:
+        token = self._peek()
+        return token.kind == 'PUNCT' and token.value == punct
+
+    def _accept(self, punct: str) -> bool:
+        if self._at(punct):
+            self.index += 1
+            return True
+        return False
+
+    def _expect(self, punct: str):
+        if not self._accept(punct):
+            raise self._error(f"Expected '{punct}'")
+
+    def _at_keyword(self, *keywords) -> bool:
+        token = self._peek()
+        return token.kind == 'NAME' and token.value.upper() in keywords
+
+    def _accept_keyword(self, keyword: str) -> bool:
+        if self._at_keyword(keyword):
+            self.index += 1
+            return True
+        return False
+
+    def _expect_keyword(self, keyword: str):
+        if not self._accept_keyword(keyword):
+            raise self._error(f"Expected {keyword}")
+
+    # --- クエリ全体 ---
+
+    def parse(self) -> dict:
+        self._prologue()
+
+        if self._at_keyword('SELECT'):
+            query = self._select_query()
+        elif self._at_keyword('CONSTRUCT'):
+            query = self._construct_query()
+        elif self._at_keyword('DESCRIBE'):
+            query = self._describe_query()
+        elif self._at_keyword('ASK'):
+            query = self._ask_query()
+        else:
+            raise self._error("Expected SELECT, CONSTRUCT, DESCRIBE or ASK")
+
+        self._values_clause()
+        if self._peek().kind != 'EOF':
+            raise self._error("Unexpected token after the end of the query")
+
+        output = {'prefixes': dict(self.prefixes)}
+        if query['ast'] is not None:
+            output['ast'] = query['ast']
+        output['queryType'] = query['queryType']
+        output['isDistinct'] = query['isDistinct']
+        output['selectVariables'] = query['selectVariables']
+        output['orderBy'] = query['orderBy']
+        # Gson は null のフィールドを出力しないため、存在する場合のみキーを追加する
+        if query['limit'] is not None:
+            output['limit'] = query['limit']
+        if query['offset'] is not None:
+            output['offset'] = query['offset']
+        # Jena の hasAggregators() / hasGroupBy() / hasHaving() と isQueryResultStar()。true の場合だけ出力する
+        if query['hasAggregation']:
+            output['hasAggregation'] = True
+        if query['isSelectAll']:
+            output['isSelectAll'] = True
+        return output
+
+    def _prologue(self):
+        while True:
+            if self._accept_keyword('BASE'):
+                self.base = self._iriref(self._expect_kind('IRIREF'))
+            elif self._accept_keyword('PREFIX'):
+                token = self._expect_kind('PNAME')
+                if not token.value.endswith(':') or token.value.count(':') != 1:
+                    raise self._error("Expected a prefix name ending with ':'", token)
+                self.prefixes[token.value[:-1]] = self._iriref(self._expect_kind('IRIREF'))
+            else:
+                return
+
+    def _expect_kind(self, kind: str) -> _Token:
+        token = self._peek()
+        if token.kind != kind:
+            raise self._error(f"Expected {kind}")
+        return self._next()
+
+    def _new_query(self, query_type: str) -> dict:
+        return {
+            'ast': None, 'queryType': query_type, 'isDistinct': False,
+            'selectVariables': [], 'orderBy': [], 'limit': None, 'offset': None,
+            'hasAggregation': False, 'isSelectAll': False,
+        }
+
+    def _select_query(self, sub: bool = False) -> dict:
+        query = self._new_query('SELECT')
+        self._expect_keyword('SELECT')
+        if self._accept_keyword('DISTINCT'):
+            query['isDistinct'] = True
+        else:
+            self._accept_keyword('REDUCED')
+
+        # 副問い合わせの集約関数は外側のクエリに数えない
+        outer_aggregate_seen, self._aggregate_seen = self._aggregate_seen, False
+        projection = None
+        if self._accept('*'):
+            query['isSelectAll'] = True
+        else:
+            projection = []
+            while True:
+                token = self._peek()
+                if token.kind == 'VAR':
+                    self._next()
+                    projection.append(token.value[1:])
+                elif self._accept('('):
+                    self._expression()
+                    self._expect_keyword('AS')
+                    projection.append(self._expect_kind('VAR').value[1:])
+                    self._expect(')')
+                else:
+                    break
+            if not projection:
+                raise self._error("Expected variables or '*' after SELECT")
+
+        if not sub:
+            self._dataset_clauses()
+        self._accept_keyword('WHERE')
+        query['ast'] = self._group_graph_pattern()
+        group_vars = self._solution_modifier(query)
+        if sub:
+            self._values_clause()
+
+        query['hasAggregation'] = query['hasAggregation'] or self._aggregate_seen
+        self._aggregate_seen = outer_aggregate_seen
+        if projection is not None:
+            query['selectVariables'] = projection
+        elif group_vars is not None:
+            query['selectVariables'] = group_vars
+        else:
+            # 匿名変数（"?N"）と内部変数（".N"）は含めない
+            query['selectVariables'] = [v for v in self._pattern_vars(query['ast']) if not v.startswith(('?', '.'))]
+        return query
+
+    def _construct_query(self) -> dict:
+        query = self._new_query('CONSTRUCT')
+        self._expect_keyword('CONSTRUCT')
+        if self._at('{'):
+            self._construct_template()
+            self._dataset_clauses()
+            self._accept_keyword('WHERE')
+            query['ast'] = self._group_graph_pattern()
+        else:
+            # CONSTRUCT WHERE { triples } の短縮形
+            self._dataset_clauses()
+            self._expect_keyword('WHERE')
+            self._expect('{')
+            triples = []
+            if self._at_triples_start():
+                triples = self._triples_block()['triples']
+            self._expect('}')
+            query['ast'] = {'type': 'group', 'patterns': [{'type': 'bgp', 'triples': triples}]}
+        self._solution_modifier(query)
+        return query
+
+    def _construct_template(self):
+        # テンプレート中の空白ノードは変数にならないため、匿名変数の採番に影響させない
+        saved = (self._anon_count, dict(self._bnode_labels), set(self._used_bnode_labels))
+        self._expect('{')
+        if self._at_triples_start():
+            self._triples_block()
+        self._expect('}')
+        self._anon_count, self._bnode_labels, self._used_bnode_labels = saved
+
+    def _describe_query(self) -> dict:
+        query = self._new_query('DESCRIBE')
+        self._expect_keyword('DESCRIBE')
+        if self._accept('*'):
+            query['isSelectAll'] = True
+        else:
+            count = 0
+            while self._peek().kind in ('VAR', 'IRIREF', 'PNAME'):
+                self._var_or_iri()
+                count += 1
+            if count == 0:
+                raise self._error("Expected variables, IRIs or '*' after DESCRIBE")
+        self._dataset_clauses()
+        if self._accept_keyword('WHERE') or self._at('{'):
+            query['ast'] = self._group_graph_pattern()
+        self._solution_modifier(query)
+        return query
+
+    def _ask_query(self) -> dict:
+        query = self._new_query('ASK')
+        self._expect_keyword('ASK')
+        self._dataset_clauses()
+        self._accept_keyword('WHERE')
+        query['ast'] = self._group_graph_pattern()
+        self._solution_modifier(query)
+        return query
+
+    def _dataset_clauses(self):
+        while self._accept_keyword('FROM'):
+            self._accept_keyword('NAMED')
+            self._iri()
+
+    def _solution_modifier(self, query: dict):
+        """GROUP BY / HAVING / ORDER BY / LIMIT / OFFSET を読み、GROUP BY の変数（無ければ None）を返す。"""
+        group_vars = None
+        if self._accept_keyword('GROUP'):
+            self._expect_keyword('BY')
+            group_vars = []
+            conditions = 0
+            while True:
+                token = self._peek()
+                if token.kind == 'VAR':
+                    self._next()
+                    group_vars.append(token.value[1:])
+                elif self._accept('('):
+                    self._expression()
+                    if self._accept_keyword('AS'):
+                        group_vars.append(self._expect_kind('VAR').value[1:])
+                    self._expect(')')
+                elif self._at_constraint_call():
+                    self._constraint()
+                else:
+                    break
+                conditions += 1
+            if conditions == 0:
+                raise self._error("Expected a GROUP BY condition")
+            query['hasAggregation'] = True
+
+        if self._accept_keyword('HAVING'):
+            query['hasAggregation'] = True
+            self._constraint()
+            while self._at('(') or self._at_constraint_call():
+                self._constraint()
+
+        if self._accept_keyword('ORDER'):
+            self._expect_keyword('BY')
+            while True:
+                condition = self._order_condition()
+                if condition is None:
+                    break
+                query['orderBy'].append(condition)
+            if not query['orderBy']:
+                raise self._error("Expected an ORDER BY condition")
+
+        for _ in range(2):
+            if self._accept_keyword('LIMIT'):
+                query['limit'] = int(self._expect_kind('INTEGER').value)
+            elif self._accept_keyword('OFFSET'):
+                query['offset'] = int(self._expect_kind('INTEGER').value)
+        return group_vars
+
+    def _order_condition(self):
+        """ORDER BY の条件を1つ読み、SortCondition.toString() の形式で返す。"""
+        if self._at_keyword('ASC', 'DESC'):
+            direction = self._next().value.upper()
+            expr = self._bracketted_expression()
+            return f"(SortCondition {direction}({format_sparql_expr(expr)}))"
+        token = self._peek()
+        if token.kind == 'VAR':
+            self._next()
+            return f"(SortCondition ?{token.value[1:]})"
+        if self._at('(') or self._at_constraint_call():
+            return f"(SortCondition {format_sparql_expr(self._constraint())})"
+        return None
+
+    def _values_clause(self):
+        if self._accept_keyword('VALUES'):
+            self._data_block()
+
+    def _data_block(self) -> list:
+        """VALUES のデータブロックを読み、変数名のリストを返す。"""
+        token = self._peek()
+        if token.kind == 'VAR':
+            self._next()
+            variables = [token.value[1:]]
+            self._expect('{')
+            while not self._at('}'):
+                self._data_block_value()
+            self._expect('}')
+            return variables
+
+        variables = []
+        if token.kind == 'NIL':
+            self._next()
+        else:
+            self._expect('(')
+            while self._peek().kind == 'VAR':
+                variables.append(self._next().value[1:])
+            self._expect(')')
+        self._expect('{')
+        while not self._at('}'):
+            if self._peek().kind == 'NIL':
+                self._next()
+                continue
+            self._expect('(')
+            while not self._at(')'):
+                self._data_block_value()
+            self._expect(')')
+        self._expect('}')
+        return variables
+
+    def _data_block_value(self):
+        if self._accept_keyword('UNDEF'):
+            return
+        token = self._peek()
+        if token.kind in ('IRIREF', 'PNAME'):
+            self._iri()
+        elif token.kind in _STRING_KINDS or token.kind in _NUMBER_KINDS or self._at_keyword('TRUE', 'FALSE'):
+            self._literal_term()
+        else:
+            raise self._error("Expected a data value in VALUES")
+
+    # --- グラフパターン ---
+
+    def _group_graph_pattern(self) -> dict:
+        self._expect('{')
+        if self._at_keyword('SELECT'):
+            sub_query = self._select_query(sub=True)
+            self._expect('}')
+            element = {'type': 'subquery'}
+            self._element_vars[id(element)] = list(sub_query['selectVariables'])
+            return element
+
+        patterns = []
+        if self._at_triples_start():
+            patterns.append(self._triples_block())
+        while not self._at('}'):
+            element = self._graph_pattern_not_triples()
+            if element is None:
+                raise self._error("Expected a graph pattern or '}'")
+            patterns.append(element)
+            self._accept('.')
+            if self._at_triples_start():
+                patterns.append(self._triples_block())
+        self._expect('}')
+        return {'type': 'group', 'patterns': patterns}
+
+    def _graph_pattern_not_triples(self):
+        if self._at('{'):
+            first = self._group_graph_pattern()
+            if not self._at_keyword('UNION'):
+                return first
+            patterns = [first]
+            while self._accept_keyword('UNION'):
+                patterns.append(self._group_graph_pattern())
+            return {'type': 'union', 'patterns': patterns}
+
+        if self._accept_keyword('OPTIONAL'):
+            return {'type': 'optional', 'pattern': self._group_graph_pattern()}
+
+        if self._accept_keyword('FILTER'):
+            return {'type': 'filter', 'expression': expr_to_map(self._constraint())}
+
+        if self._accept_keyword('MINUS'):
+            self._group_graph_pattern()
+            return {'type': 'minus'}
+
+        if self._at_keyword('GRAPH', 'SERVICE'):
+            keyword = self._next().value.upper()
+            if keyword == 'SERVICE':
+                self._accept_keyword('SILENT')
+            name = self._var_or_iri()
+            inner = self._group_graph_pattern()
+            element = {'type': 'namedgraph' if keyword == 'GRAPH' else 'service'}
+            variables = self._pattern_vars(inner)
+            if name['type'] == 'variable':
+                variables.append(name['value'])
+            self._element_vars[id(element)] = variables
+            return element
+
+        if self._accept_keyword('BIND'):
+            self._expect('(')
+            self._expression()
+            self._expect_keyword('AS')
+            var = self._expect_kind('VAR').value[1:]
+            self._expect(')')
+            element = {'type': 'bind'}
+            self._element_vars[id(element)] = [var]
+            return element
+
+        if self._accept_keyword('VALUES'):
+            element = {'type': 'data'}
+            self._element_vars[id(element)] = self._data_block()
+            return element
+
+        return None
+
+    def _pattern_vars(self, element) -> list:
+        """Jena の PatternVars と同じ順序で、パターンが束縛する変数名を返す（重複なし）。"""
+        result = []
+
+        def add(node):
+            if node['type'] == 'variable' and node['value'] not in result:
+                result.append(node['value'])
+
+        def walk(el):
+            el_type = el.get('type')
+            if el_type in ('group', 'union'):
+                for child in el['patterns']:
+                    walk(child)
+            elif el_type == 'optional':
+                walk(el['pattern'])
+            elif el_type == 'bgp':
+                for triple in el['triples']:
+                    add(triple['subject'])
+                    if triple['type'] == 'triple':
+                        add(triple['predicate'])
+                    add(triple['object'])
+            else:
+                for var in self._element_vars.get(id(el), []):
+                    add(_variable(var))
+
+        if element is not None:
+            walk(element)
+        return result
+
+    # --- トリプル ---
+
+    def _at_triples_start(self) -> bool:
+        token = self._peek()
+        if token.kind in ('VAR', 'IRIREF', 'PNAME', 'BLANK_NODE_LABEL', 'ANON', 'NIL') \
+                or token.kind in _STRING_KINDS or token.kind in _NUMBER_KINDS:
+            return True
+        if token.kind == 'PUNCT' and token.value in ('(', '['):
+            return True
+        return self._at_keyword('TRUE', 'FALSE')
+
+    def _triples_block(self) -> dict:
+        # 空白ノードのラベルは BGP ごとにスコープを持つ
+        self._bnode_labels = {}
+        triples = []
+        while True:
+            self._triples_same_subject(triples)
+            if not self._accept('.') or not self._at_triples_start():
+                break
+        self._used_bnode_labels.update(self._bnode_labels)
+        self._bnode_labels = {}
+        return {'type': 'bgp', 'triples': triples}
+
+    def _triples_same_subject(self, acc: list):
+        if self._at('(') or self._at('['):
+            subject = self._triples_node(acc)
+            if self._at_verb():
+                self._property_list(subject, acc)
+        else:
+            subject = self._var_or_term()
+            self._property_list(subject, acc)
+
+    def _at_verb(self) -> bool:
+        token = self._peek()
+        if token.kind in ('VAR', 'IRIREF', 'PNAME'):
+            return True
+        if token.kind == 'NAME' and token.value == 'a':
+            return True
+        return token.kind == 'PUNCT' and token.value in ('^', '!', '(')
+
+    def _property_list(self, subject: dict, acc: list):
+        if not self._at_verb():
+            raise self._error("Expected a predicate")
+        while True:
+            if self._peek().kind == 'VAR':
+                predicate, path = _variable(self._next().value[1:]), None
+            else:
+                path = self._path()
+                predicate = _uri(path[1]) if path[0] == 'link' else None
+            self._object(subject, predicate, path, acc)
+            while self._accept(','):
+                self._object(subject, predicate, path, acc)
+            if not self._accept(';'):
+                return
+            while self._accept(';'):
+                pass
+            if not self._at_verb():
+                return
+
+    def _object(self, subject: dict, predicate, path, acc: list):
+        # 入れ子の空白ノードのトリプルより前に、このトリプルを挿入する（Jena と同じ順序）
+        mark = len(acc)
+        obj = self._graph_node(acc)
+        if predicate is not None:
+            triple = {'type': 'triple', 'subject': dict(subject), 'predicate': dict(predicate), 'object': dict(obj)}
+        else:
+            triple = {'type': 'path_triple', 'subject': dict(subject), 'path': _path_to_map(path),
+                      'object': dict(obj)}
+        acc.insert(mark, triple)
+
+    def _graph_node(self, acc: list) -> dict:
+        if self._at('(') or self._at('['):
+            return self._triples_node(acc)
+        return self._var_or_term()
+
+    def _triples_node(self, acc: list) -> dict:
+        if self._accept('['):
+            node = self._new_anon_var()
+            self._property_list(node, acc)
+            self._expect(']')
+            return node
+
+        # RDF コレクション ( ... )
+        self._expect('(')
+        head = None
+        last_cell = None
+        while not self._at(')'):
+            cell = self._new_anon_var()
+            if head is None:
+                head = cell
+            if last_cell is not None:
+                acc.append(self._triple(last_cell, _uri(RDF + 'rest'), cell))
+            mark = len(acc)
+            item = self._graph_node(acc)
+            acc.insert(mark, self._triple(cell, _uri(RDF + 'first'), item))
+            last_cell = cell
+        self._expect(')')
+        if last_cell is None:
+            raise self._error("Empty collection")
+        acc.append(self._triple(last_cell, _uri(RDF + 'rest'), _uri(RDF + 'nil')))
+        return head
+
+    @staticmethod
+    def _triple(subject: dict, predicate: dict, obj: dict) -> dict:
+        return {'type': 'triple', 'subject': dict(subject), 'predicate': dict(predicate), 'object': dict(obj)}
+
+    def _new_anon_var(self) -> dict:
+        node = _variable(f'?{self._anon_count}')
+        self._anon_count += 1
+        return node
+
+    # --- 項 ---
+
+    def _var_or_iri(self) -> dict:
+        token = self._peek()
+        if token.kind == 'VAR':
+            self._next()
+            return _variable(token.value[1:])
+        return _uri(self._iri())
+
+    def _var_or_term(self) -> dict:
+        token = self._peek()
+        if token.kind == 'VAR':
+            self._next()
+            return _variable(token.value[1:])
+        if token.kind in ('IRIREF', 'PNAME'):
+            return _uri(self._iri())
+        if token.kind == 'BLANK_NODE_LABEL':
+            self._next()
+            label = token.value[2:]
+            if label in self._used_bnode_labels:
+                raise self._error(f"Blank node label reused across basic graph patterns: {token.value}", token)
+            if label not in self._bnode_labels:
+                self._bnode_labels[label] = self._new_anon_var()
+            return dict(self._bnode_labels[label])
+        if token.kind == 'ANON':
+            self._next()
+            return self._new_anon_var()
+        if token.kind == 'NIL':
+            self._next()
+            return _uri(RDF + 'nil')
+        return self._literal_term()
+
+    def _literal_term(self) -> dict:
+        token = self._peek()
+        if token.kind in _STRING_KINDS:
+            return self._rdf_literal()
+        if token.kind in _NUMBER_KINDS:
+            self._next()
+            return _literal(token.value, _NUMBER_DATATYPES[token.kind])
+        if self._at_keyword('TRUE', 'FALSE'):
+            self._next()
+            return _literal(token.value.lower(), XSD_BOOLEAN)
+        raise self._error("Expected an RDF term")
+
+    def _rdf_literal(self) -> dict:
+        token = self._next()
+        quote_length = 3 if token.kind.startswith('STRING_LONG') else 1
+        lexical = _unescape_string(token.value[quote_length:-quote_length])
+        if self._peek().kind == 'LANGTAG':
+            return _literal(lexical, RDF_LANG_STRING, self._next().value[1:])
+        if self._accept('^^'):
+            return _literal(lexical, self._iri())
+        return _literal(lexical)
+
+    def _iri(self) -> str:
+        token = self._peek()
+        if token.kind == 'IRIREF':
+            iri = self._iriref(self._next())
+        elif token.kind == 'PNAME':
+            self._next()
+            prefix, _, local = token.value.partition(':')
+            if prefix not in self.prefixes:
+                raise self._error(f"Unresolved prefixed name: {token.value}", token)
+            iri = self.prefixes[prefix] + _PN_LOCAL_ESC_RE.sub(r'\1', local)
+        else:
+            raise self._error("Expected an IRI")
+        return self.terms.intern(iri)
+
+    def _iriref(self, token: _Token) -> str:
+        iri = _unescape_uchar(token.value[1:-1])
+        if not _SCHEME_RE.match(iri):
+            iri = urljoin(self.base, iri)
+        return iri
+
+    # --- プロパティパス ---
+
+    def _path(self):
+        path = self._path_sequence()
+        while self._accept('|'):
+            path = ('alt', path, self._path_sequence())
+        return path
+
+    def _path_sequence(self):
+        path = self._path_elt_or_inverse()
+        while self._accept('/'):
+            path = ('seq', path, self._path_elt_or_inverse())
+        return path
+
+    def _path_elt_or_inverse(self):
+        if self._accept('^'):
+            return ('inverse', self._path_elt())
+        return self._path_elt()
+
+    def _path_elt(self):
+        path = self._path_primary()
+        token = self._peek()
+        if token.kind == 'PUNCT' and token.value in ('*', '+', '?'):
+            self._next()
+            return ('mod', token.value, path)
+        if token.kind == 'PUNCT' and token.value == '{':
+            raise UnsupportedSparqlError("Property path length ranges ({n,m}) are not supported")
+        return path
+
+    def _path_primary(self):
+        token = self._peek()
+        if token.kind == 'NAME' and token.value == 'a':
+            self._next()
+            return ('link', RDF_TYPE)
+        if self._accept('!'):
+            return ('negated', self._path_negated_property_set())
+        if self._accept('('):
+            path = self._path()
+            self._expect(')')
+            return path
+        return ('link', self._iri())
+
+    def _path_negated_property_set(self) -> list:
+        if not self._accept('('):
+            return [self._path_one_in_property_set()]
+        items = []
+        if not self._at(')'):
+            items.append(self._path_one_in_property_set())
+            while self._accept('|'):
+                items.append(self._path_one_in_property_set())
+        self._expect(')')
+        return items
+
+    def _path_one_in_property_set(self):
+        forward = not self._accept('^')
+        token = self._peek()
+        if token.kind == 'NAME' and token.value == 'a':
+            self._next()
+            return (forward, RDF_TYPE)
+        return (forward, self._iri())
+
+    # --- 式 ---
+
+    def _at_constraint_call(self) -> bool:
+        """BuiltInCall または FunctionCall の先頭かどうか。"""
+        token = self._peek()
+        if token.kind == 'NAME':
+            name = token.value.upper()
+            return name in BUILTIN_FUNCTIONS or name in _AGGREGATES or name in ('EXISTS', 'NOT')
+        if token.kind in ('IRIREF', 'PNAME'):
+            following = self._peek(1)
+            return following.kind == 'NIL' or (following.kind == 'PUNCT' and following.value == '(')
+        return False
+
+    def _constraint(self):
+        if self._at('('):
+            return self._bracketted_expression()
+        if not self._at_constraint_call():
+            raise self._error("Expected a constraint")
+        return self._primary_expression()
+
+    def _bracketted_expression(self):
+        self._expect('(')
+        expr = self._expression()
+        self._expect(')')
+        return expr
+
+    def _expression(self):
+        expr = self._and_expression()
+        while self._accept('||'):
+            expr = ('op', '||', [expr, self._and_expression()])
+        return expr
+
+    def _and_expression(self):
+        expr = self._relational_expression()
+        while self._accept('&&'):
+            expr = ('op', '&&', [expr, self._relational_expression()])
+        return expr
+
+    def _relational_expression(self):
+        expr = self._additive_expression()
+        token = self._peek()
+        if token.kind == 'PUNCT' and token.value in _RELATIONAL_OPERATORS:
+            self._next()
+            return ('op', token.value, [expr, self._additive_expression()])
+        if self._accept_keyword('IN'):
+            return ('call', 'in', [expr] + self._expression_list())
+        if self._at_keyword('NOT') and self._peek(1).kind == 'NAME' and self._peek(1).value.upper() == 'IN':
+            self.index += 2
+            return ('call', 'notin', [expr] + self._expression_list())
+        return expr
+
+    def _expression_list(self) -> list:
+        if self._peek().kind == 'NIL':
+            self._next()
+            return []
+        self._expect('(')
+        args = [self._expression()]
+        while self._accept(','):
+            args.append(self._expression())
+        self._expect(')')
+        return args
+
+    def _additive_expression(self):
+        expr = self._multiplicative_expression()
+        while True:
+            token = self._peek()
+            if token.kind == 'PUNCT' and token.value in ('+', '-'):
+                self._next()
+                expr = ('op', token.value, [expr, self._multiplicative_expression()])
+            elif token.kind in _NUMBER_KINDS and token.value[0] in '+-':
+                # "?x -1" のように符号付き数値が続く場合は、符号を演算子として扱う
+                self._next()
+                operand = ('const', _literal(token.value[1:], _NUMBER_DATATYPES[token.kind]))
+                operand = self._multiplicative_tail(operand)
+                expr = ('op', token.value[0], [expr, operand])
+            else:
+                return expr
+
+    def _multiplicative_expression(self):
+        return self._multiplicative_tail(self._unary_expression())
+
+    def _multiplicative_tail(self, expr):
+        while True:
+            token = self._peek()
+            if token.kind == 'PUNCT' and token.value in ('*', '/'):
+                self._next()
+                expr = ('op', token.value, [expr, self._unary_expression()])
+            else:
+                return expr
+
+    def _unary_expression(self):
+        token = self._peek()
+        if token.kind == 'PUNCT' and token.value in ('!', '+', '-'):
+            self._next()
+            return ('op', token.value, [self._primary_expression()])
+        return self._primary_expression()
+
+    def _primary_expression(self):
+        token = self._peek()
+        if self._at('('):
+            return self._bracketted_expression()
+        if token.kind == 'VAR':
+            self._next()
+            return ('var', token.value[1:])
+        if token.kind in ('IRIREF', 'PNAME'):
+            iri = self._iri()
+            if self._peek().kind == 'NIL' or self._at('('):
+                return ('func', iri, self._arg_list())
+            return ('const', _uri(iri))
+        if token.kind in _STRING_KINDS or token.kind in _NUMBER_KINDS or self._at_keyword('TRUE', 'FALSE'):
+            return ('const', self._literal_term())
+        if token.kind == 'NAME':
+            name = token.value.upper()
+            if name in ('EXISTS', 'NOT'):
+                raise UnsupportedSparqlError("EXISTS / NOT EXISTS in expressions are not supported")
+            if name in _AGGREGATES:
+                return self._aggregate()
+            if name in BUILTIN_FUNCTIONS:
+                self._next()
+                return ('call', BUILTIN_FUNCTIONS[name], self._arg_list())
+        raise self._error("Expected an expression")
+
+    def _arg_list(self) -> list:
+        if self._peek().kind == 'NIL':
+            self._next()
+            return []
+        self._expect('(')
+        self._accept_keyword('DISTINCT')
+        args = [self._expression()]
+        while self._accept(','):
+            args.append(self._expression())
+        self._expect(')')
+        return args
+
+    def _aggregate(self):
+        name = _AGGREGATES[self._next().value.upper()]
+        self._expect('(')
+        parts = [name]
+        if self._accept_keyword('DISTINCT'):
+            parts.append('distinct')
+        if not self._accept('*'):
+            parts.append(format_sse(self._expression()))
+        if self._accept(';'):
+            self._expect_keyword('SEPARATOR')
+            self._expect('=')
+            parts.append(_format_node(self._rdf_literal()))
+        self._expect(')')
+        # Jena は集約関数を "?.N" という内部変数に置き換えて式に埋め込む
+        key = '(' + ' '.join(parts) + ')'
+        if key not in self._aggregates:
+            self._aggregates[key] = f'.{len(self._aggregates)}'
+        self._aggregate_seen = True
+        return ('var', self._aggregates[key])
+
+
+# ============================================================
+# 公開インターフェース
+# ============================================================
+
+def parse_sparql(query_string: str, base: str = None, terms=None) -> dict:
+    """
+    SPARQL クエリ文字列をパースし、Java 版 SparqlAstParser と同じスキーマの辞書を返す。
+
+    :param query_string: SPARQL クエリ
+    :param base: 相対 IRI を解決するベース IRI（省略時はカレントディレクトリ）
+    :param terms: IRI をインターンする TermDictionary（省略時は共有の TERMS）
+    :raises SparqlSyntaxError: 構文エラーの場合
+    :raises UnsupportedSparqlError: このパーサーが対応していない構文の場合
+    """
+    return _QueryParser(query_string, base, terms).parse()
+
+
+class PySparqlAstParser:
+    """
+    SparqlAstParser と同じインターフェースを持つ Pure-Python 実装。
+
+    使い方:
+        parser = PySparqlAstParser(fallback=SparqlAstParser(project_root))
+        ast = parser.parse('/abs/query.sparql')
+    """
+
+    def __init__(self, project_root: str = None, fallback=None, terms=None):
+        """
+        :param project_root: SparqlAstParser との互換用（使用しない）
+        :param fallback: 対応していない構文のときに委譲するパーサー（SparqlAstParser など）。
+                         None の場合は UnsupportedSparqlError をそのまま送出する。
+        :param terms: IRI をインターンする TermDictionary（省略時は共有の TERMS）
+        """
+        self.project_root = project_root
+        self.fallback = fallback
+        self.terms = terms
+        self.fallback_count = 0
+
+    def parse(self, sparql_file_path: str) -> dict:
+        """
+        SPARQLファイルをパースしてAST (辞書) を返す。
+        """
+        with open(sparql_file_path, 'r', encoding='utf-8') as f:
+            query_string = f.read()
+        try:
+            return parse_sparql(query_string, terms=self.terms)
+        except UnsupportedSparqlError:
+            if self.fallback is None:
+                raise
+            self.fallback_count += 1
+            return self.fallback.parse(sparql_file_path)
+
+    def parse_query(self, query_string: str) -> dict:
+        """
+        SPARQLクエリ文字列をパースしてAST (辞書) を返す。
+        """
+        try:
+            return parse_sparql(query_string, terms=self.terms)
+        except UnsupportedSparqlError:
+            if self.fallback is None or not hasattr(self.fallback, 'parse_query'):
+                raise
+            self.fallback_count += 1
+            return self.fallback.parse_query(query_string)
+
+    def parse_many(self, paths, threads: int = None):
+        """
+        複数のSPARQLファイル（ディレクトリ指定時は配下の *.sparql）を順にパースする。
+        レコードの形式は SparqlAstParser.parse_many と同じ。threads は互換用で使用しない。
+        """
+        for path in paths:
+            if os.path.isdir(path):
+                files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.sparql'))
+            else:
+                files = [path]
+            for file_path in files:
+                try:
+                    yield {'file': os.path.abspath(file_path), 'ast': self.parse(file_path), 'error': None}
+                except (OSError, ValueError, RuntimeError) as e:
+                    yield {'file': os.path.abspath(file_path), 'ast': None, 'error': f"{type(e).__name__}: {e}"}
+
+    def close(self):
+        """fallback のパーサーが保持しているリソースを解放する。"""
+        if self.fallback is not None and hasattr(self.fallback, 'close'):
+            self.fallback.close()
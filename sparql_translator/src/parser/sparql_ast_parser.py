@@ -1,6 +1,12 @@
+import io
 import subprocess
 import json
 import os
+import threading
+
+from ..common import ast_wire
+from ..common.java_daemon import JavaHelperDaemon
+from ..common.java_launcher import JavaLauncher
 
 class SparqlAstParser:
     """
@@ -8,12 +14,17 @@ class SparqlAstParser:
     クエリ文字列をJSON形式のASTに変換するラッパー。
     """
 
-    def __init__(self, project_root: str):
+    def __init__(self, project_root: str, wire_format: str = 'json'):
         """
         プロジェクトのルートディレクトリを初期化時に受け取る。
+
+        :param wire_format: Java側とのASTの受け渡し形式（'json' / 'compact' / 'cbor'、ast_wire 参照）
         """
         self.project_root = project_root
         self.gradlew_path = os.path.join(project_root, 'gradlew')
+        # ビルド済みJarがあれば java -cp で直接起動し、無ければ gradlew にフォールバックする
+        self.launcher = JavaLauncher(project_root)
+        self.wire_format = ast_wire.check_wire_format(wire_format)
 
     def parse(self, sparql_file_path: str) -> dict:
         """
@@ -23,13 +34,8 @@ class SparqlAstParser:
         :return: パースされたASTを表す辞書。
         :raises RuntimeError: Javaプログラムの実行に失敗した場合。
         """
-        # Javaプログラムを実行するためのコマンドを構築
-        # Gradleの 'run' タスクを使用し、ファイルパスを引数として渡す
-        command = [
-            self.gradlew_path,
-            'run',
-            f'--args="{sparql_file_path}"'
-        ]
+        # Javaプログラムを実行するためのコマンドを構築し、ファイルパスを引数として渡す
+        command = self.launcher.command('parser', [sparql_file_path] + ast_wire.wire_args(self.wire_format))
 
         try:
             # サブプロセスとしてJavaプログラムを実行
@@ -37,12 +43,26 @@ class SparqlAstParser:
                 command,
                 cwd=self.project_root, # Gradleプロジェクトのルートで実行
                 capture_output=True,
-                text=True,
                 check=True  # エラーが発生したら例外をスロー
             )
 
-            # Gradleのログの中からJSON部分だけを抽出する
-            output_str = result.stdout
+            if self.wire_format == 'cbor':
+                # CBOR は「バイト長 + 改行」のフレームで出力される（Gradleのログは読み飛ばす）
+                payload = ast_wire.read_frame(io.BytesIO(result.stdout))
+                if payload is None:
+                    raise RuntimeError(f"Java parser returned no AST frame.\n"
+                                       f"Stderr:\n{result.stderr.decode('utf-8', errors='replace')}")
+                return ast_wire.decode_cbor(payload)
+
+            output_str = result.stdout.decode('utf-8')
+            if self.launcher.uses_jar:
+                # Jarから直接起動した場合、標準出力にはJSONしか出力されない
+                if not output_str.strip():
+                    raise RuntimeError(f"Java parser returned no output.\n"
+                                       f"Stderr:\n{result.stderr.decode('utf-8', errors='replace')}")
+                return json.loads(output_str)
+
+            # Gradle経由の場合は、Gradleのログの中からJSON部分だけを抽出する
             json_start = output_str.find('{')
             json_end = output_str.rfind('}')
             
@@ -55,17 +75,138 @@ class SparqlAstParser:
         except subprocess.CalledProcessError as e:
             # Javaプログラムがエラーを返した場合
             error_message = f"SPARQL AST Parser (Java) failed with exit code {e.returncode}.\n"
-            error_message += f"Stderr:\n{e.stderr}"
+            error_message += f"Stderr:\n{e.stderr.decode('utf-8', errors='replace')}"
             raise RuntimeError(error_message)
-        except json.JSONDecodeError as e:
-            # JSONのパースに失敗した場合
-            error_message = f"Failed to decode JSON output from Java parser.\n"
+        except (ValueError, EOFError) as e:
+            # JSON / CBOR のデコードに失敗した場合（json.JSONDecodeError は ValueError の派生）
+            error_message = f"Failed to decode {self.wire_format} output from Java parser.\n"
             error_message += f"Error: {e}\n"
-            error_message += f"Raw output:\n{result.stdout}"
+            error_message += f"Raw output:\n{result.stdout[:2000]!r}"
             raise RuntimeError(error_message)
         except FileNotFoundError:
-            raise RuntimeError(f"Could not find gradlew executable at {self.gradlew_path}. "
-                             "Ensure the project root is correct and Gradle wrapper is set up.")
+            raise RuntimeError(f"Could not launch the Java helper: {command[0]} not found. "
+                             "Ensure the project root is correct and Gradle wrapper (or helper jar) is set up.")
+
+
+    def parse_many(self, paths, threads: int = None):
+        """
+        複数のSPARQLファイルを1回のJVM起動でまとめてパースし、結果を逐次返す。
+
+        Java側はスレッドプールで並列にパースし、完了した順に1行1件のJSONを出力する。
+
+        :param paths: ファイル・ディレクトリ・globパターンのリスト（ディレクトリは直下の .sparql を対象とする）
+        :param threads: Java側のスレッド数。None の場合はCPUコア数。
+        :return: {'file': パス, 'ast': AST辞書 or None, 'error': エラーメッセージ or None} を返すイテレータ
+        :raises RuntimeError: Javaプログラムの実行自体に失敗した場合。
+        """
+        batch_args = ['--batch']
+        if threads is not None:
+            batch_args += ['--threads', str(threads)]
+        batch_args += [os.path.abspath(p) for p in paths]
+        command = self.launcher.command('parser', ast_wire.wire_args(self.wire_format) + batch_args)
+
+        try:
+            # CBOR のフレームを読むため、標準出力はバイナリで受け取る
+            process = subprocess.Popen(
+                command,
+                cwd=self.project_root,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        except FileNotFoundError:
+            raise RuntimeError(f"Could not launch the Java helper: {command[0]} not found. "
+                             "Ensure the project root is correct and Gradle wrapper (or helper jar) is set up.")
+
+        # stderr がパイプを詰まらせないよう、別スレッドで読み切る
+        stderr_lines = []
+        stderr_reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+        stderr_reader.start()
+
+        finished = False
+        try:
+            for record in ast_wire.read_records(process.stdout, self.wire_format):
+                yield {
+                    'file': record.get('file'),
+                    'ast': record.get('ast'),
+                    'error': record.get('error'),
+                }
+            finished = True
+        finally:
+            # 呼び出し側が途中で反復をやめた場合はJavaプロセスを止める
+            if not finished:
+                process.kill()
+            process.wait()
+            stderr_reader.join()
+            process.stdout.close()
+            process.stderr.close()
+
+        stderr = b''.join(stderr_lines).decode('utf-8', errors='replace')
+
+        if process.returncode != 0:
+            error_message = f"SPARQL AST Parser (Java, batch) failed with exit code {process.returncode}.\n"
+            error_message += f"Stderr:\n{stderr}"
+            raise RuntimeError(error_message)
+
+
+class DaemonSparqlAstParser:
+    """
+    常駐プロセス（SparqlHelperDaemon）を使う SparqlAstParser。
+    実行中は1つのJVMを使い回すため、2回目以降のパースは起動コストがかからない。
+    """
+
+    def __init__(self, project_root: str, daemon: JavaHelperDaemon = None):
+        """
+        :param project_root: プロジェクトのルートディレクトリ。
+        :param daemon: 共有する常駐プロセス（JavaHelperDaemon または JavaWorkerPool）。
+                       None の場合は新しく用意する。
+        """
+        self.project_root = project_root
+        self.daemon = daemon if daemon is not None else JavaHelperDaemon(project_root)
+
+    def parse(self, sparql_file_path: str) -> dict:
+        """
+        指定されたSPARQLファイルをパースし、JSON形式のASTを返す。
+
+        :param sparql_file_path: パース対象のSPARQLファイルへのパス。
+        :return: パースされたASTを表す辞書。
+        :raises RuntimeError: Java側でパースに失敗した場合。
+        """
+        return self.daemon.request('parse', path=os.path.abspath(sparql_file_path))
+
+    def parse_query(self, query_string: str) -> dict:
+        """
+        SPARQLクエリ文字列をパースし、JSON形式のASTを返す。
+
+        :param query_string: パース対象のSPARQLクエリ。
+        :return: パースされたASTを表す辞書。
+        :raises RuntimeError: Java側でパースに失敗した場合。
+        """
+        return self.daemon.request('parse', query=query_string)
+
+    def parse_many(self, paths, threads: int = None):
+        """
+        SparqlAstParser.parse_many と同じ形式で、常駐プロセスを使ってパースする。
+        ディレクトリは直下の .sparql ファイルに展開する。
+        daemon が JavaWorkerPool の場合は、複数のワーカーで並列に処理する（結果は入力順）。
+
+        :param paths: ファイルまたはディレクトリのリスト
+        :param threads: 互換性のための引数（並列度はプールのワーカー数で決まる）
+        :return: {'file', 'ast', 'error'} を返すイテレータ
+        """
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.sparql')))
+            else:
+                files.append(path)
+        files = [os.path.abspath(f) for f in files]
+        results = self.daemon.request_many('parse', ({'path': f} for f in files))
+        for file_path, (ast, error) in zip(files, results):
+            yield {'file': file_path, 'ast': ast, 'error': str(error) if error is not None else None}
+
+    def close(self):
+        """常駐プロセスを終了する。"""
+        self.daemon.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,80 @@
+"""
+同じソース URI に対する複数の対応（代替）の選び方
+- アラインメントには、同じ entity1 に対する対応（Cell）が複数あることがある（cmt-conference の cmt:Author など）。
+  MappingIndex はソース URI ごとに候補の対応をすべて集め、AlternativePolicy で書き換えに使う対応を選ぶ
+- mode:
+    'last': アラインメントの最後の対応だけを使う（従来の動作。既定）/ 'best': Cell.measure が最も高い対応だけを使う /
+    'top-k': measure の高い順に top_k 個までを UNION の分岐にする / 'union': 使えるすべての対応を UNION の分岐にする
+- どのモードでも measure が min_measure 未満の対応は使わない。分岐は measure の高い順（同じ measure なら
+  アラインメントの後の対応が先）に並べ、max_branches を超える分は捨てる（1つのソース URI が生む分岐数の上限）
+- 複数の対応を選んだ場合、述語・rdf:type の目的語の位置のターゲットは Alternatives になり、各分岐の展開の UNION に
+  書き換わる。主語・目的語・FILTER の中の URI の置換には先頭（最も measure の高い）分岐を使う
+"""
+from dataclasses import dataclass, field
+from typing import List
+
+from ..parser.edoal_parser import EDOALEntity
+
+ALTERNATIVE_MODES = ('last', 'best', 'top-k', 'union')
+DEFAULT_TOP_K = 3
+DEFAULT_MAX_BRANCHES = 8
+
+
+@dataclass
+class Alternatives(EDOALEntity):
+    """
+    1つのソース URI に対する複数のターゲット（UNION の分岐になる）。
+
+    operands: 各対応の entity2（分岐の順）
+    measures: 各対応の Cell.measure
+    """
+    operands: List[EDOALEntity] = field(default_factory=list)
+    measures: List[float] = field(default_factory=list)
+
+    @property
+    def best(self) -> EDOALEntity:
+        """先頭（最も measure の高い）ターゲット。"""
+        return self.operands[0]
+
+
+class AlternativePolicy:
+    """
+    ソース URI ごとの候補の対応から、書き換えに使う対応を選ぶ設定。
+
+    :ivar mode: ALTERNATIVE_MODES のいずれか
+    :ivar min_measure: これより measure の低い対応は使わない
+    :ivar top_k: mode='top-k' で使う対応の数
+    :ivar max_branches: 1つのソース URI で使う対応の数の上限（どのモードでも適用する）
+    """
+
+    __slots__ = ('mode', 'min_measure', 'top_k', 'max_branches')
+
+    def __init__(self, mode='last', min_measure=0.0, top_k=DEFAULT_TOP_K, max_branches=DEFAULT_MAX_BRANCHES):
+        if mode not in ALTERNATIVE_MODES:
+            raise ValueError(f"Unknown alternative mode: {mode!r} (expected one of {', '.join(ALTERNATIVE_MODES)})")
+        if top_k < 1 or max_branches < 1:
+            raise ValueError(f"Invalid branch limits: top_k={top_k!r}, max_branches={max_branches!r} (expected >= 1)")
+        self.mode = mode
+        self.min_measure = min_measure
+        self.top_k = top_k
+        self.max_branches = max_branches
+
+    def select(self, uri: str, cells: list):
+        """
+        候補の対応（アラインメントの順）から使う対応を選ぶ。
+
+        :return: (使う対応のリスト（分岐の順）, 使わない対応と理由のリスト)
+        """
+        dropped = [(cell, f"Below minimum measure: {uri} ({cell.measure} < {self.min_measure})")
+                   for cell in cells if cell.measure < self.min_measure]
+        # 後の対応を先にしてから measure で安定ソートする（同じ measure なら後の対応が先）
+        ranked = [cell for cell in reversed(cells) if cell.measure >= self.min_measure]
+        if self.mode == 'last':
+            limit = 1
+        else:
+            ranked.sort(key=lambda cell: -cell.measure)
+            limit = {'best': 1, 'top-k': self.top_k, 'union': len(ranked)}[self.mode]
+        limit = min(limit, self.max_branches)
+        dropped += [(cell, f"Alternative not selected ({self.mode}): {uri} (measure {cell.measure})")
+                    for cell in ranked[limit:]]
+        return ranked[:limit], dropped
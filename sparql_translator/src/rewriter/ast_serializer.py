@@ -1,6 +1,10 @@
 import subprocess
-import json
 import os
+import threading
+
+from ..common import ast_wire
+from ..common.java_daemon import JavaHelperDaemon
+from ..common.java_launcher import JavaLauncher
 
 class AstSerializer:
     """
@@ -8,12 +12,13 @@ class AstSerializer:
     書き換え後のJSON ASTをSPARQLクエリ文字列に変換するラッパー。
     """
 
-    def __init__(self, project_root: str = None):
+    def __init__(self, project_root: str = None, wire_format: str = 'json'):
         """
         プロジェクトのルートディレクトリを初期化時に受け取る。
         
         :param project_root: プロジェクトのルートディレクトリへのパス。
                             Noneの場合は、このファイルから相対的に推測する。
+        :param wire_format: Java側へのASTの受け渡し形式（'json' / 'compact' / 'cbor'、ast_wire 参照）
         """
         if project_root is None:
             # このファイルの場所からプロジェクトルートを推測
@@ -23,6 +28,9 @@ class AstSerializer:
             self.project_root = project_root
         
         self.gradlew_path = os.path.join(self.project_root, 'gradlew')
+        # ビルド済みJarがあれば java -cp で直接起動し、無ければ gradlew にフォールバックする
+        self.launcher = JavaLauncher(self.project_root)
+        self.wire_format = ast_wire.check_wire_format(wire_format)
 
     def serialize(self, ast: dict) -> str:
         """
@@ -32,30 +40,26 @@ class AstSerializer:
         :return: シリアライズされたSPARQLクエリ文字列
         :raises RuntimeError: Javaプログラムの実行に失敗した場合
         """
-        # ASTをJSON文字列に変換
-        ast_json_string = json.dumps(ast)
+        # ASTを指定した形式のバイト列に変換（CBOR の場合はフレームにする）
+        payload = ast_wire.encode(ast, self.wire_format)
+        if self.wire_format == 'cbor':
+            payload = f"{len(payload)}\n".encode('ascii') + payload
 
         # Javaプログラムを実行するためのコマンドを構築
-        command = [
-            self.gradlew_path,
-            'runSerializer',
-            '--quiet',  # Gradleのログを抑制
-            '--console=plain'
-        ]
+        command = self.launcher.command('serializer', ast_wire.wire_args(self.wire_format))
 
         try:
             # サブプロセスとしてJavaプログラムを実行し、ASTをstdinに渡す
             result = subprocess.run(
                 command,
                 cwd=self.project_root,
-                input=ast_json_string,
+                input=payload,
                 capture_output=True,
-                text=True,
                 check=True
             )
 
             # 標準出力からSPARQLクエリ文字列を取得
-            output_str = result.stdout.strip()
+            output_str = result.stdout.decode('utf-8').strip()
             
             if not output_str:
                 raise RuntimeError("Java serializer returned empty output.")
@@ -65,12 +69,138 @@ class AstSerializer:
         except subprocess.CalledProcessError as e:
             # Javaプログラムがエラーを返した場合
             error_message = f"SPARQL AST Serializer (Java) failed with exit code {e.returncode}.\n"
-            error_message += f"Stderr:\n{e.stderr}\n"
-            error_message += f"Stdout:\n{e.stdout}"
+            error_message += f"Stderr:\n{e.stderr.decode('utf-8', errors='replace')}\n"
+            error_message += f"Stdout:\n{e.stdout.decode('utf-8', errors='replace')}"
             raise RuntimeError(error_message)
         except FileNotFoundError:
-            raise RuntimeError(f"Could not find gradlew executable at {self.gradlew_path}. "
-                             "Ensure the project root is correct and Gradle wrapper is set up.")
+            raise RuntimeError(f"Could not launch the Java helper: {command[0]} not found. "
+                             "Ensure the project root is correct and Gradle wrapper (or helper jar) is set up.")
+
+
+    def serialize_many(self, asts, threads: int = None):
+        """
+        複数の書き換え後ASTを1回のJVM起動でまとめてシリアライズする。
+
+        Java側はNDJSON（cbor の場合は1件1フレーム）で受け取ったASTをスレッドプールで並列に再構築し、
+        入力と同じ順序で結果を返す。
+
+        :param asts: 書き換え後のJSON AST（辞書）のイテラブル
+        :param threads: Java側のスレッド数。None の場合はCPUコア数。
+        :return: {'index': 入力順の番号, 'query': SPARQL文字列 or None, 'error': エラーメッセージ or None}
+                 を入力順に返すイテレータ
+        :raises RuntimeError: Javaプログラムの実行自体に失敗した場合
+        """
+        batch_args = ast_wire.wire_args(self.wire_format) + ['--batch']
+        if threads is not None:
+            batch_args += ['--threads', str(threads)]
+        command = self.launcher.command('serializer', batch_args)
+
+        try:
+            # CBOR のフレームをやり取りするため、標準入出力はバイナリで扱う
+            process = subprocess.Popen(
+                command,
+                cwd=self.project_root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        except FileNotFoundError:
+            raise RuntimeError(f"Could not launch the Java helper: {command[0]} not found. "
+                             "Ensure the project root is correct and Gradle wrapper (or helper jar) is set up.")
+
+        # stdin への書き込みと stderr の読み出しは別スレッドで行い、パイプの詰まりを防ぐ
+        def write_asts():
+            try:
+                for ast in asts:
+                    ast_wire.write_record(process.stdin, ast, self.wire_format)
+            except BrokenPipeError:
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        stderr_lines = []
+        writer = threading.Thread(target=write_asts, daemon=True)
+        stderr_reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+        writer.start()
+        stderr_reader.start()
+
+        finished = False
+        try:
+            for record in ast_wire.read_records(process.stdout, self.wire_format):
+                yield {
+                    'index': record.get('index'),
+                    'query': record.get('query'),
+                    'error': record.get('error'),
+                }
+            finished = True
+        finally:
+            # 呼び出し側が途中で反復をやめた場合はJavaプロセスを止める
+            if not finished:
+                process.kill()
+            process.wait()
+            writer.join()
+            stderr_reader.join()
+            process.stdout.close()
+            process.stderr.close()
+
+        if process.returncode != 0:
+            error_message = f"SPARQL AST Serializer (Java, batch) failed with exit code {process.returncode}.\n"
+            error_message += f"Stderr:\n{b''.join(stderr_lines).decode('utf-8', errors='replace')}"
+            raise RuntimeError(error_message)
+
+
+class DaemonAstSerializer:
+    """
+    常駐プロセス（SparqlHelperDaemon）を使う AstSerializer。
+    パーサーと同じ JavaHelperDaemon を渡せば、1つのJVMで両方を処理できる。
+    """
+
+    def __init__(self, project_root: str = None, daemon: JavaHelperDaemon = None):
+        """
+        :param project_root: プロジェクトのルートディレクトリへのパス。
+        :param daemon: 共有する常駐プロセス（JavaHelperDaemon または JavaWorkerPool）。
+                       None の場合は新しく用意する。
+        """
+        self.daemon = daemon if daemon is not None else JavaHelperDaemon(project_root)
+        self.project_root = self.daemon.project_root
+
+    def serialize(self, ast: dict) -> str:
+        """
+        書き換え後のJSON ASTをSPARQLクエリ文字列に変換する。
+
+        :param ast: 書き換え後のJSON AST（辞書形式）
+        :return: シリアライズされたSPARQLクエリ文字列
+        :raises RuntimeError: Java側でシリアライズに失敗した場合
+        """
+        output_str = self.daemon.request('serialize', ast=ast).strip()
+        if not output_str:
+            raise RuntimeError("Java serializer returned empty output.")
+        return output_str
+
+    def serialize_many(self, asts, threads: int = None):
+        """
+        AstSerializer.serialize_many と同じ形式で、常駐プロセスを使ってシリアライズする。
+        daemon が JavaWorkerPool の場合は、複数のワーカーで並列に処理する（結果は入力順）。
+
+        :param asts: 書き換え後のJSON AST（辞書）のイテラブル
+        :param threads: 互換性のための引数（並列度はプールのワーカー数で決まる）
+        :return: {'index', 'query', 'error'} を入力順に返すイテレータ
+        """
+        results = self.daemon.request_many('serialize', ({'ast': ast} for ast in asts))
+        for index, (output_str, error) in enumerate(results):
+            if error is None and not (output_str or '').strip():
+                error = RuntimeError("Java serializer returned empty output.")
+            if error is not None:
+                yield {'index': index, 'query': None, 'error': str(error)}
+            else:
+                yield {'index': index, 'query': output_str.strip(), 'error': None}
+
+    def close(self):
+        """常駐プロセスを終了する。"""
+        self.daemon.close()
 
 
 if __name__ == '__main__':
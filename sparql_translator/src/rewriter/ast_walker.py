@@ -1,8 +1,48 @@
 import pprint
 
+from ..common.typed_ast import AST_NODES, Node
+
+# visit / enter / leave のいずれも無い型の処理（既定の方法で子を巡回する）
+_DEFAULT_HANDLER = (None, None, None)
+_HANDLER_PREFIXES = ('visit_', 'enter_', 'leave_')
+
+
+class _Frame:
+    """反復巡回中のコンテナ（dict または list）1つ分の状態。"""
+
+    __slots__ = ('node', 'keys', 'children', 'index', 'copy', 'leave')
+
+    def __init__(self, node, leave=None):
+        self.node = node
+        if isinstance(node, dict):
+            # 子を持ちうる値（dict / list）のキーだけを巡回する
+            self.keys = [key for key, value in node.items() if isinstance(value, (dict, list, Node))]
+            self.children = [node[key] for key in self.keys]
+        elif isinstance(node, Node):
+            # 型付きのノード（typed_ast）は子を持ちうる項目だけを巡回する
+            self.keys = [key for key in node._children if isinstance(getattr(node, key, None), (dict, list, Node))]
+            self.children = [getattr(node, key) for key in self.keys]
+        else:
+            self.keys = None
+            self.children = node
+        self.index = 0
+        # 子が変わった場合に作る浅いコピー（コピーオンライト。型付きのノードでは変わった項目だけの dict）
+        self.copy = None
+        self.leave = leave
+
+
 class AstWalker:
     """
-    SPARQLのJSON ASTを再帰的に巡回し、ノードを書き換えるための基本クラス。
+    SPARQLのJSON ASTを巡回し、ノードを書き換えるための基本クラス。
+
+    ノードの型ごとの処理は次のメソッドで定義する（型 -> メソッドの表はクラスごとに1回だけ作られる）。
+    - visit_<type>(node): 書き換え後のノード（またはノードのリスト）を返す。子の巡回は visit メソッドが
+      _walk_node で行う
+    - enter_<type>(node) / leave_<type>(node, new_node): 子を既定の方法で巡回する前後に呼ばれる。
+      leave は子を巡回した結果 new_node（何も変わらなければ node 自身）を受け取り、書き換え後のノードを返す
+    どちらも無い型は visit_default で処理する。既定の巡回は再帰ではなく明示的なスタックで行うため、
+    深く入れ子になったクエリでも再帰の上限に達しない。
+    dict の AST のほか、型付きのノード（common.typed_ast）や両者の混在した AST も同じように巡回する。
     """
 
     def walk(self, node):
@@ -11,42 +51,130 @@ class AstWalker:
         """
         return self._walk_node(node)
 
+    @classmethod
+    def _handler(cls, node_type):
+        """
+        ノードの型に対する (visit, enter, leave) を返す。
+        最初の呼び出しでクラスに定義された全メソッドの表を作り、それ以外の型は初めて現れたときに追加する。
+        """
+        table = cls.__dict__.get('_handlers')
+        if table is None:
+            table = {}
+            for name in dir(cls):
+                for prefix in _HANDLER_PREFIXES:
+                    if name.startswith(prefix) and name != 'visit_default':
+                        node_type_name = name[len(prefix):]
+                        table[node_type_name] = cls._resolve_handler(node_type_name)
+            cls._handlers = table
+        try:
+            return table[node_type]
+        except (KeyError, TypeError):
+            handler = cls._resolve_handler(node_type)
+            try:
+                table[node_type] = handler
+            except TypeError:
+                pass
+            return handler
+
+    @classmethod
+    def _resolve_handler(cls, node_type):
+        """
+        MRO の中で最も派生したクラスの定義を使う。同じクラスに visit と enter/leave の両方があれば
+        enter/leave（反復巡回）を優先する。
+        """
+        visit_name, enter_name, leave_name = (prefix + str(node_type) for prefix in _HANDLER_PREFIXES)
+        for klass in cls.__mro__:
+            if enter_name in klass.__dict__ or leave_name in klass.__dict__:
+                return (None, getattr(cls, enter_name, None), getattr(cls, leave_name, None))
+            if visit_name in klass.__dict__:
+                return (getattr(cls, visit_name), None, None)
+        if cls.visit_default is not AstWalker.visit_default:
+            # visit_default を独自に定義したクラスでは、その処理に任せる
+            return (cls.visit_default, None, None)
+        return _DEFAULT_HANDLER
+
     def _walk_node(self, node):
         """
         ノードの型に応じて、適切なvisitメソッドを呼び出すディスパッチャ。
         """
-        if not isinstance(node, dict):
+        if not isinstance(node, AST_NODES):
             return node
 
-        node_type = node.get('type')
-        visit_method_name = f'visit_{node_type}'
-        visit_method = getattr(self, visit_method_name, self.visit_default)
-        
-        return visit_method(node)
+        visit, enter, leave = self._handler(node.get('type'))
+        if visit is not None:
+            return visit(self, node)
+        if enter is not None:
+            enter(self, node)
+        return self._walk_children(node, leave)
 
     def visit_default(self, node):
         """
         特定のvisitメソッドが定義されていないノードのためのデフォルト処理。
-        子のノードを再帰的に処理する。
+        子のノードを処理し、リストの要素の結果がリストの場合は展開（flatten）する。
+        子がどれも変わらなければ元のノードをそのまま返し、変わった場合だけ浅いコピーを作る
+        （コピーオンライト。入力のASTは書き換えない）。
+        """
+        return self._walk_children(node, None)
+
+    def _walk_children(self, root, leave):
         """
-        new_node = {}
-        for key, value in node.items():
-            if isinstance(value, list):
-                # リストの各要素を処理し、結果がリストの場合は展開する
-                new_list = []
-                for item in value:
-                    result = self._walk_node(item)
-                    # 結果がリストの場合は展開（flatten）
+        root の子孫を明示的なスタックで巡回する（visit_default の本体）。
+        visit メソッドを持つ子はその結果を使い、持たない子（enter/leave の型を含む）はスタックに積む。
+        """
+        handler = self._handler
+        stack = [_Frame(root, leave)]
+        while True:
+            frame = stack[-1]
+            children = frame.children
+            index = frame.index
+            if index < len(children):
+                child = children[index]
+                if isinstance(child, AST_NODES):
+                    visit, enter, child_leave = handler(child.get('type'))
+                    if visit is None:
+                        if enter is not None:
+                            enter(self, child)
+                        stack.append(_Frame(child, child_leave))
+                        continue
+                    result = visit(self, child)
+                elif frame.keys is not None:
+                    # dict の値のリストはそのまま巡回する
+                    stack.append(_Frame(child))
+                    continue
+                else:
+                    # リストの要素の dict 以外の値はそのまま（リストは展開する）
+                    result = child
+            else:
+                # コンテナの子をすべて処理した
+                stack.pop()
+                result = frame.node if frame.copy is None else frame.copy
+                if frame.copy is not None and isinstance(frame.node, Node):
+                    result = frame.node.replace(**frame.copy)
+                if frame.leave is not None:
+                    result = frame.leave(self, frame.node, result)
+                if not stack:
+                    return result
+                frame = stack[-1]
+                index = frame.index
+                child = frame.children[index]
+
+            # 子の結果を親のコンテナに反映する（変わった場合だけコピーを作る）
+            if frame.keys is not None:
+                if result is not child:
+                    if frame.copy is None:
+                        frame.copy = {} if isinstance(frame.node, Node) else dict(frame.node)
+                    frame.copy[frame.keys[index]] = result
+            else:
+                new_list = frame.copy
+                if new_list is None and (result is not child or isinstance(result, list)):
+                    # 最初に変わった要素までは元のリストと同じ
+                    new_list = frame.copy = frame.node[:index]
+                if new_list is not None:
                     if isinstance(result, list):
                         new_list.extend(result)
                     else:
                         new_list.append(result)
-                new_node[key] = new_list
-            elif isinstance(value, dict):
-                new_node[key] = self._walk_node(value)
-            else:
-                new_node[key] = value
-        return new_node
+            frame.index = index + 1
 
     # --- 具体的なノードタイプのvisitメソッド (今後拡張していく) ---
 
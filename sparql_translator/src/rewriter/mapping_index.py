@@ -0,0 +1,119 @@
+"""
+アラインメントの索引（ソース URI の役割ごと）
+- entity1 が単純な URI の対応を、エンティティの種類（Class / Property・Relation / Instance）で分けて持つ。
+  種類を持たない IdentifiedEntity は entity2 の種類から決め、どちらも分からなければすべての役割に置く
+- クエリ中の位置ごとに、引く表が決まっている:
+    述語: predicates（プロパティ・関係）/ rdf:type の目的語の展開: classes /
+    主語・目的語の URI の置換: mapping（スキーマへの問い合わせでは、クラスやプロパティも主語・目的語に現れる）
+- entity1 と entity2 の種類が食い違う対応（クラスをプロパティの式に対応付けるなど）は、索引を作る時点で
+  misrouted に理由とともに残し、どの表にも置かない
+- 同じソース URI の対応が複数ある場合は、AlternativePolicy（src/rewriter/alternatives.py）で使う対応を選ぶ。
+  複数選んだ場合、predicates / classes のターゲットは Alternatives、mapping のターゲットは先頭の分岐になる。
+  選ばれなかった対応は pruned に理由とともに残す
+- ソース URI は TERMS（src/common/term_dictionary.py）でインターンし、クエリの AST の URI と同じ
+  文字列オブジェクトをキーにする。rdf:type は定数 RDF_TYPE と同一のオブジェクトかどうかで判定できる
+  （パーサーは 'a' と rdf:type の IRI を RDF_TYPE にそろえる）。他の経路で作られた AST のために、文字列の比較にも戻れる
+"""
+from .alternatives import AlternativePolicy, Alternatives
+from ..common.term_dictionary import RDF_TYPE, TERMS
+from ..parser.edoal_parser import (
+    AttributeDomainRestriction, AttributeOccurenceRestriction, AttributeValueRestriction, Class,
+    IdentifiedEntity, Instance, LogicalConstructor, PathConstructor, Property, Relation,
+    RelationCoDomainRestriction, RelationDomainRestriction,
+)
+
+ROLES = ('class', 'property', 'instance')
+
+
+def is_rdf_type(value) -> bool:
+    """述語の URI が rdf:type かどうか（インターンされた定数なら同一性の判定だけで済む）。"""
+    return value is RDF_TYPE or value == RDF_TYPE
+
+
+def entity_role(entity):
+    """
+    エンティティの種類を 'class' / 'property' / 'instance' で返す。種類が分からない場合は None。
+    LogicalConstructor はプロパティを含めば 'property'、クラスを含めば 'class'。
+    """
+    if isinstance(entity, Class):
+        return 'class'
+    if isinstance(entity, (Property, Relation)):
+        return 'property'
+    if isinstance(entity, Instance):
+        return 'instance'
+    if isinstance(entity, IdentifiedEntity):
+        return None
+    if isinstance(entity, (PathConstructor, RelationDomainRestriction, RelationCoDomainRestriction)):
+        return 'property'
+    if isinstance(entity, (AttributeDomainRestriction, AttributeValueRestriction, AttributeOccurenceRestriction)):
+        return 'class'
+    if isinstance(entity, LogicalConstructor):
+        roles = {entity_role(operand) for operand in entity.operands}
+        if 'property' in roles:
+            return 'property'
+        if 'class' in roles:
+            return 'class'
+    return None
+
+
+class MappingIndex:
+    """
+    役割ごとのソース URI -> ターゲットのエンティティの表。
+
+    :ivar mapping: 使えるすべての対応（主語・目的語の URI の置換や FILTER の中の URI に使う）
+    :ivar predicates: 述語の位置で使う対応
+    :ivar classes: rdf:type の目的語の位置で使う対応
+    :ivar instances: entity1 がインスタンスの対応
+    :ivar roles: ソース URI -> 役割のタプル
+    :ivar cells: ソース URI -> 使う対応のリスト（分岐の順）
+    :ivar misrouted: entity1 と entity2 の種類が食い違うため使わない対応と理由のリスト
+    :ivar pruned: 同じソース URI の候補のうち、policy で選ばれなかった対応と理由のリスト
+    """
+
+    def __init__(self, cells, policy: AlternativePolicy = None):
+        self.policy = AlternativePolicy() if policy is None else policy
+        self.mapping = {}
+        self.predicates = {}
+        self.classes = {}
+        self.instances = {}
+        self.roles = {}
+        self.cells = {}
+        self.misrouted = []
+        self.pruned = []
+        candidates = {}
+        for cell in cells:
+            if not isinstance(cell.entity1, IdentifiedEntity):
+                continue
+            uri = TERMS.intern(cell.entity1.uri)
+            source_role, target_role = entity_role(cell.entity1), entity_role(cell.entity2)
+            if source_role and target_role and source_role != target_role:
+                self.misrouted.append((cell, f"Misrouted correspondence: {source_role} {uri} "
+                                             f"is mapped to a {target_role} expression"))
+                continue
+            candidates.setdefault(uri, []).append((cell, source_role or target_role))
+        tables = {'class': self.classes, 'property': self.predicates, 'instance': self.instances}
+        for uri, found in candidates.items():
+            role_of = {id(cell): role for cell, role in found}
+            selected, dropped = self.policy.select(uri, [cell for cell, role in found])
+            self.pruned.extend(dropped)
+            if not selected:
+                continue
+            # 分岐の役割は先頭から決め、役割の異なる対応は同じ UNION に入れない
+            role = next((role_of[id(cell)] for cell in selected if role_of[id(cell)]), None)
+            for cell in selected[1:]:
+                if role_of[id(cell)] not in (None, role):
+                    self.pruned.append((cell, f"Incompatible alternative: {role_of[id(cell)]} target for {role} {uri}"))
+            selected = [cell for cell in selected if role_of[id(cell)] in (None, role)]
+            if len(selected) == 1:
+                target = selected[0].entity2
+            else:
+                target = Alternatives([cell.entity2 for cell in selected], [cell.measure for cell in selected])
+            roles = ROLES if role is None else (role,)
+            for name in roles:
+                tables[name][uri] = target
+            self.mapping[uri] = selected[0].entity2
+            self.roles[uri] = roles
+            self.cells[uri] = selected
+
+    def __len__(self) -> int:
+        return len(self.mapping)
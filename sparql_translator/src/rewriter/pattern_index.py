@@ -0,0 +1,424 @@
+"""
+複雑なソース側（Cell.entity1）の対応のパターン索引
+- entity1 が単純な URI でない対応（and / compose / inverse / 属性の制約など）を、クエリの BGP に現れる
+  トリプルのパターン（主語・目的語・内部変数と定数からなるトリプルの並び）に変換する
+- パターンは最も選択性の高い定数（他のパターンと共有することが最も少ない述語 URI、または rdf:type の
+  クラス URI）をキーにした表に登録する。BGP の各トリプルのキーで表を引いて候補のパターンだけを照合するので、
+  照合の手間はアラインメントの大きさではなく、BGP に現れる語彙に対応するパターンの数で決まる
+- BGP の中でパターン全体が一致し、内部変数（compose の途中の変数など）が一致した部分の外で使われていない
+  場合だけ、SparqlRewriter がその部分を entity2 の展開に置き換える
+- 変換できない entity1（or / not、パーサーが解釈できなかった構造、等価でない比較など）は skipped に理由とともに残す
+"""
+import re
+
+from .rewrite_trace import describe_entity
+from .mapping_index import RDF_TYPE
+from ..parser.edoal_parser import (
+    AttributeDomainRestriction, AttributeOccurenceRestriction, AttributeValueRestriction, Class,
+    IdentifiedEntity, Instance, LogicalConstructor, PathConstructor, Property, Relation,
+    RelationCoDomainRestriction, RelationDomainRestriction,
+)
+from ..common.typed_ast import AST_NODES
+
+# パターンの変数の番号（2 以降は内部変数）
+SUBJECT_VAR = 0
+OBJECT_VAR = 1
+
+EQUALS = 'http://ns.inria.org/edoal/1.0/#equals'
+# パーサーが解釈できなかった構造の IdentifiedEntity.uri の接頭辞
+_PLACEHOLDER_PREFIX = 'Complex Entity:'
+_RDF_TYPE_NODE = {'type': 'uri', 'value': RDF_TYPE}
+_VARIABLE_RE = re.compile(r'[?$]([A-Za-z0-9_]+)')
+
+
+def _node_key(node):
+    return (node.get('type'), node.get('value'), node.get('datatype'), node.get('lang'))
+
+
+def _triple_key(predicate: str, obj):
+    """索引のキー。rdf:type の目的語が定数ならクラス URI まで、それ以外は述語 URI だけを使う。"""
+    if predicate == RDF_TYPE and isinstance(obj, AST_NODES) and obj.get('type') == 'uri':
+        return (predicate, obj['value'])
+    return (predicate, None)
+
+
+def _query_keys(triple: dict) -> tuple:
+    """クエリのトリプルが一致しうるキー（rdf:type のトリプルは述語だけのキーとクラスまでのキーの両方）。"""
+    predicate = triple.get('predicate')
+    if triple.get('type') != 'triple' or not isinstance(predicate, AST_NODES) or predicate.get('type') != 'uri':
+        return ()
+    key = _triple_key(predicate['value'], triple.get('object'))
+    return (key, (key[0], None)) if key[1] is not None else (key,)
+
+
+def _uri(entity) -> str:
+    uri = entity.uri
+    if not uri or uri.startswith(_PLACEHOLDER_PREFIX):
+        raise ValueError(f"Unsupported source entity: {uri!r} (the parser could not read it)")
+    return uri
+
+
+def _is_relation(entity) -> bool:
+    """entity1 が2項の関係（述語として現れる）かどうか。そうでなければクラス（rdf:type の目的語）として扱う。"""
+    if isinstance(entity, (Relation, Property, PathConstructor,
+                           RelationDomainRestriction, RelationCoDomainRestriction)):
+        return True
+    if isinstance(entity, LogicalConstructor):
+        return any(_is_relation(operand) for operand in entity.operands)
+    return False
+
+
+class _PatternBuilder:
+    """entity1 をトリプルのパターンに変換する。項は変数の番号（int）か定数のノード（dict）。"""
+
+    def __init__(self, value_node):
+        self.triples = []
+        self.var_count = 2
+        self.value_node = value_node
+
+    def new_var(self) -> int:
+        self.var_count += 1
+        return self.var_count - 1
+
+    def add_class(self, entity, x):
+        if isinstance(entity, LogicalConstructor) and entity.operator == 'and' and entity.operands:
+            for operand in entity.operands:
+                self.add_class(operand, x)
+        elif isinstance(entity, AttributeDomainRestriction):
+            if entity.class_expression is None:
+                raise ValueError("Unsupported source entity: AttributeDomainRestriction without a class")
+            y = self.new_var()
+            self.add_relation(entity.on_attribute, x, y)
+            self.add_class(entity.class_expression, y)
+        elif isinstance(entity, AttributeValueRestriction):
+            if entity.comparator != EQUALS:
+                raise ValueError(f"Unsupported comparator: {entity.comparator!r} (expected {EQUALS})")
+            self.add_relation(entity.on_attribute, x, self.value_node(entity.value))
+        elif isinstance(entity, AttributeOccurenceRestriction):
+            if 'greater-than' not in (entity.comparator or '') or entity.value != 0:
+                raise ValueError(f"Unsupported occurrence restriction: {entity.comparator} {entity.value}")
+            self.add_relation(entity.on_attribute, x, self.new_var())
+        elif isinstance(entity, IdentifiedEntity) and not isinstance(entity, (Relation, Property, Instance)):
+            self.triples.append((x, _RDF_TYPE_NODE, {'type': 'uri', 'value': _uri(entity)}))
+        else:
+            raise ValueError(f"Unsupported class expression: {describe_entity(entity)}")
+
+    def add_relation(self, entity, s, o):
+        if isinstance(entity, LogicalConstructor) and entity.operator == 'and' and entity.operands:
+            for operand in entity.operands:
+                if isinstance(operand, (RelationDomainRestriction, RelationCoDomainRestriction)):
+                    if operand.class_expression is None:
+                        raise ValueError(f"Unsupported source entity: {type(operand).__name__} without a class")
+                    target = s if isinstance(operand, RelationDomainRestriction) else o
+                    self.add_class(operand.class_expression, target)
+                else:
+                    self.add_relation(operand, s, o)
+        elif isinstance(entity, PathConstructor) and entity.operator == 'compose' and entity.operands:
+            # ?s p1 ?v0 . ?v0 p2 ?v1 . ... ?vn pn ?o
+            current = s
+            for index, operand in enumerate(entity.operands):
+                following = o if index == len(entity.operands) - 1 else self.new_var()
+                self.add_relation(operand, current, following)
+                current = following
+        elif isinstance(entity, PathConstructor) and entity.operator == 'inverse' and len(entity.operands) == 1:
+            self.add_relation(entity.operands[0], o, s)
+        elif isinstance(entity, IdentifiedEntity) and not isinstance(entity, (Class, Instance)):
+            self.triples.append((s, {'type': 'uri', 'value': _uri(entity)}, o))
+        else:
+            raise ValueError(f"Unsupported relation expression: {describe_entity(entity)}")
+
+
+class SourcePattern:
+    """
+    1つの対応の entity1 を変換したパターン。
+
+    :ivar triples: (主語, 述語, 目的語) の並び。項は変数の番号か定数のノードで、先頭は索引のキーのトリプル
+    :ivar role: 'class'（主語 ?x が entity1 に属する）または 'relation'（?s と ?o が entity1 の関係にある）
+    :ivar var_count: 変数の数（0: 主語、1: 目的語、2 以降: 内部変数）
+    :ivar cell: 元の対応
+    :ivar key: 索引のキー（述語 URI, rdf:type のクラス URI または None）
+    """
+
+    __slots__ = ('triples', 'role', 'var_count', 'cell', 'key')
+
+    def __init__(self, triples, role: str, var_count: int, cell, key):
+        self.triples = triples
+        self.role = role
+        self.var_count = var_count
+        self.cell = cell
+        self.key = key
+
+    @property
+    def source(self) -> str:
+        """索引のキーの URI（rdf:type の場合はクラス URI）。"""
+        return self.key[1] or self.key[0]
+
+    def __repr__(self) -> str:
+        source = self.source if self.key else None
+        return f'SourcePattern({self.role}, {source}, triples={len(self.triples)})'
+
+
+def compile_source_pattern(cell, value_node) -> SourcePattern:
+    """
+    対応の entity1 をパターンにする（索引のキーはまだ決めない）。
+
+    :param value_node: EDOAL の値をクエリの定数ノードにする関数（SparqlRewriter._value_node）
+    :raises ValueError: パターンに変換できない entity1
+    """
+    builder = _PatternBuilder(value_node)
+    if _is_relation(cell.entity1):
+        role = 'relation'
+        builder.add_relation(cell.entity1, SUBJECT_VAR, OBJECT_VAR)
+    else:
+        role = 'class'
+        builder.add_class(cell.entity1, SUBJECT_VAR)
+    slots = {term for s, p, o in builder.triples for term in (s, o) if isinstance(term, int)}
+    if SUBJECT_VAR not in slots or (role == 'relation' and OBJECT_VAR not in slots):
+        raise ValueError(f"Unsupported source entity: {describe_entity(cell.entity1)} "
+                         f"does not bind its subject and object")
+    return SourcePattern(tuple(builder.triples), role, builder.var_count, cell, None)
+
+
+class PatternMatch:
+    """BGP の中で一致したパターン。indices は一致したトリプルの位置、subject / object は束縛されたノード。"""
+
+    __slots__ = ('pattern', 'indices', 'subject', 'object')
+
+    def __init__(self, pattern: SourcePattern, indices: tuple, subject: dict, obj):
+        self.pattern = pattern
+        self.indices = indices
+        self.subject = subject
+        self.object = obj
+
+
+def count_variables(query) -> dict:
+    """
+    クエリ全体での変数の出現回数（変数名 -> 回数）。
+    変数ノードのほか、selectVariables の名前と、式などの文字列に現れる ?name も数える。
+    """
+    counts = {}
+    if isinstance(query, AST_NODES):
+        for name in query.get('selectVariables') or ():
+            counts[name] = counts.get(name, 0) + 1
+    stack = [query]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, AST_NODES):
+            if item.get('type') == 'variable':
+                name = item.get('value')
+                counts[name] = counts.get(name, 0) + 1
+                continue
+            for key, value in item.items():
+                if key == 'selectVariables' and item is query:
+                    continue
+                if isinstance(value, str):
+                    if key not in ('type', 'value', 'datatype', 'lang', 'uri'):
+                        for name in _VARIABLE_RE.findall(value):
+                            counts[name] = counts.get(name, 0) + 1
+                else:
+                    stack.append(value)
+        elif isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, str):
+            for name in _VARIABLE_RE.findall(item):
+                counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+class PatternIndex:
+    """
+    アラインメントの複雑な entity1 のパターンの索引。
+
+    使い方:
+        index = PatternIndex(alignment.cells, rewriter.mapping, rewriter._value_node)
+        for match in index.select(bgp['triples'], count_variables(query)):
+            ...  # match.indices のトリプルを match.pattern.cell.entity2 の展開に置き換える
+    """
+
+    def __init__(self, cells, direct=(), value_node=None):
+        """
+        :param cells: アラインメントの対応
+        :param direct: entity1 が単純な URI の対応のソース URI（SparqlRewriter.mapping）。
+                       1トリプルだけのパターンがこれと同じトリプルに一致する場合は、単純な対応を優先する
+        :param value_node: EDOAL の値を定数ノードにする関数
+        """
+        self.patterns = []
+        # 変換できなかった対応と理由
+        self.skipped = []
+        # キー -> パターンのリスト
+        self.index = {}
+        seen = set()
+        compiled = []
+        for cell in cells:
+            if isinstance(cell.entity1, IdentifiedEntity):
+                continue
+            try:
+                pattern = compile_source_pattern(cell, value_node or _plain_value)
+            except ValueError as e:
+                self.skipped.append((cell, str(e)))
+                continue
+            shape = tuple((s, _node_key(p), o if isinstance(o, int) else _node_key(o))
+                          for s, p, o in pattern.triples)
+            if shape in seen:
+                self.skipped.append((cell, 'Duplicate source pattern'))
+                continue
+            seen.add(shape)
+            compiled.append(pattern)
+
+        # 各キーを使うパターンの数が少ないほど選択性が高い
+        frequency = {}
+        for pattern in compiled:
+            for key in {_triple_key(p['value'], o) for s, p, o in pattern.triples}:
+                frequency[key] = frequency.get(key, 0) + 1
+        for pattern in compiled:
+            keys = [_triple_key(p['value'], o) for s, p, o in pattern.triples]
+            anchor = min(range(len(keys)), key=lambda i: frequency[keys[i]])
+            if len(keys) == 1 and (keys[0][1] or keys[0][0]) in direct:
+                self.skipped.append((pattern.cell, 'Shadowed by a correspondence with a simple source URI'))
+                continue
+            pattern.key = keys[anchor]
+            pattern.triples = _connected_order(pattern.triples, anchor)
+            self.patterns.append(pattern)
+            self.index.setdefault(pattern.key, []).append(pattern)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __iter__(self):
+        return iter(self.patterns)
+
+    def anchors(self) -> list:
+        """索引のキーの URI（クエリの事前スキャンで、これを含まないクエリは一致しない）。"""
+        return [key[1] or key[0] for key in self.index]
+
+    def candidates(self, triple: dict) -> list:
+        """トリプルを索引のキーのトリプルとして一致する可能性があるパターン。"""
+        found = []
+        for key in _query_keys(triple):
+            found.extend(self.index.get(key, ()))
+        return found
+
+    def select(self, triples: list, variable_counts=None, accept=None) -> list:
+        """
+        BGP のトリプルに一致するパターンを、重ならないように選ぶ（トリプルの多いパターンを優先）。
+
+        :param triples: BGP のトリプル
+        :param variable_counts: クエリ全体での変数の出現回数（count_variables）。None の場合は
+                                内部変数を持つパターンは一致させない
+        :param accept: accept(pattern) が False のパターンは使わない
+        :return: 先頭のトリプルの位置の順に並べた PatternMatch のリスト
+        """
+        anchored = [(position, pattern) for position, triple in enumerate(triples)
+                    for pattern in self.candidates(triple)]
+        if not anchored:
+            return []
+        # キーのトリプル以外は、述語（と rdf:type のクラス）で BGP の中から探す
+        by_key = {}
+        for position, triple in enumerate(triples):
+            for key in _query_keys(triple):
+                by_key.setdefault(key, []).append(position)
+
+        matches = []
+        for position, pattern in anchored:
+            if accept is not None and not accept(pattern):
+                continue
+            for bindings, indices in _unify(pattern, triples, by_key, position):
+                if _is_local(pattern, bindings, indices, triples, variable_counts):
+                    matches.append(PatternMatch(pattern, indices, bindings[SUBJECT_VAR],
+                                                bindings[OBJECT_VAR] if pattern.role == 'relation' else None))
+        matches.sort(key=lambda m: (-len(m.indices), min(m.indices)))
+        used = set()
+        selected = []
+        for match in matches:
+            if used.isdisjoint(match.indices):
+                used.update(match.indices)
+                selected.append(match)
+        selected.sort(key=lambda m: min(m.indices))
+        return selected
+
+
+def _plain_value(value):
+    if isinstance(value, dict) and 'uri' in value:
+        return {'type': 'uri', 'value': value['uri']}
+    if isinstance(value, dict):
+        return {'type': 'literal', 'value': value.get('string'), 'datatype': value.get('type')}
+    return {'type': 'literal', 'value': str(value), 'datatype': None}
+
+
+def _connected_order(triples: tuple, anchor: int) -> tuple:
+    """キーのトリプルを先頭に、既に現れた変数を共有するトリプルが先に来るように並べ替える。"""
+    ordered = [triples[anchor]]
+    rest = [t for i, t in enumerate(triples) if i != anchor]
+    bound = {term for term in (triples[anchor][0], triples[anchor][2]) if isinstance(term, int)}
+    while rest:
+        index = next((i for i, (s, p, o) in enumerate(rest)
+                      if any(isinstance(term, int) and term in bound for term in (s, o))), 0)
+        s, p, o = rest.pop(index)
+        ordered.append((s, p, o))
+        bound.update(term for term in (s, o) if isinstance(term, int))
+    return tuple(ordered)
+
+
+def _bind(term, node, bindings: list) -> bool:
+    """パターンの項をクエリのノードに束縛する（既に束縛されていれば同じノードかどうかを調べる）。"""
+    if isinstance(term, int):
+        bound = bindings[term]
+        if bound is None:
+            if term > OBJECT_VAR and node.get('type') != 'variable':
+                # 内部変数は定数に束縛しない（定数の分だけクエリの方が条件が強い）
+                return False
+            bindings[term] = node
+            return True
+        return _node_key(bound) == _node_key(node)
+    return _node_key(term) == _node_key(node)
+
+
+def _unify(pattern: SourcePattern, triples: list, by_key: dict, anchor: int):
+    """先頭のトリプルを triples[anchor] に固定して、パターン全体の一致（束縛, 位置）を列挙する。"""
+    bindings = [None] * pattern.var_count
+    indices = []
+
+    def extend(step: int):
+        if step == len(pattern.triples):
+            yield list(bindings), tuple(indices)
+            return
+        s, p, o = pattern.triples[step]
+        positions = [anchor] if step == 0 else by_key.get(_triple_key(p['value'], o), ())
+        for position in positions:
+            if position in indices:
+                continue
+            triple = triples[position]
+            if _node_key(triple['predicate']) != _node_key(p):
+                continue
+            saved = list(bindings)
+            if _bind(s, triple['subject'], bindings) and _bind(o, triple['object'], bindings):
+                indices.append(position)
+                yield from extend(step + 1)
+                indices.pop()
+            bindings[:] = saved
+
+    yield from extend(0)
+
+
+def _is_local(pattern: SourcePattern, bindings: list, indices: tuple, triples: list, variable_counts) -> bool:
+    """内部変数が互いに異なるクエリの変数に束縛され、一致したトリプルの外で使われていないかどうか。"""
+    internal = [bindings[var]['value'] for var in range(OBJECT_VAR + 1, pattern.var_count)]
+    if not internal:
+        return True
+    if variable_counts is None or len(set(internal)) != len(internal):
+        return False
+    slots = {_node_key(bindings[SUBJECT_VAR])}
+    if pattern.role == 'relation':
+        slots.add(_node_key(bindings[OBJECT_VAR]))
+    inside = {}
+    for position in indices:
+        triple = triples[position]
+        for node in (triple['subject'], triple['object']):
+            if node.get('type') == 'variable':
+                inside[node['value']] = inside.get(node['value'], 0) + 1
+    for name in internal:
+        if ('variable', name, None, None) in slots:
+            return False
+        if variable_counts.get(name, 0) != inside.get(name, 0):
+            return False
+    return True
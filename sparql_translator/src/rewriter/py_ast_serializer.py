@@ -0,0 +1,559 @@
+"""
+Pure-Python の AST → SPARQL シリアライザー
+- Java 版 (SparqlAstSerializer.java) と同じ JSON AST を受け取り、Jena の Query.serialize() に近い
+  レイアウトの SPARQL 文字列を返す。JVM を起動せずにプロセス内で変換できる
+- FILTER 式は式木の辞書（py_sparql_parser.expr_to_map と同じ形）を SPARQL 構文で出力する。
+  以前の形式の S-Expression (SSE) 文字列も読み取る
+- 変化していない部分木の描画結果はメモ化する。同じプレフィックス集合のクエリ間で構造が同じ部分木
+  （共通の BGP、UNION の各分岐など）は2回目以降は文字列を組み立て直さない
+- 読み取れない式（EXISTS を含むものなど）は AstSerializationError を送出する。fallback に Java 版の
+  シリアライザーを渡しておくと、その場合だけ Java 側に委譲する
+"""
+import re
+
+from ..parser.py_sparql_parser import (
+    BUILTIN_FUNCTIONS, RDF, RDF_LANG_STRING, RDF_TYPE, XSD, XSD_BOOLEAN, XSD_DECIMAL,
+    XSD_DOUBLE, XSD_INTEGER, XSD_STRING,
+)
+from ..common.typed_ast import AST_NODES
+
+
+class AstSerializationError(ValueError):
+    """AST を SPARQL に変換できない（FILTER の式が読み取れない、未知のパスなど）。"""
+
+
+# SSE.parseExpr() が既定で解決するプレフィックス
+_SSE_PREFIXES = {
+    'rdf': RDF,
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+    'xsd': XSD,
+    'owl': 'http://www.w3.org/2002/07/owl#',
+    'fn': 'http://www.w3.org/2005/xpath-functions#',
+}
+
+# 中置で出力する演算子（'!' と単項の '-' は前置）
+_OPERATORS = {'&&', '||', '=', '!=', '<', '>', '<=', '>=', '+', '-', '*', '/', '!'}
+_FUNCTIONS = set(BUILTIN_FUNCTIONS.values())
+
+_SSE_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<iri><[^<>"{}|^`\\\s]*>)
+  | (?P<literal>(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+        (?P<suffix>@[A-Za-z]+(?:-[A-Za-z0-9]+)*|\^\^(?:<[^<>\s]*>|[A-Za-z][\w.\-]*:[\w.\-]*))?)
+  | (?P<var>\?[^\s()]+)
+  | (?P<symbol>[^\s()]+)
+''', re.VERBOSE)
+
+_ESCAPES = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+_ESCAPE_RE = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+
+_INTEGER_RE = re.compile(r'[+-]?[0-9]+')
+_DECIMAL_RE = re.compile(r'[+-]?[0-9]*\.[0-9]+')
+_DOUBLE_RE = re.compile(r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)[eE][+-]?[0-9]+')
+
+# プレフィックス名として安全に出力できるローカル名（末尾の '.' は不可）
+_LOCAL_NAME_RE = re.compile(r'(?:[A-Za-z0-9_](?:[A-Za-z0-9_.\-]*[A-Za-z0-9_\-])?)?')
+_VAR_CHARS_RE = re.compile(r'[^a-zA-Z0-9_]')
+
+# メモ化テーブルがこの件数を超えたら破棄して作り直す
+_MEMO_LIMIT = 200000
+# 保持するプレフィックス集合ごとの描画器の数
+_RENDERER_CACHE_SIZE = 32
+
+
+def _unescape(body: str) -> str:
+    def replace(match):
+        code = match.group(1)
+        if code[0] in 'uU' and len(code) > 1:
+            return chr(int(code[1:], 16))
+        return _ESCAPES.get(code, code)
+    return _ESCAPE_RE.sub(replace, body)
+
+
+def parse_sse_expr(text: str):
+    """
+    SSE 文字列（例: '(regex ?label "x" "i")'）を py_sparql_parser と同じ式のタプルにする。
+
+    :raises AstSerializationError: 読み取れない場合
+    """
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _SSE_TOKEN_RE.match(text, pos)
+        if match is None:
+            raise AstSerializationError(f"Failed to parse FILTER expression: {text}")
+        pos = match.end()
+        if match.lastgroup != 'ws':
+            tokens.append(match)
+
+    expr, index = _sse_expr(tokens, 0, text)
+    if index != len(tokens):
+        raise AstSerializationError(f"Failed to parse FILTER expression: {text}")
+    return expr
+
+
+def _sse_expr(tokens: list, index: int, text: str):
+    if index >= len(tokens):
+        raise AstSerializationError(f"Failed to parse FILTER expression: {text}")
+    token = tokens[index]
+    kind = token.lastgroup
+    if kind == 'lparen':
+        if index + 1 >= len(tokens):
+            raise AstSerializationError(f"Failed to parse FILTER expression: {text}")
+        head = tokens[index + 1]
+        index += 2
+        args = []
+        while index < len(tokens) and tokens[index].lastgroup != 'rparen':
+            arg, index = _sse_expr(tokens, index, text)
+            args.append(arg)
+        if index >= len(tokens):
+            raise AstSerializationError(f"Failed to parse FILTER expression: {text}")
+        return _sse_call(head, args, text), index + 1
+    if kind == 'rparen':
+        raise AstSerializationError(f"Failed to parse FILTER expression: {text}")
+    return ('const', _sse_node(token, text)) if kind != 'var' else ('var', token.group()[1:]), index + 1
+
+
+def _sse_call(head, args: list, text: str):
+    if head.lastgroup == 'iri':
+        return ('func', head.group()[1:-1], args)
+    name = head.group()
+    if head.lastgroup == 'symbol':
+        iri = _expand_sse_pname(name)
+        if iri is not None:
+            return ('func', iri, args)
+        if name in _OPERATORS and (len(args) == 2 or (len(args) == 1 and name in ('!', '-', '+'))):
+            return ('op', name, args)
+        if name in _FUNCTIONS or name in ('in', 'notin'):
+            return ('call', name, args)
+    raise AstSerializationError(f"Failed to parse FILTER expression: {text} (unknown function {name!r})")
+
+
+def map_to_expr(node):
+    """
+    式木の辞書（expr_to_map の出力）を py_sparql_parser と同じ式のタプルにする。
+
+    :raises AstSerializationError: 未知のノードや EXISTS を含む場合
+    """
+    if not isinstance(node, AST_NODES):
+        raise AstSerializationError(f"Unknown FILTER expression node: {node!r}")
+    node_type = node.get('type')
+    if node_type == 'variable':
+        return ('var', node.get('value', ''))
+    if node_type in ('uri', 'literal'):
+        return ('const', node)
+    if node_type in ('operator', 'function'):
+        args = [map_to_expr(arg) for arg in node.get('args') or []]
+        if node_type == 'operator':
+            name = node.get('name')
+            if name in _OPERATORS and (len(args) == 2 or (len(args) == 1 and name in ('!', '-', '+'))):
+                return ('op', name, args)
+        elif node.get('iri'):
+            return ('func', node['iri'], args)
+        elif node.get('name') in _FUNCTIONS or node.get('name') in ('in', 'notin'):
+            return ('call', node['name'], args)
+        raise AstSerializationError(f"Unknown FILTER {node_type}: {node.get('name')!r}")
+    if node_type in ('exists', 'not_exists'):
+        raise AstSerializationError("EXISTS / NOT EXISTS in FILTER expressions are not supported")
+    raise AstSerializationError(f"Unknown FILTER expression node type: {node_type}")
+
+
+def _freeze(value):
+    """式木をメモ化のキーに使えるタプルにする。"""
+    if isinstance(value, AST_NODES):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _expand_sse_pname(name: str):
+    prefix, sep, local = name.partition(':')
+    if sep and prefix in _SSE_PREFIXES:
+        return _SSE_PREFIXES[prefix] + local
+    return None
+
+
+def _sse_node(token, text: str) -> dict:
+    kind = token.lastgroup
+    value = token.group()
+    if kind == 'iri':
+        return {'type': 'uri', 'value': value[1:-1]}
+    if kind == 'literal':
+        lexical = _unescape(token.group('string')[1:-1])
+        suffix = token.group('suffix')
+        if not suffix:
+            return {'type': 'literal', 'value': lexical, 'datatype': XSD_STRING}
+        if suffix.startswith('@'):
+            return {'type': 'literal', 'value': lexical, 'datatype': RDF_LANG_STRING, 'lang': suffix[1:]}
+        datatype = suffix[2:]
+        if datatype.startswith('<'):
+            datatype = datatype[1:-1]
+        else:
+            datatype = _expand_sse_pname(datatype)
+            if datatype is None:
+                raise AstSerializationError(f"Failed to parse FILTER expression: {text} (unknown prefix in {value!r})")
+        return {'type': 'literal', 'value': lexical, 'datatype': datatype}
+
+    # シンボル: 数値・真偽値・プレフィックス名
+    if _INTEGER_RE.fullmatch(value):
+        return {'type': 'literal', 'value': value, 'datatype': XSD_INTEGER}
+    if _DECIMAL_RE.fullmatch(value):
+        return {'type': 'literal', 'value': value, 'datatype': XSD_DECIMAL}
+    if _DOUBLE_RE.fullmatch(value):
+        return {'type': 'literal', 'value': value, 'datatype': XSD_DOUBLE}
+    if value in ('true', 'false'):
+        return {'type': 'literal', 'value': value, 'datatype': XSD_BOOLEAN}
+    iri = _expand_sse_pname(value)
+    if iri is not None:
+        return {'type': 'uri', 'value': iri}
+    raise AstSerializationError(f"Failed to parse FILTER expression: {text} (unexpected symbol {value!r})")
+
+
+class _Renderer:
+    """
+    1つのプレフィックス集合に対する描画器。
+
+    パターンは相対インデントの行リストとして描画し、構造キーごとにメモ化する。
+    構造キーは子の部分木IDのタプルなので、大きな部分木でもキーの計算は子の数に比例するだけで済む。
+    """
+
+    def __init__(self, prefixes: dict):
+        self.prefixes = prefixes
+        # 最長一致のため、長い名前空間から順に試す
+        self._namespaces = sorted(((ns, prefix) for prefix, ns in prefixes.items() if ns),
+                                  key=lambda item: -len(item[0]))
+        self._term_texts = {}
+        self._subtree_ids = {}
+        self._subtree_lines = []
+        self.hits = 0
+        self.misses = 0
+
+    # --- 部分木のメモ化 ---
+
+    def _memoized(self, key, render):
+        subtree_id = self._subtree_ids.get(key)
+        if subtree_id is not None:
+            self.hits += 1
+            return subtree_id, self._subtree_lines[subtree_id]
+        self.misses += 1
+        lines = render()
+        subtree_id = len(self._subtree_lines)
+        self._subtree_ids[key] = subtree_id
+        self._subtree_lines.append(lines)
+        return subtree_id, lines
+
+    # --- 項 ---
+
+    def uri(self, value: str) -> str:
+        for namespace, prefix in self._namespaces:
+            if value.startswith(namespace) and _LOCAL_NAME_RE.fullmatch(value, len(namespace)):
+                return f'{prefix}:{value[len(namespace):]}'
+        return f'<{value}>'
+
+    def term(self, node: dict) -> str:
+        node_type = node.get('type')
+        value = node.get('value', '')
+        key = (node_type, value, node.get('datatype'), node.get('lang') or node.get('language'))
+        text = self._term_texts.get(key)
+        if text is None:
+            text = self._term_texts[key] = self._render_term(*key)
+        return text
+
+    def _render_term(self, node_type, value, datatype, lang) -> str:
+        if node_type == 'uri':
+            return self.uri(value)
+        if node_type == 'variable':
+            # 空白ノード由来の匿名変数 "?0" は Jena と同様に空白ノードとして出力する
+            if value.startswith('?'):
+                return '_:b' + _VAR_CHARS_RE.sub('', value)
+            return f'?{value}'
+        if node_type == 'blank':
+            return '_:' + (_VAR_CHARS_RE.sub('', value) or 'b')
+        if node_type != 'literal':
+            # Java 版と同様、未知のノードは変数 "unknown" として扱う
+            return '?unknown'
+
+        if datatype == XSD_INTEGER and _INTEGER_RE.fullmatch(value):
+            return value
+        if datatype == XSD_DECIMAL and _DECIMAL_RE.fullmatch(value):
+            return value
+        if datatype == XSD_DOUBLE and _DOUBLE_RE.fullmatch(value):
+            return value
+        if datatype == XSD_BOOLEAN and value in ('true', 'false'):
+            return value
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"')
+                   .replace('\n', '\\n').replace('\r', '\\r').replace('\f', '\\f'))
+        if lang:
+            return f'"{escaped}"@{lang}'
+        if datatype and datatype not in (XSD_STRING, RDF_LANG_STRING):
+            return f'"{escaped}"^^{self.uri(datatype)}'
+        return f'"{escaped}"'
+
+    def path(self, path: dict, parent: str = None, position: str = None) -> str:
+        path_type = path.get('type')
+        if path_type == 'link':
+            return self.uri(path['uri'])
+        if path_type == 'complex':
+            # Java 版では再構築できない '?' などのパスは、Jena が出力したパス文字列をそのまま使う
+            return f"({path['pathString']})"
+        if path_type == 'inverse':
+            return '^' + self._path_operand(path['subPath'])
+        if path_type == 'mod':
+            modifier = path.get('modifier')
+            if modifier == 'custom':
+                suffix = f"{{{path['min']},{path['max']}}}"
+            elif modifier in ('*', '+', '?'):
+                suffix = modifier
+            else:
+                raise AstSerializationError(f"Unknown path modifier: {modifier}")
+            return self._path_operand(path['subPath']) + suffix
+        if path_type in ('seq', 'alt'):
+            separator = '/' if path_type == 'seq' else '|'
+            text = (self.path(path['left'], path_type, 'left') + separator
+                    + self.path(path['right'], path_type, 'right'))
+            # 左結合で読み戻されるため、右側の同じ演算子と、seq の中の alt だけ括弧が必要
+            needs_parens = (parent == 'seq' and (path_type == 'alt' or position == 'right')) or \
+                           (parent == 'alt' and path_type == 'alt' and position == 'right')
+            return f'({text})' if needs_parens else text
+        raise AstSerializationError(f"Unknown path type: {path_type}")
+
+    def _path_operand(self, path: dict) -> str:
+        text = self.path(path)
+        return text if path.get('type') in ('link', 'complex') else f'({text})'
+
+    def _triple_key(self, triple: dict):
+        if triple.get('type') == 'path_triple':
+            return (self.term(triple['subject']), self.path(triple['path']), self.term(triple['object']))
+        predicate = triple['predicate']
+        if predicate.get('type') == 'uri' and predicate.get('value') == RDF_TYPE:
+            predicate_text = 'a'
+        else:
+            predicate_text = self.term(predicate)
+        return (self.term(triple['subject']), predicate_text, self.term(triple['object']))
+
+    # --- 式 ---
+
+    def expr(self, expr) -> str:
+        kind = expr[0]
+        if kind == 'var':
+            return f'?{expr[1]}'
+        if kind == 'const':
+            return self.term(expr[1])
+        args = expr[2]
+        if kind == 'op':
+            if len(args) == 1:
+                return f'( {expr[1]} {self.expr(args[0])} )'
+            return f'( {self.expr(args[0])} {expr[1]} {self.expr(args[1])} )'
+        if kind == 'call' and expr[1] in ('in', 'notin'):
+            keyword = 'IN' if expr[1] == 'in' else 'NOT IN'
+            values = ', '.join(self.expr(arg) for arg in args[1:])
+            return f'( {self.expr(args[0])} {keyword} ({values}) )'
+        name = self.uri(expr[1]) if kind == 'func' else expr[1]
+        return f"{name}({', '.join(self.expr(arg) for arg in args)})"
+
+    def filter(self, expression) -> str:
+        expr = parse_sse_expr(expression) if isinstance(expression, str) else map_to_expr(expression)
+        text = self.expr(expr)
+        # FmtExprSPARQL と同様、変数・定数だけの場合は括弧で囲む
+        if expr[0] in ('var', 'const'):
+            text = f'( {text} )'
+        return f'FILTER {text}'
+
+    # --- パターン ---
+
+    def pattern(self, node: dict):
+        """パターンを描画し、(部分木ID, 行リスト) を返す。"""
+        node_type = node.get('type')
+        if node_type in ('group', 'union'):
+            children = [self.pattern(p) for p in node.get('patterns', []) if isinstance(p, AST_NODES)]
+            key = (node_type,) + tuple((child_id, child_type) for child_id, _, child_type in children)
+            render = self._group_lines if node_type == 'group' else self._union_lines
+            return self._memoized(key, lambda: render(children)) + (node_type,)
+        if node_type == 'bgp':
+            triples = tuple(self._triple_key(t) for t in node.get('triples', []) if isinstance(t, AST_NODES))
+            return self._memoized(('bgp',) + triples, lambda: self._bgp_lines(triples)) + ('bgp',)
+        if node_type == 'optional':
+            pattern = node.get('pattern')
+            child = self.pattern(pattern) if isinstance(pattern, AST_NODES) else self.pattern({'type': 'group'})
+            return self._memoized(('optional', child[0]), lambda: self._optional_lines(child)) + ('optional',)
+        if node_type == 'filter':
+            if 'expression' not in node:
+                raise AstSerializationError("FILTER node has no expression")
+            expression = node['expression']
+            return self._memoized(('filter', _freeze(expression)), lambda: [self.filter(expression)]) + ('filter',)
+        # Java 版と同様、未対応のノードタイプは空のグループにする
+        return self.pattern({'type': 'group'})
+
+    def _bgp_lines(self, triples: tuple) -> list:
+        lines = []
+        index = 0
+        while index < len(triples):
+            subject = triples[index][0]
+            # 同じ主語が続くトリプルは ';' でまとめる
+            end = index
+            while end + 1 < len(triples) and triples[end + 1][0] == subject:
+                end += 1
+            indent = ' ' * (len(subject) + 2)
+            for i in range(index, end + 1):
+                _, predicate, obj = triples[i]
+                head = f'{subject}  ' if i == index else indent
+                tail = ' ;' if i < end else (' .' if end + 1 < len(triples) else '')
+                lines.append(f'{head}{predicate}  {obj}{tail}')
+            index = end + 1
+        return lines
+
+    def _group_lines(self, children: list) -> list:
+        body = []
+        for i, (_, lines, child_type) in enumerate(children):
+            if not lines:
+                continue
+            if child_type == 'bgp' and i + 1 < len(children) and children[i + 1][2] == 'bgp':
+                # 続く BGP と区切るために '.' を付ける
+                lines = lines[:-1] + [lines[-1] + ' .']
+            body.extend(lines)
+        if not body:
+            return ['{ }']
+        return ['{ ' + body[0]] + ['  ' + line for line in body[1:]] + ['}']
+
+    def _as_group(self, child) -> list:
+        _, lines, child_type = child
+        if child_type == 'group':
+            return lines
+        return self._group_lines([child])
+
+    def _union_lines(self, children: list) -> list:
+        if not children:
+            return ['{ }']
+        if len(children) == 1:
+            return children[0][1]
+        lines = []
+        for i, child in enumerate(children):
+            if i > 0:
+                lines.append('UNION')
+            lines.extend(self._as_group(child))
+        return lines
+
+    def _optional_lines(self, child) -> list:
+        return ['OPTIONAL'] + ['  ' + line for line in self._as_group(child)]
+
+    # --- クエリ全体 ---
+
+    def query(self, ast: dict) -> str:
+        # 描画中に親が子のIDを参照しているため、テーブルの破棄はクエリの境界でだけ行う
+        if len(self._subtree_lines) >= _MEMO_LIMIT:
+            self._subtree_ids.clear()
+            self._subtree_lines.clear()
+            self._term_texts.clear()
+
+        lines = []
+        if self.prefixes:
+            width = max(len(prefix) for prefix in self.prefixes) + 1
+            for prefix, namespace in self.prefixes.items():
+                lines.append(f'PREFIX  {(prefix + ":").ljust(width)} <{namespace}>')
+            lines.append('')
+
+        query_type = ast.get('queryType') or 'SELECT'
+        variables = ' '.join(f'?{v}' for v in ast.get('selectVariables') or [])
+        if query_type == 'SELECT':
+            distinct = 'DISTINCT ' if ast.get('isDistinct') else ''
+            lines.append(f'SELECT {distinct} {variables or "*"}')
+        elif query_type == 'CONSTRUCT':
+            lines.append('CONSTRUCT')
+            lines.append('  { }')
+        elif query_type == 'DESCRIBE':
+            lines.append(f'DESCRIBE {variables or "*"}')
+        elif query_type == 'ASK':
+            lines.append('ASK')
+
+        if isinstance(ast.get('ast'), AST_NODES):
+            lines.append('WHERE')
+            lines.extend('  ' + line for line in self._as_group(self.pattern(ast['ast'])))
+
+        # Java 版と同じく、SortCondition の文字列から最初の変数名だけを取り出して昇順にする
+        conditions = []
+        for condition in ast.get('orderBy') or []:
+            if '?' in condition:
+                var_name = _VAR_CHARS_RE.sub('', condition[condition.index('?') + 1:])
+                conditions.append(f'ASC(?{var_name})')
+        if conditions:
+            lines.append('ORDER BY ' + ' '.join(conditions))
+        if ast.get('limit') is not None:
+            lines.append(f"LIMIT   {ast['limit']}")
+        if ast.get('offset') is not None:
+            lines.append(f"OFFSET  {ast['offset']}")
+        return '\n'.join(lines) + '\n'
+
+
+class PyAstSerializer:
+    """
+    AstSerializer と同じインターフェースを持つ Pure-Python 実装。
+
+    使い方:
+        serializer = PyAstSerializer(fallback=AstSerializer(project_root))
+        query = serializer.serialize(rewritten_ast)
+    """
+
+    def __init__(self, project_root: str = None, fallback=None):
+        """
+        :param project_root: AstSerializer との互換用（使用しない）
+        :param fallback: 変換できない AST のときに委譲するシリアライザー（AstSerializer など）。
+                         None の場合は AstSerializationError をそのまま送出する。
+        """
+        self.project_root = project_root
+        self.fallback = fallback
+        self.fallback_count = 0
+        # プレフィックス集合 -> 描画器（メモ化テーブルは描画器ごとに持つ）
+        self._renderers = {}
+
+    def _renderer(self, prefixes: dict) -> _Renderer:
+        key = tuple(prefixes.items())
+        renderer = self._renderers.pop(key, None)
+        if renderer is None:
+            renderer = _Renderer(dict(prefixes))
+            if len(self._renderers) >= _RENDERER_CACHE_SIZE:
+                # 最も古く使われた描画器を捨てる（dict は挿入順を保つ）
+                del self._renderers[next(iter(self._renderers))]
+        self._renderers[key] = renderer
+        return renderer
+
+    @property
+    def memo_stats(self) -> dict:
+        """部分木メモ化のヒット数とミス数（全描画器の合計）。"""
+        renderers = self._renderers.values()
+        return {'hits': sum(r.hits for r in renderers), 'misses': sum(r.misses for r in renderers)}
+
+    def serialize(self, ast: dict) -> str:
+        """
+        書き換え後のJSON ASTをSPARQLクエリ文字列に変換する。
+
+        :raises AstSerializationError: 変換できず、fallback も無い場合
+        """
+        try:
+            return self._renderer(ast.get('prefixes') or {}).query(ast).strip()
+        except (AstSerializationError, KeyError, TypeError, AttributeError) as e:
+            if self.fallback is None:
+                if isinstance(e, AstSerializationError):
+                    raise
+                raise AstSerializationError(f"Malformed AST: {type(e).__name__}: {e}") from e
+            self.fallback_count += 1
+            return self.fallback.serialize(ast)
+
+    def serialize_many(self, asts, threads: int = None):
+        """
+        AstSerializer.serialize_many と同じ形式で順にシリアライズする。threads は互換用で使用しない。
+
+        :return: {'index', 'query', 'error'} を入力順に返すイテレータ
+        """
+        for index, ast in enumerate(asts):
+            try:
+                yield {'index': index, 'query': self.serialize(ast), 'error': None}
+            except (ValueError, RuntimeError) as e:
+                yield {'index': index, 'query': None, 'error': f"{type(e).__name__}: {e}"}
+
+    def close(self):
+        """fallback のシリアライザーが保持しているリソースを解放する。"""
+        if self.fallback is not None and hasattr(self.fallback, 'close'):
+            self.fallback.close()
@@ -0,0 +1,63 @@
+"""
+書き換え1回分（1クエリ）の可変な状態
+- SparqlRewriter はアラインメントの索引・書き換えプランなど、作成後に変わらない（またはロックで守られた）
+  状態だけを持ち、一時変数の番号やグループごとの展開の表は RewriteContext に持つ
+- 実行中のコンテキストは contextvars で管理するので、1つの SparqlRewriter を複数のスレッドや
+  asyncio のタスクから同時に使える。一時変数の番号はクエリごとに 0 から振られ、出力は実行順に依存しない
+"""
+import contextvars
+
+# 実行中の書き換えのコンテキスト（スレッド・タスクごとに独立）
+_current_context = contextvars.ContextVar('sparql_rewrite_context', default=None)
+
+
+class RewriteContext:
+    """
+    1回の書き換えの状態と結果。
+
+    :ivar temp_var_counter: 次に採番する一時変数の番号
+    :ivar variable_mapping: 変数の書き換えマップ（元の変数 -> 新しい変数）
+    :ivar expansion_scopes: グループごとの展開済み（テンプレート, 主語, 目的語）-> 一時変数（入れ子のグループのスタック）
+    :ivar template_new_var: テンプレート作成中だけ設定される、一時変数のプレースホルダーを返す関数
+    :ivar trace: 書き換えの記録（記録しない場合は None）
+    :ivar query: 書き換え前の AST 全体
+    :ivar variable_counts: query での変数の出現回数（entity1 のパターンの照合で最初に必要になったときに数える）
+    :ivar ast: 書き換え後の AST
+    :ivar changed: 書き換え後の AST が元の AST と構造的に異なるかどうか
+    :ivar union_mode: このクエリだけに使う UNION の出力形式（None なら SparqlRewriter.union_mode）
+    :ivar applications: 見積もり（explain）の場合だけ、適用したテンプレートと一時変数を新たに採番したかどうかの組を集めるリスト（それ以外は None）
+    :ivar cost: 予算を確認した場合の書き換え後のコスト（rewrite_cost.RewriteCost。確認しなければ None）
+    :ivar pruned_branches: 他の分岐に包含されるため取り除いた UNION の分岐の数（union_pruning）
+    """
+
+    __slots__ = ('temp_var_counter', 'variable_mapping', 'expansion_scopes', 'template_new_var',
+                 'trace', 'query', 'variable_counts', 'ast', 'changed', 'union_mode', 'applications', 'cost',
+                 'pruned_branches')
+
+    def __init__(self, trace=None):
+        self.temp_var_counter = 0
+        self.variable_mapping = {}
+        self.expansion_scopes = []
+        self.template_new_var = None
+        self.trace = trace
+        self.query = None
+        self.variable_counts = None
+        self.ast = None
+        self.changed = False
+        self.union_mode = None
+        self.applications = None
+        self.cost = None
+        self.pruned_branches = 0
+
+    def activate(self):
+        """このコンテキストを実行中にする。戻り値は deactivate() に渡す。"""
+        return _current_context.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current_context.reset(token)
+
+
+def current_context():
+    """実行中の書き換えのコンテキスト（書き換え中でなければ None）。"""
+    return _current_context.get()
@@ -0,0 +1,210 @@
+"""
+書き換えのコスト（クエリの大きさ）の見積もりと予算
+- RewriteCost は AST（またはテンプレートの断片）に含まれる次の数を持つ:
+    triples: トリプルパターン（triple / path_triple）/ unions: UNION / branches: UNION の分岐の合計 /
+    product: UNION をすべて直積に展開した場合の分岐数（visit_bgp で UNION を直積にまとめた場合の最悪値）/
+    temp_vars: 一時変数 / path_operators: プロパティパスの演算子（+ * ^ / | と複雑なパス）/ filters: FILTER
+- SparqlRewriter.explain() は書き換え前後のコストと、各数を生んだ EDOAL の対応（Cell）ごとの内訳を RewriteExplanation で返す
+- RewriteBudget は各数の上限。超えた場合は on_exceed に従い、書き換えを拒否する（RewriteBudgetExceeded）か、
+  UNION を直積にしない形式（factorized）で書き換え直してから、なお超えていれば拒否する
+"""
+import json
+
+from .rewrite_trace import describe_entity
+from ..common.typed_ast import AST_NODES, Node
+
+COST_FIGURES = ('triples', 'unions', 'branches', 'product', 'temp_vars', 'path_operators', 'filters')
+BUDGET_ACTIONS = ('reject', 'factorize')
+
+TEMP_VAR_PREFIX = 'variable_temp'
+# 一時変数の名前の接頭辞（書き換え後の AST と、テンプレートの断片のプレースホルダー rewrite_plan.Slot）
+_TEMP_VAR_PREFIXES = (TEMP_VAR_PREFIX, '<fresh')
+_PATH_OPERATORS = ('mod', 'inverse', 'seq', 'alt', 'complex')
+
+
+class RewriteCost:
+    """AST の大きさの見積もり（COST_FIGURES の各数）。"""
+
+    __slots__ = COST_FIGURES
+
+    def __init__(self, **figures):
+        for name in COST_FIGURES:
+            setattr(self, name, figures.get(name, 0))
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in COST_FIGURES}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RewriteCost) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"RewriteCost({', '.join(f'{name}={getattr(self, name)}' for name in COST_FIGURES)})"
+
+
+def _product(value) -> int:
+    """UNION をすべて直積に展開した場合の分岐数（UNION は分岐の和、それ以外の要素は子の積）。"""
+    if isinstance(value, list):
+        result = 1
+        for item in value:
+            result *= _product(item)
+        return result
+    if not isinstance(value, AST_NODES):
+        return 1
+    if value.get('type') == 'union':
+        return sum(_product(pattern) for pattern in value.get('patterns', [])) or 1
+    if value.get('type') in ('triple', 'path_triple', 'uri', 'variable', 'literal'):
+        return 1
+    result = 1
+    for item in value.values():
+        if isinstance(item, (dict, list, Node)):
+            result *= _product(item)
+    return result
+
+
+def measure_cost(value) -> RewriteCost:
+    """AST（またはテンプレートの断片のリスト）のコストを数える。"""
+    cost = RewriteCost()
+    names = set()
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+            continue
+        if not isinstance(item, AST_NODES):
+            continue
+        node_type = item.get('type')
+        if node_type in ('triple', 'path_triple'):
+            cost.triples += 1
+        elif node_type == 'union':
+            cost.unions += 1
+            cost.branches += len(item.get('patterns', []))
+        elif node_type == 'filter':
+            cost.filters += 1
+        elif node_type in _PATH_OPERATORS and ('subPath' in item or 'left' in item or 'pathString' in item):
+            cost.path_operators += 1
+        elif node_type == 'variable' and str(item.get('value', '')).startswith(_TEMP_VAR_PREFIXES):
+            names.add(item['value'])
+            continue
+        stack.extend(child for child in item.values() if isinstance(child, (dict, list, Node)))
+    cost.product = _product(value)
+    cost.temp_vars = len(names)
+    return cost
+
+
+def template_costs(template, fresh: bool = True) -> list:
+    """
+    テンプレート1回の適用のコストを、もとになった対応ごとに分ける。
+
+    代替（alternatives.Alternatives）の UNION で分岐と対応が1対1に並ぶ場合は、各分岐のコストをその対応に、
+    UNION 自体は先頭の対応に帰属させる。それ以外は全体のコストをすべての対応に帰属させる。
+    :param fresh: False なら一時変数を再利用した適用（一時変数は増えない）
+    :return: (対応のタプル, RewriteCost) のリスト
+    """
+    fragments = template.fragments
+    cells = template.cells
+    if (len(cells) > 1 and isinstance(fragments, list) and len(fragments) == 1
+            and fragments[0].get('type') == 'union' and len(fragments[0]['patterns']) == len(cells)):
+        costs = []
+        for index, (cell, branch) in enumerate(zip(cells, fragments[0]['patterns'])):
+            cost = measure_cost(branch)
+            cost.unions, cost.branches = cost.unions + (index == 0), cost.branches + 1
+            costs.append(((cell,), cost))
+    else:
+        costs = [(cells, measure_cost(fragments))]
+    if not fresh:
+        for _, cost in costs:
+            cost.temp_vars = 0
+    return costs
+
+
+class RewriteBudget:
+    """
+    書き換え後のクエリのコストの上限（None の項目は制限しない）。
+
+    :ivar limits: COST_FIGURES の名前 -> 上限
+    :ivar on_exceed: 'reject'（RewriteBudgetExceeded を送出）/ 'factorize'（UNION を直積にしない形式で書き換え直し、
+                     なお超えていれば送出）
+    """
+
+    __slots__ = ('limits', 'on_exceed')
+
+    def __init__(self, on_exceed='reject', **limits):
+        if on_exceed not in BUDGET_ACTIONS:
+            raise ValueError(f"Unknown budget action: {on_exceed!r} (expected one of {', '.join(BUDGET_ACTIONS)})")
+        for name in limits:
+            if name not in COST_FIGURES:
+                raise ValueError(f"Unknown cost figure: {name!r} (expected one of {', '.join(COST_FIGURES)})")
+        self.on_exceed = on_exceed
+        self.limits = {name: limit for name, limit in limits.items() if limit is not None}
+
+    def violations(self, cost: RewriteCost) -> list:
+        """上限を超えた項目のメッセージのリスト（超えていなければ空）。"""
+        return [f"Budget exceeded: {name} {getattr(cost, name)} > {limit}"
+                for name, limit in self.limits.items() if getattr(cost, name) > limit]
+
+
+class RewriteBudgetExceeded(ValueError):
+    """書き換え後のクエリが予算を超えた。explanation に書き換えの見積もりを持つ。"""
+
+    def __init__(self, explanation):
+        super().__init__('; '.join(explanation.violations))
+        self.explanation = explanation
+
+
+def describe_cell(cell, index: int = None) -> dict:
+    """内訳に使う対応の説明（アラインメント中の位置、entity1、entity2 の種類、measure）。"""
+    entity1 = getattr(cell.entity1, 'uri', None) or describe_entity(cell.entity1)
+    return {'cell': index, 'entity1': entity1, 'entity2': describe_entity(cell.entity2), 'measure': cell.measure}
+
+
+class RewriteExplanation:
+    """
+    1クエリの書き換えの見積もり。
+
+    :ivar before: 書き換え前のコスト
+    :ivar after: 書き換え後のコスト
+    :ivar cells: 対応ごとの内訳（describe_cell の情報 + 適用回数 applied と、その対応の展開が生んだ COST_FIGURES の数）
+    :ivar violations: 予算を超えた項目（予算が無ければ空）
+    :ivar union_mode: 書き換えに使った UNION の出力形式
+    :ivar ast: 書き換え後の AST
+    """
+
+    __slots__ = ('before', 'after', 'cells', 'violations', 'union_mode', 'ast')
+
+    def __init__(self, before, after, cells, violations, union_mode, ast):
+        self.before = before
+        self.after = after
+        self.cells = cells
+        self.violations = violations
+        self.union_mode = union_mode
+        self.ast = ast
+
+    def to_dict(self) -> dict:
+        return {'before': self.before.to_dict(), 'after': self.after.to_dict(), 'cells': self.cells,
+                'violations': self.violations, 'union_mode': self.union_mode}
+
+    def to_json(self, indent=None) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+
+
+def attribute_cells(applications, describe) -> list:
+    """
+    適用された展開を対応ごとに集計する。
+
+    :param applications: (対応のタプル, RewriteCost) のイテラブル（1回の適用ごと）
+    :param describe: describe(対応) -> describe_cell の辞書
+    :return: アラインメントの順の内訳のリスト
+    """
+    rows = {}
+    for cells, cost in applications:
+        for cell in cells:
+            row = rows.get(id(cell))
+            if row is None:
+                row = rows[id(cell)] = {**describe(cell), 'applied': 0,
+                                        **{name: 0 for name in COST_FIGURES if name != 'product'}}
+            row['applied'] += 1
+            for name in COST_FIGURES:
+                if name != 'product':
+                    row[name] += getattr(cost, name)
+    return sorted(rows.values(), key=lambda row: (row['cell'] is None, row['cell'] or 0))
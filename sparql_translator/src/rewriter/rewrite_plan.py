@@ -0,0 +1,189 @@
+"""
+アラインメントの書き換えプラン（展開テンプレート）
+- Cell.entity2 の展開（_expand_complex_entity / _expand_complex_relation / _expand_compose_path）は
+  主語・目的語・一時変数を除けば毎回同じ結果になる。そこで、ソース URI と役割（述語 / rdf:type の目的語）
+  ごとに1回だけ記号的な主語・目的語で展開し、その結果をテンプレートとして保持する
+- テンプレートは triple / path_triple / filter / union の断片のリストで、主語・目的語・一時変数の
+  位置にプレースホルダー (Slot) を持つ。書き換え時はテンプレートを辞書から引き、断片をたどって
+  プレースホルダーを埋めるだけで済む（展開メソッドは呼ばない）
+- 一時変数は展開時と同じ順序で採番するため、出力は直接展開した場合と同じになる
+- テンプレートは書き換えの記録（rewrite_trace）に使う情報（種類・ソース URI・生成するトリプル数）も持つ
+"""
+import threading
+
+
+class Slot(dict):
+    """
+    テンプレート中のプレースホルダー（主語・目的語・一時変数）。
+
+    展開メソッドからは通常の変数ノードに見えるよう dict を継承している。
+    index は instantiate() に渡す値のリストの位置（0: 主語、1: 目的語、2 以降: 一時変数）。
+    """
+
+    def __init__(self, index: int, name: str):
+        super().__init__(type='variable', value=name)
+        self.index = index
+
+
+SUBJECT = Slot(0, '<subject>')
+OBJECT = Slot(1, '<object>')
+
+
+def _fill(value, slots: list):
+    """
+    断片をたどって、プレースホルダーを slots[index] に置き換えた新しい断片を作る。
+    dict・list は作り直し、それ以外の値（文字列・数値や、URI などの定数）はそのまま共有する。
+    """
+    value_type = type(value)
+    if value_type is Slot:
+        return slots[value.index]
+    if value_type is dict:
+        # 値の大半は type / value などの文字列なので、呼び出しを省く
+        return {key: item if type(item) is str else _fill(item, slots) for key, item in value.items()}
+    if value_type is list:
+        return [_fill(item, slots) for item in value]
+    return value
+
+
+def _count_triples(value) -> int:
+    """断片に含まれる triple / path_triple の数（UNION の各分岐の分も数える）。"""
+    if isinstance(value, list):
+        return sum(_count_triples(item) for item in value)
+    if not isinstance(value, dict):
+        return 0
+    if value.get('type') in ('triple', 'path_triple'):
+        return 1
+    return sum(_count_triples(item) for item in value.values())
+
+
+class RewriteTemplate:
+    """
+    1つのソース URI・役割に対する展開結果のテンプレート。
+
+    :ivar fragments: 展開結果（断片のリスト、または path_triple の辞書）。空の場合は書き換えない
+    :ivar fresh_count: インスタンス化のたびに採番する一時変数の数
+    :ivar event: 書き換えの記録に使う情報（kind, source, target, entity）
+    :ivar triple_count: 断片に含まれるトリプルの数
+    :ivar cells: この展開を生む EDOAL の対応（Cell）のタプル（書き換えの見積もりの内訳に使う）
+    """
+
+    __slots__ = ('fragments', 'fresh_count', 'event', 'triple_count', 'cells')
+
+    def __init__(self, fragments, fresh_count: int, event: dict, cells=()):
+        self.fragments = fragments
+        self.fresh_count = fresh_count
+        self.event = event
+        self.cells = tuple(cells)
+        self.triple_count = _count_triples(fragments)
+
+    def instantiate(self, subject: dict, obj: dict, new_var):
+        """
+        プレースホルダーを埋めた新しい断片を返す。
+
+        :param subject: 主語ノード
+        :param obj: 目的語ノード（rdf:type の展開では使わない）
+        :param new_var: 一時変数ノードを1つ返す関数（fresh_count 回呼ばれる）
+        :return: 展開結果（空のテンプレートでも一時変数は採番する）
+        """
+        return self.fill(subject, obj, [new_var() for _ in range(self.fresh_count)])
+
+    def fill(self, subject: dict, obj: dict, fresh_vars: list):
+        """
+        既に採番した一時変数を使って断片を作る（同じ展開を一時変数ごと再利用する場合）。
+
+        :param fresh_vars: fresh_count 個の一時変数ノード
+        """
+        return _fill(self.fragments, [subject, obj] + fresh_vars)
+
+
+def compile_template(expand, event: dict, cells=()) -> RewriteTemplate:
+    """
+    展開関数を記号的な主語・目的語で1回呼び出し、テンプレートにする。
+
+    :param expand: expand(subject, obj, new_var) -> 展開結果。new_var() は一時変数のノードを返す
+    :param event: 書き換えの記録に使う情報（rewrite_trace.template_event）
+    :param cells: 展開のもとになった対応（Cell）
+    """
+    fresh = []
+
+    def new_var():
+        slot = Slot(len(fresh) + 2, f'<fresh{len(fresh)}>')
+        fresh.append(slot)
+        return slot
+
+    return RewriteTemplate(expand(SUBJECT, OBJECT, new_var), len(fresh), event, cells)
+
+
+class RewritePlan:
+    """
+    アラインメント1つ分のテンプレートの表。
+
+    テンプレートは最初に使われたときに作られ、同じ SparqlRewriter で書き換える全クエリで再利用される。
+    compile_all() で全 URI のテンプレートを先に作っておくこともできる。
+    テンプレートの作成はロックで直列化するので、複数のスレッドから同時に使える（作成済みのテンプレートの
+    参照はロックを取らない）。
+    """
+
+    def __init__(self, mapping: dict, compile_relation, compile_class, compile_pattern=None,
+                 relations: dict = None, classes: dict = None):
+        """
+        :param mapping: SparqlRewriter.mapping（ソース URI -> ターゲットのエンティティ）
+        :param compile_relation: compile_relation(source_uri, entity) -> 述語としての RewriteTemplate または None
+        :param compile_class: compile_class(source_uri, entity) -> rdf:type の目的語としての RewriteTemplate または None
+        :param compile_pattern: compile_pattern(source_pattern) -> entity1 のパターン（pattern_index.SourcePattern）に
+                                一致した部分を置き換える RewriteTemplate
+        :param relations: 述語のテンプレートに使う表（MappingIndex.predicates。省略時は mapping）
+        :param classes: rdf:type の目的語のテンプレートに使う表（MappingIndex.classes。省略時は mapping）
+        """
+        self.mapping = mapping
+        self.relations = mapping if relations is None else relations
+        self.classes = mapping if classes is None else classes
+        self._compile_relation = compile_relation
+        self._compile_class = compile_class
+        self._compile_pattern = compile_pattern
+        self.relation_templates = {}
+        self.class_templates = {}
+        self.pattern_templates = {}
+        self._lock = threading.Lock()
+
+    def relation(self, uri: str):
+        """述語 uri の展開テンプレート。展開が不要（単純な URI の置換）の場合は None。"""
+        try:
+            return self.relation_templates[uri]
+        except KeyError:
+            return self._compile(self.relation_templates, self._compile_relation, self.relations, uri)
+
+    def rdf_class(self, uri: str):
+        """rdf:type の目的語 uri の展開テンプレート。展開が不要な場合は None。"""
+        try:
+            return self.class_templates[uri]
+        except KeyError:
+            return self._compile(self.class_templates, self._compile_class, self.classes, uri)
+
+    def pattern(self, source_pattern):
+        """entity1 のパターンに一致した部分の展開テンプレート。"""
+        try:
+            return self.pattern_templates[source_pattern]
+        except KeyError:
+            with self._lock:
+                if source_pattern not in self.pattern_templates:
+                    self.pattern_templates[source_pattern] = self._compile_pattern(source_pattern)
+                return self.pattern_templates[source_pattern]
+
+    def _compile(self, templates: dict, compile_template, table: dict, uri: str):
+        """テンプレートを1回だけ作って templates に登録する（他のスレッドが先に作っていればそれを返す）。"""
+        with self._lock:
+            if uri not in templates:
+                templates[uri] = compile_template(uri, table.get(uri, self.mapping[uri]))
+            return templates[uri]
+
+    def compile_all(self, uris):
+        """uris の全テンプレート（述語・rdf:type の目的語の両方）を作っておく。"""
+        for uri in uris:
+            self.relation(uri)
+            self.rdf_class(uri)
+        return self
+
+    def __len__(self) -> int:
+        return sum(t is not None for t in self.relation_templates.values()) + \
+            sum(t is not None for t in self.class_templates.values()) + len(self.pattern_templates)
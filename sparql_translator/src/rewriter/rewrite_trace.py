@@ -0,0 +1,90 @@
+"""
+書き換えの記録（トレース）
+- SparqlRewriter(trace=True) の場合だけ、walk() ごとに書き換えのイベントを RewriteTrace に記録する。
+  記録する書き換え（trace=True または explain()）が実行中でなければ、URI を置換するたびのコストは
+  SparqlRewriter._active_traces が 0 かどうかの判定1回だけで、実行中のコンテキストも引かない。画面・ログへの出力も行わない
+- イベントは JSON にそのまま書き出せる辞書:
+    kind: 'simple'（URI の置換）/ 'transitive'（述語 -> プロパティパス）/
+          'relation'（述語の複雑な展開）/ 'class'（rdf:type の目的語の複雑な展開）/
+          'pattern'（複雑な entity1 のパターンに一致した複数のトリプルの置換。matched に一致したトリプル数を持つ）
+    source: ソース URI、target: 置換先の URI（simple / transitive のみ）、
+    entity: 対応のターゲット（Cell.entity2）の種類、triples: 生成したトリプルの数、temp_vars: 使った一時変数
+- 従来の画面出力（"  [Rewrite] ..."）は format_event / print_trace で記録から作る
+"""
+import json
+
+TRACE_KINDS = ('simple', 'transitive', 'relation', 'class', 'pattern')
+
+
+def describe_entity(entity) -> str:
+    """Cell.entity2 の種類を表す文字列（例: 'LogicalConstructor(or)', 'AttributeDomainRestriction'）。"""
+    operator = getattr(entity, 'operator', None)
+    name = type(entity).__name__
+    return f'{name}({operator})' if operator else name
+
+
+def simple_event(source: str, target: str) -> dict:
+    """URI の置換のイベント。"""
+    return {'kind': 'simple', 'source': source, 'target': target, 'entity': 'IdentifiedEntity',
+            'triples': 0, 'temp_vars': []}
+
+
+def template_event(kind: str, source: str, entity, target: str = None) -> dict:
+    """
+    展開テンプレートの静的な情報（RewriteTemplate.event）。
+    インスタンス化のたびに triples と temp_vars を加えてイベントにする。
+    """
+    if kind not in TRACE_KINDS:
+        raise ValueError(f"Unknown trace kind: {kind!r} (expected one of {', '.join(TRACE_KINDS)})")
+    return {'kind': kind, 'source': source, 'target': target, 'entity': describe_entity(entity)}
+
+
+class RewriteTrace:
+    """1回の walk()（1クエリ）分の書き換えイベントのリスト。"""
+
+    __slots__ = ('events',)
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, event: dict):
+        self.events.append(event)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def to_dict(self) -> dict:
+        return {'events': self.events}
+
+    def to_json(self, indent=None) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+
+
+def format_event(event: dict) -> str:
+    """イベントを従来の画面出力と同じ1行のメッセージにする。"""
+    kind, source = event['kind'], event['source']
+    if kind == 'simple':
+        return f"Simple URI rewrite: {source} -> {event['target']}"
+    if kind == 'transitive':
+        return f"Transitive property: {source} -> {event['target']}+"
+    if kind == 'relation':
+        return f"Complex rewrite for predicate: {source}"
+    if kind == 'pattern':
+        return f"Pattern rewrite for {event['matched']} triples: {source}"
+    return f"Complex rewrite for object: {source}"
+
+
+def print_trace(trace: RewriteTrace, logger=None):
+    """記録を従来と同じ形式で画面に表示する（logger を渡すとログにも書き込む）。"""
+    for event in trace:
+        message = format_event(event)
+        print(f"  [Rewrite] {message}")
+        if logger is not None:
+            try:
+                logger.info(f"[Rewrite] {message}")
+            except Exception:
+                # ログ出力に失敗しても処理を継続する
+                pass
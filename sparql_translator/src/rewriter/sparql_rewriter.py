@@ -1,46 +1,318 @@
+import re
+import threading
+
+from .alternatives import Alternatives
 from .ast_walker import AstWalker
+from .mapping_index import RDF_TYPE, MappingIndex, is_rdf_type
+from .pattern_index import PatternIndex, count_variables
+from .rewrite_context import RewriteContext, current_context
+from .rewrite_cost import (
+    RewriteBudgetExceeded, RewriteCost, RewriteExplanation, attribute_cells, describe_cell, measure_cost,
+    template_costs,
+)
+from .rewrite_plan import RewritePlan, compile_template
+from .rewrite_trace import RewriteTrace, simple_event, template_event
+from .union_pruning import UnionPruner, applies_to, check_union_pruning
+from .vocabulary_index import VocabularyIndex
 from ..parser.edoal_parser import (
     Alignment, Cell, IdentifiedEntity, LogicalConstructor, PathConstructor,
     AttributeDomainRestriction, AttributeValueRestriction, AttributeOccurenceRestriction,
     RelationDomainRestriction, RelationCoDomainRestriction, Relation
 )
 from ..common.logger import get_logger
+from ..common.typed_ast import AST_NODES, Node, replace_node
 
 """
 タスク：クエリの変換パターンを関数に落とし込む
 
 """
 
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+
+UNION_MODES = ('auto', 'product', 'factorized')
+# union_mode='auto' で直積に展開する分岐数の上限
+DEFAULT_UNION_PRODUCT_LIMIT = 16
+
+# EDOAL の比較演算子 -> FILTER の演算子（contains は関数なので別に扱う）
+_COMPARATOR_OPERATORS = {
+    'http://ns.inria.org/edoal/1.0/#greaterThan': '>',
+    'http://ns.inria.org/edoal/1.0/#lessThan': '<',
+    'http://ns.inria.org/edoal/1.0/#greaterThanOrEqual': '>=',
+    'http://ns.inria.org/edoal/1.0/#lessThanOrEqual': '<=',
+}
+
+_NUMERIC_DATATYPES = [
+    (re.compile(r'[+-]?[0-9]+'), XSD + 'integer'),
+    (re.compile(r'[+-]?[0-9]*\.[0-9]+'), XSD + 'decimal'),
+    (re.compile(r'[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)[eE][+-]?[0-9]+'), XSD + 'double'),
+]
+
+
+def _numeric_datatype(lexical: str):
+    """数値の字句からデータ型を決める（SPARQL の数値リテラルと同じ規則）。数値でなければ None。"""
+    for pattern, datatype in _NUMERIC_DATATYPES:
+        if pattern.fullmatch(lexical):
+            return datatype
+    return None
+
+
+def _literal_node(lexical: str, datatype: str) -> dict:
+    return {'type': 'literal', 'value': lexical, 'datatype': datatype}
+
+
+def _node_key(node):
+    """主語・目的語ノードを比較用のキーにする。"""
+    if node is None:
+        return None
+    return (node.get('type'), node.get('value'), node.get('datatype'), node.get('lang'))
+
+
+def _freeze(value):
+    """ASTの断片を比較用のハッシュ可能な値にする。"""
+    if isinstance(value, dict):
+        try:
+            # 値がすべてハッシュ可能なノード（URI・変数・リテラルなど）はそのまま集合にする
+            return frozenset(value.items())
+        except TypeError:
+            # 値に dict / list を含む
+            return frozenset([(key, _freeze(item)) for key, item in value.items()])
+    if isinstance(value, Node):
+        # 型付きのノードは同じ内容の dict と同じ値にする（子を持ちうる型は例外を待たずに子をたどる）
+        if value._children:
+            return frozenset([(key, _freeze(item)) for key, item in value.items()])
+        return frozenset(value.items())
+    if isinstance(value, list):
+        return tuple([_freeze(item) for item in value])
+    return value
+
+
+def _unique(items):
+    """構造が完全に同じ要素の2回目以降を取り除く（順序は保つ）。"""
+    seen = set()
+    unique = []
+    for item in items:
+        key = _freeze(item)
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+    return unique
+
+
+def _branch(fragments) -> dict:
+    """展開結果を UNION の1つの分岐にする（トリプルだけなら BGP、FILTER や UNION を含めばグループ）。"""
+    if isinstance(fragments, dict):
+        fragments = [fragments]
+    triples = [item for item in fragments if item.get('type') in ('triple', 'path_triple')]
+    others = [item for item in fragments if item.get('type') not in ('triple', 'path_triple')]
+    bgp = {'type': 'bgp', 'triples': triples}
+    if not others:
+        return bgp
+    return {'type': 'group', 'patterns': ([bgp] if triples else []) + others}
+
+
+def _join_branches(patterns, triples) -> dict:
+    """
+    UNION の分岐（と共通のトリプル）を結合した1つの分岐にする。
+    すべて BGP なら1つの BGP、グループの分岐（FILTER などを含む）があればその要素を並べたグループにする。
+    """
+    combined, others = [], []
+    for pattern in patterns:
+        items = pattern.get('patterns', []) if pattern.get('type') == 'group' else [pattern]
+        for item in items:
+            if item.get('type') == 'bgp':
+                combined.extend(item.get('triples', []))
+            else:
+                others.append(item)
+    combined.extend(triples)
+    bgp = {'type': 'bgp', 'triples': _unique(combined)}
+    if not others:
+        return bgp
+    return {'type': 'group', 'patterns': [bgp] + others}
+
 class SparqlRewriter(AstWalker):
     """
     アラインメント情報に基づいてSPARQL ASTを書き換える。
+
+    インスタンスが持つのは作成後に変わらない状態（マッピング・索引・設定）と書き換えプランだけで、
+    一時変数の番号などの書き換え1回分の状態は RewriteContext に持つ。rewrite() は呼び出しごとに
+    コンテキストを作るので、1つのインスタンスを複数のスレッドから同時に使え、一時変数の番号は
+    クエリごとに 0 から振られる。walk() は rewrite() の結果を last_walk_changed / last_trace にも残す
+    （これらは直前の呼び出しの結果なので、並行して使う場合は rewrite() の戻り値を使う）。
     """
 
-    def __init__(self, alignment: Alignment, verbose=False):
-        # URIのマッピングを効率的に検索できるよう、辞書に変換しておく
-        self.mapping = self._create_mapping(alignment)
+    def __init__(self, alignment: Alignment, verbose=False, union_mode='auto',
+                 union_product_limit=DEFAULT_UNION_PRODUCT_LIMIT, trace=False, alternative_policy=None,
+                 budget=None, union_pruning='off'):
         # ロガーを初期化（append モードでファイルに出力される設定）
         self.logger = get_logger('sparql_rewriter', verbose=False)
-        # 新しい変数を生成するためのカウンター
-        self.temp_var_counter = 0
+        # URIのマッピングを、クエリ中の役割（述語 / rdf:type の目的語 / 主語・目的語）ごとの辞書に分けておく
+        # 同じソース URI の対応が複数ある場合は alternative_policy（alternatives.AlternativePolicy）で選ぶ
+        self.roles = MappingIndex(alignment.cells, alternative_policy)
+        for cell, reason in self.roles.misrouted + self.roles.pruned:
+            self.logger.info(reason)
+        self.mapping = self._create_mapping(alignment)
         # デバッグログの制御
         self.verbose = verbose
-        # 変数の書き換えマップ（元の変数 -> 新しい変数）
-        self.variable_mapping = {}
+        # entity1 が複雑な対応の、BGP のトリプルのパターンの索引
+        self.patterns = PatternIndex(alignment.cells, self.mapping, self._value_node)
+        # ソース URI の局所名の索引（パース前のクエリ文字列を事前にふるい分ける）
+        self.vocabulary_index = VocabularyIndex(list(self.mapping) + self.patterns.anchors())
+        # BGP内に複数のUNIONが生じた場合の出力形式
+        #   'product': 直積に展開する / 'factorized': 各UNIONを独立して残す
+        #   'auto': 直積の分岐数が union_product_limit を超える場合だけ 'factorized'
+        if union_mode not in UNION_MODES:
+            raise ValueError(f"Unknown union mode: {union_mode!r} (expected one of {', '.join(UNION_MODES)})")
+        self.union_mode = union_mode
+        self.union_product_limit = union_product_limit
+        # 書き換え後に、他の分岐に包含される UNION の分岐を取り除くかどうか（union_pruning.UNION_PRUNING_MODES）
+        self.union_pruning = check_union_pruning(union_pruning)
+        # 直前の walk() で AST が変わったかどうか（変わらなければシリアライズを省略できる）
+        self.last_walk_changed = True
+        # 書き換えの記録。trace=True の場合だけ書き換えごとに RewriteTrace を作る（無効なら None のまま）
+        self.trace_enabled = trace
+        self.last_trace = None
+        # 書き換えの外から展開メソッドを直接呼んだ場合に使うコンテキスト
+        self._default_context = RewriteContext(RewriteTrace() if trace else None)
+        # 記録できるコンテキスト（記録のある既定のコンテキストと、実行中の記録する書き換え）の数。
+        # 0 の間は URI の置換のたびに実行中のコンテキストを引かずに済む
+        self._active_traces = 1 if trace else 0
+        self._trace_lock = threading.Lock()
+        # 書き換え後のクエリのコストの上限（rewrite_cost.RewriteBudget。None なら確認しない）
+        self.budget = budget
+        # 見積もりの内訳に使う、対応のアラインメント中の位置
+        self._cell_positions = {id(cell): index for index, cell in enumerate(alignment.cells)}
+        # Cell.entity2 の展開テンプレート（ソース URI ごとに1回だけ展開し、全クエリで再利用する）
+        self.plan = RewritePlan(self.mapping, self._compile_relation, self._compile_class, self._compile_pattern,
+                                relations=self.roles.predicates, classes=self.roles.classes)
 
     def _create_mapping(self, alignment: Alignment) -> dict:
         """
         EDOALパーサーの出力から、書き換えのためのマッピング辞書を作成する。
         { "source_uri": <target_entity_object> }
+        entity1 と entity2 の種類が食い違う対応は含めない（self.roles.misrouted）。
+        entity1 が複雑な対応は PatternIndex（self.patterns）で扱う。
+        """
+        return self.roles.mapping
+
+    def may_rewrite(self, query_text: str) -> bool:
+        """
+        パース前のクエリ文字列が、アラインメントのソース URI を含む可能性があるかどうか。
+        False の場合は書き換え対象が無いので、クエリをそのまま返してよい。
         """
-        mapping = {}
-        for cell in alignment.cells:
-            # ソースエンティティが単純なURIである対応関係をマッピング対象とする
-            if isinstance(cell.entity1, IdentifiedEntity):
-                source_uri = cell.entity1.uri
-                # ターゲットエンティティ（単純な場合も複雑な場合もある）をマッピングする
-                mapping[source_uri] = cell.entity2
-        return mapping
+        return self.vocabulary_index.might_match(query_text)
+
+    @property
+    def _context(self) -> RewriteContext:
+        """実行中の書き換えのコンテキスト（書き換え中でなければインスタンスの既定のコンテキスト）。"""
+        context = current_context()
+        return self._default_context if context is None else context
+
+    @property
+    def temp_var_counter(self) -> int:
+        return self._context.temp_var_counter
+
+    @temp_var_counter.setter
+    def temp_var_counter(self, value: int):
+        self._context.temp_var_counter = value
+
+    @property
+    def variable_mapping(self) -> dict:
+        return self._context.variable_mapping
+
+    @property
+    def _expansion_scopes(self) -> list:
+        return self._context.expansion_scopes
+
+    def rewrite(self, node) -> RewriteContext:
+        """
+        ASTを書き換え、結果（ast, changed, trace）を持つコンテキストを返す。スレッドセーフ。
+        書き換えの無い部分木は元のノードのまま共有され、入力のASTは変更されない。
+        budget を設定した場合は書き換え後のコストを context.cost に残し、予算を超えれば
+        budget.on_exceed に従って factorized で書き換え直すか、RewriteBudgetExceeded を送出する。
+        """
+        context = self._run(node, RewriteContext(RewriteTrace() if self.trace_enabled else None))
+        if self.budget is None:
+            return context
+        context.cost = measure_cost(context.ast)
+        if self.budget.violations(context.cost) and self._can_factorize(self.budget):
+            context = RewriteContext(RewriteTrace() if self.trace_enabled else None)
+            context.union_mode = 'factorized'
+            context = self._run(node, context)
+            context.cost = measure_cost(context.ast)
+        if self.budget.violations(context.cost):
+            raise RewriteBudgetExceeded(self.explain(node))
+        return context
+
+    def explain(self, node, budget=None) -> RewriteExplanation:
+        """
+        ASTを書き換え、書き換え前後のコストと対応ごとの内訳を返す（予算を超えても送出はしない）。
+        budget（省略時は self.budget）の on_exceed が 'factorize' で予算を超える場合は、factorized で書き換え直した
+        結果を返す。
+        """
+        budget = self.budget if budget is None else budget
+        explanation = self._explain(node, budget, None)
+        if explanation.violations and self._can_factorize(budget):
+            return self._explain(node, budget, 'factorized')
+        return explanation
+
+    def _can_factorize(self, budget) -> bool:
+        """予算を超えた場合に、UNION を直積にしない形式で書き換え直せるかどうか。"""
+        return budget.on_exceed == 'factorize' and self.union_mode != 'factorized'
+
+    def _explain(self, node, budget, union_mode) -> RewriteExplanation:
+        """union_mode（None なら self.union_mode）で書き換え、見積もりを作る。"""
+        context = RewriteContext(RewriteTrace())
+        context.union_mode = union_mode
+        context.applications = []
+        self._run(node, context)
+        after = measure_cost(context.ast)
+        # URI の置換は先頭の対応、展開はテンプレートのもとになった対応に帰属させる
+        applications = [(self.roles.cells.get(event['source'], ())[:1], RewriteCost())
+                        for event in context.trace if event['kind'] == 'simple']
+        for template, fresh in context.applications:
+            applications.extend(template_costs(template, fresh))
+        cells = attribute_cells(applications, lambda cell: describe_cell(cell, self._cell_positions.get(id(cell))))
+        violations = budget.violations(after) if budget is not None else []
+        return RewriteExplanation(measure_cost(node), after, cells, violations,
+                                  union_mode or self.union_mode, context.ast)
+
+    def _run(self, node, context: RewriteContext) -> RewriteContext:
+        """context を実行中にして node を書き換え、結果を context に残す。"""
+        context.query = node
+        traced = context.trace is not None
+        if traced:
+            with self._trace_lock:
+                self._active_traces += 1
+        token = context.activate()
+        try:
+            rewritten = super().walk(node)
+        finally:
+            RewriteContext.deactivate(token)
+            if traced:
+                with self._trace_lock:
+                    self._active_traces -= 1
+        context.ast = rewritten
+        # 何も書き換わらなければ元のノードがそのまま返る
+        try:
+            context.changed = rewritten is not node and rewritten != node
+        except RecursionError:
+            # 比較できないほど深いASTは、書き換わったものとして扱う
+            context.changed = True
+        if context.changed and self.union_pruning != 'off' and applies_to(self.union_pruning, node):
+            # 書き換えで生じた冗長な UNION の分岐を取り除く（書き換えの無いクエリはそのまま）
+            pruner = UnionPruner()
+            context.ast = pruner.prune(rewritten)
+            context.pruned_branches = pruner.pruned
+        return context
+
+    def walk(self, node):
+        """
+        ASTを書き換える。結果が元のASTと構造的に同じ場合は last_walk_changed を False にする。
+        """
+        context = self.rewrite(node)
+        self.last_walk_changed = context.changed
+        self.last_trace = context.trace
+        return context.ast
 
     def visit_uri(self, node):
         """
@@ -50,37 +322,29 @@ class SparqlRewriter(AstWalker):
         target_entity = self.mapping.get(uri_to_check)
 
         if isinstance(target_entity, IdentifiedEntity):
-            print(f"  [Rewrite] Simple URI rewrite: {uri_to_check} -> {target_entity.uri}")
-            # print は残しつつログにも出力（append）
-            try:
-                self.logger.info(f"[Rewrite] Simple URI rewrite: {uri_to_check} -> {target_entity.uri}")
-            except Exception:
-                # ログ出力に失敗しても処理を継続する
-                pass
-            return {**node, 'value': target_entity.uri}
+            # 記録は書き換えのコンテキストごと（trace=True または explain() の場合だけ）
+            if self._active_traces:
+                trace = self._context.trace
+                if trace is not None:
+                    trace.record(simple_event(uri_to_check, target_entity.uri))
+            return replace_node(node, value=target_entity.uri)
         
         return node
 
-    def visit_group(self, node):
+    def enter_group(self, node):
         """
-        Group ノードを訪問し、パターンを処理する。
-        子パターンがUNIONを返す場合、適切に統合する。
+        Group ノードの子パターンを巡回する前に呼ばれる。
+        このグループ内の展開（テンプレート, 主語, 目的語）-> 一時変数の表を作る。入れ子のグループとは共有しない。
         """
-        new_patterns = []
-        
-        for pattern in node.get('patterns', []):
-            result = self._walk_node(pattern)
-            
-            # 結果がUNIONの場合、そのまま追加
-            if isinstance(result, dict) and result.get('type') == 'union':
-                new_patterns.append(result)
-            elif isinstance(result, list):
-                # リストの場合は展開
-                new_patterns.extend(result)
-            else:
-                new_patterns.append(result)
-        
-        return {**node, 'patterns': new_patterns}
+        self._context.expansion_scopes.append({})
+
+    def leave_group(self, node, new_node):
+        """
+        Group ノードの子パターンを巡回した後に呼ばれる。
+        子パターンがUNIONやリストを返した場合の統合（リストの展開）は既定の巡回で済んでいる。
+        """
+        self._context.expansion_scopes.pop()
+        return new_node
 
     def visit_bgp(self, node):
         """
@@ -88,18 +352,29 @@ class SparqlRewriter(AstWalker):
         複数のトリプルが1つのトリプルから複数に展開される場合や、
         UNION構造やFILTERが生成される場合を処理する。
         """
+        triples = node.get('triples', [])
         new_triples = []
         filters = []  # FILTERを別途収集
         union_structures = []  # 複数のUNION構造を保持
+        changed = False
+        # 複雑な entity1 のパターンに一致した部分（先頭のトリプルの位置 -> 一致、残りの位置 -> None）
+        matched = self._match_patterns(triples) if self.patterns else None
         
-        for triple in node.get('triples', []):
-            result = self._walk_node(triple)
+        for index, triple in enumerate(triples):
+            if matched and index in matched:
+                if matched[index] is None:
+                    continue
+                result = self._instantiate_pattern(matched[index])
+                changed = True
+            else:
+                result = self._walk_node(triple)
+                changed = changed or result is not triple
             
             # 結果がリストの場合（複数トリプルへの展開、またはトリプル+FILTER）
             if isinstance(result, list):
                 # リスト内の各要素を処理
                 for item in result:
-                    if isinstance(item, dict):
+                    if isinstance(item, AST_NODES):
                         if item.get('type') == 'union':
                             # UNION構造を収集
                             union_structures.append(item)
@@ -115,7 +390,7 @@ class SparqlRewriter(AstWalker):
                         new_triples.append(item)
             else:
                 # トリプルまたはpath_tripleとして追加
-                if isinstance(result, dict):
+                if isinstance(result, AST_NODES):
                     if result.get('type') == 'union':
                         union_structures.append(result)
                     elif result.get('type') == 'filter':
@@ -125,6 +400,18 @@ class SparqlRewriter(AstWalker):
                 else:
                     new_triples.append(result)
         
+        # 同じ展開の再利用や元のクエリによって生じた、完全に同じトリプル・FILTER・UNIONを取り除く
+        new_triples = _unique(new_triples)
+        # どのトリプルも変わらず、重複も無ければ元のノードを返す
+        if not changed and not filters and not union_structures and len(new_triples) == len(triples):
+            return node
+        filters = _unique(filters)
+        union_structures = _unique(union_structures)
+        
+        # UNIONの直積が大きくなる場合は、各UNIONを独立したグループ要素として残す
+        if union_structures and self._use_factorized_unions(union_structures):
+            return self._factorized_bgp(new_triples, union_structures, filters)
+        
         # 複数のUNIONがある場合、それらをマージ
         if len(union_structures) > 1:
             # 複数のUNIONをネストしたUNION構造として結合
@@ -135,20 +422,8 @@ class SparqlRewriter(AstWalker):
             for pattern1 in union_structures[0]['patterns']:
                 # 2番目以降のUNIONの各パターンと組み合わせる
                 for pattern2 in union_structures[1]['patterns']:
-                    # 両方のパターンを組み合わせた新しいパターンを作成
-                    combined_triples = []
-                    if pattern1.get('type') == 'bgp':
-                        combined_triples.extend(pattern1.get('triples', []))
-                    if pattern2.get('type') == 'bgp':
-                        combined_triples.extend(pattern2.get('triples', []))
-                    
-                    # 他のトリプルも追加
-                    combined_triples.extend(new_triples)
-                    
-                    merged_patterns.append({
-                        'type': 'bgp',
-                        'triples': combined_triples
-                    })
+                    # 両方のパターンと他のトリプルを組み合わせた新しいパターンを作成
+                    merged_patterns.append(_join_branches([pattern1, pattern2], new_triples))
             
             # 3つ以上のUNIONがある場合は再帰的に処理
             if len(union_structures) > 2:
@@ -159,12 +434,7 @@ class SparqlRewriter(AstWalker):
                     temp_patterns = []
                     for p1 in current_union['patterns']:
                         for p2 in next_union['patterns']:
-                            combined = []
-                            if p1.get('type') == 'bgp':
-                                combined.extend(p1.get('triples', []))
-                            if p2.get('type') == 'bgp':
-                                combined.extend(p2.get('triples', []))
-                            temp_patterns.append({'type': 'bgp', 'triples': combined})
+                            temp_patterns.append(_join_branches([p1, p2], []))
                     current_union = {'type': 'union', 'patterns': temp_patterns}
                 merged_patterns = current_union['patterns']
             
@@ -181,12 +451,14 @@ class SparqlRewriter(AstWalker):
         
         # UNIONが1つだけある場合
         elif len(union_structures) == 1:
-            union_structure = union_structures[0]
-            # UNIONの各パターンに既存のトリプルを追加
-            for pattern in union_structure['patterns']:
-                if pattern.get('type') == 'bgp':
-                    # 既存のトリプルをこのパターンに追加
-                    pattern['triples'].extend(new_triples)
+            # UNIONの各パターンに既存のトリプルを追加（重複は取り除く）
+            # UNION構造は共有されている可能性があるので、変更せずに新しい分岐を作る
+            union_structure = {**union_structures[0], 'patterns': [
+                {**pattern, 'triples': _unique(pattern['triples'] + new_triples)}
+                if pattern.get('type') == 'bgp' else
+                _join_branches([pattern], new_triples) if new_triples else pattern
+                for pattern in union_structures[0]['patterns']
+            ]}
             
             # FILTERがある場合、groupでラップして返す
             if filters:
@@ -207,12 +479,68 @@ class SparqlRewriter(AstWalker):
             }
         
         # 通常のBGPを返す
-        return {**node, 'triples': new_triples}
+        return replace_node(node, triples=new_triples)
+
+    def _match_patterns(self, triples):
+        """
+        BGP のトリプルから複雑な entity1 のパターンに一致する部分を探す。
+        :return: 一致したトリプルの位置 -> PatternMatch（一致の先頭の位置）または None（それ以外の位置）
+        """
+        context = self._context
+        if context.variable_counts is None and context.query is not None:
+            context.variable_counts = count_variables(context.query)
+        matched = {}
+        for match in self.patterns.select(triples, context.variable_counts,
+                                          lambda pattern: bool(self.plan.pattern(pattern).fragments)):
+            for index in match.indices:
+                matched[index] = None
+            matched[min(match.indices)] = match
+        return matched
+
+    def _instantiate_pattern(self, match):
+        """一致した部分を entity2 の展開に置き換える。主語・目的語は通常のトリプルと同じく書き換えてから使う。"""
+        s = self._walk_node(match.subject)
+        o = None if match.object is None else self._walk_node(match.object)
+        return self._instantiate(self.plan.pattern(match.pattern), s, o)
+
+    def _use_factorized_unions(self, union_structures):
+        """
+        BGP内のUNIONを直積に展開せず、分解した形（factorized）で出力するかどうか。
+        'auto' では直積にした場合の分岐数が union_product_limit を超えるときだけ分解する。
+        """
+        union_mode = self._context.union_mode or self.union_mode
+        if union_mode == 'factorized':
+            return True
+        if union_mode == 'product':
+            return False
+        branches = 1
+        for union in union_structures:
+            branches *= max(len(union['patterns']), 1)
+            if branches > self.union_product_limit:
+                return True
+        return False
+
+    def _factorized_bgp(self, new_triples, union_structures, filters):
+        """
+        共通のトリプルを1つのBGPにまとめ、各UNIONをそのままグループに並べる。
+        グループ内の要素は結合（join）されるため、直積に展開した場合と同じ解になり、
+        出力の大きさは入力に比例する。
+        例: { ?s :p ?o . { ?s a :A } UNION { ?s a :B } { ?o a :C } UNION { ?o a :D } }
+        """
+        patterns = []
+        if new_triples:
+            patterns.append({'type': 'bgp', 'triples': new_triples})
+        patterns.extend(union_structures)
+        return {'type': 'group', 'patterns': patterns + filters}
 
     def _generate_temp_var(self):
         """新しい一時変数を生成する"""
-        var_name = f"variable_temp{self.temp_var_counter}"
-        self.temp_var_counter += 1
+        context = self._context
+        if context.template_new_var is not None:
+            # テンプレート作成中は一時変数のプレースホルダーを返す
+            return context.template_new_var()
+        var_name = f"variable_temp{context.temp_var_counter}"
+        context.temp_var_counter += 1
         return {'type': 'variable', 'value': var_name}
 
     def visit_triple(self, node):
@@ -220,79 +548,176 @@ class SparqlRewriter(AstWalker):
         トリプルノードを訪問した際に、主語・述語・目的語のいずれかが
         複雑な書き換えルールを持つかチェックする。
         """
-        # まず、各要素（主語、述語、目的語）を再帰的に書き換える
-        s = self._walk_node(node['subject'])
-        p = self._walk_node(node['predicate'])
-        o = self._walk_node(node['object'])
+        # まず、各要素（主語、述語、目的語）を役割に応じた表で書き換える
+        s = self._rewrite_term(node['subject'], self.roles.mapping)
+        p = self._rewrite_term(node['predicate'], self.roles.predicates)
+        p_value = p.get('value') if p.get('type') == 'uri' else None
 
-        # 述語が書き換え対象のURIの場合（Relationのマッピング）
-        if p.get('type') == 'uri' and p.get('value') in self.mapping:
-            target_entity = self.mapping[p['value']]
-            
-            # ターゲットがPathConstructorでtransitiveの場合 -> path_tripleに変換
-            if isinstance(target_entity, PathConstructor) and target_entity.operator == 'transitive':
-                if target_entity.operands and isinstance(target_entity.operands[0], Relation):
-                    target_uri = target_entity.operands[0].uri
-                    print(f"  [Rewrite] Transitive property: {p['value']} -> {target_uri}+")
-                    try:
-                        self.logger.info(f"[Rewrite] Transitive property: {p['value']} -> {target_uri}+")
-                    except Exception:
-                        pass
-                    
-                    # path_tripleとして返す（+修飾子付き）
-                    return {
-                        'type': 'path_triple',
-                        'subject': s,
-                        'path': {
-                            'type': 'mod',
-                            'modifier': '+',
-                            'subPath': {
-                                'type': 'link',
-                                'uri': target_uri
-                            }
-                        },
-                        'object': o
-                    }
-            
-            # ターゲットが複雑なRelation（LogicalConstructor含む）の場合
-            if not isinstance(target_entity, IdentifiedEntity):
-                print(f"  [Rewrite] Complex rewrite for predicate: {p['value']}")
-                try:
-                    self.logger.info(f"[Rewrite] Complex rewrite for predicate: {p['value']}")
-                except Exception:
-                    pass
-                
-                # 複雑なRelationを展開（ドメイン/コドメイン制約を処理）
-                expanded_triples = self._expand_complex_relation(s, target_entity, o)
-                
-                if expanded_triples:
-                    return expanded_triples
-
-        # 目的語が書き換え対象のURIで、かつrdf:typeのトリプルの場合
-        if (o.get('type') == 'uri' and 
-            o.get('value') in self.mapping and
-            p.get('type') == 'uri' and 
-            'rdf-syntax-ns#type' in p.get('value', '')):
-            
-            target_entity = self.mapping[o['value']]
-            
-            # ターゲットが単純なURIでない場合（＝複雑なエンティティ）
-            if not isinstance(target_entity, IdentifiedEntity):
-                print(f"  [Rewrite] Complex rewrite for object: {o['value']}")
-                try:
-                    self.logger.info(f"[Rewrite] Complex rewrite for object: {o['value']}")
-                except Exception:
-                    pass
-                
+        # 目的語が書き換え対象のクラスURIで、かつrdf:typeのトリプルの場合
+        # （クラスの展開は書き換える前の目的語で引く。代替のあるクラスの目的語は先頭の分岐に置換されるため）
+        source_object = node['object']
+        if (p_value is not None and is_rdf_type(p_value) and source_object.get('type') == 'uri'
+                and source_object.get('value') in self.roles.classes
+                and p_value not in self.roles.predicates):
+            template = self.plan.rdf_class(source_object['value'])
+            if template is not None:
                 # 複雑なエンティティを複数のトリプルに展開
-                expanded_triples = self._expand_complex_entity(s, target_entity)
-                
-                if expanded_triples:
-                    # 複数のトリプルを返す（リストとして返すことで、ast_walkerが展開する）
-                    return expanded_triples
+                # （リストとして返すことで、ast_walkerが展開する）
+                expanded = self._instantiate(template, s, None)
+                if expanded:
+                    return expanded
+
+        o = self._rewrite_term(source_object, self.roles.mapping)
 
+        # 述語が書き換え対象のURIの場合（Relationのマッピング）
+        if p_value in self.roles.predicates:
+            template = self.plan.relation(p_value)
+            if template is not None:
+                expanded = self._instantiate(template, s, o)
+                if expanded:
+                    return expanded
+
+        # 何も変わらなければ元のノードを返す
+        if s is node['subject'] and p is node['predicate'] and o is node['object']:
+            return node
         # 新しいトリプルを構築して返す
-        return {**node, 'subject': s, 'predicate': p, 'object': o}
+        return replace_node(node, subject=s, predicate=p, object=o)
+
+    def _rewrite_term(self, node, table: dict):
+        """
+        トリプルの主語・述語・目的語を書き換える。URI は table（その位置で使える対応）だけを引き、
+        単純なURIの対応なら置換する。URI 以外のノードは通常どおり巡回する。
+        """
+        if node.get('type') != 'uri':
+            return self._walk_node(node)
+        target_entity = table.get(node.get('value'))
+        if isinstance(target_entity, IdentifiedEntity):
+            # 記録は書き換えのコンテキストごと（trace=True または explain() の場合だけ）
+            if self._active_traces:
+                trace = self._context.trace
+                if trace is not None:
+                    trace.record(simple_event(node['value'], target_entity.uri))
+            return replace_node(node, value=target_entity.uri)
+        return node
+
+    def _instantiate(self, template, subject_node, object_node):
+        """
+        テンプレートをインスタンス化する。同じグループ内で同じ主語・目的語に対する同じ展開が
+        既にあれば、その一時変数を再利用する（生成される重複トリプルは visit_bgp で取り除かれる）。
+        """
+        context = self._context
+        fresh = True
+        if not template.fresh_count or not context.expansion_scopes:
+            fresh_vars = [self._generate_temp_var() for _ in range(template.fresh_count)]
+        else:
+            scope = context.expansion_scopes[-1]
+            key = (template, _node_key(subject_node), _node_key(object_node))
+            fresh_vars = scope.get(key)
+            if fresh_vars is None:
+                fresh_vars = scope[key] = [self._generate_temp_var() for _ in range(template.fresh_count)]
+            else:
+                fresh = False
+        if context.applications is not None and template.fragments:
+            context.applications.append((template, fresh))
+        if context.trace is not None:
+            context.trace.record({**template.event, 'triples': template.triple_count,
+                                    'temp_vars': [var['value'] for var in fresh_vars]})
+        return template.fill(subject_node, object_node, fresh_vars)
+
+    def _compile_relation(self, uri, target_entity):
+        """
+        述語 uri の書き換えテンプレートを作る。単純なURIの場合は visit_uri で置換済みなので None。
+        """
+        if isinstance(target_entity, IdentifiedEntity):
+            return None
+        if isinstance(target_entity, Alternatives):
+            # 代替のある述語 -> 各分岐の展開の UNION
+            return compile_template(
+                lambda s, o, new_var: self._expand_symbolically(
+                    new_var, self._expand_alternatives, self._expand_predicate, s, target_entity, o),
+                template_event('relation', uri, target_entity), self.roles.cells.get(uri, ()))
+        # ターゲットがPathConstructorでtransitiveの場合 -> path_tripleに変換
+        if (isinstance(target_entity, PathConstructor) and target_entity.operator == 'transitive'
+                and target_entity.operands and isinstance(target_entity.operands[0], Relation)):
+            event = template_event('transitive', uri, target_entity, target_entity.operands[0].uri)
+        else:
+            # ターゲットが複雑なRelation（LogicalConstructor含む）の場合
+            event = template_event('relation', uri, target_entity)
+        return compile_template(
+            lambda s, o, new_var: self._expand_symbolically(new_var, self._expand_predicate, s, target_entity, o),
+            event, self.roles.cells.get(uri, ()))
+
+    def _compile_class(self, uri, target_entity):
+        """
+        rdf:type の目的語 uri の書き換えテンプレートを作る。単純なURIの場合は None。
+        """
+        if isinstance(target_entity, IdentifiedEntity):
+            return None
+        if isinstance(target_entity, Alternatives):
+            return compile_template(
+                lambda s, o, new_var: self._expand_symbolically(
+                    new_var, self._expand_alternatives, self._expand_complex_entity, s, target_entity),
+                template_event('class', uri, target_entity), self.roles.cells.get(uri, ()))
+        return compile_template(
+            lambda s, o, new_var: self._expand_symbolically(new_var, self._expand_complex_entity, s, target_entity),
+            template_event('class', uri, target_entity), self.roles.cells.get(uri, ()))
+
+    def _compile_pattern(self, pattern):
+        """
+        entity1 のパターンに一致した部分の書き換えテンプレートを作る。
+        クラスのパターンは主語に対する entity2 の rdf:type の展開、関係のパターンは述語としての展開にする。
+        """
+        target_entity = pattern.cell.entity2
+        event = {**template_event('pattern', pattern.source, target_entity), 'matched': len(pattern.triples)}
+        if pattern.role == 'class':
+            return compile_template(
+                lambda s, o, new_var: self._expand_symbolically(new_var, self._expand_complex_entity, s, target_entity),
+                event, (pattern.cell,))
+        return compile_template(
+            lambda s, o, new_var: self._expand_symbolically(new_var, self._expand_predicate, s, target_entity, o),
+            event, (pattern.cell,))
+
+    def _expand_alternatives(self, expand, subject_node, alternatives, *rest):
+        """
+        代替（Alternatives）の各ターゲットを expand(subject_node, entity, *rest) で展開し、分岐の順の UNION にする。
+        展開できた分岐が1つだけなら、その展開結果をそのまま返す。
+        """
+        results = [result for result in (expand(subject_node, entity, *rest) for entity in alternatives.operands)
+                   if result]
+        if len(results) <= 1:
+            return results[0] if results else []
+        return [{'type': 'union', 'patterns': _unique([_branch(result) for result in results])}]
+
+    def _expand_symbolically(self, new_var, expand, *args):
+        """テンプレート作成用に、一時変数を new_var() で作りながら展開する。"""
+        context = self._context
+        context.template_new_var = new_var
+        try:
+            return expand(*args)
+        finally:
+            context.template_new_var = None
+
+    def _expand_predicate(self, subject_node, target_entity, object_node):
+        """述語のターゲットを展開する。transitive は path_triple、それ以外はトリプルのリストを返す。"""
+        if isinstance(target_entity, PathConstructor) and target_entity.operator == 'transitive':
+            if target_entity.operands and isinstance(target_entity.operands[0], Relation):
+                # path_tripleとして返す（+修飾子付き）
+                return {
+                    'type': 'path_triple',
+                    'subject': subject_node,
+                    'path': {
+                        'type': 'mod',
+                        'modifier': '+',
+                        'subPath': {
+                            'type': 'link',
+                            'uri': target_entity.operands[0].uri
+                        }
+                    },
+                    'object': object_node
+                }
+        
+        # 複雑なRelationを展開（ドメイン/コドメイン制約を処理）
+        return self._expand_complex_relation(subject_node, target_entity, object_node)
 
     def visit_path_triple(self, node):
         """
@@ -308,6 +733,8 @@ class SparqlRewriter(AstWalker):
         # パスを変換
         original_path = node.get('path', {})
         transformed_path = self._transform_path(original_path, s, o)
+        if s is node['subject'] and o is node['object'] and transformed_path is original_path:
+            return node
         
         # 新しいpath_tripleノードを構築して返す
         return {
@@ -331,8 +758,8 @@ class SparqlRewriter(AstWalker):
         if path_type == 'link':
             # 単純なプロパティリンク - URIを変換
             uri = path_node.get('uri')
-            if uri and uri in self.mapping:
-                target_entity = self.mapping[uri]
+            if uri and uri in self.roles.predicates:
+                target_entity = self.roles.predicates[uri]
                 
                 # ターゲットが単純なRelationの場合
                 if isinstance(target_entity, Relation):
@@ -354,6 +781,17 @@ class SparqlRewriter(AstWalker):
                             }
                         }
                 
+                # 代替のある述語 -> 単純なRelationの分岐だけを並べた選択パス (p1|p2|...)
+                # （複雑な分岐はパスで表せないので使わない）
+                elif isinstance(target_entity, Alternatives) and any(
+                        isinstance(operand, Relation) for operand in target_entity.operands):
+                    links = [{'type': 'link', 'uri': operand.uri}
+                             for operand in target_entity.operands if isinstance(operand, Relation)]
+                    alternative = links[0]
+                    for link in links[1:]:
+                        alternative = {'type': 'alt', 'left': alternative, 'right': link}
+                    return alternative
+                
                 # その他の複雑な変換 - 通常のトリプルとして展開が必要な場合があるが
                 # パスのコンテキストでは複雑なので、とりあえず元のURIを保持
                 # （将来的にはより複雑な変換が必要）
@@ -366,6 +804,9 @@ class SparqlRewriter(AstWalker):
             sub_path = path_node.get('subPath', {})
             transformed_sub = self._transform_path(sub_path, subject_node, object_node)
             
+            if transformed_sub is sub_path and sub_path.get('type') != 'mod':
+                return path_node
+            
             # 変換後のsubPathもmodの場合、二重ネストを避ける
             # 元の修飾子を優先する（元がagro:hasLowerRank+で、変換先がtransitive(narrower)の場合、
             # 元の+を保持してskos:narrower+とする）
@@ -387,6 +828,8 @@ class SparqlRewriter(AstWalker):
             # 逆方向パス - subPathを再帰的に変換
             sub_path = path_node.get('subPath', {})
             transformed_sub = self._transform_path(sub_path, subject_node, object_node)
+            if transformed_sub is sub_path:
+                return path_node
             return {
                 'type': 'inverse',
                 'subPath': transformed_sub
@@ -396,20 +839,28 @@ class SparqlRewriter(AstWalker):
             # シーケンス - 左右のパスを再帰的に変換
             left = path_node.get('left', {})
             right = path_node.get('right', {})
+            new_left = self._transform_path(left, subject_node, object_node)
+            new_right = self._transform_path(right, subject_node, object_node)
+            if new_left is left and new_right is right:
+                return path_node
             return {
                 'type': 'seq',
-                'left': self._transform_path(left, subject_node, object_node),
-                'right': self._transform_path(right, subject_node, object_node)
+                'left': new_left,
+                'right': new_right
             }
         
         elif path_type == 'alt':
             # 選択 - 左右のパスを再帰的に変換
             left = path_node.get('left', {})
             right = path_node.get('right', {})
+            new_left = self._transform_path(left, subject_node, object_node)
+            new_right = self._transform_path(right, subject_node, object_node)
+            if new_left is left and new_right is right:
+                return path_node
             return {
                 'type': 'alt',
-                'left': self._transform_path(left, subject_node, object_node),
-                'right': self._transform_path(right, subject_node, object_node)
+                'left': new_left,
+                'right': new_right
             }
         
         # その他の場合は元のパスを返す
@@ -437,7 +888,8 @@ class SparqlRewriter(AstWalker):
             elif entity.operator == 'or':
                 # ORの場合は、UNION構造を生成する
                 # 各operandに対して、rdf:typeトリプルを生成し、それらをUNIONで結合
-                print(f"    [Info] Expanding OR operator with {len(entity.operands)} operands")
+                if self.verbose:
+                    print(f"    [Info] Expanding OR operator with {len(entity.operands)} operands")
                 
                 # 各operandからトリプルを生成
                 union_patterns = []
@@ -447,7 +899,7 @@ class SparqlRewriter(AstWalker):
                         triple = {
                             'type': 'triple',
                             'subject': subject_node,
-                            'predicate': {'type': 'uri', 'value': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'},
+                            'predicate': {'type': 'uri', 'value': RDF_TYPE},
                             'object': {'type': 'uri', 'value': operand.uri}
                         }
                         # 各トリプルをBGPで包む
@@ -473,7 +925,7 @@ class SparqlRewriter(AstWalker):
             return [{
                 'type': 'triple',
                 'subject': subject_node,
-                'predicate': {'type': 'uri', 'value': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'},
+                'predicate': {'type': 'uri', 'value': RDF_TYPE},
                 'object': {'type': 'uri', 'value': entity.uri}
             }]
         
@@ -498,7 +950,7 @@ class SparqlRewriter(AstWalker):
                 triples.append({
                     'type': 'triple',
                     'subject': temp_var,
-                    'predicate': {'type': 'uri', 'value': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'},
+                    'predicate': {'type': 'uri', 'value': RDF_TYPE},
                     'object': {'type': 'uri', 'value': entity.class_expression.uri}
                 })
             
@@ -564,14 +1016,17 @@ class SparqlRewriter(AstWalker):
                             }]
                     else:
                         # その他のPathConstructorは現在未対応
-                        print(f"    [Warning] PathConstructor '{entity.on_attribute.operator}' in AttributeOccurenceRestriction not fully supported")
+                        if self.verbose:
+                            print(f"    [Warning] PathConstructor '{entity.on_attribute.operator}' in AttributeOccurenceRestriction not fully supported")
                         return []
                 else:
-                    print(f"    [Warning] Complex on_attribute in AttributeOccurenceRestriction not fully supported")
+                    if self.verbose:
+                        print(f"    [Warning] Complex on_attribute in AttributeOccurenceRestriction not fully supported")
                     return []
             else:
                 # その他の出現回数制約は現在未対応
-                print(f"    [Warning] AttributeOccurenceRestriction with comparator {entity.comparator} and value {entity.value} not fully implemented")
+                if self.verbose:
+                    print(f"    [Warning] AttributeOccurenceRestriction with comparator {entity.comparator} and value {entity.value} not fully implemented")
                 return []
         
         return []
@@ -784,110 +1239,57 @@ class SparqlRewriter(AstWalker):
     
     def _create_filter_expression(self, var_node, comparator, value):
         """
-        FILTER式をS式形式（Lisp形式）で生成する。
-        シリアライザー側でSSE.parseExpr()を使うため、S式形式が必須。
+        FILTER式を式木（operator / function / variable / 定数ノード）で生成する。
+        式木は visit_filter で他のノードと同じように巡回され、シリアライザーもそのまま出力する。
         """
-        var_name = var_node['value']
+        var = var_node
         
-        # 値の文字列表現を生成（S式形式）
-        value_str = self._format_value_sse(value)
+        # 値の定数ノードを生成
+        value_node = self._value_node(value)
         
-        # 比較演算子に応じたS式を生成
+        # 比較演算子に応じた式木を生成
         if comparator == 'http://ns.inria.org/edoal/1.0/#equals':
-            return f"(= ?{var_name} {value_str})"
+            return {'type': 'operator', 'name': '=', 'args': [var, value_node]}
         elif comparator == 'http://ns.inria.org/edoal/1.0/#contains':
-            return f"(contains (str ?{var_name}) {value_str})"
-        elif comparator == 'http://ns.inria.org/edoal/1.0/#greaterThan':
-            return f"(> ?{var_name} {value_str})"
-        elif comparator == 'http://ns.inria.org/edoal/1.0/#lessThan':
-            return f"(< ?{var_name} {value_str})"
-        elif comparator == 'http://ns.inria.org/edoal/1.0/#greaterThanOrEqual':
-            return f"(>= ?{var_name} {value_str})"
-        elif comparator == 'http://ns.inria.org/edoal/1.0/#lessThanOrEqual':
-            return f"(<= ?{var_name} {value_str})"
+            str_var = {'type': 'function', 'name': 'str', 'args': [var]}
+            return {'type': 'function', 'name': 'contains', 'args': [str_var, value_node]}
+        elif comparator in _COMPARATOR_OPERATORS:
+            return {'type': 'operator', 'name': _COMPARATOR_OPERATORS[comparator], 'args': [var, value_node]}
         else:
-            print(f"    [Warning] Unknown comparator: {comparator}")
+            if self.verbose:
+                print(f"    [Warning] Unknown comparator: {comparator}")
             return None
     
-    def _format_value_sse(self, value):
-        """EDOALの値をSSE（S式）形式の文字列に変換する"""
-        if isinstance(value, dict):
-            # Literalの場合
-            if 'string' in value:
-                value_str = value['string']
-                value_type = value.get('type', '')
-                
-                # データ型に応じた処理
-                if 'boolean' in value_type:
-                    # ブール値: true/false（小文字、クォートなし）
-                    return value_str.lower()
-                elif 'integer' in value_type or 'int' in value_type or 'long' in value_type:
-                    # 整数: クォートなし
-                    return value_str
-                elif 'decimal' in value_type or 'float' in value_type or 'double' in value_type:
-                    # 小数: クォートなし
-                    return value_str
-                elif 'string' in value_type:
-                    # 文字列: ダブルクォートで囲む
-                    return f'"{value_str}"'
-                else:
-                    # その他のデータ型: データ型付きリテラルとして出力
-                    return f'"{value_str}"^^<{value_type}>'
-            elif 'uri' in value:
-                # URIリファレンスの場合（S式形式）
-                return f'<{value["uri"]}>'
-        elif isinstance(value, str):
-            # 単純な文字列の場合
-            return f'"{value}"'
-        elif isinstance(value, bool):
-            # Pythonのブール値
-            return str(value).lower()
-        elif isinstance(value, (int, float)):
-            # Pythonの数値
-            return str(value)
-        
-        # デフォルト: 文字列として扱う
-        return f'"{str(value)}"'
-    
-    def _format_value(self, value):
-        """EDOALの値をSPARQL形式の文字列に変換する（後方互換性のため残す）"""
+    def _value_node(self, value):
+        """EDOALの値をFILTER式の定数ノード（uri / literal）に変換する"""
         if isinstance(value, dict):
             # Literalの場合
             if 'string' in value:
                 value_str = value['string']
                 value_type = value.get('type', '')
                 
-                # データ型に応じた処理
+                # データ型に応じた処理（以前のS式と同じく、数値は字句の形から型を決める）
                 if 'boolean' in value_type:
-                    # ブール値: true/false（小文字、クォートなし）
-                    return value_str.lower()
-                elif 'integer' in value_type or 'int' in value_type or 'long' in value_type:
-                    # 整数: クォートなし
-                    return value_str
-                elif 'decimal' in value_type or 'float' in value_type or 'double' in value_type:
-                    # 小数: クォートなし
-                    return value_str
-                elif 'string' in value_type:
-                    # 文字列: ダブルクォートで囲む
-                    return f'"{value_str}"'
+                    return _literal_node(value_str.lower(), XSD + 'boolean')
+                elif any(name in value_type for name in ('integer', 'int', 'long', 'decimal', 'float', 'double')):
+                    return _literal_node(value_str, _numeric_datatype(value_str) or value_type)
+                elif 'string' in value_type or not value_type:
+                    return _literal_node(value_str, XSD + 'string')
                 else:
-                    # その他のデータ型: データ型付きリテラルとして出力
-                    return f'"{value_str}"^^<{value_type}>'
+                    # その他のデータ型: データ型付きリテラル
+                    return _literal_node(value_str, value_type)
             elif 'uri' in value:
                 # URIリファレンスの場合
-                return f'<{value["uri"]}>'
-        elif isinstance(value, str):
-            # 単純な文字列の場合
-            return f'"{value}"'
+                return {'type': 'uri', 'value': value['uri']}
         elif isinstance(value, bool):
-            # Pythonのブール値
-            return str(value).lower()
+            # Pythonのブール値（int より先に判定する）
+            return _literal_node(str(value).lower(), XSD + 'boolean')
         elif isinstance(value, (int, float)):
             # Pythonの数値
-            return str(value)
+            return _literal_node(str(value), _numeric_datatype(str(value)) or XSD + 'string')
         
         # デフォルト: 文字列として扱う
-        return f'"{str(value)}"'
+        return _literal_node(str(value), XSD + 'string')
     
     def visit_filter(self, node):
         """
@@ -900,7 +1302,9 @@ class SparqlRewriter(AstWalker):
         # expressionフィールドを再帰的に処理
         if 'expression' in node:
             new_expression = self._walk_node(node['expression'])
-            return {**node, 'expression': new_expression}
+            if new_expression is node['expression']:
+                return node
+            return replace_node(node, expression=new_expression)
         
         # expressionがない場合はそのまま返す
         return node
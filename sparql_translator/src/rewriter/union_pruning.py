@@ -0,0 +1,236 @@
+"""
+UNION の冗長な分岐の除去（書き換え後の最適化）
+- 書き換えで UNION の各分岐に共通のトリプルを加えたり（visit_bgp）、or の各オペランドを展開したり
+  （_expand_complex_relation）すると、ある分岐のトリプルが別の分岐のトリプルを含む UNION ができることがある
+  （例: { ?x :p ?y } UNION { ?x :p ?y . ?y :q ?temp0 }）。含む側の分岐の解はもう一方の分岐の解でもあるので、
+  解の集合には何も加えず、エンドポイントの処理だけを増やす
+- 分岐 X が分岐 Y を包含する（Y を取り除ける）のは、一時変数を除いた変数の集合について Y が X に含まれ、
+  X のトリプルを Y のトリプルに写す準同型（X の一時変数は任意の項へ、それ以外の項はそのまま）がある場合。
+  同じ解を持つ分岐（重複）は最初の分岐だけを残し、分岐が1つになった UNION はその分岐に置き換える
+- 一時変数（variable_temp...）は、クエリ中のすべての出現がその UNION の中にある場合だけ存在変数として扱う
+  （UNION の外のトリプルと結合する一時変数は、通常の変数と同じく固定する）。比較するのはトリプル（と
+  プロパティパス）だけからなる分岐で、FILTER や OPTIONAL などを含む分岐はそのまま残す
+- 取り除くと解の重複の数が変わるため、mode は次のいずれか:
+    'off': 何もしない（SparqlRewriter の既定）/ 'distinct': SELECT DISTINCT のクエリだけ（main.py の既定）/
+    'always': 重複の数を問わない場合
+- どの mode でも、分岐を取り除くと結果が変わりうるクエリは対象にしない: 集約（集約関数 / GROUP BY / HAVING）を
+  持つクエリ（DISTINCT より前に解を数える）と、SELECT * や一時変数を射影するクエリ（取り除いた分岐の一時変数が
+  列に現れる）。射影する変数がすべてパターンに現れる SELECT だけを対象にする（集約の有無を持たない AST でも、
+  集約関数の結果の変数はパターンに現れないので除かれる）
+"""
+from .ast_walker import AstWalker
+from .pattern_index import count_variables
+from .rewrite_cost import TEMP_VAR_PREFIX
+from ..common.typed_ast import AST_NODES, replace_node
+
+UNION_PRUNING_MODES = ('off', 'distinct', 'always')
+# 1組の分岐の包含の判定で試す対応づけの数の上限（超えたら包含しないものとして扱う）
+_MAX_MATCH_STEPS = 10000
+
+
+def check_union_pruning(mode: str) -> str:
+    """UNION の分岐の除去の mode を検証して返す。"""
+    if mode not in UNION_PRUNING_MODES:
+        raise ValueError(f"Unknown union pruning mode: {mode!r} (expected one of {', '.join(UNION_PRUNING_MODES)})")
+    return mode
+
+
+def applies_to(mode: str, query) -> bool:
+    """mode で query（書き換え前の AST 全体）の UNION の分岐を取り除くかどうか。"""
+    if mode == 'off' or not isinstance(query, AST_NODES):
+        return False
+    if mode == 'distinct' and not query.get('isDistinct'):
+        return False
+    return _projection_is_plain(query)
+
+
+def _projection_is_plain(query) -> bool:
+    """集約が無く、パターンに現れる変数（一時変数を除く）を明示して射影する SELECT かどうか。"""
+    if query.get('queryType') != 'SELECT' or query.get('hasAggregation') or query.get('isSelectAll'):
+        return False
+    projection = query.get('selectVariables') or ()
+    if not projection or any(name.startswith(TEMP_VAR_PREFIX) for name in projection):
+        return False
+    bound = count_variables(query.get('ast'))
+    return all(name in bound for name in projection)
+
+
+def _term(node):
+    """トリプルの項を比較用の値にする（変数は ('variable', 名前)）。"""
+    if not isinstance(node, AST_NODES):
+        return node
+    return (node.get('type'), node.get('value'), node.get('datatype'), node.get('lang'))
+
+
+def _freeze_path(path):
+    if isinstance(path, AST_NODES):
+        return tuple(sorted((key, _freeze_path(value)) for key, value in path.items()))
+    if isinstance(path, list):
+        return tuple(_freeze_path(item) for item in path)
+    return path
+
+
+def _branch_atoms(branch):
+    """
+    トリプルだけからなる分岐（BGP、または BGP だけを並べたグループ）の (主語, 述語, 目的語) の集合。
+    それ以外の分岐は None。
+    """
+    if branch.get('type') == 'bgp':
+        bgps = [branch]
+    elif branch.get('type') == 'group':
+        bgps = branch.get('patterns', [])
+        if not all(isinstance(item, AST_NODES) and item.get('type') == 'bgp' for item in bgps):
+            return None
+    else:
+        return None
+    atoms = set()
+    for bgp in bgps:
+        for triple in bgp.get('triples', []):
+            triple_type = triple.get('type')
+            if triple_type == 'triple':
+                predicate = _term(triple.get('predicate'))
+            elif triple_type == 'path_triple':
+                predicate = ('path', _freeze_path(triple.get('path')))
+            else:
+                return None
+            atoms.add((_term(triple.get('subject')), predicate, _term(triple.get('object'))))
+    return frozenset(atoms)
+
+
+def _variables(atoms) -> set:
+    return {term for atom in atoms for term in atom if isinstance(term, tuple) and term[0] == 'variable'}
+
+
+def _maps_into(source, target, existentials) -> bool:
+    """
+    source のトリプルを target のトリプルに写す準同型があるかどうか。
+    existentials の変数は任意の項に（同じ変数は同じ項に）、それ以外の項はそれ自身に写す。
+    """
+    if not existentials:
+        return source <= target
+    fixed = [atom for atom in source if not any(term in existentials for term in atom)]
+    if any(atom not in target for atom in fixed):
+        return False
+    rest = [atom for atom in source if any(term in existentials for term in atom)]
+    if not rest:
+        return True
+    target = list(target)
+    # 候補の少ないトリプルから対応づける
+    rest.sort(key=lambda atom: sum(1 for other in target if _compatible(atom, other, {}, existentials)))
+    steps = [0]
+
+    def search(index, binding) -> bool:
+        if index == len(rest):
+            return True
+        atom = rest[index]
+        for other in target:
+            steps[0] += 1
+            if steps[0] > _MAX_MATCH_STEPS:
+                return False
+            extended = _compatible(atom, other, binding, existentials)
+            if extended is not None and search(index + 1, extended):
+                return True
+        return False
+
+    return search(0, {})
+
+
+def _compatible(atom, other, binding, existentials):
+    """atom を other に写せれば、その対応を加えた binding を返す（写せなければ None）。"""
+    extended = binding
+    for term, value in zip(atom, other):
+        if term in existentials:
+            bound = extended.get(term)
+            if bound is None:
+                if extended is binding:
+                    extended = dict(binding)
+                extended[term] = value
+            elif bound != value:
+                return None
+        elif term != value:
+            return None
+    return extended
+
+
+class UnionPruner(AstWalker):
+    """
+    書き換え後の AST から、他の分岐に包含される UNION の分岐を取り除く（1クエリごとに作る）。
+
+    :ivar pruned: 取り除いた分岐の数
+    """
+
+    def __init__(self):
+        self.pruned = 0
+        # 一時変数ごとのクエリ全体での出現回数（UNION の外に現れるかどうかの判定に使う）。
+        # 比べられる分岐を持つ UNION が現れたときに初めて数える
+        self._ast = None
+        self._counts = None
+
+    def prune(self, ast):
+        """分岐を取り除いた AST を返す（入力は変更しない。取り除くものが無ければ ast そのもの）。"""
+        self._ast, self._counts = ast, None
+        return self.walk(ast)
+
+    def visit_uri(self, node):
+        """URI は変えない（AstWalker の既定の処理は表示する）。"""
+        return node
+
+    def visit_bgp(self, node):
+        """BGP（トリプル）や FILTER の中に UNION は無いので巡回しない。"""
+        return node
+
+    visit_triple = visit_bgp
+    visit_path_triple = visit_bgp
+    visit_filter = visit_bgp
+
+    def _existentials(self, union, atoms) -> set:
+        """UNION の中だけに現れる一時変数（存在変数として扱う）の、比較用の値の集合。"""
+        if self._counts is None:
+            self._counts = {name: count for name, count in count_variables(self._ast).items()
+                            if isinstance(name, str) and name.startswith(TEMP_VAR_PREFIX)}
+        if not self._counts:
+            return set()
+        if None in atoms:
+            inside = count_variables(union)
+        else:
+            # すべての分岐がトリプルだけなら、分岐のトリプルから数える（同じトリプルの重複は1回に数えるので、
+            # 少なく数えた一時変数は UNION の外にも現れるものとして固定される）
+            inside = {}
+            for atom in (atom for item in atoms for atom in item):
+                for term in atom:
+                    if isinstance(term, tuple) and term[0] == 'variable' and term[1] in self._counts:
+                        inside[term[1]] = inside.get(term[1], 0) + 1
+        return {('variable', name, None, None) for name, count in inside.items()
+                if name in self._counts and self._counts[name] == count}
+
+    def leave_union(self, node, new_node):
+        """子の UNION を処理した後、この UNION の分岐のうち他の分岐に包含されるものを取り除く。"""
+        branches = new_node.get('patterns', [])
+        if len(branches) < 2:
+            return new_node
+        atoms = [_branch_atoms(branch) if isinstance(branch, AST_NODES) else None for branch in branches]
+        if sum(1 for item in atoms if item is not None) < 2:
+            return new_node
+        existentials = self._existentials(new_node, atoms)
+        visible = [None if item is None else _variables(item) - existentials for item in atoms]
+        # 写す先に無い述語を持つ分岐は写せないので、準同型を探す前にふるい分ける
+        predicates = [None if item is None else {atom[1] for atom in item} - existentials for item in atoms]
+        dropped = set()
+        for j, target in enumerate(atoms):
+            if target is None:
+                continue
+            for i, source in enumerate(atoms):
+                if (i == j or i in dropped or source is None or not visible[j] <= visible[i]
+                        or not predicates[i] <= predicates[j]):
+                    continue
+                if _maps_into(source, target, existentials) and (
+                        i < j or not (visible[i] <= visible[j] and _maps_into(target, source, existentials))):
+                    dropped.add(j)
+                    break
+        if not dropped:
+            return new_node
+        self.pruned += len(dropped)
+        kept = [branch for index, branch in enumerate(branches) if index not in dropped]
+        if len(kept) == 1:
+            return kept[0]
+        return replace_node(new_node, patterns=kept)
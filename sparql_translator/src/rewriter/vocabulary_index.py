@@ -0,0 +1,71 @@
+"""
+アラインメントのソース URI の索引（クエリの事前スキャン用）
+- SparqlRewriter の書き換えは、すべて mapping のキー（ソース URI）に一致したノードから始まる。
+  そのため、クエリ文字列にソース URI が1つも現れなければ、パースもシリアライズもせずにそのまま返せる
+- URI の局所名（最後の '#' または '/' より後ろ）を集合にしておき、クエリ文字列を区切り文字で
+  分割したトークンと突き合わせる。<http://cmt#Paper> でも cmt:Paper でも、局所名 Paper がトークンになる
+- 判定は保守的で、might_match() が False を返すのは書き換え対象の URI が確実に無い場合だけ
+"""
+import re
+
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+# IRI・接頭辞付き名・変数・演算子の区切りになる文字。局所名にこれらを含む URI は部分文字列で探す
+_DELIMITERS = '<>:#/?"\'(){}[];,.\\|^*+!=&@$'
+_TOKEN_RE = re.compile('[^\\s' + re.escape(_DELIMITERS) + ']+')
+
+
+def local_name(uri: str) -> str:
+    """URI の局所名（最後の '#' または '/' より後ろ）を返す。"""
+    return uri[max(uri.rfind('#'), uri.rfind('/')) + 1:]
+
+
+class VocabularyIndex:
+    """
+    ソース URI の局所名の集合。
+
+    使い方:
+        index = VocabularyIndex(rewriter.mapping)
+        if not index.might_match(query_text):
+            ...  # 書き換え対象の語彙を含まないので、クエリをそのまま返してよい
+    """
+
+    def __init__(self, uris):
+        """
+        :param uris: ソース URI のイテラブル（SparqlRewriter.mapping をそのまま渡してよい）
+        """
+        self.local_names = set()
+        # 局所名に区切り文字を含むものは、トークンにならないので部分文字列で探す
+        self.substring_names = []
+        # 局所名が空の URI や rdf:type（クエリ中では 'a' と書ける）は文字列から判定できない
+        self.always_match = False
+        for uri in uris:
+            name = local_name(uri)
+            if not name or uri == RDF_TYPE:
+                self.always_match = True
+            elif _TOKEN_RE.fullmatch(name):
+                self.local_names.add(name)
+            else:
+                self.substring_names.append(name)
+
+    def __len__(self) -> int:
+        return len(self.local_names) + len(self.substring_names)
+
+    def might_match(self, query_text: str) -> bool:
+        """
+        クエリ文字列がソース URI を含む可能性があるかどうか。
+
+        :param query_text: SPARQL クエリ文字列（パース前）
+        :return: 含む可能性があれば True。False の場合は書き換え対象の URI を含まない。
+        """
+        if self.always_match:
+            return True
+        if '\\' in query_text:
+            # \u 形式のエスケープは文字列のままでは判定できない
+            if '\\u' in query_text or '\\U' in query_text:
+                return True
+            # 接頭辞付き名の局所名のエスケープ（ex:a\-b など）を外してから探す
+            query_text = query_text.replace('\\', '')
+        if not self.local_names.isdisjoint(_TOKEN_RE.findall(query_text)):
+            return True
+        return any(name in query_text for name in self.substring_names)
@@ -0,0 +1,117 @@
+"""
+テストで共有するフィクスチャ
+- make_cell / make_alignment: 対応 (Cell) と cmt -> conf のアラインメントを作る関数
+- accepted / english: 複数のテストで使う conf 側の属性の制約
+- fake_helper_daemon: JVM の代わりに、同じフレームプロトコルを話す小さな Python スクリプトを常駐プロセスとして
+  起動する JavaHelperDaemon のサブクラス（java が無い環境でも常駐プロセス・ワーカープールを試せる）
+- java_launcher: 実際の Java ヘルパーを起動するテスト用の JavaLauncher（java が無い環境ではテストをスキップする）
+"""
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_daemon import JavaHelperDaemon
+from src.common.java_launcher import JavaLauncher, default_project_root
+from src.parser.edoal_parser import (
+    Alignment, AttributeDomainRestriction, AttributeValueRestriction, Cell, Class, Property, Relation,
+)
+
+
+@pytest.fixture
+def make_cell():
+    """entity1 -> entity2 の対応を作る関数（measure の既定は 1.0）。"""
+    def make(entity1, entity2, measure: float = 1.0) -> Cell:
+        return Cell(entity1=entity1, entity2=entity2, relation='=', measure=measure)
+    return make
+
+
+@pytest.fixture
+def make_alignment():
+    """対応を並べた cmt -> conf のアラインメントを作る関数。"""
+    def make(*cells) -> Alignment:
+        return Alignment(onto1='http://cmt', onto2='http://conf', cells=list(cells))
+    return make
+
+
+@pytest.fixture
+def accepted():
+    """conf:hasDecision が conf:Acceptance であるもの（属性の定義域の制約）。"""
+    return AttributeDomainRestriction(on_attribute=Relation(uri='http://conf#hasDecision'),
+                                      class_expression=Class(uri='http://conf#Acceptance'))
+
+
+@pytest.fixture
+def english():
+    """conf:language が 'en' であるもの（属性の値の制約）。"""
+    return AttributeValueRestriction(on_attribute=Property(uri='http://conf#language'),
+                                     comparator='http://ns.inria.org/edoal/1.0/#equals', value='en')
+
+# SparqlHelperDaemon の代わり。起動時に Gradle のログのような行を出力する（クライアントは読み飛ばす）
+# 'sleep' は指定秒数待ってから応答し、'crash' はプロセスを終了する
+# 'flaky' は counter のファイルに1文字足し、それが crashes 回目までなら応答せずにプロセスを終了する
+FAKE_HELPER = r'''
+import json, os, sys, time
+stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+stdout.write(b'> Task :run\n')
+stdout.flush()
+while True:
+    header = stdin.readline()
+    if not header:
+        break
+    request = json.loads(stdin.read(int(header)))
+    op = request['op']
+    if op == 'crash':
+        sys.exit(1)
+    if op == 'flaky':
+        with open(request['counter'], 'a+') as f:
+            f.seek(0)
+            attempts = len(f.read()) + 1
+            f.write('x')
+        if attempts <= request['crashes']:
+            sys.exit(1)
+    if op == 'sleep':
+        time.sleep(request['seconds'])
+    if op == 'parse':
+        result = {'file': request.get('path'), 'pid': os.getpid()}
+    elif op == 'serialize':
+        result = 'SELECT * WHERE { %s }' % request['ast']['body']
+    elif op == 'ping':
+        result = 'pong'
+    else:
+        result = os.getpid()
+    ok = request.get('fail') is None
+    payload = json.dumps({'id': request['id'], 'ok': ok, 'result': result, 'error': request.get('fail')}).encode()
+    stdout.write(b'%d\n' % len(payload) + payload)
+    stdout.flush()
+'''
+
+
+class FakeHelperDaemon(JavaHelperDaemon):
+    def _build_command(self) -> list:
+        return [sys.executable, '-c', FAKE_HELPER]
+
+
+@pytest.fixture
+def fake_helper_daemon():
+    """FAKE_HELPER を起動する JavaHelperDaemon のサブクラス。"""
+    return FakeHelperDaemon
+
+
+@pytest.fixture(scope='session')
+def java_launcher():
+    """
+    リポジトリの Java ヘルパーを起動する JavaLauncher。java が無ければテストをスキップする。
+    Jar が無いか古ければ最初に1回ビルドし、以降のテストは gradlew を経由せずに起動する。
+    """
+    launcher = JavaLauncher(default_project_root())
+    if launcher.java_command() is None:
+        pytest.skip('java executable not available')
+    launcher.ensure_jar()
+    return launcher
@@ -0,0 +1,145 @@
+"""
+同じソース URI に対する複数の対応（代替）の選び方 (AlternativePolicy) のテスト
+- 'last' / 'best' / 'top-k' / 'union' と min_measure・max_branches で、使う対応と分岐の順（measure の高い順）が
+  決まり、使わない対応が理由とともに pruned に残ることを確認する
+- 複数選んだ対応が rdf:type の目的語・述語・プロパティパスの位置で UNION（パスでは選択パス）に書き換わり、
+  FILTER を含む分岐や共通のトリプルが正しく結合されることを確認する
+- 既定（'last'）では従来どおり最後の対応だけが使われることを確認する
+"""
+import glob
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.parser.edoal_parser import (
+    Class, EdoalParser, IdentifiedEntity, LogicalConstructor, Property, Relation, RelationCoDomainRestriction,
+)
+from src.parser.py_sparql_parser import parse_sparql
+from src.rewriter.alternatives import AlternativePolicy, Alternatives
+from src.rewriter.mapping_index import RDF_TYPE, MappingIndex
+from src.rewriter.py_ast_serializer import PyAstSerializer
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+PREFIXES = 'PREFIX cmt: <http://cmt#> PREFIX conf: <http://conf#> '
+
+
+@pytest.fixture
+def alignment(make_alignment, make_cell, english):
+    member = LogicalConstructor(operator='and', operands=[
+        Relation(uri='http://conf#memberOf'), RelationCoDomainRestriction(class_expression=Class(uri='http://conf#PC'))])
+    return make_alignment(make_cell(Class(uri='http://cmt#Paper'), Class(uri='http://conf#Paper'), 0.9),
+                          make_cell(Class(uri='http://cmt#Paper'), Class(uri='http://conf#Contribution'), 0.6),
+                          make_cell(Class(uri='http://cmt#Paper'), english, 0.8),
+                          make_cell(Class(uri='http://cmt#Paper'), Class(uri='http://conf#Document'), 0.3),
+                          make_cell(Relation(uri='http://cmt#member'), Relation(uri='http://conf#belongsTo'), 0.7),
+                          make_cell(Relation(uri='http://cmt#member'), member, 0.7),
+                          make_cell(Relation(uri='http://cmt#title'), Property(uri='http://conf#title'), 1.0))
+
+
+def _targets(entity) -> list:
+    operands = entity.operands if isinstance(entity, Alternatives) else [entity]
+    return [getattr(operand, 'uri', type(operand).__name__) for operand in operands]
+
+
+def _rewrite(alignment, query: str, **policy) -> str:
+    rewriter = SparqlRewriter(alignment, alternative_policy=AlternativePolicy(**policy))
+    return PyAstSerializer().serialize(rewriter.walk(parse_sparql(PREFIXES + query)))
+
+
+def test_policy_orders_and_limits_alternatives(alignment):
+    cells = alignment.cells[:4]
+    assert _targets(MappingIndex(cells).classes['http://cmt#Paper']) == ['http://conf#Document']
+    expected = {'best': ['http://conf#Paper'],
+                'top-k': ['http://conf#Paper', 'AttributeValueRestriction', 'http://conf#Contribution'],
+                'union': ['http://conf#Paper', 'AttributeValueRestriction', 'http://conf#Contribution',
+                          'http://conf#Document']}
+    for mode, targets in expected.items():
+        assert _targets(MappingIndex(cells, AlternativePolicy(mode)).classes['http://cmt#Paper']) == targets
+    index = MappingIndex(cells, AlternativePolicy('union', min_measure=0.5, max_branches=2))
+    assert _targets(index.classes['http://cmt#Paper']) == ['http://conf#Paper', 'AttributeValueRestriction']
+    assert index.mapping['http://cmt#Paper'].uri == 'http://conf#Paper'
+    assert [reason for cell, reason in index.pruned] == [
+        'Below minimum measure: http://cmt#Paper (0.3 < 0.5)',
+        "Alternative not selected (union): http://cmt#Paper (measure 0.6)"]
+    # 同じ measure なら後の対応が先
+    member = MappingIndex(alignment.cells, AlternativePolicy('union')).predicates['http://cmt#member']
+    assert _targets(member) == ['LogicalConstructor', 'http://conf#belongsTo']
+    # すべて min_measure 未満なら対応しない
+    assert 'http://cmt#Paper' not in MappingIndex(cells, AlternativePolicy('best', min_measure=0.95)).mapping
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError, match='Unknown alternative mode'):
+        AlternativePolicy('all')
+    with pytest.raises(ValueError, match='Invalid branch limits'):
+        AlternativePolicy('top-k', top_k=0)
+
+
+def test_incompatible_alternatives_are_pruned(make_cell):
+    cells = [make_cell(Relation(uri='http://cmt#x'), Relation(uri='http://conf#x'), 0.9),
+             make_cell(Relation(uri='http://cmt#x'), Class(uri='http://conf#X'), 0.8)]
+    # entity1 の種類と食い違う対応は misrouted、種類の無い entity1 の候補同士の食い違いは pruned
+    assert len(MappingIndex(cells, AlternativePolicy('union')).misrouted) == 1
+    cells = [make_cell(IdentifiedEntity(uri='http://cmt#x'), Relation(uri='http://conf#x'), 0.9),
+             make_cell(IdentifiedEntity(uri='http://cmt#x'), Class(uri='http://conf#X'), 0.8)]
+    index = MappingIndex(cells, AlternativePolicy('union'))
+    assert index.roles['http://cmt#x'] == ('property',) and index.predicates['http://cmt#x'].uri == 'http://conf#x'
+    assert [reason for cell, reason in index.pruned] == [
+        'Incompatible alternative: class target for property http://cmt#x']
+
+
+def test_class_alternatives_become_a_union_in_measure_order(alignment):
+    query = 'SELECT ?p ?t WHERE { ?p a cmt:Paper ; cmt:title ?t }'
+    assert _rewrite(alignment, query) == _rewrite(alignment, query, mode='last')
+    text = _rewrite(alignment, query, mode='top-k', top_k=2)
+    # 分岐は measure の順、FILTER を含む分岐はグループになり、共通のトリプルは各分岐に入る
+    assert text.index('conf:Paper') < text.index('conf:language')
+    assert text.count('UNION') == 1 and text.count('conf:title') == 2
+    assert 'FILTER' in text and 'Contribution' not in text
+    rewriter = SparqlRewriter(alignment, alternative_policy=AlternativePolicy('top-k', top_k=2))
+    ast = rewriter.walk(parse_sparql(PREFIXES + query))
+    union = ast['ast']['patterns'][0]
+    assert union['type'] == 'union'
+    assert [branch['type'] for branch in union['patterns']] == ['bgp', 'group']
+    assert union['patterns'][1]['patterns'][0]['triples'][-1]['predicate']['value'] == 'http://conf#title'
+
+
+def test_relation_and_path_alternatives(alignment, make_alignment, make_cell):
+    text = _rewrite(alignment, 'SELECT ?a ?b WHERE { ?a cmt:member ?b }', mode='union')
+    assert text.count('UNION') == 1 and 'conf:PC' in text and 'conf:belongsTo' in text
+    # パスでは単純な Relation の分岐だけを選択パスにする
+    cells = [make_cell(Relation(uri='http://cmt#r'), Relation(uri='http://conf#r1'), 0.5),
+             make_cell(Relation(uri='http://cmt#r'), Relation(uri='http://conf#r2'), 0.9)]
+    rewriter = SparqlRewriter(make_alignment(*cells), alternative_policy=AlternativePolicy('union'))
+    path = rewriter.walk(parse_sparql('SELECT * WHERE { ?a <http://cmt#r>+ ?b }'))['ast']['patterns'][0]['triples'][0]
+    assert path['path'] == {'type': 'mod', 'modifier': '+', 'subPath': {
+        'type': 'alt', 'left': {'type': 'link', 'uri': 'http://conf#r2'}, 'right': {'type': 'link', 'uri': 'http://conf#r1'}}}
+    # 主語・目的語の位置では先頭の分岐に置換する
+    ast = rewriter.walk(parse_sparql('SELECT * WHERE { ?p <http://www.w3.org/2000/01/rdf-schema#subPropertyOf> <http://cmt#r> }'))
+    assert ast['ast']['patterns'][0]['triples'][0]['object']['value'] == 'http://conf#r2'
+
+
+def test_bundled_alternatives_are_capped():
+    files = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', 'cmt-conference', 'alignment', '*.edoal')))
+    if not files:
+        pytest.skip('data/alignment/cmt-conference not found')
+    alignment = EdoalParser(files[0]).parse()
+    index = MappingIndex(alignment.cells, AlternativePolicy('union', max_branches=2))
+    assert _targets(index.classes['http://cmt#Author']) == [
+        'http://conference#Active_conference_participant', 'http://conference#Conference_contributor']
+    assert len(index.pruned) == 1
+    ast = parse_sparql('SELECT ?x WHERE { ?x a <http://cmt#Author> }')
+    assert len(SparqlRewriter(alignment).walk(ast)['ast']['patterns'][0]['triples']) == 1
+    union = SparqlRewriter(alignment, alternative_policy=AlternativePolicy('union')).walk(ast)['ast']['patterns'][0]
+    assert union['type'] == 'union' and len(union['patterns']) == 3
+    assert {branch['triples'][0]['predicate']['value'] for branch in union['patterns']} == {RDF_TYPE}
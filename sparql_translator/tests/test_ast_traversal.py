@@ -0,0 +1,227 @@
+"""
+AstWalker の巡回（型 -> メソッドの表と明示的なスタック）のテスト
+- data/alignment/* の全クエリで、以前の再帰的な巡回（getattr で visit メソッドを探す）と同じ結果になることを確認する
+- 入れ子の深さが再帰の上限を超えるクエリも書き換えられ、入力の AST は変更されないことを確認する
+- visit_<type> / enter_<type> / leave_<type> / visit_default の優先順位と、例外で中断した場合の後始末を確認する
+"""
+import contextlib
+import glob
+import io
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.parser.edoal_parser import Alignment, Cell, EdoalParser, IdentifiedEntity, LogicalConstructor
+from src.parser.py_sparql_parser import PySparqlAstParser
+from src.rewriter.ast_walker import AstWalker
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+DATASET_DIRS = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*')))
+
+
+class RecursiveRewriter(SparqlRewriter):
+    """以前の実装のように、ノードごとに getattr で visit メソッドを探して再帰的に巡回する（比較用）。"""
+
+    def _walk_node(self, node):
+        if not isinstance(node, dict):
+            return node
+        return getattr(self, f"visit_{node.get('type')}", self.visit_default)(node)
+
+    def visit_group(self, node):
+        self.enter_group(node)
+        try:
+            new_node = self.visit_default(node)
+        except BaseException:
+            self._expansion_scopes.pop()
+            raise
+        return self.leave_group(node, new_node)
+
+    def visit_default(self, node):
+        new_node = None
+        for key, value in node.items():
+            if isinstance(value, list):
+                new_value = None
+                for index, item in enumerate(value):
+                    result = self._walk_node(item)
+                    if new_value is None:
+                        if result is item and not isinstance(result, list):
+                            continue
+                        new_value = list(value[:index])
+                    if isinstance(result, list):
+                        new_value.extend(result)
+                    else:
+                        new_value.append(result)
+                new_value = value if new_value is None else new_value
+            elif isinstance(value, dict):
+                new_value = self._walk_node(value)
+            else:
+                continue
+            if new_value is not value:
+                if new_node is None:
+                    new_node = dict(node)
+                new_node[key] = new_value
+        return node if new_node is None else new_node
+
+
+def _alignment() -> Alignment:
+    union = LogicalConstructor(operator='or', operands=[IdentifiedEntity(uri='http://conf#Paper'),
+                                                       IdentifiedEntity(uri='http://conf#Poster')])
+    cells = [Cell(entity1=IdentifiedEntity(uri='http://cmt#title'), entity2=IdentifiedEntity(uri='http://conf#title'),
+                  relation='=', measure=1.0),
+             Cell(entity1=IdentifiedEntity(uri='http://cmt#Paper'), entity2=union, relation='=', measure=1.0)]
+    return Alignment(onto1='http://cmt', onto2='http://conf', cells=cells)
+
+
+def _triple(s: str, p: str, o: str) -> dict:
+    obj = {'type': 'uri', 'value': o} if o.startswith('http') else {'type': 'variable', 'value': o}
+    return {'type': 'triple', 'subject': {'type': 'variable', 'value': s},
+            'predicate': {'type': 'uri', 'value': p}, 'object': obj}
+
+
+def _level(index: int, triples: int) -> list:
+    """1つのグループの BGP（10 個に 1 個は cmt:title、各グループの先頭は cmt:Paper の型）。"""
+    rdf_type = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+    bgp = [_triple(f's{index}', rdf_type, 'http://cmt#Paper')]
+    bgp += [_triple(f's{index}', 'http://cmt#title' if i % 10 == 0 else f'http://other#p{i}', f'o{index}_{i}')
+            for i in range(triples - 1)]
+    return [{'type': 'bgp', 'triples': bgp}]
+
+
+def nested_query(depth: int, triples: int) -> dict:
+    """OPTIONAL と UNION を交互に depth 段入れ子にし、各段にトリプルを均等に置いたクエリの AST。"""
+    per_level = max(triples // depth, 1)
+    inner = {'type': 'group', 'patterns': _level(depth - 1, per_level)}
+    for index in range(depth - 2, -1, -1):
+        if index % 2:
+            child = {'type': 'optional', 'pattern': inner}
+        else:
+            child = {'type': 'union', 'patterns': [inner, {'type': 'group', 'patterns': _level(index, 2)}]}
+        inner = {'type': 'group', 'patterns': _level(index, per_level) + [child]}
+    return {'queryType': 'SELECT', 'selectVariables': [], 'prefixes': {}, 'ast': inner}
+
+
+def _rewrite(rewriter, ast):
+    rewriter.logger.disabled = True
+    with contextlib.redirect_stdout(io.StringIO()):
+        return rewriter.walk(ast)
+
+
+def _flatten(node) -> list:
+    """AST を再帰せずに、値と構造の目印の平坦なリストにする。"""
+    flat, stack = [], [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            flat.append(('{', len(item)))
+            for key, value in item.items():
+                flat.append(key)
+                stack.append(value)
+        elif isinstance(item, list):
+            flat.append(('[', len(item)))
+            stack.extend(item)
+        else:
+            flat.append(item)
+    return flat
+
+
+@pytest.mark.skipif(not DATASET_DIRS, reason='data/alignment/* not found')
+def test_same_result_as_recursive_traversal_on_bundled_queries():
+    parser = PySparqlAstParser()
+    compared = 0
+    for dataset_dir in DATASET_DIRS:
+        alignment_files = sorted(glob.glob(os.path.join(dataset_dir, 'alignment', '*.edoal')))
+        if not alignment_files:
+            continue
+        alignment = EdoalParser(alignment_files[0]).parse()
+        iterative, recursive = SparqlRewriter(alignment), RecursiveRewriter(alignment)
+        for query_file in sorted(glob.glob(os.path.join(dataset_dir, 'queries', '*.sparql'))):
+            ast = parser.parse(query_file)
+            assert _rewrite(iterative, ast) == _rewrite(recursive, ast), query_file
+            assert iterative.last_walk_changed == recursive.last_walk_changed, query_file
+            compared += 1
+    assert compared > 0
+
+
+def test_queries_deeper_than_the_recursion_limit():
+    depth = sys.getrecursionlimit() * 2
+    ast = nested_query(depth, depth * 3)
+    # deepcopy や == も再帰するので、入力が変わらないことは平坦にした値で比べる
+    original = _flatten(ast)
+    rewriter = SparqlRewriter(_alignment())
+    result = _rewrite(rewriter, ast)
+    assert _flatten(ast) == original
+    assert rewriter.last_walk_changed
+
+    # 最も深いグループまで書き換えられている
+    group = result['ast']
+    for index in range(depth - 1):
+        child = group['patterns'][-1]
+        group = child['pattern'] if child['type'] == 'optional' else child['patterns'][0]
+    innermost = group['patterns'][0]
+    assert innermost['type'] == 'union'
+    assert {t['predicate']['value'] for branch in innermost['patterns'] for t in branch['triples']} == {
+        'http://www.w3.org/1999/02/22-rdf-syntax-ns#type', 'http://conf#title', 'http://other#p1'}
+    assert rewriter._expansion_scopes == []
+
+
+def test_handler_precedence():
+    calls = []
+
+    class Walker(AstWalker):
+        def visit_uri(self, node):
+            calls.append('uri')
+            return {**node, 'value': node['value'].upper()}
+
+        def enter_group(self, node):
+            calls.append('enter')
+
+        def leave_group(self, node, new_node):
+            calls.append('leave')
+            return {**new_node, 'left': True}
+
+    class Override(Walker):
+        def visit_group(self, node):
+            calls.append('visit')
+            return node
+
+    node = {'type': 'group', 'patterns': [{'type': 'uri', 'value': 'a'}]}
+    assert Walker().walk(node) == {'type': 'group', 'patterns': [{'type': 'uri', 'value': 'A'}], 'left': True}
+    assert calls == ['enter', 'uri', 'leave']
+    calls.clear()
+    # サブクラスの visit_<type> は親クラスの enter/leave より優先される
+    assert Override().walk(node) is node
+    assert calls == ['visit']
+    # 型 -> メソッドの表はクラスごとに作られる
+    assert Walker._handler('group')[0] is None and Override._handler('group')[0] is Override.visit_group
+
+
+def test_custom_visit_default_keeps_working():
+    # group は enter_group / leave_group で処理される（visit_group は定義しない）
+    assert SparqlRewriter._handler('group')[0] is None
+    rewriter = RecursiveRewriter(_alignment())
+    group = nested_query(3, 12)['ast']
+    assert _rewrite(rewriter, group) == _rewrite(SparqlRewriter(_alignment()), group)
+    assert rewriter._expansion_scopes == []
+
+
+def test_scopes_are_cleared_when_a_visit_fails():
+    class Failing(SparqlRewriter):
+        def visit_bgp(self, node):
+            if self._expansion_scopes and len(self._expansion_scopes) > 2:
+                raise RuntimeError('boom')
+            return super().visit_bgp(node)
+
+    rewriter = Failing(_alignment())
+    with pytest.raises(RuntimeError):
+        _rewrite(rewriter, nested_query(5, 20))
+    assert rewriter._expansion_scopes == []
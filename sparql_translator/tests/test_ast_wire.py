@@ -0,0 +1,142 @@
+"""
+ワイヤーフォーマット (ast_wire) のテスト
+- 文字列テーブル付き CBOR の往復変換と、既知のバイト列との一致を確認する
+- Java ヘルパーが各形式で同じ AST を返すかを比較する（java が見つからない環境ではスキップ）
+- Java が出力した CBOR を Python で、Python が出力した CBOR を Java で読めるかを、データセットの全クエリで確認する
+"""
+import glob
+import io
+import json
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common import ast_wire
+from src.common.java_daemon import JavaHelperDaemon
+from src.common.java_launcher import JavaLauncher, default_project_root
+from src.parser.py_sparql_parser import PySparqlAstParser
+from src.parser.sparql_ast_parser import SparqlAstParser
+from src.rewriter.ast_serializer import AstSerializer
+
+REPO_ROOT = default_project_root()
+QUERY_FILES = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*', 'queries', '*.sparql')))
+
+
+def _java_available() -> bool:
+    return JavaLauncher(REPO_ROOT).java_command() is not None
+
+
+def make_large_ast(triple_count: int) -> dict:
+    """同じ URI が何度も現れる、書き換え後のクエリに近い大きな AST を作る。"""
+    triples = [{
+        'type': 'triple',
+        'subject': {'type': 'variable', 'value': f'v{i % 50}'},
+        'predicate': {'type': 'uri', 'value': f'http://example.org/onto#property{i % 30}'},
+        'object': {'type': 'uri', 'value': f'http://example.org/onto#Class{i % 100}'},
+    } for i in range(triple_count)]
+    return {
+        'prefixes': {'ex': 'http://example.org/onto#'},
+        'ast': {'type': 'group', 'patterns': [{'type': 'bgp', 'triples': triples}]},
+        'queryType': 'SELECT', 'isDistinct': True, 'selectVariables': ['v0'], 'orderBy': [], 'limit': 10,
+    }
+
+
+def test_cbor_round_trip_of_dataset_asts():
+    for path in QUERY_FILES:
+        ast = PySparqlAstParser().parse(path)
+        assert ast_wire.decode_cbor(ast_wire.encode_cbor(ast)) == ast, path
+
+
+def test_cbor_scalars_and_string_table():
+    value = {'n': [0, 23, 24, 255, 256, 65536, 2 ** 40, -1, -300], 'f': 1.5, 'b': [True, False, None],
+             'text': ['ab', 'abc', 'abc', 'é' * 4]}
+    assert ast_wire.decode_cbor(ast_wire.encode_cbor(value)) == value
+
+    # [["type", "uri"], {"type": "uri", "v": "ab"}] — 3バイト以上の文字列はテーブルから tag 25 で参照する
+    encoded = ast_wire.encode_cbor({'type': 'uri', 'v': 'ab'})
+    assert encoded == bytes.fromhex('82' '82' '6474797065' '63757269' 'a2' 'd81900' 'd81901' '6176' '626162')
+
+
+def test_frames_skip_log_lines():
+    stream = io.BytesIO()
+    stream.write(b'> Task :runDaemon\n')
+    ast_wire.write_frame(stream, b'\x82\x80\x01')
+    ast_wire.write_record(stream, {'index': 1}, 'cbor')
+    stream.seek(0)
+    assert ast_wire.read_frame(stream) == b'\x82\x80\x01'
+    assert list(ast_wire.read_records(stream, 'cbor')) == [{'index': 1}]
+
+    lines = io.BytesIO(b'Starting a Gradle Daemon\n{"index": 0}\n{"index": 1}\n')
+    assert list(ast_wire.read_records(lines, 'compact')) == [{'index': 0}, {'index': 1}]
+
+
+def test_malformed_input_is_rejected():
+    with pytest.raises(ValueError):
+        ast_wire.check_wire_format('msgpack')
+    with pytest.raises(ValueError):
+        ast_wire.decode_cbor(b'\x82\x80')
+    with pytest.raises(EOFError):
+        ast_wire.read_frame(io.BytesIO(b'10\nabc'))
+
+
+def test_compact_formats_are_smaller():
+    ast = make_large_ast(2000)
+    pretty = json.dumps(ast, indent=2).encode('utf-8')
+    compact = ast_wire.encode(ast, 'compact')
+    cbor = ast_wire.encode(ast, 'cbor')
+    assert len(cbor) < len(compact) < len(pretty)
+    # URI とキー名がテーブルに1回だけ入るため、CBOR は1行の JSON の半分以下になる
+    assert len(cbor) * 2 < len(compact)
+
+
+@pytest.mark.skipif(not QUERY_FILES or not _java_available(), reason='java executable not available')
+@pytest.mark.parametrize('wire_format', ['compact', 'cbor'])
+def test_java_helpers_agree_across_wire_formats(wire_format):
+    paths = QUERY_FILES[:20]
+    expected = {r['file']: r['ast'] for r in SparqlAstParser(REPO_ROOT).parse_many(paths)}
+    records = {r['file']: r['ast'] for r in SparqlAstParser(REPO_ROOT, wire_format=wire_format).parse_many(paths)}
+    assert records == expected
+    assert SparqlAstParser(REPO_ROOT, wire_format=wire_format).parse(paths[0]) == expected[os.path.abspath(paths[0])]
+
+    asts = [expected[os.path.abspath(p)] for p in paths]
+    queries = [r['query'] for r in AstSerializer(REPO_ROOT).serialize_many(asts)]
+    serializer = AstSerializer(REPO_ROOT, wire_format=wire_format)
+    assert [r['query'] for r in serializer.serialize_many(asts)] == queries
+    assert serializer.serialize(asts[0]) == queries[0].strip()
+
+
+@pytest.mark.skipif(not QUERY_FILES, reason='data/alignment/*/queries not found')
+def test_java_cbor_round_trip_of_dataset_queries(java_launcher):
+    # Java が CBOR で出力した AST を Python の decode_cbor で読み、JSON で受け取った AST と比べる
+    expected = {r['file']: r['ast'] for r in SparqlAstParser(REPO_ROOT).parse_many(QUERY_FILES)}
+    records = list(SparqlAstParser(REPO_ROOT, wire_format='cbor').parse_many(QUERY_FILES))
+    assert [r for r in records if r['error'] is not None] == []
+    assert {r['file']: r['ast'] for r in records} == expected
+
+    # Python の encode_cbor で送った AST を Java が読み、JSON で送った場合と同じクエリを返すか
+    asts = [expected[os.path.abspath(p)] for p in QUERY_FILES]
+    queries = [r['query'] for r in AstSerializer(REPO_ROOT).serialize_many(asts)]
+    assert [r['query'] for r in AstSerializer(REPO_ROOT, wire_format='cbor').serialize_many(asts)] == queries
+
+    # Pure-Python パーサーの AST も同じように Java に渡せるか
+    py_asts = [PySparqlAstParser().parse(p) for p in QUERY_FILES]
+    py_queries = [r['query'] for r in AstSerializer(REPO_ROOT).serialize_many(py_asts)]
+    assert [r['query'] for r in AstSerializer(REPO_ROOT, wire_format='cbor').serialize_many(py_asts)] == py_queries
+
+
+@pytest.mark.skipif(not QUERY_FILES, reason='data/alignment/*/queries not found')
+def test_java_cbor_round_trip_through_the_daemon(java_launcher):
+    with JavaHelperDaemon(REPO_ROOT) as json_daemon, JavaHelperDaemon(REPO_ROOT, wire_format='cbor') as cbor_daemon:
+        for path in QUERY_FILES:
+            path = os.path.abspath(path)
+            ast = cbor_daemon.request('parse', path=path)
+            assert ast == json_daemon.request('parse', path=path), path
+            assert cbor_daemon.request('serialize', ast=ast) == json_daemon.request('serialize', ast=ast), path
@@ -0,0 +1,85 @@
+"""
+SparqlRewriter の並行利用（書き換え1回分の状態を RewriteContext に分けたこと）のテスト
+- 一時変数の番号はクエリごとに 0 から振られ、前に書き換えたクエリに依存しないことを確認する
+- data/alignment/* のクエリを1つの SparqlRewriter で多数のスレッドから同時に書き換えても、
+  1スレッドで書き換えた場合と同じ AST と書き換えの記録になることを確認する（テンプレートの作成も並行して起きる）
+"""
+import glob
+import os
+import random
+import sys
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.parser.edoal_parser import EdoalParser
+from src.parser.py_sparql_parser import PySparqlAstParser
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+DATASETS = ['conference', 'taxons', 'agronomic-voc', 'ekaw-conference']
+THREADS = 16
+ROUNDS = 20
+
+
+def _load(dataset: str):
+    dataset_dir = os.path.join(REPO_ROOT, 'data', 'alignment', dataset)
+    alignment_files = sorted(glob.glob(os.path.join(dataset_dir, 'alignment', '*.edoal')))
+    query_files = sorted(glob.glob(os.path.join(dataset_dir, 'queries', '*.sparql')))
+    if not alignment_files or not query_files:
+        pytest.skip(f'data/alignment/{dataset} not found')
+    parser = PySparqlAstParser()
+    return EdoalParser(alignment_files[0]).parse(), [parser.parse(path) for path in query_files]
+
+
+def test_temp_vars_restart_for_every_query():
+    alignment, asts = _load('taxons')
+    rewriter = SparqlRewriter(alignment)
+    for ast in asts:
+        # 他のクエリを何回書き換えた後でも、新しいインスタンスで書き換えた場合と同じ結果になる
+        assert rewriter.walk(ast) == SparqlRewriter(alignment).walk(ast)
+    assert rewriter.rewrite(asts[-1]).ast == rewriter.rewrite(asts[-1]).ast
+
+
+@pytest.mark.parametrize('dataset', DATASETS)
+def test_one_rewriter_shared_by_many_threads(dataset):
+    alignment, asts = _load(dataset)
+    expected = []
+    for ast in asts:
+        context = SparqlRewriter(alignment, trace=True).rewrite(ast)
+        expected.append((context.ast, context.changed, context.trace.events))
+
+    shared = SparqlRewriter(alignment, trace=True)
+    start = threading.Barrier(THREADS)
+
+    def worker(seed: int) -> list:
+        order = list(range(len(asts))) * ROUNDS
+        random.Random(seed).shuffle(order)
+        start.wait()
+        mismatches = []
+        for index in order:
+            context = shared.rewrite(asts[index])
+            if (context.ast, context.changed, context.trace.events) != expected[index]:
+                mismatches.append(index)
+        return mismatches
+
+    switch_interval = sys.getswitchinterval()
+    # スレッドの切り替えを頻繁にして、書き換えの途中での割り込みを起こしやすくする
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            results = list(pool.map(worker, range(THREADS)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert results == [[]] * THREADS
+    # 書き換えの外から見た既定のコンテキストは使われていない
+    assert shared.temp_var_counter == 0 and shared._expansion_scopes == []
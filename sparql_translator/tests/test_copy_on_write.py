@@ -0,0 +1,129 @@
+"""
+AstWalker / SparqlRewriter のコピーオンライトのテスト
+- data/alignment/* の全クエリについて、書き換えで入力の AST が変更されないこと、
+  同じ AST を2回書き換えても同じ結果になることを確認する
+- 書き換えの無いクエリでは元の AST がそのまま返り、書き換えのある場合も変わらない部分木は共有されることを確認する
+- UNION に展開される場合も、テンプレートや他の結果と共有される断片を変更しないことを確認する
+"""
+import contextlib
+import copy
+import glob
+import io
+import os
+import sys
+import pathlib
+import re
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.parser.edoal_parser import Alignment, Cell, EdoalParser, IdentifiedEntity, LogicalConstructor
+from src.parser.py_sparql_parser import PySparqlAstParser, parse_sparql
+from src.rewriter.ast_walker import AstWalker
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+DATASET_DIRS = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*')))
+
+
+def _alignment() -> Alignment:
+    union = LogicalConstructor(operator='or', operands=[IdentifiedEntity(uri='http://conf#Paper'),
+                                                       IdentifiedEntity(uri='http://conf#Poster')])
+    cells = [Cell(entity1=IdentifiedEntity(uri='http://cmt#title'), entity2=IdentifiedEntity(uri='http://conf#title'),
+                  relation='=', measure=1.0),
+             Cell(entity1=IdentifiedEntity(uri='http://cmt#Paper'), entity2=union, relation='=', measure=1.0)]
+    return Alignment(onto1='http://cmt', onto2='http://conf', cells=cells)
+
+
+def _rewrite(rewriter, ast):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return rewriter.walk(ast)
+
+
+def _strip_temp_numbers(ast) -> str:
+    return re.sub(r'variable_temp\d+', 'variable_temp', repr(ast))
+
+
+@pytest.mark.skipif(not DATASET_DIRS, reason='data/alignment/* not found')
+def test_bundled_queries_are_never_mutated():
+    parser = PySparqlAstParser()
+    checked = 0
+    for dataset_dir in DATASET_DIRS:
+        alignment_files = sorted(glob.glob(os.path.join(dataset_dir, 'alignment', '*.edoal')))
+        if not alignment_files:
+            continue
+        rewriter = SparqlRewriter(EdoalParser(alignment_files[0]).parse())
+        for query_file in sorted(glob.glob(os.path.join(dataset_dir, 'queries', '*.sparql'))):
+            ast = parser.parse(query_file)
+            original = copy.deepcopy(ast)
+            first = _rewrite(rewriter, ast)
+            assert ast == original, query_file
+            second = _rewrite(rewriter, ast)
+            assert ast == original, query_file
+            # 一時変数の番号だけが異なり、構造は同じ
+            assert _strip_temp_numbers(first) == _strip_temp_numbers(second), query_file
+            checked += 1
+    assert checked > 0
+
+
+def test_unaligned_query_returns_the_same_object():
+    ast = parse_sparql('SELECT * WHERE { ?s <http://other#p> ?o OPTIONAL { ?o <http://other#q> ?x } '
+                       'FILTER (?x > 1) }')
+    rewriter = SparqlRewriter(_alignment())
+    assert _rewrite(rewriter, ast) is ast
+    assert rewriter.last_walk_changed is False
+
+
+def test_only_the_path_to_a_rewrite_is_copied():
+    ast = parse_sparql('SELECT * WHERE { ?s <http://other#p> ?o . ?s <http://cmt#title> ?t '
+                       'OPTIONAL { ?o <http://other#q> ?x } }')
+    original = copy.deepcopy(ast)
+    result = _rewrite(SparqlRewriter(_alignment()), ast)
+    assert ast == original
+
+    bgp, optional = ast['ast']['patterns']
+    new_bgp, new_optional = result['ast']['patterns']
+    assert result is not ast and new_bgp is not bgp
+    assert new_optional is optional
+    assert result['prefixes'] is ast['prefixes']
+    # 書き換えの無いトリプルとその中のノードは共有される
+    assert new_bgp['triples'][0] is bgp['triples'][0]
+    assert new_bgp['triples'][1]['subject'] is bgp['triples'][1]['subject']
+    assert new_bgp['triples'][1]['predicate']['value'] == 'http://conf#title'
+
+
+def test_union_expansion_does_not_mutate_shared_fragments():
+    rewriter = SparqlRewriter(_alignment())
+    ast = parse_sparql('SELECT * WHERE { ?s a <http://cmt#Paper> . ?s <http://other#p> ?o }')
+    original = copy.deepcopy(ast)
+    first = _rewrite(rewriter, ast)
+    snapshot = copy.deepcopy(first)
+    template = copy.deepcopy(rewriter.plan.rdf_class('http://cmt#Paper').fragments)
+
+    second = _rewrite(rewriter, ast)
+    assert ast == original
+    assert first == snapshot == second
+    assert rewriter.plan.rdf_class('http://cmt#Paper').fragments == template
+    assert all(len(branch['triples']) == 2 for branch in first['ast']['patterns'][0]['patterns'])
+
+
+def test_walker_flattens_list_results_and_keeps_unchanged_lists():
+    class Splitter(AstWalker):
+        def visit_uri(self, node):
+            return node
+
+        def visit_pair(self, node):
+            return [{'type': 'one'}, {'type': 'two'}]
+
+    node = {'type': 'root', 'items': [{'type': 'uri', 'value': 'x'}, {'type': 'pair'}], 'other': [{'type': 'uri'}]}
+    result = Splitter().walk(node)
+    assert [item['type'] for item in result['items']] == ['uri', 'one', 'two']
+    assert result['items'][0] is node['items'][0]
+    assert result['other'] is node['other']
+    assert node['items'][1] == {'type': 'pair'}
@@ -0,0 +1,72 @@
+"""
+FILTER 式の式木のテスト
+- パーサーが出力した FILTER の式木を SparqlRewriter が巡回し、式の中の URI 定数も書き換えることを確認する
+- EDOAL の値の制約 (AttributeValueRestriction) から生成した FILTER が式木になり、
+  シリアライズ → 再パースで同じ式木に戻ることを確認する
+"""
+import json
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.parser.edoal_parser import AttributeValueRestriction, IdentifiedEntity
+from src.parser.py_sparql_parser import parse_sparql
+from src.rewriter.py_ast_serializer import PyAstSerializer
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+EDOAL = 'http://ns.inria.org/edoal/1.0/#'
+
+
+def _filters(node) -> list:
+    """AST 中の FILTER ノードを出現順に集める。"""
+    if isinstance(node, list):
+        return [f for item in node for f in _filters(item)]
+    if not isinstance(node, dict):
+        return []
+    found = [node] if node.get('type') == 'filter' else []
+    return found + [f for value in node.values() for f in _filters(value)]
+
+
+def test_uris_inside_filters_are_rewritten(make_alignment, make_cell):
+    rewriter = SparqlRewriter(make_alignment(make_cell(IdentifiedEntity(uri='http://cmt#Paper'),
+                                                       IdentifiedEntity(uri='http://conf#Paper'))))
+    ast = parse_sparql('SELECT * WHERE { ?s ?p ?c FILTER(?c = <http://cmt#Paper> || ?c IN (<http://cmt#Review>)) }')
+    rewritten = rewriter.walk(ast)
+    assert rewriter.last_walk_changed is True
+    expression = _filters(rewritten)[0]['expression']
+    assert expression['name'] == '||'
+    equals, one_of = expression['args']
+    assert equals['args'][1] == {'type': 'uri', 'value': 'http://conf#Paper'}
+    assert one_of['args'][1] == {'type': 'uri', 'value': 'http://cmt#Review'}
+    query = PyAstSerializer().serialize({**rewritten, 'prefixes': {'conf': 'http://conf#'}})
+    assert 'FILTER ( ( ?c = conf:Paper ) || ( ?c IN (<http://cmt#Review>) ) )' in query
+
+
+@pytest.mark.parametrize('comparator, value, expected', [
+    ('equals', {'string': 'True', 'type': XSD + 'boolean'}, '( ?variable_temp0 = true )'),
+    ('greaterThan', {'string': '5', 'type': XSD + 'integer'}, '( ?variable_temp0 > 5 )'),
+    ('lessThanOrEqual', {'string': '1.5', 'type': XSD + 'decimal'}, '( ?variable_temp0 <= 1.5 )'),
+    ('contains', {'string': 'abc', 'type': XSD + 'string'}, 'contains(str(?variable_temp0), "abc")'),
+    ('greaterThanOrEqual', {'string': '2010-01-01', 'type': XSD + 'date'}, '( ?variable_temp0 >= "2010-01-01"^^xsd:date )'),
+    ('equals', {'uri': 'http://conf#Accepted'}, '( ?variable_temp0 = conf:Accepted )'),
+])
+def test_value_restrictions_become_expression_trees(comparator, value, expected, make_alignment, make_cell):
+    restriction = AttributeValueRestriction(on_attribute=IdentifiedEntity(uri='http://conf#status'),
+                                            comparator=EDOAL + comparator, value=value)
+    rewriter = SparqlRewriter(make_alignment(make_cell(IdentifiedEntity(uri='http://cmt#Special'), restriction)))
+    rewritten = rewriter.walk(parse_sparql('SELECT ?s WHERE { ?s a <http://cmt#Special> }'))
+    (filter_node,) = _filters(rewritten)
+    assert isinstance(filter_node['expression'], dict)
+    query = PyAstSerializer().serialize({**rewritten, 'prefixes': {'conf': 'http://conf#', 'xsd': XSD}})
+    assert f'FILTER {expected}' in query
+    # 再パースすると、書き換えで生成した式木と同じになる
+    reparsed = _filters(parse_sparql(query))[0]['expression']
+    assert reparsed == json.loads(json.dumps(filter_node['expression']))
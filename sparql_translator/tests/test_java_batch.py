@@ -0,0 +1,82 @@
+"""
+Java ヘルパーのバッチモード（SparqlAstParser.parse_many / AstSerializer.serialize_many）のテスト
+- バッチの結果が、1件ずつ処理した結果（単発の起動・常駐プロセス）と一致するかを確認する
+- パース → シリアライズ → 再パースの往復で AST が変わらないかを確認する
+（java が見つからない環境ではスキップ）
+"""
+import glob
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_daemon import JavaHelperDaemon
+from src.common.java_launcher import default_project_root
+from src.parser.sparql_ast_parser import SparqlAstParser
+from src.rewriter.ast_serializer import AstSerializer
+
+REPO_ROOT = default_project_root()
+QUERY_FILES = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*', 'queries', '*.sparql')))
+
+pytestmark = pytest.mark.skipif(not QUERY_FILES, reason='data/alignment/*/queries not found')
+
+
+def _sample(paths):
+    # 単発モードはクエリごとに JVM を起動するので、各データセットから数件ずつ比べる
+    return paths[::max(1, len(paths) // 25)]
+
+
+def _parse_batch(paths) -> dict:
+    records = list(SparqlAstParser(REPO_ROOT).parse_many(paths, threads=4))
+    assert len(records) == len(paths)
+    assert [r for r in records if r['error'] is not None] == []
+    return {os.path.abspath(r['file']): r['ast'] for r in records}
+
+
+def test_batch_parse_matches_per_query_parse(java_launcher):
+    batch = _parse_batch(QUERY_FILES)
+    # 常駐プロセスは1件ずつ処理するので、全クエリを同じ JVM で比べられる
+    with JavaHelperDaemon(REPO_ROOT) as daemon:
+        for path in QUERY_FILES:
+            assert daemon.request('parse', path=os.path.abspath(path)) == batch[os.path.abspath(path)], path
+    parser = SparqlAstParser(REPO_ROOT)
+    for path in _sample(QUERY_FILES):
+        assert parser.parse(path) == batch[os.path.abspath(path)], path
+
+
+def test_batch_serialize_matches_per_query_serialize(java_launcher):
+    batch = _parse_batch(QUERY_FILES)
+    asts = [batch[os.path.abspath(path)] for path in QUERY_FILES]
+    records = list(AstSerializer(REPO_ROOT).serialize_many(asts, threads=4))
+    assert [r['index'] for r in records] == list(range(len(asts)))
+    assert [r for r in records if r['error'] is not None] == []
+    with JavaHelperDaemon(REPO_ROOT) as daemon:
+        for path, ast, record in zip(QUERY_FILES, asts, records):
+            assert daemon.request('serialize', ast=ast).strip() == record['query'], path
+    serializer = AstSerializer(REPO_ROOT)
+    for index in range(0, len(asts), max(1, len(asts) // 25)):
+        assert serializer.serialize(asts[index]) == records[index]['query'], QUERY_FILES[index]
+
+
+def test_batch_round_trip_keeps_the_ast(java_launcher, tmp_path):
+    batch = _parse_batch(QUERY_FILES)
+    asts = [batch[os.path.abspath(path)] for path in QUERY_FILES]
+    records = list(AstSerializer(REPO_ROOT).serialize_many(asts, threads=4))
+
+    # シリアライズしたクエリを書き出し、もう一度バッチでパースする
+    rewritten = []
+    for record in records:
+        path = tmp_path / f"{record['index']:05d}.sparql"
+        path.write_text(record['query'], encoding='utf-8')
+        rewritten.append(str(path))
+    reparsed = _parse_batch([str(tmp_path)])
+    assert len(reparsed) == len(asts)
+    for path, ast, copy in zip(QUERY_FILES, asts, rewritten):
+        assert reparsed[os.path.abspath(copy)] == ast, path
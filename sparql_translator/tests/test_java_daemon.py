@@ -0,0 +1,115 @@
+"""
+Java ヘルパー常駐プロセスのクライアント (JavaHelperDaemon) のテスト
+- JVM の代わりに conftest.py の fake_helper_daemon（同じフレームプロトコルを話す Python スクリプト）を起動する
+- クラッシュ時の再起動（落とした要求は再送しない）と、タイムアウト時の強制終了を確認する
+- java がある環境では、実際の SparqlHelperDaemon が単発のパーサー/シリアライザーと同じ結果を返し、
+  失敗した要求の後も動き続けることを確認する
+"""
+import glob
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_daemon import HelperCrashError, HelperTimeoutError, JavaHelperDaemon
+from src.common.java_launcher import default_project_root
+from src.parser.sparql_ast_parser import SparqlAstParser
+from src.rewriter.ast_serializer import AstSerializer
+
+REPO_ROOT = default_project_root()
+QUERY_FILES = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*', 'queries', '*.sparql')))
+
+
+def test_request_skips_log_lines_and_returns_result(fake_helper_daemon):
+    with fake_helper_daemon(PROJECT_ROOT) as daemon:
+        # 起動時の '> Task :run' の行はヘッダとして扱われない
+        assert daemon.request('ping') == 'pong'
+        assert daemon.ping()
+        assert daemon.request('serialize', ast={'body': '?s ?p ?o'}) == 'SELECT * WHERE { ?s ?p ?o }'
+        with pytest.raises(RuntimeError, match='boom'):
+            daemon.request('ping', fail='boom')
+        # 失敗の応答ではプロセスは再起動しない
+        assert daemon.restart_count == 0
+
+
+def test_crash_fails_the_request_and_restarts_the_process(fake_helper_daemon):
+    with fake_helper_daemon(PROJECT_ROOT) as daemon:
+        first_pid = daemon.request('pid')
+        with pytest.raises(HelperCrashError, match="crashed while handling 'crash'; the request was not resent"):
+            daemon.request('crash')
+        assert daemon.restart_count == 1
+        # 次の要求のために、プロセスはすぐに起動し直されている
+        assert daemon.is_alive()
+        assert daemon.request('pid') != first_pid
+
+
+def test_request_that_crashed_the_process_is_not_resent(fake_helper_daemon, tmp_path):
+    counter = tmp_path / 'counter'
+    with fake_helper_daemon(PROJECT_ROOT) as daemon:
+        with pytest.raises(HelperCrashError):
+            daemon.request('flaky', counter=str(counter), crashes=1)
+        # 落ちたプロセスに1回だけ届き、再起動後のプロセスには送られていない
+        assert counter.read_text() == 'x'
+        # 呼び出し側が送り直せば、再起動後のプロセスが処理する
+        assert daemon.request('flaky', counter=str(counter), crashes=1) == daemon.request('pid')
+        assert daemon.restart_count == 1
+
+
+def test_every_crashing_request_costs_one_restart(fake_helper_daemon):
+    with fake_helper_daemon(PROJECT_ROOT) as daemon:
+        # 落とす要求が続いても、1要求につき1回しか再起動しない
+        for _ in range(3):
+            with pytest.raises(HelperCrashError):
+                daemon.request('crash')
+        assert daemon.restart_count == 3
+        assert daemon.ping()
+
+
+def test_timeout_kills_the_process_and_next_request_restarts_it(fake_helper_daemon):
+    with fake_helper_daemon(PROJECT_ROOT) as daemon:
+        first_pid = daemon.request('pid')
+        with pytest.raises(HelperTimeoutError, match='within 0.2 seconds'):
+            daemon.request('sleep', timeout=0.2, seconds=5)
+        assert daemon.timeout_count == 1
+        assert not daemon.is_alive()
+        # タイムアウトは再送せず、再起動の回数にも数えない
+        assert daemon.restart_count == 0
+        assert daemon.request('pid', timeout=5) != first_pid
+        # 時間内に応答した場合はウォッチドッグが止まり、プロセスはそのまま使われる
+        assert daemon.request('sleep', timeout=5, seconds=0.1) == daemon.request('pid')
+        assert daemon.timeout_count == 1
+
+
+@pytest.mark.skipif(not QUERY_FILES, reason='data/alignment/*/queries not found')
+def test_real_daemon_matches_single_shot_helpers(java_launcher):
+    # 単発モードはクエリごとに JVM を起動するので、各データセットから数件ずつ比べる
+    paths = QUERY_FILES[::max(1, len(QUERY_FILES) // 20)]
+    parser, serializer = SparqlAstParser(REPO_ROOT), AstSerializer(REPO_ROOT)
+    with JavaHelperDaemon(REPO_ROOT) as daemon:
+        assert daemon.ping(timeout=60)
+        for path in paths:
+            ast = daemon.request('parse', path=os.path.abspath(path))
+            assert ast == parser.parse(path), path
+            with open(path, encoding='utf-8') as f:
+                assert daemon.request('parse', query=f.read()) == ast, path
+            assert daemon.request('serialize', ast=ast).strip() == serializer.serialize(ast), path
+        assert daemon.restart_count == 0
+
+
+def test_real_daemon_reports_errors_and_keeps_running(java_launcher):
+    with JavaHelperDaemon(REPO_ROOT) as daemon:
+        with pytest.raises(RuntimeError, match='QueryParseException'):
+            daemon.request('parse', query='SELECT * WHERE { ?s ?p }')
+        with pytest.raises(RuntimeError, match='Unknown op: bogus'):
+            daemon.request('bogus')
+        # 失敗の応答ではプロセスは落ちず、同じ JVM が次の要求を処理する
+        assert daemon.ping() and daemon.restart_count == 0
+        ast = daemon.request('parse', query='SELECT ?s WHERE { ?s a <http://example.org/A> }')
+        assert ast['selectVariables'] == ['s']
@@ -0,0 +1,134 @@
+"""
+Java ヘルパーの起動コマンド (JavaLauncher) のテスト
+- AppCDS アーカイブが揃っていて、今の Jar と java で作られたものの場合だけ起動オプションに加わることを確認する
+- アーカイブがある環境では、それを使って起動したヘルパーの出力が壊れていないかを確認する
+  （java やアーカイブが無い環境ではスキップ）
+- ensure_jar() が Jar の無いときだけ gradlew helperJar でビルドすることを確認する
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import (
+    CDS_INFO_FILENAME, HELPERS, HELPER_JVM_OPTIONS, JavaLauncher, default_project_root,
+)
+from src.parser.py_sparql_parser import PySparqlAstParser
+
+REPO_ROOT = default_project_root()
+QUERY_FILES = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*', 'queries', '*.sparql')))
+
+
+def _fake_launcher(tmp_path, java='/opt/jdk/bin/java') -> JavaLauncher:
+    launcher = JavaLauncher(str(tmp_path))
+    os.makedirs(os.path.dirname(launcher.jar_path))
+    with open(launcher.jar_path, 'wb'):
+        pass
+    launcher._java_command = [java]
+    launcher._uses_jar = True
+    return launcher
+
+
+def _write_archives(launcher: JavaLauncher, java='/opt/jdk/bin/java', helpers=HELPERS):
+    os.makedirs(launcher.cds_dir, exist_ok=True)
+    for helper in helpers:
+        with open(launcher.cds_archive_path(helper), 'wb'):
+            pass
+    with open(os.path.join(launcher.cds_dir, CDS_INFO_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({'java': [java], 'jar': launcher.jar_path}, f)
+
+
+def test_command_uses_startup_jit_options_without_archives(tmp_path):
+    launcher = _fake_launcher(tmp_path)
+    command = launcher.command('parser', ['/q.sparql'])
+    assert command[:4] == ['/opt/jdk/bin/java', '-XX:TieredStopAtLevel=1', '-XX:+UseSerialGC', '-XX:-UsePerfData']
+    assert command[-4:] == ['-cp', launcher.jar_path, HELPERS['parser'][0], '/q.sparql']
+    assert not any(option.startswith('-XX:SharedArchiveFile') for option in command)
+    # 常駐プロセスは長く動くので C2 を止めない
+    assert '-XX:TieredStopAtLevel=1' not in launcher.command('daemon')
+
+
+def test_command_uses_archive_built_for_this_jar_and_java(tmp_path):
+    launcher = _fake_launcher(tmp_path)
+    _write_archives(launcher)
+    command = launcher.command('serializer', ['--batch'])
+    assert f"-XX:SharedArchiveFile={launcher.cds_archive_path('serializer')}" in command
+    # JVM の警告が stdout（AST の出力）に混ざらないようにする
+    assert '-Xlog:all=warning:stderr' in command
+    assert command.index('-cp') > command.index('-Xshare:auto')
+
+
+@pytest.mark.parametrize('break_archives', ['other_java', 'missing_helper', 'older_than_jar'])
+def test_stale_archives_are_ignored(tmp_path, break_archives):
+    launcher = _fake_launcher(tmp_path)
+    if break_archives == 'other_java':
+        _write_archives(launcher, java='/usr/lib/jvm/other/bin/java')
+    elif break_archives == 'missing_helper':
+        _write_archives(launcher, helpers=['parser', 'serializer'])
+    else:
+        _write_archives(launcher)
+        for helper in HELPERS:
+            os.utime(launcher.cds_archive_path(helper), (0, 0))
+    assert not launcher.has_cds_archives()
+    assert launcher.jvm_options('parser') == HELPER_JVM_OPTIONS['parser']
+
+
+def _fake_gradlew(tmp_path):
+    """helperJar の代わりに空の Jar を作り、呼ばれた回数を build/calls に残す gradlew。"""
+    gradlew = tmp_path / 'gradlew'
+    gradlew.write_text('#!/bin/sh\nmkdir -p build/libs\necho "$1" >> build/calls\n'
+                       'touch build/libs/sparql-helpers-all.jar\n')
+    gradlew.chmod(0o755)
+    return tmp_path / 'build' / 'calls'
+
+
+def test_ensure_jar_builds_a_missing_jar_once(tmp_path):
+    calls = _fake_gradlew(tmp_path)
+    launcher = JavaLauncher(str(tmp_path))
+    launcher._find_java = lambda: sys.executable
+    assert launcher.ensure_jar() and launcher.uses_jar
+    assert launcher.command('daemon')[-2:] == [launcher.jar_path, HELPERS['daemon'][0]]
+    # ビルド済みなら gradlew は呼ばない
+    assert JavaLauncher(str(tmp_path)).ensure_jar()
+    assert calls.read_text() == 'helperJar\n'
+
+
+def test_ensure_jar_without_java_keeps_the_gradlew_fallback(tmp_path):
+    calls = _fake_gradlew(tmp_path)
+    launcher = JavaLauncher(str(tmp_path))
+    launcher._find_java = lambda: None
+    assert not launcher.ensure_jar()
+    assert launcher.command('daemon')[:2] == [launcher.gradlew_path, 'runDaemon']
+    assert not calls.exists()
+
+
+def test_build_cds_requires_the_jar(tmp_path):
+    with pytest.raises(RuntimeError, match='--build'):
+        JavaLauncher(str(tmp_path)).build_cds()
+
+
+def _archives_in_use() -> bool:
+    launcher = JavaLauncher(REPO_ROOT)
+    return launcher.uses_jar and launcher.has_cds_archives()
+
+
+@pytest.mark.skipif(not QUERY_FILES or not _archives_in_use(), reason='AppCDS archives not built (java_launcher --cds)')
+def test_helpers_started_with_archives_produce_clean_output():
+    launcher = JavaLauncher(REPO_ROOT)
+    parsed = subprocess.run(launcher.command('parser', [QUERY_FILES[0]]), cwd=REPO_ROOT,
+                            capture_output=True, check=True)
+    ast = json.loads(parsed.stdout)
+    assert ast == json.loads(json.dumps(PySparqlAstParser().parse(QUERY_FILES[0])))
+    serialized = subprocess.run(launcher.command('serializer'), cwd=REPO_ROOT, input=parsed.stdout,
+                                capture_output=True, check=True)
+    assert serialized.stdout.decode('utf-8').lstrip().startswith(('PREFIX', 'SELECT', 'ASK', 'CONSTRUCT'))
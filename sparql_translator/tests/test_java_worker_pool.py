@@ -0,0 +1,117 @@
+"""
+Java ヘルパーのワーカープール (JavaWorkerPool) のテスト
+- JVM の代わりに、同じフレームプロトコルを話す小さな Python スクリプトを常駐プロセスとして起動する
+  （conftest.py の fake_helper_daemon）ため、java が無い環境でも実行できる
+- 並列処理、入力順での結果の返却、タイムアウト時の強制終了と再起動、ヘルスチェックを確認する
+"""
+import sys
+import pathlib
+import threading
+import time
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_daemon import HelperCrashError, HelperTimeoutError
+from src.common.java_worker_pool import JavaWorkerPool
+from src.parser.sparql_ast_parser import DaemonSparqlAstParser
+from src.rewriter.ast_serializer import DaemonAstSerializer
+
+def _pool(daemon_class, **kwargs) -> JavaWorkerPool:
+    return JavaWorkerPool(PROJECT_ROOT, daemon_factory=lambda: daemon_class(PROJECT_ROOT), **kwargs)
+
+
+def test_requests_run_in_parallel_and_keep_input_order(fake_helper_daemon):
+    with _pool(fake_helper_daemon, size=4, queue_depth=2) as pool:
+        pool.start()
+        # 起動を待ってから計測する
+        assert all(r == 'pong' for r, _ in pool.request_many('ping', [{}] * 4))
+        started = time.monotonic()
+        results = list(pool.request_many('sleep', [{'seconds': 0.3}] * 8))
+        elapsed = time.monotonic() - started
+        assert all(error is None for _, error in results)
+        # 4並列なら 0.3 秒 x 2 巡、直列なら 2.4 秒
+        assert elapsed < 1.5
+        assert len({pid for pid, _ in results}) == 4
+
+        parser = DaemonSparqlAstParser(PROJECT_ROOT, pool)
+        files = [f"/tmp/q{i}.sparql" for i in range(20)]
+        assert [r['file'] for r in parser.parse_many(files)] == files
+        assert [r['ast']['file'] for r in parser.parse_many(files)] == files
+
+        serializer = DaemonAstSerializer(PROJECT_ROOT, pool)
+        records = list(serializer.serialize_many([{'body': '?s ?p ?o'}, {'body': '', 'x': 1}]))
+        assert records[0] == {'index': 0, 'query': 'SELECT * WHERE { ?s ?p ?o }', 'error': None}
+
+        stats = pool.stats()
+        assert (stats['size'], stats['queue_depth']) == (4, 2)
+        assert (stats['in_flight'], stats['queued'], stats['failed']) == (0, 0, 0)
+        assert stats['completed'] == 4 + 8 + 40 + 2
+
+
+def test_queue_is_bounded_and_stats_report_backlog(fake_helper_daemon):
+    with _pool(fake_helper_daemon, size=1, queue_depth=2) as pool:
+        first = pool.submit('sleep', seconds=0.5)
+        while pool.stats()['in_flight'] == 0:
+            time.sleep(0.01)
+        queued = [pool.submit('ping'), pool.submit('ping')]
+        stats = pool.stats()
+        assert (stats['in_flight'], stats['queued']) == (1, 2)
+
+        # キューが満杯なので3件目の投入はブロックする
+        blocked = threading.Thread(target=pool.submit, args=('ping',))
+        blocked.start()
+        blocked.join(timeout=0.1)
+        assert blocked.is_alive()
+        first.result()
+        blocked.join(timeout=5)
+        assert not blocked.is_alive()
+        assert [f.result() for f in queued] == ['pong', 'pong']
+
+
+def test_timeout_kills_worker_and_next_request_restarts_it(fake_helper_daemon):
+    with _pool(fake_helper_daemon, size=1, request_timeout=0.3) as pool:
+        pid = pool.request('pid')
+        with pytest.raises(HelperTimeoutError):
+            pool.request('sleep', seconds=5)
+        # 強制終了されたプロセスの代わりに新しいプロセスが起動する
+        assert pool.request('pid') != pid
+        stats = pool.stats()
+        assert (stats['timeouts'], stats['restarts'], stats['failed']) == (1, 1, 1)
+
+
+def test_errors_and_crashes_are_reported_per_request(fake_helper_daemon):
+    with _pool(fake_helper_daemon, size=2) as pool:
+        results = list(pool.request_many('parse', [{'path': 'a'}, {'path': 'b', 'fail': 'boom'}, {'path': 'c'}]))
+        assert [r['file'] if r else None for r, _ in results] == ['a', None, 'c']
+        assert 'boom' in str(results[1][1])
+        # クラッシュしたワーカーは1回だけ再起動され、要求は再送されずに失敗する
+        with pytest.raises(HelperCrashError):
+            pool.request('crash')
+        assert pool.stats()['restarts'] == 1
+        assert pool.request('ping') == 'pong'
+    with pytest.raises(RuntimeError, match='closed'):
+        pool.submit('ping')
+
+
+def test_idle_workers_are_health_checked(fake_helper_daemon):
+    class HangingPingDaemon(fake_helper_daemon):
+        def ping(self, timeout=None):
+            self.pings = getattr(self, 'pings', 0) + 1
+            return self.pings > 1
+
+    pool = JavaWorkerPool(PROJECT_ROOT, size=1, health_check_interval=0.1,
+                          daemon_factory=lambda: HangingPingDaemon(PROJECT_ROOT))
+    try:
+        pid = pool.request('pid')
+        time.sleep(0.35)
+        # 最初の ping に失敗したワーカーは終了され、次の要求で起動し直される
+        assert pool.stats()['restarts'] == 1
+        assert pool.request('pid') != pid
+    finally:
+        pool.close()
@@ -0,0 +1,108 @@
+"""
+役割ごとのアラインメントの索引 (MappingIndex) のテスト
+- entity1 の種類（Class / Property・Relation / Instance、種類が無ければ entity2 の種類）で対応が分けられ、
+  クラスの URI は述語の位置では、プロパティの URI は rdf:type の目的語の展開では使われないことを確認する
+- entity1 と entity2 の種類が食い違う対応は索引を作る時点で misrouted に残り、書き換えに使われないことを確認する
+- パーサーが 'a' と rdf:type の IRI をインターンされた定数にそろえることを確認する
+"""
+import glob
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.parser.edoal_parser import (
+    Class, EdoalParser, IdentifiedEntity, Instance, LogicalConstructor, Property, Relation,
+)
+from src.parser.py_sparql_parser import parse_sparql
+from src.rewriter.mapping_index import RDF_TYPE, MappingIndex, entity_role
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+PREFIXES = 'PREFIX cmt: <http://cmt#> PREFIX conf: <http://conf#> '
+
+
+@pytest.fixture
+def alignment(make_alignment, make_cell, accepted, english):
+    return make_alignment(
+        make_cell(Class(uri='http://cmt#Paper'), Class(uri='http://conf#Paper')),
+        make_cell(Class(uri='http://cmt#Accepted'), accepted),
+        make_cell(Property(uri='http://cmt#title'), Property(uri='http://conf#title')),
+        make_cell(Instance(uri='http://cmt#ISWC'), Instance(uri='http://conf#ISWC')),
+        make_cell(IdentifiedEntity(uri='http://cmt#note'), IdentifiedEntity(uri='http://conf#note')),
+        # 種類が食い違う対応
+        make_cell(Class(uri='http://cmt#Author'), Relation(uri='http://conf#hasAuthor')),
+        make_cell(Relation(uri='http://cmt#inEnglish'), english))
+
+
+def _rewrite(alignment, query: str) -> dict:
+    return SparqlRewriter(alignment).walk(parse_sparql(PREFIXES + query))
+
+
+def _triples(ast) -> list:
+    return [tuple(t[k]['value'] for k in ('subject', 'predicate', 'object'))
+            for t in ast['ast']['patterns'][0]['triples']]
+
+
+def test_cells_are_partitioned_by_role(alignment):
+    index = MappingIndex(alignment.cells)
+    assert sorted(index.classes) == ['http://cmt#Accepted', 'http://cmt#Paper', 'http://cmt#note']
+    assert sorted(index.predicates) == ['http://cmt#note', 'http://cmt#title']
+    assert sorted(index.instances) == ['http://cmt#ISWC', 'http://cmt#note']
+    assert index.roles['http://cmt#note'] == ('class', 'property', 'instance')
+    assert [reason for cell, reason in index.misrouted] == [
+        'Misrouted correspondence: class http://cmt#Author is mapped to a property expression',
+        'Misrouted correspondence: property http://cmt#inEnglish is mapped to a class expression']
+    assert 'http://cmt#Author' not in index.mapping and len(index) == 5
+
+
+def test_entity_roles():
+    assert entity_role(IdentifiedEntity(uri='http://x')) is None
+    assert entity_role(LogicalConstructor(operator='or', operands=[Class(uri='a'), Class(uri='b')])) == 'class'
+    assert entity_role(LogicalConstructor(operator='and', operands=[Relation(uri='a'), Class(uri='b')])) == 'property'
+
+
+def test_lookups_skip_impossible_roles(alignment):
+    # クラスの URI は述語の位置では置換・展開しない
+    assert _triples(_rewrite(alignment, 'SELECT * WHERE { ?s cmt:Accepted ?o . ?s cmt:Paper ?t }')) == [
+        ('s', 'http://cmt#Accepted', 'o'), ('s', 'http://cmt#Paper', 't')]
+    # プロパティの URI は rdf:type の目的語として展開しないが、主語・目的語の URI としては置換する
+    assert _triples(_rewrite(alignment, 'SELECT * WHERE { ?s a cmt:Accepted . ?p <http://www.w3.org/2000/01/rdf-schema#subPropertyOf> cmt:title }')) == [
+        ('s', 'http://conf#hasDecision', 'variable_temp0'), ('variable_temp0', RDF_TYPE, 'http://conf#Acceptance'),
+        ('p', 'http://www.w3.org/2000/01/rdf-schema#subPropertyOf', 'http://conf#title')]
+    assert _triples(_rewrite(alignment, 'SELECT * WHERE { ?s cmt:title ?t . ?s ?p cmt:ISWC . ?s cmt:note cmt:note }')) == [
+        ('s', 'http://conf#title', 't'), ('s', 'p', 'http://conf#ISWC'), ('s', 'http://conf#note', 'http://conf#note')]
+
+
+def test_misrouted_cells_are_never_applied(alignment):
+    query = 'SELECT * WHERE { ?s a cmt:Author . ?s cmt:Author ?o . ?s cmt:inEnglish ?o }'
+    ast = parse_sparql(PREFIXES + query)
+    assert SparqlRewriter(alignment).walk(ast) is ast
+
+
+def test_parser_interns_rdf_type(alignment):
+    ast = parse_sparql('SELECT * WHERE { ?s a ?c . ?s <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> ?d . '
+                       '?s ?p ?o }')
+    predicates = [t['predicate'].get('value') for t in ast['ast']['patterns'][0]['triples']]
+    assert predicates[0] is RDF_TYPE and predicates[1] is RDF_TYPE
+    # インターンされていない（JSON から読んだ）rdf:type も文字列の比較で判定される
+    ast['ast']['patterns'][0]['triples'][0]['predicate']['value'] = ''.join(RDF_TYPE)
+    ast['ast']['patterns'][0]['triples'][0]['object'] = {'type': 'uri', 'value': 'http://cmt#Accepted'}
+    assert len(SparqlRewriter(alignment).walk(ast)['ast']['patterns'][0]['triples']) == 4
+
+
+def test_bundled_misrouted_cells():
+    files = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', 'gbo-gmo', 'alignment', '*.edoal')))
+    if not files:
+        pytest.skip('data/alignment/gbo-gmo not found')
+    index = MappingIndex(EdoalParser(files[0]).parse().cells)
+    assert len(index.misrouted) == 6
+    assert all(type(cell.entity2).__name__ == 'AttributeValueRestriction' for cell, reason in index.misrouted)
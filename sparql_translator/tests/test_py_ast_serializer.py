@@ -0,0 +1,207 @@
+"""
+Pure-Python シリアライザー (PyAstSerializer) のテスト
+- data/alignment/*/queries の全クエリについて、パース → シリアライズ → 再パースで AST が変わらないかを確認する
+- Java 版 (Jena) の出力と、再パースした AST 同士が一致するかを比較する
+  （java が見つからない環境では差分テストはスキップされる）
+- 単体でも実行でき、その場合は Java 版との差分の一覧を表示する:
+    python3 tests/test_py_ast_serializer.py
+"""
+import glob
+import json
+import os
+import re
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import JavaLauncher, default_project_root
+from src.parser.py_sparql_parser import PySparqlAstParser, expr_to_map, parse_sparql
+from src.rewriter.ast_serializer import AstSerializer
+from src.rewriter.py_ast_serializer import AstSerializationError, PyAstSerializer, parse_sse_expr
+
+REPO_ROOT = default_project_root()
+QUERY_FILES = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*', 'queries', '*.sparql')))
+
+EX = 'http://ex#'
+
+
+def _java_available() -> bool:
+    return JavaLauncher(REPO_ROOT).java_command() is not None
+
+
+def _reparse(query: str) -> dict:
+    ast = parse_sparql(query)
+    # プレフィックスは出力の書式に依存しないため比較から外す
+    ast.pop('prefixes', None)
+    # Java 版と同様に ORDER BY は変数名だけが引き継がれる（向きは常に昇順）
+    ast['orderBy'] = [re.sub(r'\b(?:ASC|DESC)\((\?\w+)\)', r'\1', c) for c in ast['orderBy']]
+    return ast
+
+
+def _query_ast(patterns: list, **extra) -> dict:
+    ast = {'prefixes': {'ex': EX}, 'ast': {'type': 'group', 'patterns': patterns},
+           'queryType': 'SELECT', 'isDistinct': False, 'selectVariables': ['s'], 'orderBy': []}
+    ast.update(extra)
+    return ast
+
+
+def _triple(s, p, o) -> dict:
+    return {'type': 'triple', 'subject': s, 'predicate': p, 'object': o}
+
+
+def _var(name: str) -> dict:
+    return {'type': 'variable', 'value': name}
+
+
+def _uri(local: str) -> dict:
+    return {'type': 'uri', 'value': EX + local}
+
+
+def find_differences():
+    """
+    全クエリを Java 版と Pure-Python 版でシリアライズし、再パースした AST が一致しなかったものを返す。
+
+    :return: (ファイルパス, Java の出力 または エラー, Python の出力 または エラー) のリスト
+    """
+    asts = [PySparqlAstParser().parse(path) for path in QUERY_FILES]
+    java_records = list(AstSerializer(REPO_ROOT).serialize_many(asts))
+    serializer = PyAstSerializer()
+
+    differences = []
+    for path, ast, java in zip(QUERY_FILES, asts, java_records):
+        try:
+            python_query = serializer.serialize(ast)
+        except AstSerializationError as e:
+            python_query = f"error: {e}"
+        if java['error']:
+            if not python_query.startswith('error: '):
+                differences.append((path, f"error: {java['error']}", python_query))
+        elif python_query.startswith('error: ') or _reparse(java['query']) != _reparse(python_query):
+            differences.append((path, java['query'], python_query))
+    return differences
+
+
+@pytest.mark.skipif(not QUERY_FILES, reason='data/alignment/*/queries not found')
+def test_dataset_queries_round_trip():
+    serializer = PyAstSerializer()
+    for path in QUERY_FILES:
+        ast = PySparqlAstParser().parse(path)
+        expected = json.loads(json.dumps(ast))
+        expected.pop('prefixes')
+        assert _reparse(serializer.serialize(ast)) == expected, path
+
+
+@pytest.mark.skipif(not QUERY_FILES, reason='data/alignment/*/queries not found')
+def test_equivalent_to_java_serializer_on_dataset_queries(java_launcher):
+    differences = find_differences()
+    details = '\n'.join(f"{path}\n  java:\n{java}\n  python:\n{python}" for path, java, python in differences[:3])
+    assert not differences, f"{len(differences)} of {len(QUERY_FILES)} queries differ:\n{details}"
+
+
+@pytest.mark.parametrize('expression, sparql', [
+    ('(= ?v 5)', '( ?v = 5 )'),
+    ('(contains (str ?v) "abc")', 'contains(str(?v), "abc")'),
+    ('(>= ?v "2010-01-01"^^<http://www.w3.org/2001/XMLSchema#date>)', '( ?v >= "2010-01-01"^^xsd:date )'),
+    ('(< ?v 1.5)', '( ?v < 1.5 )'),
+    ('(= ?v true)', '( ?v = true )'),
+    ('(= ?v <http://ex#A>)', '( ?v = ex:A )'),
+    ('(! (bound ?d))', '( ! bound(?d) )'),
+    ('(regex ?label "^triticum$" "i")', 'regex(?label, "^triticum$", "i")'),
+    ('(notin ?v 1 2)', '( ?v NOT IN (1, 2) )'),
+    ('(<http://ex#f> ?v)', 'ex:f(?v)'),
+    ('?v', '( ?v )'),
+])
+def test_rewriter_filter_forms(expression, sparql):
+    ast = _query_ast([{'type': 'filter', 'expression': expression}],
+                     prefixes={'ex': EX, 'xsd': 'http://www.w3.org/2001/XMLSchema#'})
+    query = PyAstSerializer().serialize(ast)
+    assert f'FILTER {sparql}' in query
+    # 以前の形式の SSE 文字列も読み取れ、再パースすると同じ式の式木になる
+    tree = _reparse(query)['ast']['patterns'][0]['expression']
+    assert tree == json.loads(json.dumps(expr_to_map(parse_sse_expr(expression))))
+    tree_ast = _query_ast([{'type': 'filter', 'expression': tree}],
+                          prefixes={'ex': EX, 'xsd': 'http://www.w3.org/2001/XMLSchema#'})
+    assert PyAstSerializer().serialize(tree_ast) == query
+
+
+def test_property_paths_round_trip():
+    paths = [
+        {'type': 'mod', 'modifier': '*', 'subPath': {'type': 'link', 'uri': EX + 'p'}},
+        {'type': 'inverse', 'subPath': {'type': 'seq', 'left': {'type': 'link', 'uri': EX + 'p'},
+                                        'right': {'type': 'link', 'uri': EX + 'q'}}},
+        {'type': 'seq', 'left': {'type': 'link', 'uri': EX + 'p'},
+         'right': {'type': 'alt', 'left': {'type': 'link', 'uri': EX + 'q'}, 'right': {'type': 'link', 'uri': EX + 'r'}}},
+        {'type': 'alt', 'left': {'type': 'seq', 'left': {'type': 'link', 'uri': EX + 'p'},
+                                 'right': {'type': 'link', 'uri': EX + 'q'}},
+         'right': {'type': 'mod', 'modifier': '+', 'subPath': {'type': 'inverse', 'subPath': {'type': 'link', 'uri': EX + 'r'}}}},
+    ]
+    triples = [{'type': 'path_triple', 'subject': _var('s'), 'path': path, 'object': _var('o')} for path in paths]
+    ast = _query_ast([{'type': 'bgp', 'triples': triples}])
+    reparsed = _reparse(PyAstSerializer().serialize(ast))
+    assert [t['path'] for t in reparsed['ast']['patterns'][0]['triples']] == paths
+
+
+def test_union_optional_and_modifiers():
+    branch_a = {'type': 'group', 'patterns': [{'type': 'bgp', 'triples': [_triple(_var('s'), _uri('p'), _uri('A'))]}]}
+    branch_b = {'type': 'group', 'patterns': [{'type': 'bgp', 'triples': [_triple(_var('s'), _uri('p'), _uri('B'))]}]}
+    optional = {'type': 'optional', 'pattern': {'type': 'group', 'patterns': [
+        {'type': 'bgp', 'triples': [_triple(_var('s'), _uri('name'), {'type': 'literal', 'value': 'x', 'lang': 'en',
+                                                                      'datatype': EX + 'ignored'})]}]}}
+    ast = _query_ast([{'type': 'union', 'patterns': [branch_a, branch_b]}, optional],
+                     isDistinct=True, orderBy=['(SortCondition ?s)'], limit=10, offset=5)
+    query = PyAstSerializer().serialize(ast)
+    assert 'SELECT DISTINCT  ?s' in query
+    assert '"x"@en' in query
+    reparsed = _reparse(query)
+    assert [p['type'] for p in reparsed['ast']['patterns']] == ['union', 'optional']
+    assert reparsed['orderBy'] == ['(SortCondition ?s)']
+    assert (reparsed['limit'], reparsed['offset']) == (10, 5)
+
+
+def test_unchanged_subtrees_are_memoized():
+    shared = {'type': 'bgp', 'triples': [_triple(_var('s'), _uri('p'), _var('o'))]}
+    serializer = PyAstSerializer()
+    first = serializer.serialize(_query_ast([shared]))
+    misses = serializer.memo_stats['misses']
+    # 同じ BGP を含む別のクエリでは、BGP の描画結果が再利用される
+    second = serializer.serialize(_query_ast([dict(shared), {'type': 'filter', 'expression': '(bound ?o)'}]))
+    assert serializer.memo_stats['hits'] >= 1
+    assert serializer.memo_stats['misses'] == misses + 2  # FILTER と外側のグループだけ
+    assert first.splitlines()[-2] in second
+
+
+def test_unknown_filter_uses_fallback():
+    class FakeFallback:
+        def serialize(self, ast):
+            return 'fallback'
+
+    ast = _query_ast([{'type': 'filter', 'expression': '(exists (bgp))'}])
+    with pytest.raises(AstSerializationError):
+        PyAstSerializer().serialize(ast)
+    exists = _query_ast([{'type': 'filter', 'expression': {'type': 'not_exists', 'pattern': {'type': 'group'}}}])
+    with pytest.raises(AstSerializationError):
+        PyAstSerializer().serialize(exists)
+    serializer = PyAstSerializer(fallback=FakeFallback())
+    assert serializer.serialize(ast) == 'fallback'
+    assert serializer.fallback_count == 1
+    with pytest.raises(AstSerializationError):
+        parse_sse_expr('(= ?x')
+
+
+if __name__ == '__main__':
+    if not _java_available():
+        print('java が見つからないため、差分テストを実行できません。')
+        sys.exit(1)
+    differences = find_differences()
+    for path, java, python in differences:
+        print(f"[DIFF] {path}")
+        print(f"  java:\n{java}")
+        print(f"  python:\n{python}")
+    print(f"\n{len(QUERY_FILES) - len(differences)}/{len(QUERY_FILES)} queries match the Java serializer.")
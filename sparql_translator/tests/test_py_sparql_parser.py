@@ -0,0 +1,180 @@
+"""
+Pure-Python パーサー (PySparqlAstParser) のテスト
+- data/alignment/*/queries の全クエリについて、Java 版 (Jena) の AST と完全一致するかを比較する
+  （java が見つからない環境では差分テストはスキップされる）
+- 単体でも実行でき、その場合は差分の一覧を表示する:
+    python3 tests/test_py_sparql_parser.py
+"""
+import glob
+import json
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import JavaLauncher, default_project_root
+from src.parser.py_sparql_parser import PySparqlAstParser, parse_sparql, UnsupportedSparqlError
+from src.parser.sparql_ast_parser import SparqlAstParser
+
+REPO_ROOT = default_project_root()
+QUERY_DIRS = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*', 'queries')))
+QUERY_FILES = sorted(f for d in QUERY_DIRS for f in glob.glob(os.path.join(d, '*.sparql')))
+
+RDF_TYPE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
+
+
+def _query_path(dataset: str, name: str) -> str:
+    return os.path.join(REPO_ROOT, 'data', 'alignment', dataset, 'queries', name)
+
+
+def _string(value: str) -> dict:
+    return {'type': 'literal', 'value': value, 'datatype': 'http://www.w3.org/2001/XMLSchema#string'}
+
+
+def _java_available() -> bool:
+    return JavaLauncher(REPO_ROOT).java_command() is not None
+
+
+def _normalize(ast: dict) -> dict:
+    # Java 側は JSON 経由で受け取るため、Python 側も JSON を通して型を揃える
+    return json.loads(json.dumps(ast))
+
+
+def find_differences():
+    """
+    全クエリを Java 版と Pure-Python 版でパースし、一致しなかったものを返す。
+
+    :return: (ファイルパス, Java の AST または エラー, Python の AST または エラー) のリスト
+    """
+    java_results = {}
+    for record in SparqlAstParser(REPO_ROOT).parse_many(QUERY_DIRS):
+        java_results[os.path.abspath(record['file'])] = record
+
+    differences = []
+    for path in QUERY_FILES:
+        java = java_results.get(os.path.abspath(path))
+        try:
+            python_ast = _normalize(PySparqlAstParser().parse(path))
+        except Exception as e:
+            python_ast = f"error: {e}"
+        if java is None:
+            differences.append((path, 'missing from Java batch output', python_ast))
+        elif java['error']:
+            # Java がエラーなら Python 側もエラーになるべき
+            if not isinstance(python_ast, str):
+                differences.append((path, f"error: {java['error']}", python_ast))
+        elif java['ast'] != python_ast:
+            differences.append((path, java['ast'], python_ast))
+    return differences
+
+
+@pytest.mark.skipif(not QUERY_FILES, reason='data/alignment/*/queries not found')
+def test_all_dataset_queries_parse():
+    for path in QUERY_FILES:
+        ast = PySparqlAstParser().parse(path)
+        assert ast['ast']['type'] == 'group', path
+
+
+@pytest.mark.skipif(not QUERY_FILES, reason='data/alignment/*/queries not found')
+def test_matches_java_parser_on_dataset_queries(java_launcher):
+    differences = find_differences()
+    details = '\n'.join(f"{path}\n  java:   {java}\n  python: {python}" for path, java, python in differences[:5])
+    assert not differences, f"{len(differences)} of {len(QUERY_FILES)} queries differ:\n{details}"
+
+
+def test_optional_and_negated_bound_filter():
+    ast = PySparqlAstParser().parse(_query_path('cmt-conference', 'query_29.sparql'))
+    patterns = ast['ast']['patterns']
+    assert [p['type'] for p in patterns] == ['bgp', 'optional', 'filter']
+    assert patterns[1]['pattern']['type'] == 'group'
+    assert patterns[2]['expression'] == {
+        'type': 'operator', 'name': '!',
+        'args': [{'type': 'function', 'name': 'bound', 'args': [{'type': 'variable', 'value': 'decision'}]}],
+    }
+    assert ast['selectVariables'] == ['paper']
+    assert 'limit' not in ast and 'offset' not in ast
+
+
+def test_union_of_groups_with_hyphenated_local_name():
+    ast = PySparqlAstParser().parse(_query_path('cmt-conference', 'query_27.sparql'))
+    union = ast['ast']['patterns'][0]
+    assert union['type'] == 'union'
+    objects = [g['patterns'][0]['triples'][0]['object']['value'] for g in union['patterns']]
+    assert objects == ['http://cmt#Reviewer', 'http://cmt#Meta-Reviewer']
+
+
+def test_property_path_and_regex_filter():
+    ast = PySparqlAstParser().parse(_query_path('agronomic-voc', 'query_0.sparql'))
+    triples = ast['ast']['patterns'][0]['triples']
+    assert triples[0]['predicate'] == {'type': 'uri', 'value': RDF_TYPE}
+    assert triples[2]['type'] == 'path_triple'
+    assert triples[2]['path'] == {
+        'type': 'mod',
+        'subPath': {'type': 'link', 'uri': 'http://ontology.irstea.fr/agronomictaxon/core#hasLowerRank'},
+        'modifier': '+',
+    }
+    assert ast['ast']['patterns'][1]['expression'] == {
+        'type': 'function', 'name': 'regex',
+        'args': [{'type': 'variable', 'value': 'label'}, _string('^triticum$'), _string('i')],
+    }
+    assert ast['isDistinct'] is True
+
+
+def test_order_by_limit_and_literals():
+    ast = parse_sparql('SELECT * WHERE { ?s <http://p> "x"@en , 5 , 1.5 . FILTER(?s != "a") } '
+                       'ORDER BY DESC(?s) LIMIT 10')
+    objects = [t['object'] for t in ast['ast']['patterns'][0]['triples']]
+    assert objects[0] == {'type': 'literal', 'value': 'x',
+                          'datatype': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#langString', 'lang': 'en'}
+    assert objects[1]['datatype'] == 'http://www.w3.org/2001/XMLSchema#integer'
+    assert objects[2]['datatype'] == 'http://www.w3.org/2001/XMLSchema#decimal'
+    assert ast['ast']['patterns'][1]['expression'] == {
+        'type': 'operator', 'name': '!=', 'args': [{'type': 'variable', 'value': 's'}, _string('a')],
+    }
+    assert ast['selectVariables'] == ['s']
+    assert ast['orderBy'] == ['(SortCondition DESC(?s))']
+    assert ast['limit'] == 10
+
+
+def test_aggregation_and_select_all_flags():
+    # Jena の hasAggregators() / hasGroupBy() / hasHaving() と isQueryResultStar()。true の場合だけキーを持つ
+    for query in ['SELECT (COUNT(?o) AS ?n) WHERE { ?s ?p ?o }', 'SELECT ?s WHERE { ?s ?p ?o } GROUP BY ?s',
+                  'SELECT ?s WHERE { ?s ?p ?o } HAVING (COUNT(?o) > 1)']:
+        assert parse_sparql(query)['hasAggregation'] is True, query
+    select_all = parse_sparql('SELECT * WHERE { ?s ?p ?o }')
+    assert select_all['isSelectAll'] is True and 'hasAggregation' not in select_all
+    # 副問い合わせの集約関数は外側のクエリに数えない
+    nested = parse_sparql('SELECT ?n WHERE { { SELECT (COUNT(?o) AS ?n) WHERE { ?s ?p ?o } } }')
+    assert 'hasAggregation' not in nested and 'isSelectAll' not in nested
+
+
+def test_unsupported_syntax_uses_fallback():
+    class FakeFallback:
+        def parse_query(self, query_string):
+            return {'fallback': True}
+
+    query = 'SELECT ?s WHERE { ?s ?p ?o FILTER NOT EXISTS { ?s a ?c } }'
+    with pytest.raises(UnsupportedSparqlError):
+        PySparqlAstParser().parse_query(query)
+    parser = PySparqlAstParser(fallback=FakeFallback())
+    assert parser.parse_query(query) == {'fallback': True}
+    assert parser.fallback_count == 1
+
+
+if __name__ == '__main__':
+    if not _java_available():
+        print('java が見つからないため、差分テストを実行できません。')
+        sys.exit(1)
+    differences = find_differences()
+    for path, java, python in differences:
+        print(f"[DIFF] {path}")
+        print(f"  java:   {json.dumps(java, ensure_ascii=False)}")
+        print(f"  python: {json.dumps(python, ensure_ascii=False)}")
+    print(f"\n{len(QUERY_FILES) - len(differences)}/{len(QUERY_FILES)} queries match the Java parser.")
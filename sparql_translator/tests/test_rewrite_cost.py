@@ -0,0 +1,128 @@
+"""
+書き換えのコストの見積もり (rewrite_cost / SparqlRewriter.explain) と予算 (RewriteBudget) のテスト
+- トリプル・UNION・分岐・直積の分岐数・一時変数・プロパティパスの演算子・FILTER が数えられ、
+  各数がそれを生んだ EDOAL の対応（アラインメント中の位置）に帰属することを確認する
+- 予算を超えた書き換えは拒否され（RewriteBudgetExceeded）、on_exceed='factorize' では UNION を直積にしない形式に
+  切り替わることを確認する
+- 同梱の全データセットで、explain() の書き換え結果が rewrite() と同じになることを確認する
+"""
+import glob
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.parser.edoal_parser import (
+    Class, EdoalParser, LogicalConstructor, PathConstructor, Relation,
+)
+from src.parser.py_sparql_parser import PySparqlAstParser, parse_sparql
+from src.rewriter.alternatives import AlternativePolicy
+from src.rewriter.rewrite_cost import RewriteBudget, RewriteBudgetExceeded, RewriteCost, measure_cost
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+DATASETS = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*')))
+PREFIXES = 'PREFIX cmt: <http://cmt#> PREFIX conf: <http://conf#> '
+
+
+@pytest.fixture
+def alignment(make_alignment, make_cell, accepted, english):
+    return make_alignment(
+        make_cell(Class(uri='http://cmt#Accepted'), accepted),
+        make_cell(Class(uri='http://cmt#English'), english),
+        make_cell(Relation(uri='http://cmt#broader'), PathConstructor(operator='transitive',
+                                                                      operands=[Relation(uri='http://conf#broader')])),
+        make_cell(Class(uri='http://cmt#Event'), LogicalConstructor(operator='or', operands=[
+            Class(uri='http://conf#Talk'), Class(uri='http://conf#Demo')])),
+        make_cell(Class(uri='http://cmt#Session'), LogicalConstructor(operator='or', operands=[
+            Class(uri='http://conf#Track'), Class(uri='http://conf#Workshop')])),
+        make_cell(Class(uri='http://cmt#Paper'), Class(uri='http://conf#Paper')))
+
+
+def _parse(query: str) -> dict:
+    return parse_sparql(PREFIXES + query)
+
+
+def test_measure_cost_counts_query_features():
+    cost = measure_cost(_parse('SELECT * WHERE { ?s cmt:p+/^cmt:q ?o . { ?s a cmt:A } UNION { ?s a cmt:B } UNION '
+                               '{ ?s a cmt:C } { ?o a cmt:D } UNION { ?o a cmt:E } FILTER(?o != ?s) }'))
+    assert cost == RewriteCost(triples=6, unions=2, branches=5, product=6, path_operators=3, filters=1)
+    assert measure_cost({'type': 'variable', 'value': 'variable_temp3'}).temp_vars == 1
+
+
+def test_explain_attributes_figures_to_cells(alignment):
+    rewriter = SparqlRewriter(alignment)
+    explanation = rewriter.explain(_parse('SELECT * WHERE { ?p a cmt:Accepted , cmt:English , cmt:Paper . '
+                                          '?p cmt:broader ?q }'))
+    assert explanation.before == RewriteCost(triples=4, product=1)
+    assert explanation.after == RewriteCost(triples=5, product=1, temp_vars=2, path_operators=1, filters=1)
+    rows = {row['cell']: row for row in explanation.cells}
+    assert sorted(rows) == [0, 1, 2, 5]
+    assert rows[0]['entity2'] == 'AttributeDomainRestriction' and rows[0]['triples'] == 2 and rows[0]['temp_vars'] == 1
+    assert rows[1]['filters'] == 1 and rows[1]['temp_vars'] == 1
+    assert rows[2]['path_operators'] == 1 and rows[2]['entity1'] == 'http://cmt#broader'
+    assert rows[5]['applied'] == 1 and rows[5]['triples'] == 0
+    assert explanation.violations == [] and explanation.to_dict()['after']['filters'] == 1
+    # explain() は trace の設定を変えない
+    assert rewriter.rewrite(_parse('SELECT * WHERE { ?p a cmt:Paper }')).trace is None
+
+
+def test_union_product_and_alternative_branches(alignment, make_alignment, make_cell):
+    query = 'SELECT * WHERE { ?e a cmt:Event . ?s a cmt:Session . ?e cmt:in ?s }'
+    product = SparqlRewriter(alignment, union_mode='product').explain(_parse(query))
+    factorized = SparqlRewriter(alignment, union_mode='factorized').explain(_parse(query))
+    assert product.after.product == factorized.after.product == 4
+    assert (product.after.unions, product.after.branches, product.after.triples) == (1, 4, 12)
+    assert (factorized.after.unions, factorized.after.branches, factorized.after.triples) == (2, 4, 5)
+    # 代替の UNION は分岐ごとに対応へ帰属する
+    cells = [make_cell(Class(uri='http://cmt#Paper'), Class(uri='http://conf#Paper'), 0.9),
+             make_cell(Class(uri='http://cmt#Paper'), Class(uri='http://conf#Article'), 0.5)]
+    rewriter = SparqlRewriter(make_alignment(*cells), alternative_policy=AlternativePolicy('union'))
+    rows = rewriter.explain(_parse('SELECT * WHERE { ?p a cmt:Paper }')).cells
+    assert [(row['cell'], row['unions'], row['branches'], row['triples']) for row in rows] == [(0, 1, 1, 1), (1, 0, 1, 1)]
+
+
+def test_budget_rejects_or_factorizes(alignment):
+    query = _parse('SELECT * WHERE { ?e a cmt:Event . ?s a cmt:Session . ?e cmt:in ?s }')
+    with pytest.raises(RewriteBudgetExceeded, match='Budget exceeded: triples 12 > 8') as error:
+        SparqlRewriter(alignment, union_mode='product', budget=RewriteBudget(triples=8)).rewrite(query)
+    assert error.value.explanation.after.triples == 12
+    context = SparqlRewriter(alignment, union_mode='product',
+                             budget=RewriteBudget('factorize', triples=8)).rewrite(query)
+    assert context.cost.triples == 5 and context.ast['ast']['patterns'][0]['type'] == 'group'
+    # 直積の分岐数は形式を変えても減らない
+    with pytest.raises(RewriteBudgetExceeded, match='product 4 > 2'):
+        SparqlRewriter(alignment, budget=RewriteBudget('factorize', product=2)).rewrite(query)
+    explanation = SparqlRewriter(alignment, union_mode='product').explain(query, RewriteBudget('factorize', product=2))
+    assert explanation.union_mode == 'factorized' and explanation.violations == ['Budget exceeded: product 4 > 2']
+
+
+def test_invalid_budget():
+    with pytest.raises(ValueError, match='Unknown cost figure'):
+        RewriteBudget(rows=10)
+    with pytest.raises(ValueError, match='Unknown budget action'):
+        RewriteBudget('truncate', triples=10)
+
+
+@pytest.mark.parametrize('dataset_dir', DATASETS, ids=os.path.basename)
+def test_explain_matches_rewrite_on_bundled_queries(dataset_dir):
+    alignment_files = sorted(glob.glob(os.path.join(dataset_dir, 'alignment', '*.edoal')))
+    query_files = sorted(glob.glob(os.path.join(dataset_dir, 'queries', '*.sparql')))
+    if not alignment_files or not query_files:
+        pytest.skip('no alignment or queries')
+    alignment = EdoalParser(alignment_files[0]).parse()
+    rewriter = SparqlRewriter(alignment)
+    parser = PySparqlAstParser()
+    for path in query_files:
+        ast = parser.parse(path)
+        explanation = rewriter.explain(ast)
+        assert explanation.ast == rewriter.rewrite(ast).ast, path
+        assert all(0 <= row['cell'] < len(alignment.cells) for row in explanation.cells)
@@ -0,0 +1,111 @@
+"""
+書き換えプラン (RewritePlan) のテスト
+- data/alignment/* の全アラインメントについて、テンプレートをインスタンス化した結果が
+  Cell.entity2 を直接展開した結果（一時変数の番号も含む）と同じになることを確認する
+- テンプレートはソース URI ごとに1回だけ作られ、インスタンス化した断片はテンプレートと共有されないことを確認する
+- 深く入れ子になった断片（UNION の中の UNION など）もプレースホルダーを埋められることを確認する
+"""
+import glob
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.parser.edoal_parser import (
+    Alignment, AttributeDomainRestriction, Cell, EdoalParser, IdentifiedEntity, LogicalConstructor,
+)
+from src.parser.py_sparql_parser import parse_sparql
+from src.rewriter.rewrite_plan import OBJECT, SUBJECT, compile_template
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+ALIGNMENT_FILES = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*', 'alignment', '*.edoal')))
+
+
+def _var(name: str) -> dict:
+    return {'type': 'variable', 'value': name}
+
+
+@pytest.mark.skipif(not ALIGNMENT_FILES, reason='data/alignment/*/alignment/*.edoal not found')
+def test_templates_match_direct_expansion_on_all_alignments():
+    compared = 0
+    for alignment_file in ALIGNMENT_FILES:
+        alignment = EdoalParser(alignment_file).parse()
+        for uri, target in SparqlRewriter(alignment).mapping.items():
+            if isinstance(target, IdentifiedEntity):
+                continue
+            for role in ('relation', 'rdf_class'):
+                direct, planned = SparqlRewriter(alignment), SparqlRewriter(alignment)
+                # 既に一時変数を使ったクエリの途中でも、番号が続きから振られることを確かめる
+                direct.temp_var_counter = planned.temp_var_counter = 3
+                if role == 'relation':
+                    expected = direct._expand_predicate(_var('s'), target, _var('o'))
+                    template = planned.plan.relation(uri)
+                else:
+                    expected = direct._expand_complex_entity(_var('s'), target)
+                    template = planned.plan.rdf_class(uri)
+                actual = template.instantiate(_var('s'), _var('o'), planned._generate_temp_var)
+                assert actual == expected, (alignment_file, uri, role)
+                assert planned.temp_var_counter == direct.temp_var_counter, (alignment_file, uri, role)
+                compared += 1
+    assert compared > 0
+
+
+def test_templates_are_compiled_once_and_not_shared():
+    restriction = AttributeDomainRestriction(on_attribute=IdentifiedEntity(uri='http://conf#hasDecision'),
+                                             class_expression=IdentifiedEntity(uri='http://conf#Acceptance'))
+    union = LogicalConstructor(operator='or', operands=[IdentifiedEntity(uri='http://conf#Paper'),
+                                                       IdentifiedEntity(uri='http://conf#Poster')])
+    cells = [Cell(entity1=IdentifiedEntity(uri='http://cmt#Accepted'), entity2=restriction, relation='=', measure=1.0),
+             Cell(entity1=IdentifiedEntity(uri='http://cmt#Paper'), entity2=union, relation='=', measure=1.0)]
+    rewriter = SparqlRewriter(Alignment(onto1='http://cmt', onto2='http://conf', cells=cells))
+    calls = []
+    compile_class = rewriter.plan._compile_class
+    rewriter.plan._compile_class = lambda uri, entity: calls.append(uri) or compile_class(uri, entity)
+
+    query = 'SELECT * WHERE { ?a a <http://cmt#Accepted> . ?b a <http://cmt#Accepted> . ?b a <http://cmt#Paper> }'
+    first = rewriter.walk(parse_sparql(query))
+    second = rewriter.walk(parse_sparql(query))
+    assert sorted(calls) == ['http://cmt#Accepted', 'http://cmt#Paper']
+    assert len(rewriter.plan) == 2
+
+    # 同じテンプレートから作った断片は別々の一時変数を持つ
+    triples = first['ast']['patterns'][0]['patterns'][0]['triples']
+    temp_vars = [t['object']['value'] for t in triples if t['predicate']['value'] == 'http://conf#hasDecision']
+    assert temp_vars == ['variable_temp0', 'variable_temp1']
+    # visit_bgp は UNION の各分岐にトリプルを追加するが、テンプレート自体は変わらない
+    template = rewriter.plan.rdf_class('http://cmt#Paper')
+    assert all(len(p['triples']) == 1 for p in template.fragments[0]['patterns'])
+    # 一時変数の番号はクエリごとに 0 から振られるので、同じクエリは同じ結果になる
+    assert second == first and second is not first
+    assert rewriter.rewrite(parse_sparql(query)).temp_var_counter == 2
+
+
+def test_deeply_nested_fragments_are_filled():
+    def expand(subject, obj, new_var):
+        fragment = {'type': 'triple', 'subject': subject, 'predicate': {'type': 'uri', 'value': 'http://conf#p'},
+                    'object': new_var()}
+        for _ in range(100):
+            fragment = {'type': 'union', 'patterns': [{'type': 'bgp', 'triples': [fragment]}]}
+        return [fragment]
+
+    template = compile_template(expand, {'kind': 'class'})
+    filled = template.fill(_var('s'), _var('o'), [_var('variable_temp0')])
+    inner, depth = filled[0], 0
+    while inner['type'] == 'union':
+        inner, depth = inner['patterns'][0]['triples'][0], depth + 1
+    assert depth == 100 and inner['subject'] == _var('s') and inner['object'] == _var('variable_temp0')
+    assert template.triple_count == 1 and template.fresh_count == 1
+    # テンプレート自体はプレースホルダーのまま
+    inner = template.fragments[0]
+    while inner['type'] == 'union':
+        inner = inner['patterns'][0]['triples'][0]
+    assert inner['subject'] is SUBJECT and inner['object'] is not OBJECT
@@ -0,0 +1,119 @@
+"""
+書き換えの記録 (rewrite_trace) のテスト
+- trace=False（既定）では書き換え中に何も出力せず、last_trace が None で、URI の置換ごとに実行中のコンテキストを引かないことを確認する
+- trace=True では URI の置換・述語/rdf:type の展開・推移的プロパティのイベント（ソース URI、対応の種類、
+  生成したトリプル数、一時変数）が walk() ごとに記録され、JSON に書き出せることを確認する
+- print_trace が従来と同じ "[Rewrite] ..." の形式で表示することを確認する
+"""
+import json
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.parser.edoal_parser import (
+    Alignment, AttributeDomainRestriction, AttributeOccurenceRestriction, AttributeValueRestriction, Cell,
+    IdentifiedEntity, PathConstructor, Property, Relation,
+)
+from src.parser.py_sparql_parser import parse_sparql
+from src.rewriter.rewrite_trace import format_event, print_trace, template_event
+from src.rewriter import sparql_rewriter
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+QUERY = ('SELECT * WHERE { ?p a <http://cmt#Accepted> . ?p <http://cmt#title> ?t . '
+         '?p <http://cmt#cites> ?q . ?p a <http://cmt#Accepted> }')
+
+
+def _alignment() -> Alignment:
+    accepted = AttributeDomainRestriction(on_attribute=IdentifiedEntity(uri='http://conf#hasDecision'),
+                                          class_expression=IdentifiedEntity(uri='http://conf#Acceptance'))
+    cites = PathConstructor(operator='transitive', operands=[Relation(uri='http://conf#references')])
+    cells = [Cell(entity1=IdentifiedEntity(uri='http://cmt#Accepted'), entity2=accepted, relation='=', measure=1.0),
+             Cell(entity1=IdentifiedEntity(uri='http://cmt#title'), entity2=IdentifiedEntity(uri='http://conf#title'),
+                  relation='=', measure=1.0),
+             Cell(entity1=IdentifiedEntity(uri='http://cmt#cites'), entity2=cites, relation='=', measure=1.0)]
+    return Alignment(onto1='http://cmt', onto2='http://conf', cells=cells)
+
+
+def test_disabled_trace_prints_nothing(capsys):
+    rewriter = SparqlRewriter(_alignment())
+    rewriter.walk(parse_sparql(QUERY))
+    assert rewriter.last_trace is None
+    assert capsys.readouterr().out == ''
+
+
+def test_unsupported_expansions_warn_only_when_verbose(capsys, make_alignment, make_cell):
+    unknown = AttributeValueRestriction(on_attribute=Property(uri='http://conf#language'),
+                                        comparator='http://ns.inria.org/edoal/1.0/#matches', value='en')
+    counted = AttributeOccurenceRestriction(on_attribute=Property(uri='http://conf#author'),
+                                            comparator='http://ns.inria.org/edoal/1.0/#equals', value=2)
+    alignment = make_alignment(make_cell(IdentifiedEntity(uri='http://cmt#English'), unknown),
+                               make_cell(IdentifiedEntity(uri='http://cmt#Solo'), counted))
+    query = 'SELECT * WHERE { ?p a <http://cmt#English> , <http://cmt#Solo> }'
+    SparqlRewriter(alignment).walk(parse_sparql(query))
+    assert capsys.readouterr().out == ''
+    SparqlRewriter(alignment, verbose=True).walk(parse_sparql(query))
+    out = capsys.readouterr().out
+    assert '[Warning] Unknown comparator: http://ns.inria.org/edoal/1.0/#matches' in out
+    assert '[Warning] AttributeOccurenceRestriction with comparator' in out
+
+
+def test_events_are_recorded_per_walk(capsys):
+    rewriter = SparqlRewriter(_alignment(), trace=True)
+    rewriter.walk(parse_sparql(QUERY))
+    assert capsys.readouterr().out == ''
+    events = rewriter.last_trace.events
+    assert [(e['kind'], e['source']) for e in events] == [
+        ('class', 'http://cmt#Accepted'), ('simple', 'http://cmt#title'),
+        ('transitive', 'http://cmt#cites'), ('class', 'http://cmt#Accepted')]
+    assert events[0] == {'kind': 'class', 'source': 'http://cmt#Accepted', 'target': None,
+                         'entity': 'AttributeDomainRestriction', 'triples': 2, 'temp_vars': ['variable_temp0']}
+    # 同じグループ内の同じ展開は一時変数を再利用する
+    assert events[3]['temp_vars'] == ['variable_temp0']
+    assert events[1]['target'] == 'http://conf#title'
+    assert events[2]['entity'] == 'PathConstructor(transitive)' and events[2]['triples'] == 1
+    assert json.loads(rewriter.last_trace.to_json()) == {'events': events}
+
+    rewriter.walk(parse_sparql('SELECT * WHERE { ?s <http://cmt#title> ?t }'))
+    assert [e['kind'] for e in rewriter.last_trace] == ['simple']
+
+
+def test_disabled_trace_does_not_look_up_the_context_per_uri(monkeypatch):
+    rewriter = SparqlRewriter(_alignment())
+    lookups = []
+    original = sparql_rewriter.current_context
+    monkeypatch.setattr(sparql_rewriter, 'current_context', lambda: lookups.append(1) or original())
+    # 置換する URI が増えても、コンテキストを引く回数（グループの出入りの分）は変わらない
+    rewriter.walk(parse_sparql('SELECT * WHERE { ?s <http://cmt#title> ?t }'))
+    one = len(lookups)
+    query = parse_sparql('SELECT * WHERE { %s }' % ' . '.join(f'?s{i} <http://cmt#title> ?t' for i in range(10)))
+    rewriter.walk(query)
+    assert len(lookups) == 2 * one and rewriter.last_trace is None
+    # explain() の書き換えは記録する（終われば、また引かなくなる）
+    assert [cell['applied'] for cell in rewriter.explain(query).cells] == [10]
+    assert rewriter._active_traces == 0
+
+
+def test_print_trace_keeps_the_console_format(capsys):
+    rewriter = SparqlRewriter(_alignment(), trace=True)
+    rewriter.walk(parse_sparql(QUERY))
+    print_trace(rewriter.last_trace)
+    assert capsys.readouterr().out.splitlines() == [
+        '  [Rewrite] Complex rewrite for object: http://cmt#Accepted',
+        '  [Rewrite] Simple URI rewrite: http://cmt#title -> http://conf#title',
+        '  [Rewrite] Transitive property: http://cmt#cites -> http://conf#references+',
+        '  [Rewrite] Complex rewrite for object: http://cmt#Accepted',
+    ]
+    assert format_event({**template_event('relation', 'http://cmt#p', Relation(uri='x')),
+                         'triples': 1, 'temp_vars': []}) == 'Complex rewrite for predicate: http://cmt#p'
+
+
+def test_unknown_trace_kind_is_rejected():
+    with pytest.raises(ValueError, match='trace kind'):
+        template_event('path', 'http://cmt#p', Relation(uri='x'))
@@ -0,0 +1,81 @@
+"""
+同じ展開の一時変数の再利用と、重複トリプルの除去のテスト
+- 同じグループ内で同じ主語・目的語に対する同じ展開（AttributeDomainRestriction / compose など）は
+  一時変数とトリプルを再利用し、重複したトリプルは出力されないことを確認する
+- 主語が違う展開や、入れ子のグループ（OPTIONAL など）の中の展開では一時変数を共有しないことを確認する
+"""
+import contextlib
+import io
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.parser.edoal_parser import (
+    Alignment, AttributeDomainRestriction, Cell, IdentifiedEntity, LogicalConstructor, PathConstructor,
+)
+from src.parser.py_sparql_parser import parse_sparql
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+PREFIX = 'PREFIX cmt: <http://cmt#> '
+
+
+def _rewriter() -> SparqlRewriter:
+    accepted = AttributeDomainRestriction(on_attribute=IdentifiedEntity(uri='http://conf#hasDecision'),
+                                          class_expression=IdentifiedEntity(uri='http://conf#Acceptance'))
+    written_by = LogicalConstructor(operator='or', operands=[
+        PathConstructor(operator='compose', operands=[IdentifiedEntity(uri='http://conf#hasContribution'),
+                                                      IdentifiedEntity(uri='http://conf#author')]),
+        IdentifiedEntity(uri='http://conf#writtenBy'),
+    ])
+    cells = [Cell(entity1=IdentifiedEntity(uri='http://cmt#Accepted'), entity2=accepted, relation='=', measure=1.0),
+             Cell(entity1=IdentifiedEntity(uri='http://cmt#writtenBy'), entity2=written_by, relation='=', measure=1.0)]
+    return SparqlRewriter(Alignment(onto1='http://cmt', onto2='http://conf', cells=cells))
+
+
+def _rewrite(query: str) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _rewriter().walk(parse_sparql(PREFIX + query))['ast']
+
+
+def _temp_vars(node) -> set:
+    if isinstance(node, list):
+        return set().union(*(_temp_vars(item) for item in node)) if node else set()
+    if not isinstance(node, dict):
+        return set()
+    found = {node['value']} if node.get('type') == 'variable' and 'temp' in str(node.get('value')) else set()
+    return found.union(*(_temp_vars(value) for value in node.values()))
+
+
+def test_identical_expansions_share_temp_vars_and_triples():
+    ast = _rewrite('SELECT * WHERE { ?p a cmt:Accepted . ?p cmt:title ?t . ?p a cmt:Accepted }')
+    triples = ast['patterns'][0]['triples']
+    assert [t['predicate']['value'].split('#')[1] for t in triples] == ['hasDecision', 'type', 'title']
+    assert _temp_vars(ast) == {'variable_temp0'}
+
+
+def test_identical_compose_expansions_are_reused_inside_unions():
+    ast = _rewrite('SELECT * WHERE { ?p cmt:writtenBy ?a . ?p cmt:writtenBy ?a }')
+    union = ast['patterns'][0]
+    assert union['type'] == 'union' and len(union['patterns']) == 2
+    compose = union['patterns'][0]['triples']
+    assert len(compose) == 2
+    assert _temp_vars(ast) == {'variable_temp0'}
+
+
+def test_different_subjects_and_nested_groups_get_their_own_temp_vars():
+    ast = _rewrite('SELECT * WHERE { ?p a cmt:Accepted . ?q a cmt:Accepted }')
+    assert _temp_vars(ast) == {'variable_temp0', 'variable_temp1'}
+    # OPTIONAL の中は別のグループなので、外側の一時変数とは結合しない
+    ast = _rewrite('SELECT * WHERE { ?p a cmt:Accepted OPTIONAL { ?p a cmt:Accepted } }')
+    assert _temp_vars(ast['patterns'][0]) == {'variable_temp0'}
+    assert _temp_vars(ast['patterns'][1]) == {'variable_temp1'}
+
+
+def test_exact_duplicate_triples_are_removed():
+    ast = _rewrite('SELECT * WHERE { ?s cmt:title ?t . ?s cmt:title ?t ; cmt:title ?u }')
+    assert [t['object']['value'] for t in ast['patterns'][0]['triples']] == ['t', 'u']
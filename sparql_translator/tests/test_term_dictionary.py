@@ -0,0 +1,116 @@
+"""
+URI の辞書 (TermDictionary / TERMS) のテスト
+- クエリのパーサー・EdoalParser・ワイヤーフォーマットの読み込みが同じ URI に同じ文字列オブジェクトを使い、
+  書き換え後の AST の URI もアラインメントの URI と同じオブジェクトになることを確認する
+- 'a' と rdf:type の IRI が RDF_TYPE そのものになることを確認する
+"""
+import glob
+import json
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common import ast_wire
+from src.common.ast_wire import decode, encode
+from src.common.java_launcher import default_project_root
+from src.common.term_dictionary import RDF_TYPE, TERMS, TermDictionary
+from src.parser.edoal_parser import EdoalParser
+from src.parser.py_sparql_parser import parse_sparql
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+GBO_GMO = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', 'gbo-gmo', 'alignment', '*.edoal')))
+QUERY = ('PREFIX ex: <http://example.org/ns#> SELECT * WHERE { ?s a ex:Thing ; ex:p ?o . '
+         '?o <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://example.org/ns#Thing> '
+         'FILTER(?o != "x"^^<http://example.org/ns#dt>) }')
+
+
+def _uris(ast) -> list:
+    """AST の uri ノードの値（出現順）。"""
+    found, stack = [], [ast]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if item.get('type') == 'uri':
+                found.append(item['value'])
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+    return found
+
+
+def test_intern_returns_one_object_per_uri():
+    terms = TermDictionary()
+    first = terms.intern(''.join(['http://example.org/', 'a']))
+    second = terms.intern(''.join(['http://example.org/', 'a']))
+    assert first is second and len(terms) == 1 and 'http://example.org/a' in terms
+    assert TERMS.intern(''.join(RDF_TYPE)) is RDF_TYPE
+
+
+def test_dictionary_is_bounded_and_keeps_pinned_terms():
+    terms = TermDictionary([RDF_TYPE], max_size=3)
+    first = terms.intern(''.join(['http://example.org/', 'a']))
+    terms.intern('http://example.org/b')
+    assert len(terms) == 3
+    # 上限に達したら空にしてから登録する。rdf:type は残る
+    terms.intern('http://example.org/c')
+    assert len(terms) == 2 and 'http://example.org/a' not in terms
+    assert terms.intern(''.join(RDF_TYPE)) is RDF_TYPE
+    # 作り直された後も、等しい文字列が返る
+    again = terms.intern(''.join(['http://example.org/', 'a']))
+    assert again == first and again is not first
+    terms.clear()
+    assert len(terms) == 1 and RDF_TYPE in terms
+
+
+def test_parsed_queries_share_uri_objects():
+    first, second = _uris(parse_sparql(QUERY)), _uris(parse_sparql(QUERY))
+    assert first == second and all(a is b for a, b in zip(first, second))
+    # 'a' も IRI で書いた rdf:type も RDF_TYPE そのもの
+    triples = parse_sparql(QUERY)['ast']['patterns'][0]['triples']
+    assert [t['predicate']['value'] is RDF_TYPE for t in triples] == [True, False, True]
+    # 別の辞書を渡せば共有しない
+    separate = _uris(parse_sparql(QUERY, terms=TermDictionary()))
+    assert separate == first and separate[1] is not first[1]
+
+
+@pytest.mark.parametrize('wire_format', ['json', 'compact', 'cbor'])
+def test_wire_decoding_interns_uris(wire_format):
+    ast = json.loads(json.dumps(parse_sparql(QUERY)))
+    decoded = decode(encode(ast, wire_format), wire_format)
+    assert decoded == ast
+    assert all(uri is TERMS.intern(uri) for uri in _uris(decoded))
+    literal = decoded['ast']['patterns'][1]['expression']['args'][1]
+    assert literal['datatype'] is TERMS.intern('http://example.org/ns#dt')
+
+
+@pytest.mark.parametrize('wire_format', ['json', 'compact', 'cbor'])
+def test_wire_decoding_interns_only_uris(wire_format, monkeypatch):
+    terms = TermDictionary()
+    monkeypatch.setattr(ast_wire, 'TERMS', terms)
+    ast = {'type': 'bgp', 'triples': [{
+        'subject': {'type': 'variable', 'value': 'subject_variable'},
+        'predicate': {'type': 'uri', 'value': 'http://example.org/ns#p'},
+        'object': {'type': 'literal', 'value': 'a literal value', 'datatype': 'http://example.org/ns#dt'},
+    }] * 2}
+    assert decode(encode(ast, wire_format), wire_format) == ast
+    # リテラルの値・変数名・キー名は辞書に入らない
+    assert len(terms) == 2 and 'http://example.org/ns#p' in terms and 'http://example.org/ns#dt' in terms
+
+
+@pytest.mark.skipif(not GBO_GMO, reason='data/alignment/gbo-gmo not found')
+def test_alignment_query_and_rewrite_share_uri_objects():
+    alignment = EdoalParser(GBO_GMO[0]).parse()
+    source, target = next((c.entity1.uri, c.entity2.uri) for c in alignment.cells
+                          if type(c.entity1).__name__ == 'Class' and type(c.entity2).__name__ == 'Class')
+    ast = parse_sparql(f'SELECT * WHERE {{ ?s a <{source}> }}')
+    assert _uris(ast)[1] is source
+    assert _uris(SparqlRewriter(alignment).walk(ast))[1] is target
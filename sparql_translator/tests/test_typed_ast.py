@@ -0,0 +1,149 @@
+"""
+型付きの AST (typed_ast) のテスト
+- to_typed() / to_dict() で dict の AST（JSON のスキーマ）と相互に変換でき、往復で元と同じ JSON に戻ること、
+  対象外の型や項目が定義と合わないノードは dict のまま残ることを確認する
+- ノードが読み取り専用の Mapping として dict と同じように使え、変更できないことを確認する
+- 同梱の全データセットで、型付きの AST を書き換えた結果が dict の AST を書き換えた結果と同じになり、
+  入力が変わらず、置換したノードが型付きのまま残ることを確認する
+"""
+import glob
+import json
+import os
+import pickle
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.common.typed_ast import (
+    NODE_CLASSES, Bgp, Filter, Group, Literal, Node, Optional, PathTriple, Triple, Union, Uri, Variable, to_dict,
+    to_typed,
+)
+from src.parser.edoal_parser import Alignment, Cell, EdoalParser, IdentifiedEntity, LogicalConstructor
+from src.parser.py_sparql_parser import PySparqlAstParser, parse_sparql
+from src.rewriter.py_ast_serializer import PyAstSerializer
+from src.rewriter.rewrite_cost import measure_cost
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+REPO_ROOT = default_project_root()
+DATASETS = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*')))
+QUERY = ('PREFIX ex: <http://example.org/ns#> SELECT * WHERE { ?s ex:p "x"@en , 3 ; ex:q+ ?o '
+         'OPTIONAL { ?o a ex:C } { ?s a ex:A } UNION { ?s a ex:B } FILTER(?o != ex:x) BIND(1 AS ?z) }')
+
+
+def _alignment() -> Alignment:
+    union = LogicalConstructor(operator='or', operands=[IdentifiedEntity(uri='http://conf#Paper'),
+                                                       IdentifiedEntity(uri='http://conf#Poster')])
+    cells = [Cell(entity1=IdentifiedEntity(uri='http://cmt#title'), entity2=IdentifiedEntity(uri='http://conf#title'),
+                  relation='=', measure=1.0),
+             Cell(entity1=IdentifiedEntity(uri='http://cmt#Paper'), entity2=union, relation='=', measure=1.0)]
+    return Alignment(onto1='http://cmt', onto2='http://conf', cells=cells)
+
+
+def _nodes(value) -> list:
+    """AST の中の type を持つノード（dict / 型付き）のリスト。"""
+    nodes, stack = [], [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, (dict, Node)):
+            if 'type' in item:
+                nodes.append(item)
+            stack.extend(item.values())
+    return nodes
+
+
+def test_round_trip_keeps_the_json_schema():
+    ast = parse_sparql(QUERY)
+    typed = to_typed(ast)
+    assert isinstance(typed, dict) and isinstance(typed['ast'], Group)
+    assert {type(node) for node in _nodes(typed)} >= {Group, Bgp, Triple, PathTriple, Union, Optional, Filter, Uri,
+                                                      Variable, Literal}
+    # パスや式の演算子・bind など対象外の型は dict のまま（子の URI・変数は型付き）
+    assert isinstance(typed['ast']['patterns'][0]['triples'][-1]['path'], dict)
+    expression = [node for node in _nodes(typed) if node['type'] == 'filter'][0]['expression']
+    assert isinstance(expression, dict) and isinstance(expression['args'][1], Uri)
+    assert to_dict(typed) == ast and json.dumps(to_dict(typed)) == json.dumps(ast)
+    assert typed == ast and to_typed(typed) == typed
+    # 入力は変更しない
+    assert json.dumps(ast) == json.dumps(parse_sparql(QUERY))
+
+
+def test_nodes_that_do_not_fit_stay_dicts():
+    extra = {'type': 'uri', 'value': 'http://x', 'note': 1}
+    missing = {'type': 'triple', 'subject': {'type': 'variable', 'value': 's'}}
+    typed = to_typed([extra, missing, {'type': 'literal', 'value': 'x'}])
+    assert typed[0] == extra and type(typed[0]) is dict
+    assert type(typed[1]) is dict and isinstance(typed[1]['subject'], Variable)
+    assert isinstance(typed[2], Literal) and 'datatype' not in typed[2] and len(typed[2]) == 2
+    assert set(NODE_CLASSES) == {'group', 'bgp', 'triple', 'path_triple', 'union', 'optional', 'filter', 'uri',
+                                 'variable', 'literal'}
+
+
+def test_nodes_are_read_only_mappings():
+    triple = Triple(Variable('s'), Uri('http://p'), Literal('x', 'http://dt', 'en'))
+    assert triple['type'] == 'triple' and triple.get('predicate') == {'type': 'uri', 'value': 'http://p'}
+    assert list(triple) == ['type', 'subject', 'predicate', 'object'] and 'object' in triple and 'x' not in triple
+    assert triple.get('items') is None and triple.get('path', 0) == 0
+    with pytest.raises(KeyError):
+        triple['path']
+    with pytest.raises(AttributeError, match='immutable'):
+        triple.subject = Variable('t')
+    changed = triple.replace(subject=Variable('t'))
+    assert changed['subject']['value'] == 't' and triple['subject']['value'] == 's'
+    assert pickle.loads(pickle.dumps(triple)) == triple
+    assert triple != changed and triple == to_dict(triple) and to_dict(triple) == triple
+    assert repr(Uri('http://p')) == "Uri(value='http://p')"
+
+
+def test_deeply_nested_queries_convert_without_recursion():
+    inner = {'type': 'group', 'patterns': []}
+    for _ in range(sys.getrecursionlimit() + 100):
+        inner = {'type': 'group', 'patterns': [{'type': 'optional', 'pattern': inner}]}
+    typed = to_typed(inner)
+    assert isinstance(typed, Group) and isinstance(typed.patterns[0], Optional)
+    assert type(to_dict(typed)) is dict
+
+
+def test_rewrite_keeps_replaced_nodes_typed():
+    query = parse_sparql('SELECT * WHERE { ?s <http://cmt#title> ?t . ?s <http://other#p> ?o }')
+    rewriter = SparqlRewriter(_alignment())
+    typed = to_typed(query)
+    context = rewriter.rewrite(typed)
+    triples = context.ast['ast']['patterns'][0]['triples']
+    assert context.changed and isinstance(context.ast['ast'], Group) and isinstance(triples[0], Triple)
+    assert triples[0]['predicate'] == Uri('http://conf#title')
+    assert triples[1] is typed['ast']['patterns'][0]['triples'][1]
+    assert to_dict(context.ast) == rewriter.rewrite(query).ast
+    # 展開で新しく作るノードは dict（to_typed でそろえられる）
+    expanded = rewriter.rewrite(to_typed(parse_sparql('SELECT * WHERE { ?s a <http://cmt#Paper> }'))).ast
+    assert type(expanded['ast']['patterns'][0]) is dict and isinstance(to_typed(expanded)['ast']['patterns'][0], Union)
+    unchanged = to_typed(parse_sparql('SELECT * WHERE { ?s <http://other#p> ?o }'))
+    assert rewriter.rewrite(unchanged).ast is unchanged
+
+
+@pytest.mark.parametrize('dataset_dir', DATASETS, ids=os.path.basename)
+def test_typed_rewrite_matches_dict_rewrite_on_bundled_queries(dataset_dir):
+    alignment_files = sorted(glob.glob(os.path.join(dataset_dir, 'alignment', '*.edoal')))
+    query_files = sorted(glob.glob(os.path.join(dataset_dir, 'queries', '*.sparql')))
+    if not alignment_files or not query_files:
+        pytest.skip('no alignment or queries')
+    rewriter = SparqlRewriter(EdoalParser(alignment_files[0]).parse())
+    parser = PySparqlAstParser()
+    serializer = PyAstSerializer()
+    for path in query_files:
+        ast = parser.parse(path)
+        typed = to_typed(ast)
+        expected, context = rewriter.rewrite(ast), rewriter.rewrite(typed)
+        assert to_dict(context.ast) == expected.ast and context.changed == expected.changed, path
+        assert serializer.serialize(context.ast) == serializer.serialize(expected.ast), path
+        assert measure_cost(context.ast) == measure_cost(expected.ast), path
+        assert to_dict(typed) == ast, path
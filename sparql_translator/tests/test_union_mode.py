@@ -0,0 +1,95 @@
+"""
+BGP 内の複数の UNION の出力形式 (SparqlRewriter の union_mode) のテスト
+- 'product' は各 UNION の直積、'factorized' は共通のトリプルと各 UNION を並べたグループになり、
+  直積の各分岐がちょうど factorized の各 UNION から1分岐ずつ選んだ組み合わせに一致することを確認する
+- 'auto' は直積の分岐数が union_product_limit を超える場合だけ factorized になることを確認する
+"""
+import contextlib
+import io
+import itertools
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.parser.edoal_parser import Alignment, Cell, IdentifiedEntity, LogicalConstructor
+from src.parser.py_sparql_parser import parse_sparql
+from src.rewriter.py_ast_serializer import PyAstSerializer
+from src.rewriter.sparql_rewriter import SparqlRewriter
+
+
+def _alignment(disjunctions: int, branches: int) -> Alignment:
+    """cmt:C<i> -> conf:C<i>_0 ∪ ... ∪ conf:C<i>_<branches-1> の対応を disjunctions 個持つアラインメント。"""
+    cells = []
+    for i in range(disjunctions):
+        union = LogicalConstructor(operator='or', operands=[IdentifiedEntity(uri=f'http://conf#C{i}_{j}')
+                                                            for j in range(branches)])
+        cells.append(Cell(entity1=IdentifiedEntity(uri=f'http://cmt#C{i}'), entity2=union, relation='=', measure=1.0))
+    return Alignment(onto1='http://cmt', onto2='http://conf', cells=cells)
+
+
+def _query(disjunctions: int) -> str:
+    types = ' '.join(f'?x{i} a <http://cmt#C{i}> .' for i in range(disjunctions))
+    return f'SELECT * WHERE {{ ?x0 <http://cmt#p> ?x1 . {types} }}'
+
+
+def _rewrite(disjunctions: int, branches: int, **options) -> dict:
+    rewriter = SparqlRewriter(_alignment(disjunctions, branches), **options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return rewriter.walk(parse_sparql(_query(disjunctions)))['ast']['patterns'][0]
+
+
+def _key(triple: dict) -> tuple:
+    return tuple(triple[role]['value'] for role in ('subject', 'predicate', 'object'))
+
+
+def test_factorized_is_the_product_without_duplication():
+    product = _rewrite(3, 3, union_mode='product')
+    factorized = _rewrite(3, 3, union_mode='factorized')
+
+    assert product['type'] == 'union' and len(product['patterns']) == 27
+    assert factorized['type'] == 'group'
+    shared, *unions = factorized['patterns']
+    assert shared == {'type': 'bgp', 'triples': [{'type': 'triple', 'subject': {'type': 'variable', 'value': 'x0'},
+                                                  'predicate': {'type': 'uri', 'value': 'http://cmt#p'},
+                                                  'object': {'type': 'variable', 'value': 'x1'}}]}
+    assert [u['type'] for u in unions] == ['union'] * 3
+    assert all(len(u['patterns']) == 3 for u in unions)
+
+    # 直積の各分岐 = 共通のトリプル + 各 UNION から1分岐ずつ
+    expected = {frozenset(map(_key, shared['triples'] + [t for branch in choice for t in branch['triples']]))
+                for choice in itertools.product(*(u['patterns'] for u in unions))}
+    assert {frozenset(map(_key, branch['triples'])) for branch in product['patterns']} == expected
+
+
+def test_factorized_output_round_trips_through_the_serializer():
+    ast = {'queryType': 'SELECT', 'selectVariables': [], 'prefixes': {'conf': 'http://conf#'},
+           'ast': {'type': 'group', 'patterns': [_rewrite(2, 2, union_mode='factorized')]}}
+    query = PyAstSerializer().serialize(ast)
+    assert query.count('UNION') == 2
+    assert query.count('?x0  <http://cmt#p>  ?x1') == 1
+    assert parse_sparql(query)['ast']['patterns'][0]['patterns'][1]['type'] == 'union'
+
+
+@pytest.mark.parametrize('limit, expected', [(27, 'union'), (26, 'group')])
+def test_auto_switches_above_the_product_limit(limit, expected):
+    assert _rewrite(3, 3, union_product_limit=limit)['type'] == expected
+
+
+def test_single_union_keeps_shared_triples_outside_when_factorized():
+    product = _rewrite(1, 2, union_mode='product')
+    assert all(len(branch['triples']) == 2 for branch in product['patterns'])
+    factorized = _rewrite(1, 2, union_mode='factorized')
+    assert [p['type'] for p in factorized['patterns']] == ['bgp', 'union']
+    assert all(len(branch['triples']) == 1 for branch in factorized['patterns'][1]['patterns'])
+
+
+def test_unknown_union_mode_is_rejected():
+    with pytest.raises(ValueError, match='union mode'):
+        SparqlRewriter(_alignment(1, 2), union_mode='cartesian')
@@ -0,0 +1,174 @@
+"""
+UNION の冗長な分岐の除去 (union_pruning / SparqlRewriter(union_pruning=...)) のテスト
+- 重複する分岐、他の分岐のトリプルを含む分岐、一時変数の名前だけが違う分岐が取り除かれ、分岐が1つになった
+  UNION はその分岐に置き換わることを確認する
+- UNION の外にも現れる一時変数や、FILTER を含む分岐、投影される変数の集合が違う分岐は残ることを確認する
+- mode ごとに対象のクエリ（'distinct' は SELECT DISTINCT だけ）が変わり、取り除いた数が context.pruned_branches に
+  残ること、未知の mode は ValueError になることを確認する
+- 集約・GROUP BY・HAVING を持つクエリや、SELECT * / 一時変数を射影するクエリはどの mode でも対象外になることを確認する
+- 同梱の全データセットで、取り除いた後の AST がシリアライズでき、入力が変わらないことを確認する
+"""
+import glob
+import json
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.common.typed_ast import to_dict, to_typed
+from src.parser.edoal_parser import Alignment, Cell, Class, EdoalParser, LogicalConstructor, Relation
+from src.parser.py_sparql_parser import PySparqlAstParser, parse_sparql
+from src.rewriter.py_ast_serializer import PyAstSerializer
+from src.rewriter.rewrite_cost import measure_cost
+from src.rewriter.sparql_rewriter import SparqlRewriter
+from src.rewriter.union_pruning import UNION_PRUNING_MODES, UnionPruner, applies_to, check_union_pruning
+
+REPO_ROOT = default_project_root()
+DATASETS = sorted(glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*')))
+PREFIXES = 'PREFIX cmt: <http://cmt#> PREFIX conf: <http://conf#> '
+
+
+def _parse(query: str) -> dict:
+    return parse_sparql(PREFIXES + query)
+
+
+def _prune(query: str):
+    """query の AST から分岐を取り除き、(結果の WHERE のパターン, 取り除いた数) を返す。"""
+    pruner = UnionPruner()
+    ast = pruner.prune(_parse(query))
+    return ast['ast']['patterns'], pruner.pruned
+
+
+def _triples(group) -> list:
+    """BGP だけからなるグループのトリプル。"""
+    return [triple for bgp in group['patterns'] for triple in bgp['triples']]
+
+
+def _alignment() -> Alignment:
+    # cmt:Paper は conf:Paper / conf:Article / conf:Paper の UNION（重複する分岐を生む）
+    operands = [Class(uri='http://conf#Paper'), Class(uri='http://conf#Article'), Class(uri='http://conf#Paper')]
+    paper = LogicalConstructor(operator='or', operands=operands)
+    cells = [Cell(entity1=Class(uri='http://cmt#Paper'), entity2=paper, relation='=', measure=1.0),
+             Cell(entity1=Relation(uri='http://cmt#title'), entity2=Relation(uri='http://conf#title'), relation='=',
+                  measure=1.0)]
+    return Alignment(onto1='http://cmt', onto2='http://conf', cells=cells)
+
+
+def test_duplicate_and_subsumed_branches_are_dropped():
+    patterns, pruned = _prune('SELECT ?s ?o WHERE { { ?s cmt:p ?o } UNION { ?s cmt:q ?o } UNION { ?s cmt:p ?o } '
+                              'UNION { ?s cmt:p ?o . ?o a cmt:C } }')
+    assert pruned == 2
+    assert [_triples(branch)[0]['predicate']['value'] for branch in patterns[0]['patterns']] == ['http://cmt#p',
+                                                                                               'http://cmt#q']
+    # 分岐が1つになった UNION はその分岐に置き換わる
+    patterns, pruned = _prune('SELECT ?s ?o WHERE { { ?s cmt:p ?o } UNION { ?o a cmt:C . ?s cmt:p ?o } }')
+    assert pruned == 1 and patterns[0]['type'] == 'group' and len(_triples(patterns[0])) == 1
+
+
+def test_temp_variables_local_to_the_union_are_existential():
+    # 一時変数の名前だけが違う分岐は重複
+    patterns, pruned = _prune('SELECT ?s ?o WHERE { { ?s cmt:p ?variable_temp0 } UNION { ?s cmt:p ?variable_temp1 } }')
+    assert pruned == 1 and patterns[0]['type'] == 'group'
+    # 一時変数を具体的な項にした分岐は、一時変数の分岐に包含される
+    patterns, pruned = _prune('SELECT ?s ?o WHERE { { ?s cmt:p cmt:x } UNION { ?s cmt:p ?variable_temp0 } }')
+    assert pruned == 1 and _triples(patterns[0])[0]['object']['value'] == 'variable_temp0'
+    # UNION の外にも現れる一時変数は固定する
+    _, pruned = _prune('SELECT ?s WHERE { ?variable_temp1 cmt:r ?s '
+                       '{ ?s cmt:p ?variable_temp0 } UNION { ?s cmt:p ?variable_temp1 } }')
+    assert pruned == 0
+    # 通常の変数は名前が違えば別の解になる
+    _, pruned = _prune('SELECT ?s ?o WHERE { { ?s cmt:p ?a } UNION { ?s cmt:p ?b } }')
+    assert pruned == 0
+
+
+def test_branches_that_are_not_plain_triples_are_kept():
+    _, pruned = _prune('SELECT ?s ?o WHERE { { ?s cmt:p ?o } UNION { ?s cmt:p ?o FILTER(?o != cmt:x) } }')
+    assert pruned == 0
+    _, pruned = _prune('SELECT ?s ?o WHERE { { ?s cmt:p ?o } UNION { ?s cmt:p ?o OPTIONAL { ?o cmt:q ?z } } }')
+    assert pruned == 0
+    # 入れ子の UNION は内側から処理する
+    patterns, pruned = _prune('SELECT ?s ?o WHERE { { { ?s cmt:p ?o } UNION { ?s cmt:p ?o } } UNION { ?s cmt:q ?o } }')
+    assert pruned == 1 and [len(branch['patterns']) for branch in patterns[0]['patterns']] == [1, 1]
+    # プロパティパスは同じパスどうしだけを比べる
+    _, pruned = _prune('SELECT ?s ?o WHERE { { ?s cmt:p+ ?o } UNION { ?s cmt:p+ ?o } UNION { ?s cmt:p* ?o } }')
+    assert pruned == 1
+
+
+def test_rewriter_prunes_by_mode():
+    query = 'SELECT {} ?p ?t WHERE {{ ?p a cmt:Paper ; cmt:title ?t }}'
+    distinct, plain = _parse(query.format('DISTINCT')), _parse(query.format(''))
+    for mode, expected in [('off', (0, 0)), ('distinct', (1, 0)), ('always', (1, 1))]:
+        rewriter = SparqlRewriter(_alignment(), union_pruning=mode)
+        assert (rewriter.rewrite(distinct).pruned_branches, rewriter.rewrite(plain).pruned_branches) == expected, mode
+    context = SparqlRewriter(_alignment(), union_pruning='distinct').rewrite(distinct)
+    union = [pattern for pattern in context.ast['ast']['patterns'] if pattern['type'] == 'union'][0]
+    assert [branch['triples'][0]['object']['value'] for branch in union['patterns']] == ['http://conf#Paper',
+                                                                                        'http://conf#Article']
+    assert measure_cost(context.ast).branches == 2
+    # 書き換えの無いクエリには何もしない（元の AST のまま）
+    unchanged = _parse('SELECT DISTINCT * WHERE { { ?s cmt:p ?o } UNION { ?s cmt:p ?o } }')
+    assert SparqlRewriter(_alignment(), union_pruning='always').rewrite(unchanged).ast is unchanged
+    # 型付きの AST でも同じ結果になる
+    typed = SparqlRewriter(_alignment(), union_pruning='distinct').rewrite(to_typed(distinct))
+    assert to_dict(typed.ast) == context.ast and typed.pruned_branches == 1
+
+
+def test_queries_whose_results_depend_on_the_branches_are_not_pruned():
+    queries = ['SELECT DISTINCT (COUNT(?p) AS ?n) WHERE { ?p a cmt:Paper }',
+               'SELECT DISTINCT ?p WHERE { ?p a cmt:Paper ; cmt:title ?t } GROUP BY ?p',
+               'SELECT DISTINCT ?p WHERE { ?p a cmt:Paper ; cmt:title ?t } HAVING (COUNT(?t) > 1)',
+               'SELECT DISTINCT * WHERE { ?p a cmt:Paper ; cmt:title ?t }',
+               'SELECT DISTINCT ?p ?variable_temp0 WHERE { ?p a cmt:Paper ; cmt:title ?variable_temp0 }',
+               'ASK { ?p a cmt:Paper }']
+    rewriter = SparqlRewriter(_alignment(), union_pruning='always')
+    for query in queries:
+        context = rewriter.rewrite(_parse(query))
+        assert context.changed and context.pruned_branches == 0, query
+    # 集約の有無を持たない AST（以前の Java 版の出力など）でも、集約関数の結果の変数はパターンに現れない
+    ast = _parse(queries[0])
+    del ast['hasAggregation']
+    assert not applies_to('always', ast)
+
+
+def test_modes():
+    assert UNION_PRUNING_MODES == ('off', 'distinct', 'always')
+    query = _parse('SELECT ?s WHERE { ?s cmt:p ?o }')
+    assert applies_to('always', query) and not applies_to('distinct', query)
+    distinct = _parse('SELECT DISTINCT ?s WHERE { ?s cmt:p ?o }')
+    assert applies_to('distinct', distinct) and not applies_to('off', distinct)
+    with pytest.raises(ValueError, match='Unknown union pruning mode'):
+        check_union_pruning('aggressive')
+    with pytest.raises(ValueError, match='Unknown union pruning mode'):
+        SparqlRewriter(_alignment(), union_pruning=True)
+
+
+@pytest.mark.parametrize('dataset_dir', DATASETS, ids=os.path.basename)
+def test_pruning_on_bundled_queries(dataset_dir):
+    alignment_files = sorted(glob.glob(os.path.join(dataset_dir, 'alignment', '*.edoal')))
+    query_files = sorted(glob.glob(os.path.join(dataset_dir, 'queries', '*.sparql')))
+    if not alignment_files or not query_files:
+        pytest.skip('no alignment or queries')
+    alignment = EdoalParser(alignment_files[0]).parse()
+    plain = SparqlRewriter(alignment)
+    pruning = SparqlRewriter(alignment, union_pruning='always')
+    parser = PySparqlAstParser()
+    serializer = PyAstSerializer()
+    for path in query_files:
+        ast = parser.parse(path)
+        before = json.dumps(ast)
+        expected, context = plain.rewrite(ast), pruning.rewrite(ast)
+        if context.pruned_branches:
+            # 分岐を取り除いた分だけ少なくなる（分岐が1つになった UNION は数えなくなる）
+            assert measure_cost(context.ast).branches < measure_cost(expected.ast).branches, path
+            assert serializer.serialize(context.ast), path
+        else:
+            assert context.ast == expected.ast, path
+        assert json.dumps(ast) == before, path
@@ -0,0 +1,87 @@
+"""
+クエリの事前スキャン (VocabularyIndex) と、SparqlRewriter の変更検出のテスト
+- data/alignment/* の全データセットについて、事前スキャンで「語彙を含まない」と判定されたクエリは
+  書き換えても AST が変わらない（= 省略しても結果が同じ）ことを確認する
+"""
+import glob
+import os
+import sys
+import pathlib
+
+# tests ディレクトリから直接実行した場合でもプロジェクトの src を import できるよう
+# プロジェクトルートを sys.path に追加
+PROJECT_ROOT = str(pathlib.Path(__file__).resolve().parents[1])
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pytest
+
+from src.common.java_launcher import default_project_root
+from src.parser.edoal_parser import Alignment, Cell, IdentifiedEntity, EdoalParser
+from src.parser.py_sparql_parser import PySparqlAstParser, parse_sparql
+from src.rewriter.sparql_rewriter import SparqlRewriter
+from src.rewriter.vocabulary_index import VocabularyIndex
+
+REPO_ROOT = default_project_root()
+DATASETS = sorted(d for d in glob.glob(os.path.join(REPO_ROOT, 'data', 'alignment', '*'))
+                  if glob.glob(os.path.join(d, 'alignment', '*.edoal')) and glob.glob(os.path.join(d, 'queries', '*.sparql')))
+
+
+def _rewriter(*pairs) -> SparqlRewriter:
+    cells = [Cell(entity1=IdentifiedEntity(uri=s), entity2=IdentifiedEntity(uri=t), relation='Equivalence', measure=1.0)
+             for s, t in pairs]
+    return SparqlRewriter(Alignment(onto1='http://src', onto2='http://tgt', cells=cells))
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('SELECT * WHERE { ?s a <http://cmt#Paper> }', True),
+    ('PREFIX cmt: <http://cmt#> SELECT * WHERE { ?s a cmt:Paper . }', True),
+    ('PREFIX cmt: <http://cmt#> SELECT * WHERE { ?s a cmt:Paper. }', True),
+    ('PREFIX : <http://cmt#> SELECT * WHERE { ?s :hasAuthor/:Paper ?o }', True),
+    ('PREFIX cmt: <http://cmt#> SELECT * WHERE { ?s cmt:Pa\\per ?o }', True),
+    ('PREFIX cmt: <http://cmt#> SELECT * WHERE { ?s a cmt:Meta-Reviewer }', True),
+    ('PREFIX cmt: <http://cmt#> SELECT * WHERE { ?s a cmt:Review }', False),
+    ('PREFIX cmt: <http://cmt#> SELECT ?Paperless WHERE { ?Paperless a cmt:Reviewer }', False),
+    ('SELECT * WHERE { ?s ?p "My Paper"@en }', True),  # 文字列中の一致は「可能性あり」として扱う
+])
+def test_prescan_forms(query, expected):
+    index = VocabularyIndex(['http://cmt#Paper', 'http://cmt#Meta-Reviewer', 'http://cmt/v1.0'])
+    assert index.might_match(query) is expected
+
+
+def test_prescan_is_conservative_for_unsearchable_uris():
+    assert VocabularyIndex(['http://cmt/v1.0']).might_match('SELECT * { ?s <http://cmt/v1.0> ?o }')
+    assert not VocabularyIndex(['http://cmt/v1.0']).might_match('SELECT * { ?s <http://cmt/v1> ?o }')
+    # rdf:type は 'a' と書けるため、文字列からは判定しない
+    assert VocabularyIndex(['http://www.w3.org/1999/02/22-rdf-syntax-ns#type']).might_match('SELECT * { ?s a ?c }')
+    assert VocabularyIndex(['http://cmt#']).might_match('SELECT * { ?s ?p ?o }')
+
+
+def test_walk_tracks_changes():
+    rewriter = _rewriter(('http://cmt#Paper', 'http://conf#Paper'))
+    untouched = parse_sparql('SELECT * WHERE { ?s a <http://cmt#Review> }')
+    assert rewriter.walk(untouched) == untouched
+    assert rewriter.last_walk_changed is False
+    rewritten = rewriter.walk(parse_sparql('SELECT * WHERE { ?s a <http://cmt#Paper> }'))
+    assert rewriter.last_walk_changed is True
+    assert rewritten['ast']['patterns'][0]['triples'][0]['object']['value'] == 'http://conf#Paper'
+
+
+@pytest.mark.skipif(not DATASETS, reason='data/alignment/* not found')
+def test_prescan_misses_never_change_the_ast():
+    parser = PySparqlAstParser()
+    misses = 0
+    for dataset in DATASETS:
+        alignment_file = sorted(glob.glob(os.path.join(dataset, 'alignment', '*.edoal')))[0]
+        rewriter = SparqlRewriter(EdoalParser(alignment_file).parse())
+        for path in sorted(glob.glob(os.path.join(dataset, 'queries', '*.sparql'))):
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            if rewriter.may_rewrite(text):
+                continue
+            misses += 1
+            ast = parser.parse_query(text)
+            rewriter.walk(ast)
+            assert not rewriter.last_walk_changed, path
+    # 会議系のデータセットでは、アラインメントに出てこない語彙だけのクエリが多い
+    assert misses > 0
@@ -0,0 +1,133 @@
+package sparql_daemon_java;
+
+import com.google.gson.Gson;
+import com.google.gson.JsonElement;
+import com.google.gson.JsonObject;
+import com.google.gson.JsonPrimitive;
+import sparql_parser_java.SparqlAstParser;
+import sparql_serializer_java.SparqlAstSerializer;
+import sparql_wire_java.AstWire;
+
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.EOFException;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.io.PrintWriter;
+import java.io.StringWriter;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+
+/**
+ * パーサーとシリアライザーを1つのJVMで常駐させるヘルパープロセス。
+ *
+ * 標準入出力でフレーム化したリクエスト/レスポンスをやり取りする。
+ * 1フレームは「ペイロードのバイト長（10進数）+ 改行」のヘッダ行と、
+ * 続くUTF-8のJSONペイロードから成る。
+ * 起動時に --wire cbor を指定すると、ペイロードは文字列テーブル付きの CBOR になる
+ * （リクエスト・レスポンスの両方。sparql_wire_java.AstWire 参照）。
+ *
+ * リクエスト:  {"id": 1, "op": "parse", "path": "/abs/query.sparql"}
+ *             {"id": 2, "op": "parse", "query": "SELECT ..."}
+ *             {"id": 3, "op": "serialize", "ast": {...}}
+ *             {"id": 4, "op": "ping"}
+ * レスポンス:  {"id": 1, "ok": true, "result": ...}
+ *             {"id": 1, "ok": false, "error": "..."}
+ */
+public class SparqlHelperDaemon {
+
+    private static final Gson GSON = new Gson();
+
+    public static void main(String[] args) throws IOException {
+        String wire = AstWire.wireFormat(args);
+
+        // プロトコル用のstdoutを確保し、ライブラリの出力がフレームを壊さないよう
+        // System.out は stderr に付け替える
+        OutputStream protocolOut = new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+        System.setOut(new PrintStream(new FileOutputStream(FileDescriptor.err), true));
+
+        DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+        while (true) {
+            byte[] payload;
+            try {
+                payload = readFrame(in);
+            } catch (EOFException e) {
+                // クライアントが stdin を閉じたら終了
+                break;
+            }
+            if (payload == null) {
+                break;
+            }
+
+            JsonObject response = handle(payload, wire);
+            AstWire.writeFrame(protocolOut, AstWire.encode(response, wire));
+
+            if (response.has("shutdown")) {
+                break;
+            }
+        }
+        protocolOut.flush();
+    }
+
+    /**
+     * 1件のリクエストを処理してレスポンスを返す。例外はレスポンスに詰めて返す。
+     */
+    private static JsonObject handle(byte[] payload, String wire) {
+        JsonObject response = new JsonObject();
+        try {
+            JsonObject request = AstWire.decode(payload, wire).getAsJsonObject();
+            if (request.has("id")) {
+                response.add("id", request.get("id"));
+            }
+            String op = request.has("op") ? request.get("op").getAsString() : "";
+
+            switch (op) {
+                case "parse": {
+                    String queryString = request.has("query")
+                        ? request.get("query").getAsString()
+                        : new String(Files.readAllBytes(Paths.get(request.get("path").getAsString())), StandardCharsets.UTF_8);
+                    JsonElement result = GSON.toJsonTree(SparqlAstParser.parseQuery(queryString));
+                    response.addProperty("ok", true);
+                    response.add("result", result);
+                    break;
+                }
+                case "serialize": {
+                    String query = SparqlAstSerializer.serialize(request.getAsJsonObject("ast"));
+                    response.addProperty("ok", true);
+                    response.add("result", new JsonPrimitive(query));
+                    break;
+                }
+                case "ping":
+                    response.addProperty("ok", true);
+                    response.addProperty("result", "pong");
+                    break;
+                case "shutdown":
+                    response.addProperty("ok", true);
+                    response.addProperty("shutdown", true);
+                    break;
+                default:
+                    throw new IllegalArgumentException("Unknown op: " + op);
+            }
+        } catch (Exception e) {
+            StringWriter trace = new StringWriter();
+            e.printStackTrace(new PrintWriter(trace));
+            response.addProperty("ok", false);
+            response.addProperty("error", e.toString());
+            response.addProperty("trace", trace.toString());
+        }
+        return response;
+    }
+
+    /**
+     * ヘッダ行（バイト長）とペイロードから成るフレームを1つ読み込む。
+     * ストリーム終端に達した場合は null を返す。
+     */
+    static byte[] readFrame(DataInputStream in) throws IOException {
+        return AstWire.readFrame(in);
+    }
+}
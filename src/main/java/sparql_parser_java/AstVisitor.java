@@ -3,7 +3,13 @@ package sparql_parser_java;
 import org.apache.jena.graph.Node;
 import org.apache.jena.graph.Triple;
 import org.apache.jena.sparql.core.TriplePath;
+import org.apache.jena.sparql.expr.E_Exists;
+import org.apache.jena.sparql.expr.E_Function;
+import org.apache.jena.sparql.expr.E_NotExists;
 import org.apache.jena.sparql.expr.Expr;
+import org.apache.jena.sparql.expr.ExprAggregator;
+import org.apache.jena.sparql.expr.ExprFunction;
+import org.apache.jena.sparql.expr.ExprFunctionOp;
 import org.apache.jena.sparql.path.*;
 import org.apache.jena.sparql.syntax.*;
 
@@ -158,11 +164,63 @@ public class AstVisitor implements ElementVisitor {
     public void visit(ElementFilter el) {
         Map<String, Object> map = new LinkedHashMap<>();
         map.put("type", "filter");
-        // Exprの変換は複雑なので、ここでは単純にtoString()で表現
-        map.put("expression", el.getExpr().toString());
+        map.put("expression", exprToMap(el.getExpr()));
         stack.push(map);
     }
 
+    /**
+     * FILTER式を式木のMapに変換
+     * 変数・定数は triple と同じノード、演算子は {type: operator, name, args}、
+     * 組み込み関数は {type: function, name, args}、IRIの関数は {type: function, iri, args}、
+     * EXISTS / NOT EXISTS は {type: exists | not_exists, pattern}
+     */
+    private Map<String, Object> exprToMap(Expr expr) {
+        if (expr instanceof ExprAggregator) {
+            // 集約関数は Jena が割り当てた内部変数 (?.0 など) として扱う
+            Map<String, Object> map = new LinkedHashMap<>();
+            map.put("type", "variable");
+            map.put("value", ((ExprAggregator) expr).getVar().getVarName());
+            return map;
+        }
+        if (expr.isVariable()) {
+            Map<String, Object> map = new LinkedHashMap<>();
+            map.put("type", "variable");
+            map.put("value", expr.getVarName());
+            return map;
+        }
+        if (expr.isConstant()) {
+            return nodeToMap(expr.getConstant().asNode());
+        }
+        if (expr instanceof E_Exists || expr instanceof E_NotExists) {
+            Map<String, Object> map = new LinkedHashMap<>();
+            map.put("type", expr instanceof E_Exists ? "exists" : "not_exists");
+            ((ExprFunctionOp) expr).getElement().visit(this);
+            map.put("pattern", stack.pop());
+            return map;
+        }
+        if (expr instanceof ExprFunction) {
+            ExprFunction function = (ExprFunction) expr;
+            Map<String, Object> map = new LinkedHashMap<>();
+            if (function instanceof E_Function) {
+                map.put("type", "function");
+                map.put("iri", ((E_Function) function).getFunctionIRI());
+            } else if (function.getOpName() != null) {
+                map.put("type", "operator");
+                map.put("name", function.getOpName());
+            } else {
+                map.put("type", "function");
+                map.put("name", function.getFunctionSymbol().getSymbol());
+            }
+            List<Object> args = new ArrayList<>();
+            for (Expr arg : function.getArgs()) {
+                args.add(exprToMap(arg));
+            }
+            map.put("args", args);
+            return map;
+        }
+        throw new IllegalArgumentException("Unsupported FILTER expression: " + expr);
+    }
+
     @Override
     public void visit(ElementGroup el) {
         Map<String, Object> map = new LinkedHashMap<>();
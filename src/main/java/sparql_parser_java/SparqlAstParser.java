@@ -9,100 +9,243 @@ import org.apache.jena.sparql.core.Prologue;
 import org.apache.jena.sparql.core.Var;
 import org.apache.jena.sparql.syntax.Element;
 import org.apache.jena.sparql.syntax.ElementWalker;
+import sparql_wire_java.AstWire;
 
+import java.io.IOException;
+import java.io.PrintStream;
+import java.io.UncheckedIOException;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.FileSystems;
 import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.PathMatcher;
 import java.nio.file.Paths;
 import java.util.ArrayList;
 import java.util.List;
 import java.util.Map;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.TimeUnit;
 import java.util.stream.Collectors;
+import java.util.stream.Stream;
 
 public class SparqlAstParser {
 
     public static void main(String[] args) throws java.io.IOException {
+        // --wire json|compact|cbor で出力形式を選ぶ（sparql_wire_java.AstWire 参照）
+        String wire = AstWire.wireFormat(args);
+        args = AstWire.stripWireArgs(args);
         if (args.length == 0) {
-            System.err.println("Usage: java -cp \".:lib/*\" sparql_parser_java.SparqlAstParser <PATH_TO_SPARQL_FILE>");
+            System.err.println("Usage: java -cp \".:lib/*\" sparql_parser_java.SparqlAstParser [--wire json|compact|cbor] <PATH_TO_SPARQL_FILE>");
+            System.err.println("       java -cp \".:lib/*\" sparql_parser_java.SparqlAstParser [--wire json|compact|cbor] --batch [--threads N] <FILE|DIR|GLOB>...");
+            return;
+        }
+        if ("--batch".equals(args[0])) {
+            runBatch(args, wire);
             return;
         }
         String filePath = args[0];
         String queryString = new String(Files.readAllBytes(Paths.get(filePath)));
 
         try {
-            // クエリをパース
-            Query query = QueryFactory.create(queryString);
-
-            // クエリの主要部分を抽出
-            Element queryPattern = query.getQueryPattern();
-            Prologue prologue = query.getPrologue();
-            
-            // Gsonを使ってAST（Element）とPrefixマッピングをJSONに変換
-            // カスタムシリアライザを使わないと循環参照でエラーになるため、
-            // ここではJenaのオブジェクトを簡略化したMapに変換してからJSONにする
-            Gson gson = new GsonBuilder().setPrettyPrinting().create();
-            
-            // Prefixマッピングを抽出
-            Map<String, String> prefixMap = prologue.getPrefixMapping().getNsPrefixMap();
-
-            // クエリパターン（AST）をカスタムのVisitorでMapに変換
-            AstVisitor visitor = new AstVisitor();
-            ElementWalker.walk(queryPattern, visitor);
-
-            // クエリタイプを取得
-            String queryType = query.isSelectType() ? "SELECT" :
-                                query.isConstructType() ? "CONSTRUCT" :
-                                query.isDescribeType() ? "DESCRIBE" :
-                                query.isAskType() ? "ASK" : "UNKNOWN";
-
-            // DISTINCT フラグを取得
-            Boolean isDistinct = query.isDistinct();
-
-            // SELECT 変数を取得
-            List<String> selectVariables = new ArrayList<>();
-            if (query.isSelectType()) {
-                List<Var> resultVars = query.getProjectVars();
-                selectVariables = resultVars.stream()
-                    .map(Var::getVarName)
-                    .collect(Collectors.toList());
+            // クエリをパースしてJSONとして出力
+            ParserOutput output = parseQuery(queryString);
+            if (AstWire.CBOR.equals(wire)) {
+                AstWire.writeFrame(System.out, AstWire.encodeCbor(new Gson().toJsonTree(output)));
+            } else if (AstWire.COMPACT.equals(wire)) {
+                System.out.println(new Gson().toJson(output));
+            } else {
+                Gson gson = new GsonBuilder().setPrettyPrinting().create();
+                System.out.println(gson.toJson(output));
             }
 
-            // ORDER BY 句を取得
-            List<String> orderBy = new ArrayList<>();
-            if (query.hasOrderBy()) {
-                List<SortCondition> sortConditions = query.getOrderBy();
-                orderBy = sortConditions.stream()
-                    .map(sc -> sc.toString())
-                    .collect(Collectors.toList());
+        } catch (Exception e) {
+            System.err.println("Error parsing SPARQL query:");
+            e.printStackTrace(System.err);
+        }
+    }
+
+    /**
+     * バッチモード: 複数のファイル（ディレクトリ/globも可）をスレッドプールでパースし、
+     * 1行に1つのコンパクトなJSON（NDJSON）として出力する（cbor の場合は1件1フレーム）。
+     * 各行は {"file": ..., "ast": {...}} または {"file": ..., "error": "..."} の形式で、
+     * 完了した順に出力される。
+     */
+    private static void runBatch(String[] args, String wire) throws IOException {
+        int threads = Runtime.getRuntime().availableProcessors();
+        List<String> inputs = new ArrayList<>();
+        for (int i = 1; i < args.length; i++) {
+            if ("--threads".equals(args[i]) && i + 1 < args.length) {
+                threads = Math.max(1, Integer.parseInt(args[++i]));
+            } else {
+                inputs.add(args[i]);
             }
+        }
 
-            // LIMIT を取得
-            Long limit = query.hasLimit() ? query.getLimit() : null;
+        List<Path> files = expandInputs(inputs);
+        Gson gson = new Gson();
+        PrintStream out = new PrintStream(System.out, false, StandardCharsets.UTF_8);
 
-            // OFFSET を取得
-            Long offset = query.hasOffset() ? query.getOffset() : null;
+        ExecutorService pool = Executors.newFixedThreadPool(threads);
+        for (Path file : files) {
+            pool.submit(() -> {
+                BatchRecord record = new BatchRecord(file.toString());
+                try {
+                    String queryString = new String(Files.readAllBytes(file), StandardCharsets.UTF_8);
+                    record.ast = parseQuery(queryString);
+                } catch (Exception e) {
+                    // 1ファイルの失敗でバッチ全体を止めず、エラーとして記録する
+                    record.error = e.toString();
+                }
+                if (AstWire.CBOR.equals(wire)) {
+                    try {
+                        AstWire.writeFrame(out, AstWire.encodeCbor(gson.toJsonTree(record)));
+                    } catch (IOException e) {
+                        throw new UncheckedIOException(e);
+                    }
+                    return;
+                }
+                String line = gson.toJson(record);
+                synchronized (out) {
+                    out.println(line);
+                    out.flush();
+                }
+            });
+        }
+        pool.shutdown();
+        try {
+            pool.awaitTermination(Long.MAX_VALUE, TimeUnit.SECONDS);
+        } catch (InterruptedException e) {
+            Thread.currentThread().interrupt();
+        }
+        out.flush();
+    }
 
-            // 結果をまとめる
-            ParserOutput output = new ParserOutput(
-                prefixMap, 
-                visitor.getAstRoot(),
-                queryType,
-                isDistinct,
-                selectVariables,
-                orderBy,
-                limit,
-                offset
-            );
+    /**
+     * 入力引数（ファイル / ディレクトリ / globパターン）を .sparql ファイルのリストに展開する。
+     */
+    static List<Path> expandInputs(List<String> inputs) throws IOException {
+        List<Path> files = new ArrayList<>();
+        for (String input : inputs) {
+            if (input.contains("*") || input.contains("?")) {
+                // globの場合: ワイルドカードを含まない先頭部分をベースディレクトリとして探索
+                int wildcard = input.indexOf('*') >= 0 ? input.indexOf('*') : input.length();
+                if (input.indexOf('?') >= 0) {
+                    wildcard = Math.min(wildcard, input.indexOf('?'));
+                }
+                int slash = input.lastIndexOf('/', wildcard);
+                Path baseDir = Paths.get(slash >= 0 ? input.substring(0, slash + 1) : ".");
+                PathMatcher matcher = FileSystems.getDefault().getPathMatcher("glob:" + input);
+                try (Stream<Path> walk = Files.walk(baseDir)) {
+                    walk.filter(Files::isRegularFile)
+                        .filter(p -> matcher.matches(slash >= 0 ? p : p.normalize()))
+                        .sorted()
+                        .forEach(files::add);
+                }
+            } else {
+                Path path = Paths.get(input);
+                if (Files.isDirectory(path)) {
+                    try (Stream<Path> list = Files.list(path)) {
+                        list.filter(p -> p.toString().endsWith(".sparql"))
+                            .sorted()
+                            .forEach(files::add);
+                    }
+                } else {
+                    files.add(path);
+                }
+            }
+        }
+        return files;
+    }
 
-            // JSONとして出力
-            System.out.println(gson.toJson(output));
+    /**
+     * SPARQLクエリ文字列をパースし、JSONに変換可能な出力コンテナを返す。
+     * 常駐プロセス（SparqlHelperDaemon）からも再利用される。
+     */
+    public static ParserOutput parseQuery(String queryString) {
+        // クエリをパース
+        Query query = QueryFactory.create(queryString);
 
-        } catch (Exception e) {
-            System.err.println("Error parsing SPARQL query:");
-            e.printStackTrace(System.err);
+        // クエリの主要部分を抽出
+        Element queryPattern = query.getQueryPattern();
+        Prologue prologue = query.getPrologue();
+
+        // Gsonを使ってAST（Element）とPrefixマッピングをJSONに変換
+        // カスタムシリアライザを使わないと循環参照でエラーになるため、
+        // ここではJenaのオブジェクトを簡略化したMapに変換してからJSONにする
+
+        // Prefixマッピングを抽出
+        Map<String, String> prefixMap = prologue.getPrefixMapping().getNsPrefixMap();
+
+        // クエリパターン（AST）をカスタムのVisitorでMapに変換
+        AstVisitor visitor = new AstVisitor();
+        ElementWalker.walk(queryPattern, visitor);
+
+        // クエリタイプを取得
+        String queryType = query.isSelectType() ? "SELECT" :
+                            query.isConstructType() ? "CONSTRUCT" :
+                            query.isDescribeType() ? "DESCRIBE" :
+                            query.isAskType() ? "ASK" : "UNKNOWN";
+
+        // DISTINCT フラグを取得
+        Boolean isDistinct = query.isDistinct();
+
+        // SELECT 変数を取得
+        List<String> selectVariables = new ArrayList<>();
+        if (query.isSelectType()) {
+            List<Var> resultVars = query.getProjectVars();
+            selectVariables = resultVars.stream()
+                .map(Var::getVarName)
+                .collect(Collectors.toList());
+        }
+
+        // ORDER BY 句を取得
+        List<String> orderBy = new ArrayList<>();
+        if (query.hasOrderBy()) {
+            List<SortCondition> sortConditions = query.getOrderBy();
+            orderBy = sortConditions.stream()
+                .map(sc -> sc.toString())
+                .collect(Collectors.toList());
         }
+
+        // LIMIT を取得
+        Long limit = query.hasLimit() ? query.getLimit() : null;
+
+        // OFFSET を取得
+        Long offset = query.hasOffset() ? query.getOffset() : null;
+
+        // 集約（集約関数 / GROUP BY / HAVING）と SELECT * の有無（Gson は null を出力しないので true の場合だけ出力）
+        Boolean hasAggregation = query.hasAggregators() || query.hasGroupBy() || query.hasHaving() ? Boolean.TRUE : null;
+        Boolean isSelectAll = query.isQueryResultStar() ? Boolean.TRUE : null;
+
+        // 結果をまとめる
+        return new ParserOutput(
+            prefixMap,
+            visitor.getAstRoot(),
+            queryType,
+            isDistinct,
+            selectVariables,
+            orderBy,
+            limit,
+            offset,
+            hasAggregation,
+            isSelectAll
+        );
     }
     
+    // バッチモードの1行分の出力
+    static class BatchRecord {
+        String file;
+        ParserOutput ast;
+        String error;
+
+        BatchRecord(String file) {
+            this.file = file;
+        }
+    }
+
     // 出力用のコンテナクラス
-    static class ParserOutput {
+    public static class ParserOutput {
         Map<String, String> prefixes;
         Object ast;
         String queryType;
@@ -111,10 +254,13 @@ public class SparqlAstParser {
         List<String> orderBy;
         Long limit;
         Long offset;
+        Boolean hasAggregation;
+        Boolean isSelectAll;
 
         ParserOutput(Map<String, String> prefixes, Object ast, String queryType, 
                      Boolean isDistinct, List<String> selectVariables, 
-                     List<String> orderBy, Long limit, Long offset) {
+                     List<String> orderBy, Long limit, Long offset,
+                     Boolean hasAggregation, Boolean isSelectAll) {
             this.prefixes = prefixes;
             this.ast = ast;
             this.queryType = queryType;
@@ -123,6 +269,8 @@ public class SparqlAstParser {
             this.orderBy = orderBy;
             this.limit = limit;
             this.offset = offset;
+            this.hasAggregation = hasAggregation;
+            this.isSelectAll = isSelectAll;
         }
     }
 }
\ No newline at end of file
@@ -12,17 +12,35 @@ import org.apache.jena.query.QueryFactory;
 import org.apache.jena.query.SortCondition;
 import org.apache.jena.sparql.core.Var;
 import org.apache.jena.sparql.core.TriplePath;
+import org.apache.jena.sparql.expr.E_Exists;
+import org.apache.jena.sparql.expr.E_LogicalAnd;
+import org.apache.jena.sparql.expr.E_LogicalNot;
+import org.apache.jena.sparql.expr.E_LogicalOr;
+import org.apache.jena.sparql.expr.E_NotExists;
 import org.apache.jena.sparql.expr.Expr;
 import org.apache.jena.sparql.expr.ExprVar;
+import org.apache.jena.sparql.expr.NodeValue;
 import org.apache.jena.sparql.path.*;
+import org.apache.jena.sparql.sse.Item;
+import org.apache.jena.sparql.sse.ItemList;
 import org.apache.jena.sparql.sse.SSE;
+import org.apache.jena.sparql.sse.builders.BuilderExpr;
 import org.apache.jena.sparql.syntax.*;
+import sparql_wire_java.AstWire;
 
+import java.io.BufferedInputStream;
 import java.io.BufferedReader;
+import java.io.InputStream;
 import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
 import java.util.ArrayList;
 import java.util.List;
 import java.util.Map;
+import java.util.concurrent.Callable;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
 
 /**
  * JSON AST（書き換え済み）を標準入力から読み取り、
@@ -31,7 +49,27 @@ import java.util.Map;
 public class SparqlAstSerializer {
 
     public static void main(String[] args) {
+        // --wire json|compact|cbor で入力（AST）の形式を選ぶ（sparql_wire_java.AstWire 参照）
+        String wire = AstWire.wireFormat(args);
+        args = AstWire.stripWireArgs(args);
+        for (String arg : args) {
+            if ("--batch".equals(arg)) {
+                runBatch(args, wire);
+                return;
+            }
+        }
+
         try {
+            if (AstWire.CBOR.equals(wire)) {
+                // 標準入力から CBOR のフレームを1つ読み取る
+                byte[] payload = AstWire.readFrame(new BufferedInputStream(System.in));
+                if (payload == null) {
+                    throw new IllegalArgumentException("No AST frame on stdin");
+                }
+                System.out.println(serialize(AstWire.decodeCbor(payload).getAsJsonObject()));
+                return;
+            }
+
             // 標準入力からJSON ASTを読み取る
             BufferedReader reader = new BufferedReader(new InputStreamReader(System.in));
             StringBuilder jsonBuilder = new StringBuilder();
@@ -45,11 +83,8 @@ public class SparqlAstSerializer {
             Gson gson = new Gson();
             JsonObject astJson = gson.fromJson(jsonString, JsonObject.class);
 
-            // Queryオブジェクトを再構築
-            Query query = reconstructQuery(astJson);
-
-            // SPARQL文字列として出力
-            System.out.println(query.serialize());
+            // Queryオブジェクトを再構築し、SPARQL文字列として出力
+            System.out.println(serialize(astJson));
 
         } catch (Exception e) {
             System.err.println("Error serializing AST to SPARQL:");
@@ -58,6 +93,88 @@ public class SparqlAstSerializer {
         }
     }
 
+    /**
+     * バッチモード: 標準入力から1行1件のJSON AST（NDJSON）を読み取り、
+     * スレッドプールで並列に再構築して、入力と同じ順序で1行1件のJSONを出力する。
+     * 各行は {"index": i, "query": "..."} または {"index": i, "error": "..."} の形式。
+     * cbor の場合は入力・出力とも1件1フレームになる。
+     */
+    private static void runBatch(String[] args, String wire) {
+        int threads = Runtime.getRuntime().availableProcessors();
+        for (int i = 0; i < args.length - 1; i++) {
+            if ("--threads".equals(args[i])) {
+                threads = Math.max(1, Integer.parseInt(args[i + 1]));
+            }
+        }
+
+        Gson gson = new Gson();
+        PrintStream out = new PrintStream(System.out, false, StandardCharsets.UTF_8);
+        ExecutorService pool = Executors.newFixedThreadPool(threads);
+        boolean cbor = AstWire.CBOR.equals(wire);
+        try {
+            List<Future<JsonObject>> futures = new ArrayList<>();
+            if (cbor) {
+                InputStream in = new BufferedInputStream(System.in);
+                byte[] payload;
+                while ((payload = AstWire.readFrame(in)) != null) {
+                    final byte[] frame = payload;
+                    futures.add(submitRecord(pool, futures.size(), () -> AstWire.decodeCbor(frame).getAsJsonObject()));
+                }
+            } else {
+                BufferedReader reader = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+                String line;
+                while ((line = reader.readLine()) != null) {
+                    if (line.trim().isEmpty()) {
+                        continue;
+                    }
+                    final String jsonLine = line;
+                    futures.add(submitRecord(pool, futures.size(), () -> gson.fromJson(jsonLine, JsonObject.class)));
+                }
+            }
+
+            // 入力順に出力する
+            for (Future<JsonObject> future : futures) {
+                if (cbor) {
+                    AstWire.writeFrame(out, AstWire.encodeCbor(future.get()));
+                } else {
+                    out.println(gson.toJson(future.get()));
+                    out.flush();
+                }
+            }
+        } catch (Exception e) {
+            System.err.println("Error serializing AST batch to SPARQL:");
+            e.printStackTrace(System.err);
+            System.exit(1);
+        } finally {
+            pool.shutdown();
+        }
+    }
+
+    /**
+     * 1件分のASTのデコードとシリアライズをスレッドプールに投入し、結果のレコードを返す Future を返す。
+     */
+    private static Future<JsonObject> submitRecord(ExecutorService pool, int index, Callable<JsonObject> astSupplier) {
+        return pool.submit(() -> {
+            JsonObject record = new JsonObject();
+            record.addProperty("index", index);
+            try {
+                record.addProperty("query", serialize(astSupplier.call()));
+            } catch (Exception e) {
+                // 1件の失敗でバッチ全体を止めず、エラーとして記録する
+                record.addProperty("error", e.toString());
+            }
+            return record;
+        });
+    }
+
+    /**
+     * JSON ASTをSPARQLクエリ文字列に変換する。
+     * 常駐プロセス（SparqlHelperDaemon）からも再利用される。
+     */
+    public static String serialize(JsonObject astJson) {
+        return reconstructQuery(astJson).serialize();
+    }
+
     /**
      * JSON ASTからJena Queryオブジェクトを再構築する
      */
@@ -299,18 +416,25 @@ public class SparqlAstSerializer {
      * FILTERノードを再構築
      */
     private static ElementFilter reconstructFilter(JsonObject node) {
-        // FILTER の式はS式形式（Lisp形式）で保存されているので、SSE.parseExpr() を使用
         if (node.has("expression")) {
-            String exprString = node.get("expression").getAsString();
-            
+            JsonElement expression = node.get("expression");
+            if (expression.isJsonPrimitive()) {
+                // 以前の形式: S式（例: "(regex ?label \"pattern\" \"i\")"）の文字列
+                String exprString = expression.getAsString();
+                try {
+                    return new ElementFilter(SSE.parseExpr(exprString));
+                } catch (Exception ex) {
+                    System.err.println("Error: Could not parse FILTER expression using SSE: " + exprString);
+                    System.err.println("  Error: " + ex.getMessage());
+                    throw new RuntimeException("Failed to parse FILTER expression: " + exprString, ex);
+                }
+            }
             try {
-                // S式（例: "(regex ?label \"pattern\" \"i\")"）をJena Exprオブジェクトにパース
-                Expr expr = SSE.parseExpr(exprString);
-                return new ElementFilter(expr);
+                return new ElementFilter(reconstructExpr(expression.getAsJsonObject()));
             } catch (Exception ex) {
-                System.err.println("Error: Could not parse FILTER expression using SSE: " + exprString);
+                System.err.println("Error: Could not reconstruct FILTER expression: " + expression);
                 System.err.println("  Error: " + ex.getMessage());
-                throw new RuntimeException("Failed to parse FILTER expression: " + exprString, ex);
+                throw new RuntimeException("Failed to reconstruct FILTER expression: " + expression, ex);
             }
         }
         
@@ -318,6 +442,76 @@ public class SparqlAstSerializer {
         throw new RuntimeException("FILTER node has no expression");
     }
 
+    /**
+     * FILTERの式木（AstVisitor.exprToMap の出力）を Expr に再構築
+     * EXISTS を子に持てるよう、論理演算子は直接組み立て、それ以外は SSE の Item を経由して
+     * Jena の組み込み関数表（BuilderExpr）で組み立てる
+     */
+    private static Expr reconstructExpr(JsonObject exprJson) {
+        String type = exprJson.has("type") ? exprJson.get("type").getAsString() : "";
+        switch (type) {
+            case "variable":
+                return new ExprVar(exprJson.get("value").getAsString());
+            case "uri":
+            case "literal":
+                return NodeValue.makeNode(reconstructNode(exprJson));
+            case "exists":
+                return new E_Exists(reconstructElement(exprJson.getAsJsonObject("pattern")));
+            case "not_exists":
+                return new E_NotExists(reconstructElement(exprJson.getAsJsonObject("pattern")));
+            case "operator": {
+                String name = exprJson.get("name").getAsString();
+                JsonArray args = exprJson.getAsJsonArray("args");
+                if (name.equals("&&") && args.size() == 2) {
+                    return new E_LogicalAnd(reconstructExpr(args.get(0).getAsJsonObject()),
+                                            reconstructExpr(args.get(1).getAsJsonObject()));
+                }
+                if (name.equals("||") && args.size() == 2) {
+                    return new E_LogicalOr(reconstructExpr(args.get(0).getAsJsonObject()),
+                                           reconstructExpr(args.get(1).getAsJsonObject()));
+                }
+                if (name.equals("!") && args.size() == 1) {
+                    return new E_LogicalNot(reconstructExpr(args.get(0).getAsJsonObject()));
+                }
+                return BuilderExpr.buildExpr(exprItem(exprJson));
+            }
+            case "function":
+                return BuilderExpr.buildExpr(exprItem(exprJson));
+            default:
+                throw new RuntimeException("Unknown FILTER expression node type: " + type);
+        }
+    }
+
+    /**
+     * 式木を SSE の Item に変換（例: {type: operator, name: "=", args: [...]} -> (= ?x 1)）
+     */
+    private static Item exprItem(JsonObject exprJson) {
+        String type = exprJson.has("type") ? exprJson.get("type").getAsString() : "";
+        switch (type) {
+            case "variable":
+                return Item.createNode(Var.alloc(exprJson.get("value").getAsString()));
+            case "uri":
+            case "literal":
+                return Item.createNode(reconstructNode(exprJson));
+            case "operator":
+            case "function": {
+                ItemList list = new ItemList();
+                if (exprJson.has("iri")) {
+                    list.add(Item.createNode(NodeFactory.createURI(exprJson.get("iri").getAsString())));
+                } else {
+                    list.add(Item.createSymbol(exprJson.get("name").getAsString()));
+                }
+                for (JsonElement arg : exprJson.getAsJsonArray("args")) {
+                    list.add(exprItem(arg.getAsJsonObject()));
+                }
+                return Item.createList(list);
+            }
+            default:
+                // EXISTS は論理演算子の子としてだけ再構築できる
+                throw new RuntimeException("Unsupported FILTER expression node here: " + type);
+        }
+    }
+
     /**
      * トリプルを再構築
      */
@@ -342,12 +536,13 @@ public class SparqlAstSerializer {
                 return Var.alloc(value).asNode();
             case "literal":
                 // リテラルの完全な処理（言語タグ、データタイプ）
-                if (nodeJson.has("datatype")) {
+                // 言語タグ付きリテラルは datatype が rdf:langString なので、言語タグを優先する
+                if (nodeJson.has("lang") || nodeJson.has("language")) {
+                    String language = nodeJson.get(nodeJson.has("lang") ? "lang" : "language").getAsString();
+                    return NodeFactory.createLiteral(value, language);
+                } else if (nodeJson.has("datatype")) {
                     String datatype = nodeJson.get("datatype").getAsString();
                     return NodeFactory.createLiteral(value, NodeFactory.getType(datatype));
-                } else if (nodeJson.has("language")) {
-                    String language = nodeJson.get("language").getAsString();
-                    return NodeFactory.createLiteral(value, language);
                 } else {
                     return NodeFactory.createLiteral(value);
                 }
@@ -0,0 +1,399 @@
+package sparql_wire_java;
+
+import com.google.gson.Gson;
+import com.google.gson.JsonArray;
+import com.google.gson.JsonElement;
+import com.google.gson.JsonNull;
+import com.google.gson.JsonObject;
+import com.google.gson.JsonPrimitive;
+
+import java.io.ByteArrayOutputStream;
+import java.io.EOFException;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+
+/**
+ * Python ラッパーとの間で AST をやり取りするワイヤーフォーマット。
+ * Python 側の実装は sparql_translator/src/common/ast_wire.py で、両者は同じ形式を読み書きする。
+ *
+ * 形式は各ヘルパーに {@code --wire <format>} を渡して選ぶ（省略時は json）。
+ *   json    : 従来どおりの JSON（パーサーの単発モードは整形済み）
+ *   compact : 空白を含まない1行の JSON
+ *   cbor    : 文字列テーブル付きの CBOR (RFC 8949)
+ *
+ * CBOR メッセージは [[文字列0, 文字列1, ...], 本体] の配列で、本体の中の文字列
+ * （マップのキーを含む）はテーブルに入っていれば tag 25 + 番号で参照する。
+ * バイナリを含むため、CBOR の場合は「バイト長 + 改行」のヘッダ付きフレームで送る。
+ */
+public final class AstWire {
+
+    public static final String JSON = "json";
+    public static final String COMPACT = "compact";
+    public static final String CBOR = "cbor";
+
+    private static final Gson GSON = new Gson();
+
+    // この長さ（UTF-8 バイト数）未満の文字列はテーブルに入れず、そのまま書く
+    private static final int MIN_INTERNED_LENGTH = 3;
+    private static final int STRING_REF_TAG = 25;
+
+    private AstWire() {
+    }
+
+    /**
+     * 引数から {@code --wire <format>} を取り出す。指定が無ければ json。
+     */
+    public static String wireFormat(String[] args) {
+        for (int i = 0; i < args.length - 1; i++) {
+            if ("--wire".equals(args[i])) {
+                String format = args[i + 1];
+                if (!JSON.equals(format) && !COMPACT.equals(format) && !CBOR.equals(format)) {
+                    throw new IllegalArgumentException("Unknown wire format: " + format);
+                }
+                return format;
+            }
+        }
+        return JSON;
+    }
+
+    /**
+     * 引数から {@code --wire <format>} を取り除いたものを返す。
+     */
+    public static String[] stripWireArgs(String[] args) {
+        List<String> rest = new ArrayList<>();
+        for (int i = 0; i < args.length; i++) {
+            if ("--wire".equals(args[i]) && i + 1 < args.length) {
+                i++;
+                continue;
+            }
+            rest.add(args[i]);
+        }
+        return rest.toArray(new String[0]);
+    }
+
+    /**
+     * JSON ツリーを指定した形式のバイト列にする（json と compact はどちらも1行の JSON）。
+     */
+    public static byte[] encode(JsonElement element, String format) {
+        if (CBOR.equals(format)) {
+            return encodeCbor(element);
+        }
+        return GSON.toJson(element).getBytes(StandardCharsets.UTF_8);
+    }
+
+    /**
+     * 指定した形式のバイト列を JSON ツリーに戻す。
+     */
+    public static JsonElement decode(byte[] payload, String format) {
+        if (CBOR.equals(format)) {
+            return decodeCbor(payload);
+        }
+        return GSON.fromJson(new String(payload, StandardCharsets.UTF_8), JsonElement.class);
+    }
+
+    // ============================================================
+    // フレーム
+    // ============================================================
+
+    /**
+     * ヘッダ行（バイト長）とペイロードから成るフレームを1つ読み込む。
+     * ストリーム終端に達した場合は null を返す。
+     */
+    public static byte[] readFrame(InputStream in) throws IOException {
+        String header = readHeaderLine(in);
+        if (header == null) {
+            return null;
+        }
+        int length = Integer.parseInt(header.trim());
+        byte[] payload = new byte[length];
+        int offset = 0;
+        while (offset < length) {
+            int read = in.read(payload, offset, length - offset);
+            if (read < 0) {
+                throw new EOFException("Stream closed in the middle of a frame");
+            }
+            offset += read;
+        }
+        return payload;
+    }
+
+    private static String readHeaderLine(InputStream in) throws IOException {
+        ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+        int b;
+        while ((b = in.read()) != -1) {
+            if (b == '\n') {
+                String line = buffer.toString(StandardCharsets.US_ASCII);
+                if (line.trim().isEmpty()) {
+                    // 空行は読み飛ばす
+                    buffer.reset();
+                    continue;
+                }
+                return line;
+            }
+            buffer.write(b);
+        }
+        return null;
+    }
+
+    /**
+     * フレームを書き出してフラッシュする。
+     */
+    public static void writeFrame(OutputStream out, byte[] payload) throws IOException {
+        synchronized (out) {
+            out.write((payload.length + "\n").getBytes(StandardCharsets.US_ASCII));
+            out.write(payload);
+            out.flush();
+        }
+    }
+
+    // ============================================================
+    // CBOR（文字列テーブル付き）
+    // ============================================================
+
+    /**
+     * JSON ツリーを文字列テーブル付きの CBOR にする。
+     */
+    public static byte[] encodeCbor(JsonElement root) {
+        CborEncoder encoder = new CborEncoder();
+        encoder.writeValue(root);
+
+        ByteArrayOutputStream out = new ByteArrayOutputStream(encoder.body.size() + encoder.tableBytes + 16);
+        writeHead(out, 4, 2);
+        writeHead(out, 4, encoder.strings.size());
+        for (byte[] data : encoder.strings) {
+            writeHead(out, 3, data.length);
+            out.write(data, 0, data.length);
+        }
+        byte[] body = encoder.body.toByteArray();
+        out.write(body, 0, body.length);
+        return out.toByteArray();
+    }
+
+    private static void writeHead(ByteArrayOutputStream out, int major, long value) {
+        int type = major << 5;
+        if (value < 24) {
+            out.write(type | (int) value);
+        } else if (value < 0x100L) {
+            out.write(type | 24);
+            out.write((int) value);
+        } else if (value < 0x10000L) {
+            out.write(type | 25);
+            writeBigEndian(out, value, 2);
+        } else if (value < 0x100000000L) {
+            out.write(type | 26);
+            writeBigEndian(out, value, 4);
+        } else {
+            out.write(type | 27);
+            writeBigEndian(out, value, 8);
+        }
+    }
+
+    private static void writeBigEndian(ByteArrayOutputStream out, long value, int size) {
+        for (int shift = (size - 1) * 8; shift >= 0; shift -= 8) {
+            out.write((int) (value >>> shift) & 0xff);
+        }
+    }
+
+    private static final class CborEncoder {
+        final ByteArrayOutputStream body = new ByteArrayOutputStream();
+        final Map<String, Integer> table = new HashMap<>();
+        final List<byte[]> strings = new ArrayList<>();
+        int tableBytes = 0;
+
+        void writeString(String value) {
+            Integer index = table.get(value);
+            if (index == null) {
+                byte[] data = value.getBytes(StandardCharsets.UTF_8);
+                if (data.length < MIN_INTERNED_LENGTH) {
+                    writeHead(body, 3, data.length);
+                    body.write(data, 0, data.length);
+                    return;
+                }
+                index = strings.size();
+                table.put(value, index);
+                strings.add(data);
+                tableBytes += data.length + 5;
+            }
+            body.write(0xd8);
+            body.write(STRING_REF_TAG);
+            writeHead(body, 0, index);
+        }
+
+        void writeValue(JsonElement element) {
+            if (element == null || element.isJsonNull()) {
+                body.write(0xf6);
+            } else if (element.isJsonObject()) {
+                JsonObject object = element.getAsJsonObject();
+                writeHead(body, 5, object.size());
+                for (Map.Entry<String, JsonElement> entry : object.entrySet()) {
+                    writeString(entry.getKey());
+                    writeValue(entry.getValue());
+                }
+            } else if (element.isJsonArray()) {
+                JsonArray array = element.getAsJsonArray();
+                writeHead(body, 4, array.size());
+                for (JsonElement item : array) {
+                    writeValue(item);
+                }
+            } else {
+                JsonPrimitive primitive = element.getAsJsonPrimitive();
+                if (primitive.isBoolean()) {
+                    body.write(primitive.getAsBoolean() ? 0xf5 : 0xf4);
+                } else if (primitive.isNumber()) {
+                    writeNumber(primitive.getAsNumber());
+                } else {
+                    writeString(primitive.getAsString());
+                }
+            }
+        }
+
+        void writeNumber(Number number) {
+            // JSON と同様、整数として読める値は整数、それ以外は float64 にする
+            long value;
+            try {
+                value = Long.parseLong(number.toString());
+            } catch (NumberFormatException e) {
+                body.write(0xfb);
+                writeBigEndian(body, Double.doubleToLongBits(number.doubleValue()), 8);
+                return;
+            }
+            if (value >= 0) {
+                writeHead(body, 0, value);
+            } else {
+                writeHead(body, 1, -1 - value);
+            }
+        }
+    }
+
+    /**
+     * encodeCbor（または Python の encode_cbor）の出力を JSON ツリーに戻す。
+     */
+    public static JsonElement decodeCbor(byte[] data) {
+        if (data.length == 0 || (data[0] & 0xff) != 0x82) {
+            throw new IllegalArgumentException("Malformed CBOR message: expected [string table, body]");
+        }
+        CborDecoder decoder = new CborDecoder(data);
+        decoder.pos = 1;
+        try {
+            // 本体の tag 25 を解決できるよう、先に文字列テーブルを読む
+            JsonArray table = decoder.read().getAsJsonArray();
+            decoder.strings = new ArrayList<>(table.size());
+            for (JsonElement entry : table) {
+                decoder.strings.add(entry.getAsJsonPrimitive());
+            }
+            JsonElement result = decoder.read();
+            if (decoder.pos != data.length) {
+                throw new IllegalArgumentException("Malformed CBOR message: trailing bytes");
+            }
+            return result;
+        } catch (ArrayIndexOutOfBoundsException | IllegalStateException e) {
+            throw new IllegalArgumentException("Malformed CBOR message: " + e, e);
+        }
+    }
+
+    private static final class CborDecoder {
+        final byte[] data;
+        int pos;
+        List<JsonPrimitive> strings = new ArrayList<>();
+
+        CborDecoder(byte[] data) {
+            this.data = data;
+        }
+
+        long argument(int info) {
+            if (info < 24) {
+                return info;
+            }
+            if (info > 27) {
+                throw new IllegalArgumentException("Unsupported CBOR additional info " + info + " at offset " + pos);
+            }
+            int size = 1 << (info - 24);
+            long value = 0;
+            for (int i = 0; i < size; i++) {
+                value = (value << 8) | (data[pos++] & 0xff);
+            }
+            return value;
+        }
+
+        int length(int info) {
+            long value = argument(info);
+            if (value < 0 || value > Integer.MAX_VALUE) {
+                throw new IllegalArgumentException("CBOR length out of range: " + value);
+            }
+            return (int) value;
+        }
+
+        JsonElement read() {
+            int initial = data[pos++] & 0xff;
+            int major = initial >>> 5;
+            int info = initial & 0x1f;
+            switch (major) {
+                case 0:
+                    return new JsonPrimitive(argument(info));
+                case 1:
+                    return new JsonPrimitive(-1 - argument(info));
+                case 3: {
+                    int length = length(info);
+                    String text = new String(data, pos, length, StandardCharsets.UTF_8);
+                    pos += length;
+                    return new JsonPrimitive(text);
+                }
+                case 4: {
+                    int length = length(info);
+                    JsonArray array = new JsonArray(length);
+                    for (int i = 0; i < length; i++) {
+                        array.add(read());
+                    }
+                    return array;
+                }
+                case 5: {
+                    int length = length(info);
+                    JsonObject object = new JsonObject();
+                    for (int i = 0; i < length; i++) {
+                        String key = read().getAsString();
+                        object.add(key, read());
+                    }
+                    return object;
+                }
+                case 6: {
+                    long tag = argument(info);
+                    if (tag != STRING_REF_TAG) {
+                        throw new IllegalArgumentException("Unsupported CBOR tag " + tag);
+                    }
+                    int refInitial = data[pos++] & 0xff;
+                    if ((refInitial >>> 5) != 0) {
+                        throw new IllegalArgumentException("String reference must be an unsigned integer");
+                    }
+                    return strings.get(length(refInitial & 0x1f));
+                }
+                case 7:
+                    switch (info) {
+                        case 20:
+                            return new JsonPrimitive(false);
+                        case 21:
+                            return new JsonPrimitive(true);
+                        case 22:
+                        case 23:
+                            return JsonNull.INSTANCE;
+                        case 26:
+                            return new JsonPrimitive((double) Float.intBitsToFloat((int) argument(info)));
+                        case 27:
+                            return new JsonPrimitive(Double.longBitsToDouble(argument(info)));
+                        default:
+                            break;
+                    }
+                    break;
+                default:
+                    break;
+            }
+            throw new IllegalArgumentException(
+                "Unsupported CBOR item 0x" + Integer.toHexString(initial) + " at offset " + (pos - 1));
+        }
+    }
+}